@@ -10,19 +10,30 @@ from flask import Flask, render_template, request, jsonify, session, redirect, u
 from src.agent.travel_agent import TravelAgent
 from src.config import config
 from src.models.user import user_manager
+from src.utils.amap_rate_limiter import get_amap_rate_limiter
+from src.utils.amap_cache import cache_stats as amap_cache_stats
+from src.agent.llm_registry import llm_registry_stats
+from src.agent.memory_store import get_memory_store
+from src.agent.agent_pool import create_agent_pool
+from src.agent.intent_router import get_intent_router
+from src.agent.parallel_executor import parallel_executor_stats
+from src.agent.response_cache import get_response_cache
+from src.agent.run_guard import RunRejected, get_run_guard
+from src.agent.event_bus import AgentEventHandler, EventBus, run_in_background
+from src.agent.streaming import stream_tokens
+from src.agent.tool_memo import tool_memo_stats, tool_request_scope
+from src.utils.cancellation import CancellationToken, cancellation_stats
 from functools import wraps
+import time
 import uuid
 import json
-import queue
-import threading
-from langchain.callbacks.base import BaseCallbackHandler
-from langchain.schema import AgentAction
 
 app = Flask(__name__)
 app.secret_key = 'travel-assistant-secret-key-change-in-production'
 
-# 存储每个会话的Agent实例
-agents = {}
+# 存储每个会话的Agent实例（限制常驻数量，按LRU和空闲时间回收，见 agent.pool 配置）
+agents = create_agent_pool(lambda agent_key: TravelAgent(verbose=True, session_id=agent_key),
+                           in_use=lambda agent_key: get_run_guard().is_busy(agent_key))
 
 
 def login_required(f):
@@ -49,22 +60,28 @@ def get_or_create_agent(user_id: str = None, session_id: str = None):
         return None, "缺少用户ID或会话ID"
     
     if agent_key not in agents:
-        try:
-            print(f'\n--- 创建新的Agent实例 ---', flush=True)
-            print(f'用户ID: {user_id[:8] if user_id else "未登录"}...', flush=True)
-            print(f'会话ID: {session_id[:8] if session_id else "N/A"}...', flush=True)
-            # 使用user_id作为session_id传递给Agent（用于偏好管理）
-            agents[agent_key] = TravelAgent(verbose=True, session_id=user_id or session_id)
-            print('Agent实例创建成功\n', flush=True)
-        except Exception as e:
-            import traceback
-            print(f'\n--- Agent创建失败 ---', flush=True)
-            print(f'错误: {e}', flush=True)
-            traceback.print_exc()
-            return None, str(e)
+        print(f'\n--- 创建新的Agent实例 ---', flush=True)
+        print(f'用户ID: {user_id[:8] if user_id else "未登录"}...', flush=True)
+        print(f'会话ID: {session_id[:8] if session_id else "N/A"}...', flush=True)
     else:
         print(f'使用现有Agent实例，用户ID: {user_id[:8] if user_id else "未登录"}...', flush=True)
-    return agents[agent_key], None
+    try:
+        # 使用user_id作为session_id传递给Agent（用于偏好管理）；被回收的Agent会从状态快照恢复
+        return agents.get(agent_key), None
+    except Exception as e:
+        import traceback
+        print(f'\n--- Agent创建失败 ---', flush=True)
+        print(f'错误: {e}', flush=True)
+        traceback.print_exc()
+        return None, str(e)
+
+
+def rejected_response(e: RunRejected):
+    """请求被并发控制拒绝（同一会话排队已满或系统繁忙）时返回429，附带建议的重试间隔"""
+    response = jsonify({'error': str(e)})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
 
 
 @app.route('/')
@@ -125,6 +142,7 @@ def plan_page():
 @app.route('/api/chat', methods=['POST'])
 def chat():
     """处理聊天请求"""
+    ticket = None
     try:
         # 检查登录状态
         if 'user_id' not in session:
@@ -153,6 +171,9 @@ def chat():
         if not user_input:
             return jsonify({'error': '消息不能为空'}), 400
         
+        # 同一会话的请求依次执行（Agent的旅行信息和对话记忆不能并发修改），系统繁忙时返回429
+        ticket = get_run_guard().acquire(user_id or session_id)
+        
         # 获取或创建Agent（使用user_id或session_id）
         agent, error = get_or_create_agent(user_id=user_id, session_id=session_id)
         if error:
@@ -179,10 +200,42 @@ def chat():
         return jsonify({
             'response': response,
             'user_id': user_id,
-            'session_id': session_id
+            'session_id': session_id,
+            'memory': agent.get_memory_report()  # 本轮发送的对话历史token数及节省的token数
         })
+    except RunRejected as e:
+        return rejected_response(e)
     except Exception as e:
         return jsonify({'error': f'处理请求时出错: {str(e)}'}), 500
+    finally:
+        if ticket:
+            ticket.release()
+
+
+def _sse_response(bus: EventBus, token: CancellationToken) -> Response:
+    """
+    把事件总线上的事件作为Server-Sent Events推送（有事件时立即推送，空闲时发送心跳保持连接）
+    
+    客户端断开后（推送事件或心跳失败时关闭生成器）关闭事件总线，Agent后续发布的事件不再排队；
+    运行尚未结束时取消运行，Agent在下一个检查点停止调用LLM和API。
+    """
+    def generate():
+        try:
+            for event in bus.events(heartbeat=config.get("web.sse.heartbeat", 15)):
+                yield f"data: {json.dumps(event.to_dict(), ensure_ascii=False)}\n\n"
+        finally:
+            if not bus.closed:
+                token.cancel("客户端断开连接")
+            bus.close()
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # 禁用nginx缓冲
+        }
+    )
 
 
 @app.route('/api/chat/stream', methods=['POST'])
@@ -204,149 +257,140 @@ def chat_stream():
         if not user_input:
             return jsonify({'error': '消息不能为空'}), 400
         
-        # 获取或创建Agent
-        agent, error = get_or_create_agent(user_id=user_id, session_id=session_id)
-        if error:
-            return jsonify({'error': f'Agent初始化失败: {error}'}), 500
-        
-        # 设置旅行信息
-        if travel_info:
-            agent.set_travel_info(travel_info)
-        elif 'travel_info' in session:
-            agent.set_travel_info(session['travel_info'])
-        
-        # 创建队列用于在线程间传递工具执行结果
-        result_queue = queue.Queue()
-        
-        # 创建回调处理器，用于监听工具执行
-        class ToolCallbackHandler(BaseCallbackHandler):
-            def __init__(self, result_queue):
-                self.result_queue = result_queue
-                self.current_tool = None
-                
-            def on_agent_action(self, action: AgentAction, **kwargs) -> None:
-                """工具调用开始"""
-                tool_name = action.tool
-                tool_names = {
-                    "query_weather_agent": "天气查询",
-                    "query_transport_agent": "交通路线",
-                    "query_hotel_agent": "酒店价格",
-                    "query_attraction_agent": "景点信息",
-                    "query_planning_agent": "行程规划",
-                    "query_recommendation_agent": "个性化推荐"
-                }
-                friendly_name = tool_names.get(tool_name, tool_name)
-                self.result_queue.put({
-                    'type': 'tool_start',
-                    'tool': tool_name,
-                    'message': f'正在查询{friendly_name}...'
-                })
-                self.current_tool = tool_name
-                
-            def on_tool_end(self, output: str, **kwargs) -> None:
-                """工具执行完成"""
-                if self.current_tool:
-                    tool_names = {
-                        "query_weather_agent": "天气",
-                        "query_transport_agent": "交通路线",
-                        "query_hotel_agent": "酒店价格",
-                        "query_attraction_agent": "景点信息",
-                        "query_planning_agent": "行程规划",
-                        "query_recommendation_agent": "推荐"
-                    }
-                    friendly_name = tool_names.get(self.current_tool, self.current_tool)
-                    # 简化输出，只显示前200字符
-                    summary = output[:200] + "..." if len(output) > 200 else output
-                    self.result_queue.put({
-                        'type': 'tool_end',
-                        'tool': self.current_tool,
-                        'message': f'✓ {friendly_name}查询完成',
-                        'summary': summary
-                    })
-                    self.current_tool = None
-        
-        callback_handler = ToolCallbackHandler(result_queue)
-        
-        # 在线程中执行Agent聊天（避免阻塞SSE连接）
-        def run_agent():
-            try:
-                # 准备输入
-                import hashlib
-                travel_info_str = str(sorted(agent.travel_info.items()))
-                current_travel_info_hash = hashlib.md5(travel_info_str.encode()).hexdigest()
-                
-                if agent.travel_info and (not agent.travel_info_added_to_conversation or current_travel_info_hash != agent.last_travel_info_hash):
-                    travel_context = agent._format_travel_info()
-                    combined_input = f"{travel_context}\n\n用户问题: {user_input}"
-                    agent.travel_info_added_to_conversation = True
-                    agent.last_travel_info_hash = current_travel_info_hash
-                else:
-                    combined_input = user_input
-                
-                # 使用回调执行Agent（直接传递回调列表）
-                response = agent.agent_executor.invoke(
-                    {"input": combined_input},
-                    config={"callbacks": [callback_handler]}
-                )
-                output = response.get("output", "抱歉，我无法处理您的请求。")
-                
-                # 发送最终结果
-                result_queue.put({
-                    'type': 'final',
-                    'message': output
-                })
-            except Exception as e:
-                error_msg = str(e)[:200] if len(str(e)) > 200 else str(e)
-                result_queue.put({
-                    'type': 'error',
-                    'message': f'处理请求时出错: {error_msg}'
-                })
-            finally:
-                # 发送结束标记
-                result_queue.put({'type': 'done'})
-        
-        # 启动Agent执行线程
-        agent_thread = threading.Thread(target=run_agent)
-        agent_thread.daemon = True
-        agent_thread.start()
-        
-        # 生成SSE响应
-        def generate():
-            while True:
-                try:
-                    # 从队列获取结果（超时1秒）
-                    try:
-                        result = result_queue.get(timeout=1)
-                    except queue.Empty:
-                        # 超时，发送心跳保持连接
-                        yield f"data: {json.dumps({'type': 'heartbeat'})}\n\n"
-                        continue
+        # 同一会话的请求依次执行，系统繁忙时返回429；执行名额在Agent运行结束后释放
+        ticket = get_run_guard().acquire(user_id or session_id)
+        try:
+            # 获取或创建Agent
+            agent, error = get_or_create_agent(user_id=user_id, session_id=session_id)
+            if error:
+                ticket.release()
+                return jsonify({'error': f'Agent初始化失败: {error}'}), 500
+            
+            # 旅行信息在取得执行名额后设置（请求中没有时使用session中保存的旅行信息）
+            travel_info = travel_info or session.get('travel_info')
+            
+            # 工具进度、LLM调用和最终回答的token（包括专门Agent的回答）都发布到事件总线，SSE按事件推送
+            bus = EventBus(max_size=config.get("web.sse.queue_size", 1000))
+            handler = AgentEventHandler(bus)
+            
+            # 在线程中执行Agent聊天（避免阻塞SSE连接）
+            def run_agent() -> str:
+                with ticket:
+                    # 设置旅行信息
+                    if travel_info:
+                        agent.set_travel_info(travel_info)
                     
-                    # 检查是否完成
-                    if result['type'] == 'done':
-                        yield f"data: {json.dumps({'type': 'done'})}\n\n"
-                        break
+                    # 准备输入
+                    import hashlib
+                    travel_info_str = str(sorted(agent.travel_info.items()))
+                    current_travel_info_hash = hashlib.md5(travel_info_str.encode()).hexdigest()
                     
-                    # 发送结果
-                    yield f"data: {json.dumps(result, ensure_ascii=False)}\n\n"
+                    if agent.travel_info and (not agent.travel_info_added_to_conversation or current_travel_info_hash != agent.last_travel_info_hash):
+                        travel_context = agent._format_travel_info()
+                        combined_input = f"{travel_context}\n\n用户问题: {user_input}"
+                        agent.travel_info_added_to_conversation = True
+                        agent.last_travel_info_hash = current_travel_info_hash
+                    else:
+                        combined_input = user_input
                     
-                except Exception as e:
-                    yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
-                    break
-        
-        return Response(
-            stream_with_context(generate()),
-            mimetype='text/event-stream',
-            headers={
-                'Cache-Control': 'no-cache',
-                'X-Accel-Buffering': 'no'  # 禁用nginx缓冲
-            }
-        )
-        
+                    # 优先使用缓存的回答；意图明确时直接调用专门Agent，否则使用回调执行主协调Agent（直接传递回调列表）
+                    cache_key, output = agent.get_cached_response(user_input, combined_input)
+                    if output is None:
+                        with stream_tokens(handler), tool_request_scope():
+                            output = agent.try_fast_path(user_input, combined_input, callbacks=[handler])
+                            if output is None:
+                                started = time.perf_counter()
+                                response = agent.agent_executor.invoke(
+                                    {"input": combined_input},
+                                    config={"callbacks": [handler]}
+                                )
+                                agent._record_llm_path(started)
+                                output = agent._finalize_output(response)
+                        agent.cache_response(cache_key, output)
+                    return output
+            
+            token = CancellationToken()
+            run_in_background(bus, run_agent, token)
+        except BaseException:
+            # 运行交给后台之前出错（包括请求被取消）时释放执行名额，避免名额泄漏
+            ticket.release()
+            raise
+        return _sse_response(bus, token)
+    
+    except RunRejected as e:
+        return rejected_response(e)
     except Exception as e:
         return jsonify({'error': f'处理请求时出错: {str(e)}'}), 500
 
 
+def plan_days(travel_info: dict) -> int:
+    """根据出发日期和返回日期计算旅行天数（日期无效时默认7天）"""
+    from datetime import datetime
+    try:
+        departure = datetime.strptime(travel_info['departureDate'], '%Y-%m-%d')
+        return_date = datetime.strptime(travel_info['returnDate'], '%Y-%m-%d')
+        return (return_date - departure).days + 1
+    except:
+        return 7
+
+
+def build_plan_request(travel_info: dict) -> str:
+    """
+    根据旅行信息构建发送给Agent的行程规划请求（提示Agent查询所有相关信息）
+    
+    Args:
+        travel_info: 前端提交的旅行信息
+    """
+    days = plan_days(travel_info)
+    destination = travel_info.get('destination', '')
+    departure_city = travel_info.get('departureCity', '')
+    budget = travel_info.get('budget', '')
+    preferences_parts = []
+    
+    if travel_info.get('travelStyle'):
+        preferences_parts.append(f"旅行风格：{travel_info['travelStyle']}")
+    if travel_info.get('interests'):
+        preferences_parts.append(f"兴趣偏好：{travel_info['interests']}")
+    if travel_info.get('hotelPreference'):
+        preferences_parts.append(f"住宿偏好：{travel_info['hotelPreference']}")
+    if travel_info.get('transportMode'):
+        preferences_parts.append(f"出行方式：{travel_info['transportMode']}")
+    
+    preferences = '，'.join(preferences_parts) if preferences_parts else None
+    
+    if destination:
+        user_request = f"请为我规划一个{days}天的{destination}旅行行程"
+    else:
+        user_request = f"请为我规划一个{days}天的旅行行程"
+    
+    if budget:
+        user_request += f"，预算{budget}元"
+    if preferences:
+        user_request += f"，偏好：{preferences}"
+    user_request += "。\n\n重要提示：\n"
+    
+    if destination:
+        user_request += f"1. 请先使用 get_weather_info 工具查询出发日期和{destination}的天气信息\n"
+        if travel_info.get('interests'):
+            user_request += f"2. 请使用 get_attraction_ticket_prices 工具查询{destination}的景点门票价格（根据兴趣偏好：{travel_info.get('interests')}）\n"
+    else:
+        user_request += "1. 如果用户指定了目的地，请使用 get_weather_info 工具查询天气信息\n"
+    
+    if travel_info.get('hotelPreference') and destination:
+        user_request += f"{'3' if destination and travel_info.get('interests') else '2'}. 请使用 get_hotel_prices 工具查询酒店价格信息，以便提供准确的预算估算\n"
+    
+    if departure_city and destination and travel_info.get('transportMode'):
+        step_num = 3 if destination and (travel_info.get('interests') or travel_info.get('hotelPreference')) else 2
+        user_request += f"{step_num}. 请使用 get_transport_route 工具查询从{departure_city}到{destination}的{travel_info.get('transportMode')}路线和费用\n"
+    
+    has_queries = (destination and travel_info.get('interests')) or (departure_city and destination and travel_info.get('transportMode')) or travel_info.get('hotelPreference')
+    user_request += f"{'5' if has_queries else '2'}. 然后使用 plan_travel_itinerary 工具生成详细行程，该工具会自动集成所有查询到的信息\n"
+    user_request += f"{'6' if has_queries else '3'}. 根据天气情况调整活动建议（如雨天推荐室内活动，晴天推荐户外活动）\n"
+    user_request += f"{'7' if has_queries else '4'}. 根据酒店价格、交通费用、景点门票信息调整预算分配，提供更准确的费用估算\n"
+    user_request += "\n请提供详细的每日行程安排，包括景点、餐饮、住宿、交通和预算分配。"
+    return user_request
+
+
 @app.route('/api/generate-plan/stream', methods=['POST'])
 def generate_plan_stream():
     """流式生成旅行规划（使用Server-Sent Events）"""
@@ -372,186 +416,50 @@ def generate_plan_stream():
             session_id = str(uuid.uuid4())
             session['session_id'] = session_id
         
-        # 获取或创建Agent
-        agent, error = get_or_create_agent(user_id=user_id, session_id=session_id)
-        if error:
-            return jsonify({'error': f'Agent初始化失败: {error}'}), 500
-        
-        # 设置旅行信息
-        agent.set_travel_info(travel_info)
-        
-        # 构建规划请求（与generate_plan相同）
-        from datetime import datetime
+        # 同一会话的请求依次执行，系统繁忙时返回429；执行名额在Agent运行结束后释放
+        ticket = get_run_guard().acquire(user_id or session_id)
         try:
-            departure = datetime.strptime(travel_info['departureDate'], '%Y-%m-%d')
-            return_date = datetime.strptime(travel_info['returnDate'], '%Y-%m-%d')
-            days = (return_date - departure).days + 1
-        except:
-            days = 7
-        
-        destination = travel_info.get('destination', '')
-        departure_city = travel_info.get('departureCity', '')
-        budget = travel_info.get('budget', '')
-        preferences_parts = []
-        
-        if travel_info.get('travelStyle'):
-            preferences_parts.append(f"旅行风格：{travel_info['travelStyle']}")
-        if travel_info.get('interests'):
-            preferences_parts.append(f"兴趣偏好：{travel_info['interests']}")
-        if travel_info.get('hotelPreference'):
-            preferences_parts.append(f"住宿偏好：{travel_info['hotelPreference']}")
-        if travel_info.get('transportMode'):
-            preferences_parts.append(f"出行方式：{travel_info['transportMode']}")
-        
-        preferences = '，'.join(preferences_parts) if preferences_parts else None
-        
-        if destination:
-            user_request = f"请为我规划一个{days}天的{destination}旅行行程"
-        else:
-            user_request = f"请为我规划一个{days}天的旅行行程"
-        
-        if budget:
-            user_request += f"，预算{budget}元"
-        if preferences:
-            user_request += f"，偏好：{preferences}"
-        user_request += "。\n\n重要提示：\n"
-        
-        if destination:
-            user_request += f"1. 请先使用 get_weather_info 工具查询出发日期和{destination}的天气信息\n"
-            if travel_info.get('interests'):
-                user_request += f"2. 请使用 get_attraction_ticket_prices 工具查询{destination}的景点门票价格（根据兴趣偏好：{travel_info.get('interests')}）\n"
-        else:
-            user_request += "1. 如果用户指定了目的地，请使用 get_weather_info 工具查询天气信息\n"
-        
-        if travel_info.get('hotelPreference') and destination:
-            user_request += f"{'3' if destination and travel_info.get('interests') else '2'}. 请使用 get_hotel_prices 工具查询酒店价格信息，以便提供准确的预算估算\n"
-        
-        if departure_city and destination and travel_info.get('transportMode'):
-            step_num = 3 if destination and (travel_info.get('interests') or travel_info.get('hotelPreference')) else 2
-            user_request += f"{step_num}. 请使用 get_transport_route 工具查询从{departure_city}到{destination}的{travel_info.get('transportMode')}路线和费用\n"
-        
-        user_request += f"{'5' if (destination and travel_info.get('interests')) or (departure_city and destination and travel_info.get('transportMode')) or travel_info.get('hotelPreference') else '2'}. 然后使用 plan_travel_itinerary 工具生成详细行程，该工具会自动集成所有查询到的信息\n"
-        
-        # 创建队列用于在线程间传递工具执行结果
-        result_queue = queue.Queue()
-        
-        # 创建回调处理器
-        class ToolCallbackHandler(BaseCallbackHandler):
-            def __init__(self, result_queue):
-                self.result_queue = result_queue
-                self.current_tool = None
-                
-            def on_agent_action(self, action: AgentAction, **kwargs) -> None:
-                """工具调用开始"""
-                tool_name = action.tool
-                tool_names = {
-                    "query_weather_agent": "天气查询",
-                    "query_transport_agent": "交通路线",
-                    "query_hotel_agent": "酒店价格",
-                    "query_attraction_agent": "景点信息",
-                    "query_planning_agent": "行程规划",
-                    "query_recommendation_agent": "个性化推荐"
-                }
-                friendly_name = tool_names.get(tool_name, tool_name)
-                self.result_queue.put({
-                    'type': 'tool_start',
-                    'tool': tool_name,
-                    'message': f'正在查询{friendly_name}...'
-                })
-                self.current_tool = tool_name
-                
-            def on_tool_end(self, output: str, **kwargs) -> None:
-                """工具执行完成"""
-                if self.current_tool:
-                    tool_names = {
-                        "query_weather_agent": "天气",
-                        "query_transport_agent": "交通路线",
-                        "query_hotel_agent": "酒店价格",
-                        "query_attraction_agent": "景点信息",
-                        "query_planning_agent": "行程规划",
-                        "query_recommendation_agent": "推荐"
-                    }
-                    friendly_name = tool_names.get(self.current_tool, self.current_tool)
-                    summary = output[:200] + "..." if len(output) > 200 else output
-                    self.result_queue.put({
-                        'type': 'tool_end',
-                        'tool': self.current_tool,
-                        'message': f'✓ {friendly_name}查询完成',
-                        'summary': summary
-                    })
-                    self.current_tool = None
-        
-        callback_handler = ToolCallbackHandler(result_queue)
-        
-        # 在线程中执行Agent
-        def run_agent():
-            try:
-                import hashlib
-                travel_info_str = str(sorted(agent.travel_info.items()))
-                current_travel_info_hash = hashlib.md5(travel_info_str.encode()).hexdigest()
-                
-                if agent.travel_info and (not agent.travel_info_added_to_conversation or current_travel_info_hash != agent.last_travel_info_hash):
-                    travel_context = agent._format_travel_info()
-                    combined_input = f"{travel_context}\n\n用户问题: {user_request}"
-                    agent.travel_info_added_to_conversation = True
-                    agent.last_travel_info_hash = current_travel_info_hash
-                else:
-                    combined_input = user_request
-                
-                # 使用回调执行Agent（直接传递回调列表）
-                response = agent.agent_executor.invoke(
-                    {"input": combined_input},
-                    config={"callbacks": [callback_handler]}
-                )
-                output = response.get("output", "抱歉，我无法处理您的请求。")
-                
-                result_queue.put({
-                    'type': 'final',
-                    'message': output
-                })
-            except Exception as e:
-                error_msg = str(e)[:200] if len(str(e)) > 200 else str(e)
-                result_queue.put({
-                    'type': 'error',
-                    'message': f'处理请求时出错: {error_msg}'
-                })
-            finally:
-                result_queue.put({'type': 'done'})
-        
-        # 启动线程
-        agent_thread = threading.Thread(target=run_agent)
-        agent_thread.daemon = True
-        agent_thread.start()
-        
-        # 生成SSE响应
-        def generate():
-            while True:
-                try:
-                    try:
-                        result = result_queue.get(timeout=1)
-                    except queue.Empty:
-                        yield f"data: {json.dumps({'type': 'heartbeat'})}\n\n"
-                        continue
-                    
-                    if result['type'] == 'done':
-                        yield f"data: {json.dumps({'type': 'done'})}\n\n"
-                        break
+            # 获取或创建Agent
+            agent, error = get_or_create_agent(user_id=user_id, session_id=session_id)
+            if error:
+                ticket.release()
+                return jsonify({'error': f'Agent初始化失败: {error}'}), 500
+            
+            # 构建规划请求（与generate_plan相同）
+            user_request = build_plan_request(travel_info)
+            
+            bus = EventBus(max_size=config.get("web.sse.queue_size", 1000))
+            handler = AgentEventHandler(bus)
+            
+            # 在线程中执行Agent
+            def run_agent() -> str:
+                with ticket:
+                    agent.set_travel_info(travel_info)
+                    combined_input = agent._prepare_input(user_request)
                     
-                    yield f"data: {json.dumps(result, ensure_ascii=False)}\n\n"
-                    
-                except Exception as e:
-                    yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
-                    break
-        
-        return Response(
-            stream_with_context(generate()),
-            mimetype='text/event-stream',
-            headers={
-                'Cache-Control': 'no-cache',
-                'X-Accel-Buffering': 'no'
-            }
-        )
-        
+                    # 旅行信息完整时直接根据旅行信息查询并生成行程（只调用一次规划LLM），否则使用回调执行主协调Agent
+                    with stream_tokens(handler), tool_request_scope():
+                        output = agent.plan_from_travel_info(user_request, callbacks=[handler], combined_input=combined_input)
+                        if output is None:
+                            started = time.perf_counter()
+                            response = agent.agent_executor.invoke(
+                                {"input": combined_input},
+                                config={"callbacks": [handler]}
+                            )
+                            agent._record_llm_path(started)
+                            output = agent._finalize_output(response)
+                    return output
+            
+            token = CancellationToken()
+            run_in_background(bus, run_agent, token)
+        except BaseException:
+            # 运行交给后台之前出错（包括请求被取消）时释放执行名额，避免名额泄漏
+            ticket.release()
+            raise
+        return _sse_response(bus, token)
+    
+    except RunRejected as e:
+        return rejected_response(e)
     except Exception as e:
         return jsonify({'error': f'处理请求时出错: {str(e)}'}), 500
 
@@ -628,9 +536,10 @@ def login():
 def logout():
     """用户登出"""
     user_id = session.get('user_id')
-    if user_id and user_id in agents:
-        # 清理Agent实例
-        del agents[user_id]
+    if user_id:
+        # 清理Agent实例、状态快照及专门Agent的会话历史
+        agents.remove(user_id)
+        get_memory_store().clear(user_id)
     
     session.clear()
     return jsonify({'success': True, 'message': '已登出'})
@@ -662,14 +571,24 @@ def reset():
         session_id = session.get('session_id')
         agent_key = user_id or session_id
         
-        if agent_key and agent_key in agents:
-            agents[agent_key].reset_memory()
+        if agent_key:
+            # 与对话请求一样取得执行名额：等待同一会话正在执行的运行结束后再重置，排队已满时返回429
+            with get_run_guard().acquire(agent_key):
+                agent = agents.peek(agent_key)
+                if agent:
+                    agent.reset_memory()
+                else:
+                    # Agent已被回收：丢弃状态快照，清空专门Agent的会话历史
+                    get_memory_store().clear(agent_key)
+                agents.discard_snapshot(agent_key)
         
         # 如果不是登录用户，创建新的会话ID
         if not user_id:
             session['session_id'] = str(uuid.uuid4())
         
         return jsonify({'message': '对话已重置'})
+    except RunRejected as e:
+        return rejected_response(e)
     except Exception as e:
         return jsonify({'error': f'重置失败: {str(e)}'}), 500
 
@@ -677,6 +596,7 @@ def reset():
 @app.route('/api/generate-plan', methods=['POST'])
 def generate_plan():
     """根据旅行信息生成旅行规划"""
+    ticket = None
     try:
         # 检查登录状态
         if 'user_id' not in session:
@@ -699,86 +619,35 @@ def generate_plan():
             session_id = str(uuid.uuid4())
             session['session_id'] = session_id
         
+        # 同一会话的请求依次执行，系统繁忙时返回429
+        ticket = get_run_guard().acquire(user_id or session_id)
+        
         # 获取或创建Agent（使用user_id或session_id）
         agent, error = get_or_create_agent(user_id=user_id, session_id=session_id)
         if error:
             return jsonify({'error': f'Agent初始化失败: {error}'}), 500
         
-        # 设置旅行信息
+        # 设置旅行信息并构建规划请求（与流式接口相同）
         agent.set_travel_info(travel_info)
+        days = plan_days(travel_info)
+        user_request = build_plan_request(travel_info)
         
-        # 计算旅行天数
-        from datetime import datetime
-        try:
-            departure = datetime.strptime(travel_info['departureDate'], '%Y-%m-%d')
-            return_date = datetime.strptime(travel_info['returnDate'], '%Y-%m-%d')
-            days = (return_date - departure).days + 1
-        except:
-            days = 7  # 默认7天
-        
-        # 构建规划请求
-        destination = travel_info.get('destination', '')
-        departure_city = travel_info.get('departureCity', '')
-        budget = travel_info.get('budget', '')
-        preferences_parts = []
-        
-        if travel_info.get('travelStyle'):
-            preferences_parts.append(f"旅行风格：{travel_info['travelStyle']}")
-        if travel_info.get('interests'):
-            preferences_parts.append(f"兴趣偏好：{travel_info['interests']}")
-        if travel_info.get('hotelPreference'):
-            preferences_parts.append(f"住宿偏好：{travel_info['hotelPreference']}")
-        if travel_info.get('transportMode'):
-            preferences_parts.append(f"出行方式：{travel_info['transportMode']}")
-        
-        preferences = '，'.join(preferences_parts) if preferences_parts else None
-        
-        # 构建用户请求，提示Agent查询所有相关信息
-        if destination:
-            user_request = f"请为我规划一个{days}天的{destination}旅行行程"
-        else:
-            user_request = f"请为我规划一个{days}天的旅行行程"
-        
-        if budget:
-            user_request += f"，预算{budget}元"
-        if preferences:
-            user_request += f"，偏好：{preferences}"
-        user_request += "。\n\n"
-        user_request += "重要提示：\n"
-        
-        # 如果有目的地，查询天气和景点信息
-        if destination:
-            user_request += f"1. 请先使用 get_weather_info 工具查询出发日期和{destination}的天气信息\n"
-            if travel_info.get('interests'):
-                user_request += f"2. 请使用 get_attraction_ticket_prices 工具查询{destination}的景点门票价格（根据兴趣偏好：{travel_info.get('interests')}）\n"
-        else:
-            user_request += "1. 如果用户指定了目的地，请使用 get_weather_info 工具查询天气信息\n"
-        
-        # 如果有酒店偏好，查询酒店价格
-        if travel_info.get('hotelPreference') and destination:
-            user_request += f"{'3' if destination and travel_info.get('interests') else '2'}. 请使用 get_hotel_prices 工具查询酒店价格信息，以便提供准确的预算估算\n"
-        
-        # 如果有出发地、目的地和出行方式，查询交通路线
-        if departure_city and destination and travel_info.get('transportMode'):
-            step_num = 3 if destination and (travel_info.get('interests') or travel_info.get('hotelPreference')) else 2
-            user_request += f"{step_num}. 请使用 get_transport_route 工具查询从{departure_city}到{destination}的{travel_info.get('transportMode')}路线和费用\n"
-        
-        user_request += f"{'5' if (destination and travel_info.get('interests')) or (departure_city and destination and travel_info.get('transportMode')) or travel_info.get('hotelPreference') else '2'}. 然后使用 plan_travel_itinerary 工具生成详细行程，该工具会自动集成所有查询到的信息\n"
-        user_request += f"{'6' if (destination and travel_info.get('interests')) or (departure_city and destination and travel_info.get('transportMode')) or travel_info.get('hotelPreference') else '3'}. 根据天气情况调整活动建议（如雨天推荐室内活动，晴天推荐户外活动）\n"
-        user_request += f"{'7' if (destination and travel_info.get('interests')) or (departure_city and destination and travel_info.get('transportMode')) or travel_info.get('hotelPreference') else '4'}. 根据酒店价格、交通费用、景点门票信息调整预算分配，提供更准确的费用估算\n"
-        user_request += "\n请提供详细的每日行程安排，包括景点、餐饮、住宿、交通和预算分配。"
-        
-        # 调用Agent生成规划
+        # 旅行信息完整时直接根据旅行信息查询并生成行程（只调用一次规划LLM），否则交给主协调Agent
         print(f'\n--- 开始生成规划 ---')
         print(f'请求内容: {user_request[:100]}...')
         try:
-            plan_response = agent.chat(user_request)
+            with tool_request_scope():
+                combined_input = agent._prepare_input(user_request)
+                plan_response = agent.plan_from_travel_info(user_request, combined_input=combined_input)
+                if plan_response is None:
+                    started = time.perf_counter()
+                    response = agent.agent_executor.invoke({"input": combined_input})
+                    agent._record_llm_path(started)
+                    plan_response = agent._finalize_output(response)
             print(f'规划生成成功，响应长度: {len(plan_response) if plan_response else 0}')
         except Exception as agent_error:
-            import traceback
             print(f'Agent执行异常: {agent_error}')
-            traceback.print_exc()
-            raise
+            plan_response = agent._format_error(agent_error)
         
         # 检查响应是否包含错误信息
         if plan_response and ("错误" in plan_response or "❌" in plan_response):
@@ -797,6 +666,8 @@ def generate_plan():
             'travelInfo': travel_info,
             'days': days
         })
+    except RunRejected as e:
+        return rejected_response(e)
     except Exception as e:
         import traceback
         error_msg = str(e)
@@ -816,18 +687,48 @@ def generate_plan():
             'travelInfo': travel_info,
             'days': days
         }), 500
+    finally:
+        if ticket:
+            ticket.release()
+
+
+@app.route('/api/cache/invalidate', methods=['POST'])
+@login_required
+def invalidate_response_cache():
+    """使缓存的回答失效（可按范围或数据类别，如天气数据更新后只清除天气相关的回答）"""
+    try:
+        response_cache = get_response_cache()
+        if not response_cache:
+            return jsonify({'invalidated': 0, 'message': '回答缓存未启用'})
+        data = request.json or {}
+        invalidated = response_cache.invalidate(scope=data.get('scope'), category=data.get('category'))
+        return jsonify({'invalidated': invalidated})
+    except Exception as e:
+        return jsonify({'error': f'清除缓存失败: {str(e)}'}), 500
 
 
 @app.route('/api/status', methods=['GET'])
 def status():
     """获取系统状态"""
     try:
-        # 检查API密钥
-        has_api_key = bool(config.openai_api_key)
+        # 检查API密钥（本地脚本化模型不需要密钥）
+        has_api_key = bool(config.openai_api_key) or config.llm_provider == "fake"
         
         return jsonify({
             'api_configured': has_api_key,
-            'status': 'ready' if has_api_key else 'api_key_missing'
+            'status': 'ready' if has_api_key else 'api_key_missing',
+            'llm_provider': config.llm_provider,
+            'amap_limiter': get_amap_rate_limiter().stats(),  # 限流器状态及各主机连接复用统计
+            'amap_cache': amap_cache_stats(),  # 地理编码、天气等缓存的命中率
+            'llm_registry': llm_registry_stats(),  # 共享的LLM客户端和Agent数量
+            'agent_memory': get_memory_store().stats(),  # 专门Agent会话历史的存储状态
+            'agent_pool': agents.stats(),  # 常驻Agent数、回收次数和恢复耗时
+            'intent_router': get_intent_router().stats() if get_intent_router() else None,  # 快速路由比例和节省的时间
+            'response_cache': get_response_cache().stats() if get_response_cache() else None,  # 回答缓存的命中率
+            'tool_memo': tool_memo_stats(),  # 各工具结果记忆的命中统计
+            'parallel_tools': parallel_executor_stats(),  # 并发执行的专门Agent调用和跳过的重复调用
+            'run_guard': get_run_guard().stats(),  # 执行中和排队的运行数、拒绝次数和排队等待时间
+            'cancellation': cancellation_stats()  # 客户端断开后取消的运行数及省下的LLM、工具和API调用数
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -835,7 +736,7 @@ def status():
 
 if __name__ == '__main__':
     # 检查API密钥
-    if not config.openai_api_key:
+    if not config.openai_api_key and config.llm_provider != "fake":
         print("警告：未设置 OPENAI_API_KEY 环境变量")
         print("请在 .env 或 env 文件中设置您的 OpenAI API 密钥")
     
@@ -0,0 +1,272 @@
+"""
+ASGI应用入口：流式接口（/api/chat/stream、/api/generate-plan/stream）在事件循环中以异步任务执行Agent，
+通过异步SSE推送事件总线上的事件，打开的流不再各占用一个线程；其他路由、模板和会话仍由Flask应用（app.py）处理
+
+启动方式：uvicorn asgi:app --host 0.0.0.0 --port 5000（或 python asgi.py）
+"""
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Set
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from a2wsgi import WSGIMiddleware
+from flask import Flask
+from itsdangerous import BadSignature
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+from app import app as flask_app, build_plan_request, get_or_create_agent
+from src.agent.event_bus import AgentEventHandler, EventBus, run_as_task
+from src.agent.run_guard import RunRejected, get_run_guard
+from src.agent.streaming import stream_tokens
+from src.agent.tool_memo import tool_request_scope
+from src.config import config
+from src.utils.cancellation import CancellationToken
+import uuid
+
+# 正在执行的Agent任务（保持引用，避免任务在完成前被回收）
+_agent_tasks: Set[asyncio.Task] = set()
+
+
+class FlaskSessionCookie:
+    """读写Flask的签名会话Cookie，异步路由与Flask路由共用同一个会话（登录状态、旅行信息）"""
+    
+    def __init__(self, app: Flask):
+        self.app = app
+        self.interface = app.session_interface
+        self.serializer = self.interface.get_signing_serializer(app)
+    
+    def load(self, request: Request) -> dict:
+        """读取会话（Cookie不存在、签名无效或已过期时返回空会话）"""
+        value = request.cookies.get(self.interface.get_cookie_name(self.app))
+        if not value:
+            return {}
+        try:
+            return dict(self.serializer.loads(value, max_age=int(self.app.permanent_session_lifetime.total_seconds())))
+        except BadSignature:
+            return {}
+    
+    def save(self, response: Response, session: dict):
+        """把会话写入响应的Cookie（Cookie属性与Flask一致）"""
+        response.set_cookie(
+            self.interface.get_cookie_name(self.app),
+            self.serializer.dumps(session),
+            path=self.interface.get_cookie_path(self.app),
+            domain=self.interface.get_cookie_domain(self.app),
+            secure=self.interface.get_cookie_secure(self.app),
+            httponly=self.interface.get_cookie_httponly(self.app),
+            samesite=self.interface.get_cookie_samesite(self.app),
+        )
+
+
+sessions = FlaskSessionCookie(flask_app)
+
+
+def _rejected_response(e: RunRejected) -> JSONResponse:
+    """请求被并发控制拒绝时返回429（与app.py相同）"""
+    return JSONResponse({'error': str(e)}, status_code=429, headers={'Retry-After': str(e.retry_after)})
+
+
+def _start_agent_task(bus: EventBus, work: Callable[[], Awaitable[str]], token: CancellationToken):
+    task = run_as_task(bus, work, token)
+    _agent_tasks.add(task)
+    task.add_done_callback(_agent_tasks.discard)
+
+
+def _sse_response(bus: EventBus, token: CancellationToken) -> StreamingResponse:
+    """
+    把事件总线上的事件作为Server-Sent Events异步推送（有事件时立即推送，空闲时发送心跳保持连接）
+    
+    ASGI服务器按客户端的接收速度发送，客户端接收较慢时事件留在有界的事件总线中（token合并）；
+    客户端断开后（ASGI服务器收到断开消息时取消推送）关闭事件总线，运行尚未结束时取消运行，
+    Agent在下一个检查点停止调用LLM和API。
+    """
+    async def generate():
+        try:
+            async for event in bus.aevents(heartbeat=config.get("web.sse.heartbeat", 15)):
+                yield f"data: {json.dumps(event.to_dict(), ensure_ascii=False)}\n\n"
+        finally:
+            if not bus.closed:
+                token.cancel("客户端断开连接")
+            bus.close()
+    
+    return StreamingResponse(
+        generate(),
+        media_type='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # 禁用nginx缓冲
+        }
+    )
+
+
+async def chat_stream(request: Request) -> Response:
+    """处理流式聊天请求（与app.py中的同名接口相同，Agent以异步任务执行）"""
+    try:
+        # 检查登录状态
+        session = sessions.load(request)
+        if 'user_id' not in session:
+            return JSONResponse({'error': '请先登录'}, status_code=401)
+        
+        data = await request.json()
+        user_input = data.get('message', '').strip()
+        travel_info = data.get('travelInfo', {})
+        
+        if not user_input:
+            return JSONResponse({'error': '消息不能为空'}, status_code=400)
+        
+        # 同一会话的请求依次执行，系统繁忙时返回429（等待时不阻塞事件循环）；执行名额在Agent运行结束后释放
+        ticket = await get_run_guard().aacquire(session.get('user_id') or session.get('session_id'))
+        try:
+            # 获取或创建Agent（被回收的Agent可能需要从磁盘快照恢复，在线程池中执行）
+            agent, error = await run_in_threadpool(
+                get_or_create_agent, user_id=session.get('user_id'), session_id=session.get('session_id')
+            )
+            if error:
+                ticket.release()
+                return JSONResponse({'error': f'Agent初始化失败: {error}'}, status_code=500)
+            
+            # 旅行信息在取得执行名额后设置（请求中没有时使用session中保存的旅行信息）
+            travel_info = travel_info or session.get('travel_info')
+            
+            bus = EventBus(max_size=config.get("web.sse.queue_size", 1000))
+            handler = AgentEventHandler(bus)
+            
+            async def run_agent() -> str:
+                with ticket:
+                    if travel_info:
+                        agent.set_travel_info(travel_info)
+                    # 优先使用缓存的回答；意图明确时直接调用专门Agent，否则异步执行主协调Agent
+                    combined_input = agent._prepare_input(user_input)
+                    cache_key, output = agent.get_cached_response(user_input, combined_input)
+                    if output is None:
+                        with stream_tokens(handler), tool_request_scope():
+                            output = await agent.atry_fast_path(user_input, combined_input, callbacks=[handler])
+                            if output is None:
+                                started = time.perf_counter()
+                                response = await agent.agent_executor.ainvoke(
+                                    {"input": combined_input},
+                                    config={"callbacks": [handler]}
+                                )
+                                agent._record_llm_path(started)
+                                output = agent._finalize_output(response)
+                        agent.cache_response(cache_key, output)
+                    return output
+            
+            token = CancellationToken()
+            _start_agent_task(bus, run_agent, token)
+        except BaseException:
+            # 运行交给后台之前出错（包括请求被取消）时释放执行名额，避免名额泄漏
+            ticket.release()
+            raise
+        return _sse_response(bus, token)
+    
+    except RunRejected as e:
+        return _rejected_response(e)
+    except Exception as e:
+        return JSONResponse({'error': f'处理请求时出错: {str(e)}'}, status_code=500)
+
+
+async def generate_plan_stream(request: Request) -> Response:
+    """流式生成旅行规划（与app.py中的同名接口相同，Agent以异步任务执行）"""
+    try:
+        # 检查登录状态
+        session = sessions.load(request)
+        if 'user_id' not in session:
+            return JSONResponse({'error': '请先登录'}, status_code=401)
+        
+        data = await request.json()
+        travel_info = data.get('travelInfo', {})
+        
+        # 验证必填字段
+        if not travel_info.get('departureDate') or not travel_info.get('returnDate'):
+            return JSONResponse({'error': '出发日期和返回日期不能为空'}, status_code=400)
+        
+        # 保存旅行信息到session
+        session['travel_info'] = travel_info
+        
+        user_id = session.get('user_id')
+        session_id = session.get('session_id')
+        if not user_id and not session_id:
+            session_id = str(uuid.uuid4())
+            session['session_id'] = session_id
+        
+        ticket = await get_run_guard().aacquire(user_id or session_id)
+        try:
+            agent, error = await run_in_threadpool(get_or_create_agent, user_id=user_id, session_id=session_id)
+            if error:
+                ticket.release()
+                return JSONResponse({'error': f'Agent初始化失败: {error}'}, status_code=500)
+            
+            user_request = build_plan_request(travel_info)
+            
+            bus = EventBus(max_size=config.get("web.sse.queue_size", 1000))
+            handler = AgentEventHandler(bus)
+            
+            async def run_agent() -> str:
+                with ticket:
+                    agent.set_travel_info(travel_info)
+                    combined_input = agent._prepare_input(user_request)
+                    with stream_tokens(handler), tool_request_scope():
+                        # 结构化规划没有异步版本（内部用线程池并发查询），在线程中执行
+                        output = await asyncio.to_thread(agent.plan_from_travel_info, user_request, callbacks=[handler],
+                                                        combined_input=combined_input)
+                        if output is None:
+                            started = time.perf_counter()
+                            response = await agent.agent_executor.ainvoke(
+                                {"input": combined_input},
+                                config={"callbacks": [handler]}
+                            )
+                            agent._record_llm_path(started)
+                            output = agent._finalize_output(response)
+                    return output
+            
+            token = CancellationToken()
+            _start_agent_task(bus, run_agent, token)
+        except BaseException:
+            # 运行交给后台之前出错（包括请求被取消）时释放执行名额，避免名额泄漏
+            ticket.release()
+            raise
+        response = _sse_response(bus, token)
+        sessions.save(response, session)
+        return response
+    
+    except RunRejected as e:
+        return _rejected_response(e)
+    except Exception as e:
+        return JSONResponse({'error': f'处理请求时出错: {str(e)}'}, status_code=500)
+
+
+app = Starlette(routes=[
+    Route('/api/chat/stream', chat_stream, methods=['POST']),
+    Route('/api/generate-plan/stream', generate_plan_stream, methods=['POST']),
+    # 其他路由（页面、登录、非流式接口等）在线程池中由Flask应用处理
+    Mount('/', app=WSGIMiddleware(flask_app, workers=config.get("web.asgi.wsgi_workers", 10))),
+])
+
+
+if __name__ == '__main__':
+    import uvicorn
+    
+    # 检查API密钥
+    if not config.openai_api_key and config.llm_provider != "fake":
+        print("警告：未设置 OPENAI_API_KEY 环境变量")
+        print("请在 .env 或 env 文件中设置您的 OpenAI API 密钥")
+    
+    print("\n" + "=" * 60)
+    print("智能旅行助手 Web 界面（ASGI）")
+    print("=" * 60)
+    print("访问地址: http://127.0.0.1:5000")
+    print("按 Ctrl+C 停止服务器")
+    print("=" * 60 + "\n")
+    
+    uvicorn.run(app, host='0.0.0.0', port=5000)
@@ -0,0 +1,89 @@
+"""Agent编排开销基准测试：使用本地脚本化模型和高德地图模拟服务，离线测量编排、回调和工具层的开销"""
+import argparse
+import os
+import sys
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+# 设置Windows控制台编码为UTF-8
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# 必须在导入配置之前设置，使所有Agent使用本地脚本化模型
+os.environ["LLM_PROVIDER"] = "fake"
+
+from src.agent.travel_agent import TravelAgent
+from src.config import config
+from src.utils.amap_emulator import AmapEmulator
+from src.utils.amap_rate_limiter import get_amap_rate_limiter
+
+QUERIES = [
+    "北京明天天气怎么样？",
+    "从上海到杭州自驾要多久？",
+    "成都有什么好玩的景点？",
+    "帮我查一下广州的酒店",
+    "帮我规划一个西安3天的行程",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agent编排开销基准测试（离线，无LLM费用）")
+    parser.add_argument("--requests", type=int, default=200, help="对话请求总数")
+    parser.add_argument("--workers", type=int, default=8, help="并发线程数（每个线程使用独立的TravelAgent）")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="模拟的每个token生成延迟（秒）")
+    parser.add_argument("--amap-latency", type=float, default=0.0, help="高德地图模拟服务的请求延迟（秒）")
+    args = parser.parse_args()
+    
+    config.config.setdefault("llm", {}).setdefault("fake", {})["token_latency"] = args.token_latency
+    emulator = AmapEmulator(mode="synthetic", latency=args.amap_latency)
+    os.environ["AMAP_BASE_URL"] = emulator.start()
+    os.environ.setdefault("AMAP_API_KEY", "benchmark_key")
+    get_amap_rate_limiter().configure(rate=100000, burst=100000)
+    
+    started = time.perf_counter()
+    agents = [TravelAgent(verbose=False) for _ in range(args.workers)]
+    init_elapsed = time.perf_counter() - started
+    
+    failures = []
+    
+    def run_worker(index: int) -> List[float]:
+        agent = agents[index]
+        latencies = []
+        for i in range(index, args.requests, args.workers):
+            begin = time.perf_counter()
+            result = agent.chat(QUERIES[i % len(QUERIES)])
+            latencies.append(time.perf_counter() - begin)
+            if result.startswith("❌"):
+                failures.append(result)
+        return latencies
+    
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            latencies = sorted(sum(executor.map(run_worker, range(args.workers)), []))
+    finally:
+        emulator.stop()
+    elapsed = time.perf_counter() - started
+    
+    total = len(latencies)
+    print("=" * 80)
+    print(f"Agent编排开销基准测试：{total} 次对话，{args.workers} 个并发线程，"
+          f"token延迟 {args.token_latency}秒，高德模拟延迟 {args.amap_latency}秒")
+    print("=" * 80)
+    print(f"  - 失败次数: {len(failures)}")
+    print(f"  - 创建 {args.workers} 个TravelAgent耗时: {init_elapsed:.2f}秒")
+    print(f"  - 总耗时: {elapsed:.2f}秒")
+    print(f"  - 吞吐量: {total / elapsed * 60:.0f} 次/分钟")
+    print(f"  - 延迟 P50: {latencies[total // 2] * 1000:.1f}毫秒, "
+          f"P95: {latencies[min(total - 1, int(total * 0.95))] * 1000:.1f}毫秒")
+    print(f"  - 高德模拟服务请求: {emulator.stats()['by_path']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""高德地图工具基准测试：基于本地模拟服务，对比线程池调用同步工具与 asyncio.gather 调用异步工具的吞吐量"""
+import argparse
+import asyncio
+import os
+import sys
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, List
+
+# 设置Windows控制台编码为UTF-8
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.amap_emulator import AmapEmulator
+from src.utils.amap_rate_limiter import get_amap_rate_limiter
+
+
+def _cities(prefix: str, count: int) -> List[str]:
+    """生成互不相同的模拟城市名，避免命中地理编码和天气缓存"""
+    return [f"{prefix}模拟城{i}" for i in range(count)]
+
+
+def _summary(name: str, elapsed: float, results: List[str]) -> dict:
+    failures = sum(1 for r in results if "无法获取" in r or "失败" in r)
+    return {
+        "name": name,
+        "calls": len(results),
+        "failures": failures,
+        "elapsed": elapsed,
+        "throughput": len(results) / elapsed if elapsed else 0.0,
+    }
+
+
+def run_sync(cities: List[str], date: str, workers: int) -> dict:
+    """使用线程池并发调用同步版本的天气工具"""
+    from src.agent.tools import get_weather_info
+    
+    def call(city: str) -> str:
+        return get_weather_info.invoke({"city": city, "date": date})
+    
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(call, cities))
+    return _summary(f"同步工具 + 线程池（{workers}线程）", time.perf_counter() - started, results)
+
+
+def run_async(cities: List[str], date: str) -> dict:
+    """在单个事件循环中使用 asyncio.gather 并发调用异步版本的天气工具"""
+    from src.agent.tools import get_weather_info
+    from src.utils.async_amap_client import get_async_amap_client
+    
+    async def call_all() -> List[str]:
+        try:
+            return await asyncio.gather(*[
+                get_weather_info.ainvoke({"city": city, "date": date}) for city in cities
+            ])
+        finally:
+            await get_async_amap_client().aclose()
+    
+    started = time.perf_counter()
+    results = asyncio.run(call_all())
+    return _summary("异步工具 + asyncio.gather", time.perf_counter() - started, results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="高德地图工具吞吐量基准测试（本地模拟服务）")
+    parser.add_argument("--calls", type=int, default=50, help="每种方式的工具调用次数")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟服务的单次请求延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="模拟服务的随机延迟上限（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模拟服务注入错误的比例（0-1）")
+    parser.add_argument("--rate", type=float, default=1000, help="限流器每秒补充令牌数（压测时放开配额）")
+    parser.add_argument("--burst", type=int, default=1000, help="限流器令牌桶容量")
+    parser.add_argument("--workers", type=int, default=16, help="同步方式的线程池大小")
+    args = parser.parse_args()
+    
+    emulator = AmapEmulator(mode="synthetic", latency=args.latency, jitter=args.jitter,
+                            error_rate=args.error_rate, seed=42)
+    base_url = emulator.start()
+    os.environ["AMAP_BASE_URL"] = base_url
+    os.environ.setdefault("AMAP_API_KEY", "benchmark_key")
+    get_amap_rate_limiter().configure(rate=args.rate, burst=args.burst)
+    date = datetime.now().strftime("%Y-%m-%d")
+    
+    print("=" * 80)
+    print(f"高德地图工具基准测试：每种方式 {args.calls} 次天气查询（每次2个API请求），"
+          f"模拟延迟 {args.latency:.2f}秒，模拟服务 {base_url}")
+    print("=" * 80)
+    
+    runners: List[Callable[[], dict]] = [
+        lambda: run_sync(_cities("同步", args.calls), date, args.workers),
+        lambda: run_async(_cities("异步", args.calls), date),
+    ]
+    try:
+        results = [runner() for runner in runners]
+    finally:
+        emulator.stop()
+    
+    for r in results:
+        print(f"\n{r['name']}")
+        print(f"  - 调用次数: {r['calls']}（失败 {r['failures']}）")
+        print(f"  - 总耗时: {r['elapsed']:.2f}秒")
+        print(f"  - 吞吐量: {r['throughput']:.2f} 次/秒")
+    
+    sync_result, async_result = results
+    if sync_result["throughput"]:
+        print(f"\n异步吞吐量 / 同步吞吐量: {async_result['throughput'] / sync_result['throughput']:.2f}x")
+    print("（两种方式共用 amap.rate_limit.max_concurrency 并发上限，调高该配置可观察上限对吞吐量的影响）")
+    print(f"模拟服务统计: {emulator.stats()['by_path']}")
+
+
+if __name__ == "__main__":
+    main()
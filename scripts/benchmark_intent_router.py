@@ -0,0 +1,91 @@
+"""意图快速路由基准测试：用 tests/test_agent_routing.py 的路由用例评估快速路由的准确率，并离线测量节省的延迟"""
+import argparse
+import os
+import sys
+import io
+import time
+
+# 设置Windows控制台编码为UTF-8
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# 必须在导入配置之前设置，使所有Agent使用本地脚本化模型
+os.environ["LLM_PROVIDER"] = "fake"
+
+from src.agent.intent_router import IntentRouter
+from src.agent.travel_agent import TravelAgent
+from src.config import config
+from src.utils.amap_emulator import AmapEmulator
+from src.utils.amap_rate_limiter import get_amap_rate_limiter
+from tests.fixtures import ROUTING_CASES
+
+
+def measure(agent: TravelAgent, query: str, rounds: int) -> float:
+    """测量一个问题的平均对话耗时（秒），每轮前重置记忆"""
+    total = 0.0
+    for _ in range(rounds):
+        agent.reset_memory()
+        begin = time.perf_counter()
+        agent.chat(query)
+        total += time.perf_counter() - begin
+    return total / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="意图快速路由基准测试（离线，无LLM费用）")
+    parser.add_argument("--rounds", type=int, default=5, help="每个问题的重复次数")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="模拟的每个token生成延迟（秒）")
+    parser.add_argument("--first-token-latency", type=float, default=0.3, help="模拟的首token延迟（秒）")
+    args = parser.parse_args()
+    
+    fake_config = config.config.setdefault("llm", {}).setdefault("fake", {})
+    fake_config["token_latency"] = args.token_latency
+    fake_config["first_token_latency"] = args.first_token_latency
+    emulator = AmapEmulator(mode="synthetic")
+    os.environ["AMAP_BASE_URL"] = emulator.start()
+    os.environ.setdefault("AMAP_API_KEY", "benchmark_key")
+    get_amap_rate_limiter().configure(rate=100000, burst=100000)
+    
+    router = IntentRouter(min_confidence=config.get("agent.router.min_confidence", 0.85))
+    agent = TravelAgent(verbose=False)
+    
+    print("=" * 80)
+    print(f"意图快速路由基准测试：{len(ROUTING_CASES)} 个路由用例，每个重复 {args.rounds} 次，"
+          f"首token延迟 {args.first_token_latency}秒，token延迟 {args.token_latency}秒")
+    print("=" * 80)
+    
+    fast, correct, saved = 0, 0, []
+    try:
+        for query, expected_tool in ROUTING_CASES:
+            decision = router.classify(query)
+            routed = decision.tool_name if decision.confidence >= router.min_confidence else None
+            if routed is None:
+                print(f"  - LLM路由 '{query}'（{decision.reason}）")
+                continue
+            
+            fast += 1
+            correct += routed == expected_tool
+            agent.intent_router = None
+            llm_latency = measure(agent, query, args.rounds)
+            agent.intent_router = router
+            fast_latency = measure(agent, query, args.rounds)
+            saved.append(llm_latency - fast_latency)
+            mark = "✓" if routed == expected_tool else f"✗ 期望 {expected_tool}"
+            print(f"  - 快速路径 '{query}' -> {routed} {mark}：LLM路由 {llm_latency * 1000:.0f}毫秒，"
+                  f"快速路径 {fast_latency * 1000:.0f}毫秒")
+    finally:
+        emulator.stop()
+    
+    print()
+    print(f"  - 快速路径覆盖率: {fast}/{len(ROUTING_CASES)}")
+    print(f"  - 快速路径准确率: {correct}/{fast}" if fast else "  - 快速路径准确率: -")
+    if saved:
+        print(f"  - 每次快速路径平均节省: {sum(saved) / len(saved) * 1000:.0f}毫秒")
+
+
+if __name__ == "__main__":
+    main()
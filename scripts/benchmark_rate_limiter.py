@@ -0,0 +1,129 @@
+"""限流器基准测试：对比旧版滑动窗口限流（锁内sleep）与令牌桶限流在并发调用下的吞吐量"""
+import argparse
+import os
+import sys
+import io
+import threading
+import time
+from typing import Callable, List
+
+# 设置Windows控制台编码为UTF-8
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.token_bucket import TokenBucket
+
+
+class LegacySlidingWindowLimiter:
+    """旧版限流算法（仅用于对比）：窗口内请求数达到上限时，持有锁 sleep 1 秒"""
+    
+    def __init__(self, limit: int = 3):
+        self.limit = limit
+        self._timestamps: List[float] = []
+        self._lock = threading.Lock()
+    
+    def wait(self):
+        with self._lock:
+            now = time.time()
+            self._timestamps = [ts for ts in self._timestamps if now - ts < 1.0]
+            if len(self._timestamps) >= self.limit:
+                time.sleep(1.0)
+                now = time.time()
+                self._timestamps = [ts for ts in self._timestamps if now - ts < 1.0]
+            self._timestamps.append(time.time())
+
+
+def run_benchmark(name: str, wait_func: Callable[[], object], callers: int,
+                  requests_per_caller: int, request_latency: float, max_concurrency: int,
+                  arrival_interval: float = 0.0) -> dict:
+    """
+    启动 callers 个线程并发发起请求，统计总耗时与每次请求的排队延迟
+    
+    arrival_interval > 0 时，第 i 个调用者在 i * arrival_interval 秒后才开始请求（模拟陆续到达的用户）
+    """
+    semaphore = threading.Semaphore(max_concurrency)
+    latencies: List[float] = []
+    latencies_lock = threading.Lock()
+    start_barrier = threading.Barrier(callers)
+    
+    def worker(index: int):
+        start_barrier.wait()
+        if arrival_interval > 0:
+            time.sleep(index * arrival_interval)
+        for _ in range(requests_per_caller):
+            begin = time.perf_counter()
+            wait_func()
+            with semaphore:
+                time.sleep(request_latency)  # 模拟网络请求耗时
+            with latencies_lock:
+                latencies.append(time.perf_counter() - begin)
+    
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(callers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    
+    latencies.sort()
+    total = len(latencies)
+    return {
+        "name": name,
+        "requests": total,
+        "elapsed": elapsed,
+        "throughput": total / elapsed if elapsed else 0.0,
+        "p50": latencies[total // 2],
+        "p95": latencies[min(total - 1, int(total * 0.95))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="限流器吞吐量基准测试")
+    parser.add_argument("--callers", type=int, default=50, help="并发调用者数量")
+    parser.add_argument("--requests", type=int, default=1, help="每个调用者发起的请求数")
+    parser.add_argument("--rate", type=int, default=3, help="每秒允许的请求数")
+    parser.add_argument("--burst", type=int, default=3, help="令牌桶容量")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟的单次请求耗时（秒）")
+    parser.add_argument("--concurrency", type=int, default=3, help="最大并发请求数")
+    parser.add_argument("--arrival-interval", type=float, default=None,
+                        help="调用者陆续到达的间隔（秒），默认为 1/rate，设为0表示同时到达")
+    args = parser.parse_args()
+    arrival_interval = 1.0 / args.rate if args.arrival_interval is None else args.arrival_interval
+    
+    print("=" * 80)
+    print(f"限流器基准测试：{args.callers} 个并发调用者 × {args.requests} 次请求，限流 {args.rate} 次/秒，"
+          f"到达间隔 {arrival_interval:.2f} 秒")
+    print("=" * 80)
+    
+    legacy = LegacySlidingWindowLimiter(limit=args.rate)
+    bucket = TokenBucket(rate=args.rate, burst=args.burst)
+    
+    results = [
+        run_benchmark("旧版滑动窗口（锁内sleep）", legacy.wait, args.callers, args.requests, args.latency,
+                      args.concurrency, arrival_interval),
+        run_benchmark("令牌桶（锁外精确等待）", bucket.wait, args.callers, args.requests, args.latency,
+                      args.concurrency, arrival_interval),
+    ]
+    
+    for r in results:
+        print(f"\n{r['name']}")
+        print(f"  - 请求总数: {r['requests']}")
+        print(f"  - 总耗时: {r['elapsed']:.2f}秒")
+        print(f"  - 吞吐量: {r['throughput']:.2f} 次/秒")
+        print(f"  - 延迟 P50: {r['p50']:.2f}秒, P95: {r['p95']:.2f}秒")
+    
+    legacy_result, bucket_result = results
+    if legacy_result["throughput"]:
+        gain = bucket_result["throughput"] / legacy_result["throughput"]
+        print(f"\n吞吐量提升: {gain:.2f}x（稳定负载下吞吐量受配额上限约束）")
+    if bucket_result["p50"]:
+        print(f"P50排队延迟降低: {legacy_result['p50'] / bucket_result['p50']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
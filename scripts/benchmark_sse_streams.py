@@ -0,0 +1,181 @@
+"""SSE流式接口基准测试：对比Flask开发服务器（app.run）与ASGI入口（uvicorn asgi:app）同时保持大量打开的流时的线程数、首个事件延迟和完成时间"""
+import argparse
+import asyncio
+import os
+import sys
+import io
+import threading
+import time
+import uuid
+from typing import List
+
+# 设置Windows控制台编码为UTF-8
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# 必须在导入配置之前设置，使所有Agent使用本地脚本化模型
+os.environ["LLM_PROVIDER"] = "fake"
+
+import httpx
+import uvicorn
+from werkzeug.serving import make_server
+
+from src.config import config
+from src.utils.amap_emulator import AmapEmulator
+from src.utils.amap_rate_limiter import get_amap_rate_limiter
+
+QUERIES = [
+    "北京明天天气怎么样？",
+    "从上海到杭州自驾要多久？",
+    "成都有什么好玩的景点？",
+    "帮我查一下广州的酒店",
+]
+
+
+class ThreadSampler:
+    """定期采样进程中的线程数，记录峰值"""
+    
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, threading.active_count())
+    
+    def __enter__(self):
+        self._thread.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def _percentile(values: List[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+async def _open_streams(base_url: str, cookies: List[str], cookie_name: str) -> dict:
+    """同时打开所有流并读取到结束，返回每个流的首个事件延迟和完成时间"""
+    first_events, durations, failures = [], [], 0
+    limits = httpx.Limits(max_connections=len(cookies), max_keepalive_connections=0)
+    
+    async def stream(index: int, cookie: str):
+        nonlocal failures
+        started = time.perf_counter()
+        first = None
+        async with httpx.AsyncClient(base_url=base_url, cookies={cookie_name: cookie},
+                                     timeout=None, limits=limits) as client:
+            async with client.stream("POST", "/api/chat/stream",
+                                     json={"message": QUERIES[index % len(QUERIES)]}) as response:
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    if first is None:
+                        first = time.perf_counter() - started
+                    if '"type": "error"' in line:
+                        failures += 1
+        first_events.append(first if first is not None else 0.0)
+        durations.append(time.perf_counter() - started)
+    
+    started = time.perf_counter()
+    await asyncio.gather(*[stream(i, cookie) for i, cookie in enumerate(cookies)])
+    return {
+        "elapsed": time.perf_counter() - started,
+        "first_p50": _percentile(first_events, 0.5),
+        "first_p95": _percentile(first_events, 0.95),
+        "duration_p50": _percentile(durations, 0.5),
+        "duration_p95": _percentile(durations, 0.95),
+        "failures": failures,
+    }
+
+
+def _serve_flask(flask_app, port: int):
+    """与 app.run() 相同的多线程开发服务器（每个请求一个线程）"""
+    server = make_server("127.0.0.1", port, flask_app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server.shutdown
+
+
+def _serve_asgi(asgi_app, port: int):
+    """单个uvicorn工作进程"""
+    server = uvicorn.Server(uvicorn.Config(asgi_app, host="127.0.0.1", port=port, log_level="warning", lifespan="off"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    
+    def stop():
+        server.should_exit = True
+        thread.join()
+    return stop
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SSE流式接口基准测试（离线，无LLM费用）")
+    parser.add_argument("--streams", type=int, default=100, help="同时打开的流数量（每个流使用独立的用户和Agent）")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="模拟的每个token生成延迟（秒），使流保持打开")
+    parser.add_argument("--amap-latency", type=float, default=0.05, help="高德地图模拟服务的请求延迟（秒）")
+    parser.add_argument("--port", type=int, default=5057, help="起始端口（Flask使用该端口，ASGI使用下一个端口）")
+    args = parser.parse_args()
+    
+    config.config.setdefault("llm", {}).setdefault("fake", {})["token_latency"] = args.token_latency
+    config.config.setdefault("agent", {}).setdefault("response_cache", {})["enabled"] = False
+    emulator = AmapEmulator(mode="synthetic", latency=args.amap_latency)
+    os.environ["AMAP_BASE_URL"] = emulator.start()
+    os.environ.setdefault("AMAP_API_KEY", "benchmark_key")
+    get_amap_rate_limiter().configure(rate=100000, burst=100000)
+    
+    from app import agents, app as flask_app
+    from asgi import app as asgi_app, sessions
+    
+    servers = [
+        ("Flask开发服务器（app.run，每个流占用请求线程和Agent线程）", _serve_flask, flask_app, args.port),
+        ("ASGI（uvicorn单进程，Agent以异步任务执行）", _serve_asgi, asgi_app, args.port + 1),
+    ]
+    results = []
+    try:
+        for name, serve, server_app, port in servers:
+            # 预先创建Agent，只测量打开的流
+            user_ids = [f"bench-{port}-{uuid.uuid4().hex[:8]}" for _ in range(args.streams)]
+            for user_id in user_ids:
+                agents.get(user_id)
+            cookies = [sessions.serializer.dumps({"user_id": user_id}) for user_id in user_ids]
+            
+            stop = serve(server_app, port)
+            try:
+                baseline = threading.active_count()
+                with ThreadSampler() as sampler:
+                    result = asyncio.run(_open_streams(f"http://127.0.0.1:{port}", cookies,
+                                                       flask_app.config["SESSION_COOKIE_NAME"]))
+                result.update(name=name, extra_threads=sampler.peak - baseline)
+                results.append(result)
+            finally:
+                stop()
+    finally:
+        emulator.stop()
+    
+    print("=" * 80)
+    print(f"SSE流式接口基准测试：{args.streams} 个同时打开的流，token延迟 {args.token_latency}秒，"
+          f"高德模拟延迟 {args.amap_latency}秒")
+    print("=" * 80)
+    for r in results:
+        print(f"\n{r['name']}")
+        print(f"  - 失败次数: {r['failures']}")
+        print(f"  - 流打开期间新增线程峰值: {r['extra_threads']}")
+        print(f"  - 首个事件延迟 P50: {r['first_p50'] * 1000:.1f}毫秒, P95: {r['first_p95'] * 1000:.1f}毫秒")
+        print(f"  - 单个流完成时间 P50: {r['duration_p50']:.2f}秒, P95: {r['duration_p95']:.2f}秒")
+        print(f"  - 全部流完成耗时: {r['elapsed']:.2f}秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -14,13 +14,13 @@ if sys.platform == 'win32':
 # 添加项目根目录到路径
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from src.agent.tools import _get_driving_route
+from src.agent.tools import _driving_route_steps, _run_amap_sync
 from src.config import config
 
 def test_driving_route():
     """测试自驾路线函数"""
     print("=" * 80)
-    print("测试自驾路线函数 (_get_driving_route)")
+    print("测试自驾路线函数 (_driving_route_steps)")
     print("=" * 80)
     
     # 获取API密钥
@@ -70,11 +70,11 @@ def test_driving_route():
         print()
         
         try:
-            result = _get_driving_route(
+            result = _run_amap_sync(_driving_route_steps(
                 test_case['origin'],
                 test_case['destination'],
                 test_case['api_key']
-            )
+            ))
             
             print()
             print(f"[成功] 测试完成")
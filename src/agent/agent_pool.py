@@ -0,0 +1,294 @@
+"""会话Agent池：限制常驻的TravelAgent数量，按LRU和空闲时间回收，可选把被回收Agent的状态保存到磁盘以便按需恢复"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.config import config
+
+
+class _PendingAgent:
+    """正在创建（或从快照恢复）的Agent，同一会话的其他调用方等待它完成"""
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.error: Optional[BaseException] = None
+
+
+class AgentPool:
+    """
+    线程安全的会话Agent池
+    
+    锁内只做字典操作：创建Agent（factory）、读写状态快照都在锁外进行，一个会话的创建或快照写入
+    不会阻塞其他会话；同一会话同时只创建一次，快照写入完成后才会被读取。
+    """
+    
+    def __init__(self, factory: Callable[[str], Any], max_size: int = 200, idle_ttl: float = 1800,
+                 snapshot_dir: Optional[str] = None, in_use: Optional[Callable[[str], bool]] = None):
+        """
+        Args:
+            factory: 根据会话键创建Agent的函数
+            max_size: 最多常驻的Agent数，超出后回收最久未使用的Agent
+            idle_ttl: 空闲回收时间（秒），超过该时间未使用的Agent被回收，<=0 表示不按空闲时间回收
+            snapshot_dir: 状态快照目录（可选），设置后被回收的Agent的旅行信息和对话历史会保存到磁盘，
+                          下次访问时自动恢复；Agent需要提供 export_state() / restore_state()
+            in_use: 判断会话的Agent是否正在被运行使用的函数（可选），正在使用的Agent不会被回收
+                    （避免运行中途被回收、快照缺少本轮对话），常驻数可能暂时超过 max_size
+        """
+        self.factory = factory
+        self.max_size = max(1, int(max_size))
+        self.idle_ttl = idle_ttl
+        self.snapshot_dir = snapshot_dir
+        self.in_use = in_use
+        if snapshot_dir:
+            Path(snapshot_dir).mkdir(parents=True, exist_ok=True)
+        self._agents: "OrderedDict[str, Any]" = OrderedDict()
+        self._last_used: Dict[str, float] = {}
+        self._pending: Dict[str, _PendingAgent] = {}
+        # 已回收、快照尚未写完的会话
+        self._saving: Dict[str, threading.Event] = {}
+        self._lock = threading.RLock()
+        self._stats = {
+            "created": 0,
+            "evictions_lru": 0,
+            "evictions_idle": 0,
+            "eviction_skipped_in_use": 0,
+            "snapshots": 0,
+            "revived": 0,
+            "revive_time_total": 0.0,
+            "revive_time_max": 0.0,
+        }
+    
+    def _snapshot_path(self, key: str) -> str:
+        name = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.snapshot_dir, f"{name}.json")
+    
+    def _save_snapshot(self, key: str, agent: Any):
+        """保存被回收Agent的状态（失败时只记录日志，不影响回收）"""
+        if not self.snapshot_dir or not hasattr(agent, "export_state"):
+            return
+        try:
+            with open(self._snapshot_path(key), "w", encoding="utf-8") as f:
+                json.dump(agent.export_state(), f, ensure_ascii=False)
+            with self._lock:
+                self._stats["snapshots"] += 1
+        except Exception as e:
+            print(f"Agent状态保存失败（{key[:8]}...）: {e}", flush=True)
+    
+    def _load_snapshot(self, key: str) -> Optional[dict]:
+        """读取并删除Agent状态快照"""
+        if not self.snapshot_dir:
+            return None
+        path = self._snapshot_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            os.remove(path)
+            return state
+        except Exception as e:
+            print(f"Agent状态恢复失败（{key[:8]}...）: {e}", flush=True)
+            return None
+    
+    def _discard_snapshot(self, key: str):
+        if self.snapshot_dir:
+            self._wait_saved(key)
+            try:
+                os.remove(self._snapshot_path(key))
+            except FileNotFoundError:
+                pass
+    
+    def _wait_saved(self, key: str):
+        """等待会话正在写入的快照完成"""
+        with self._lock:
+            saving = self._saving.get(key)
+        if saving is not None:
+            saving.wait()
+    
+    def _is_in_use(self, key: str) -> bool:
+        if self.in_use is None:
+            return False
+        try:
+            return bool(self.in_use(key))
+        except Exception:
+            return False
+    
+    def _evict(self, key: str, reason: str) -> Tuple[str, Any, threading.Event]:
+        """从池中移除Agent（调用方需持有锁），返回待写入快照的 (会话键, Agent, 完成事件)"""
+        agent = self._agents.pop(key)
+        self._last_used.pop(key, None)
+        self._stats[f"evictions_{reason}"] += 1
+        saving = threading.Event()
+        self._saving[key] = saving
+        return key, agent, saving
+    
+    def _evict_idle(self, now: float) -> List[Tuple[str, Any, threading.Event]]:
+        """按LRU顺序回收空闲超时且未被使用的Agent（调用方需持有锁）"""
+        evicted = []
+        if not self.idle_ttl or self.idle_ttl <= 0:
+            return evicted
+        for key in list(self._agents):
+            if now - self._last_used[key] < self.idle_ttl:
+                break
+            if self._is_in_use(key):
+                self._stats["eviction_skipped_in_use"] += 1
+                continue
+            evicted.append(self._evict(key, "idle"))
+        return evicted
+    
+    def _evict_lru(self, keep: str) -> List[Tuple[str, Any, threading.Event]]:
+        """超过上限时按LRU顺序回收未被使用的Agent（调用方需持有锁）"""
+        evicted = []
+        for key in list(self._agents):
+            if len(self._agents) <= self.max_size:
+                break
+            if key == keep:
+                continue
+            if self._is_in_use(key):
+                self._stats["eviction_skipped_in_use"] += 1
+                continue
+            evicted.append(self._evict(key, "lru"))
+        return evicted
+    
+    def _persist(self, evicted: List[Tuple[str, Any, threading.Event]]):
+        """在锁外写入被回收Agent的快照"""
+        for key, agent, saving in evicted:
+            try:
+                self._save_snapshot(key, agent)
+            finally:
+                with self._lock:
+                    if self._saving.get(key) is saving:
+                        del self._saving[key]
+                saving.set()
+    
+    def _create(self, key: str) -> Any:
+        """在锁外创建Agent，有状态快照时恢复"""
+        begin = time.perf_counter()
+        agent = self.factory(key)
+        self._wait_saved(key)
+        state = self._load_snapshot(key)
+        if state is not None:
+            agent.restore_state(state)
+        elapsed = time.perf_counter() - begin
+        with self._lock:
+            if state is not None:
+                self._stats["revived"] += 1
+                self._stats["revive_time_total"] += elapsed
+                self._stats["revive_time_max"] = max(self._stats["revive_time_max"], elapsed)
+            else:
+                self._stats["created"] += 1
+        return agent
+    
+    def get(self, key: str) -> Any:
+        """
+        获取会话的Agent，不存在时创建（有状态快照时恢复）
+        
+        Args:
+            key: 会话键（用户ID或会话ID）
+        """
+        while True:
+            with self._lock:
+                now = time.time()
+                evicted = self._evict_idle(now)
+                agent = self._agents.get(key)
+                pending = None
+                if agent is not None:
+                    self._agents.move_to_end(key)
+                    self._last_used[key] = now
+                    evicted += self._evict_lru(key)
+                else:
+                    pending = self._pending.get(key)
+                    is_creator = pending is None
+                    if is_creator:
+                        pending = self._pending[key] = _PendingAgent()
+            self._persist(evicted)
+            if agent is not None:
+                return agent
+            
+            if not is_creator:
+                # 同一会话的Agent正在由其他线程创建，等待后重新获取
+                pending.done.wait()
+                if pending.error is not None:
+                    raise pending.error
+                continue
+            
+            try:
+                agent = self._create(key)
+            except BaseException as e:
+                pending.error = e
+                raise
+            finally:
+                with self._lock:
+                    self._pending.pop(key, None)
+                    if pending.error is None:
+                        self._agents[key] = agent
+                        self._last_used[key] = time.time()
+                        evicted = self._evict_lru(key)
+                pending.done.set()
+            self._persist(evicted)
+            return agent
+    
+    def peek(self, key: str) -> Optional[Any]:
+        """获取常驻的Agent（不创建、不恢复、不更新使用时间）"""
+        with self._lock:
+            return self._agents.get(key)
+    
+    def remove(self, key: str):
+        """移除会话的Agent及其状态快照（例如用户登出）"""
+        with self._lock:
+            self._agents.pop(key, None)
+            self._last_used.pop(key, None)
+        self._discard_snapshot(key)
+    
+    def discard_snapshot(self, key: str):
+        """删除会话的状态快照（例如重置对话）"""
+        self._discard_snapshot(key)
+    
+    def evict_idle(self):
+        """立即回收空闲超时的Agent"""
+        with self._lock:
+            evicted = self._evict_idle(time.time())
+        self._persist(evicted)
+    
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._agents
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._agents)
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取Agent池统计信息"""
+        with self._lock:
+            revived = self._stats["revived"]
+            return {
+                "live_agents": len(self._agents),
+                "max_size": self.max_size,
+                "idle_ttl": self.idle_ttl,
+                "created": self._stats["created"],
+                "evictions": self._stats["evictions_lru"] + self._stats["evictions_idle"],
+                "evictions_lru": self._stats["evictions_lru"],
+                "evictions_idle": self._stats["evictions_idle"],
+                "eviction_skipped_in_use": self._stats["eviction_skipped_in_use"],
+                "snapshots": self._stats["snapshots"],
+                "revived": revived,
+                "revive_latency_avg_ms": round(self._stats["revive_time_total"] / revived * 1000, 2) if revived else 0.0,
+                "revive_latency_max_ms": round(self._stats["revive_time_max"] * 1000, 2),
+            }
+
+
+def create_agent_pool(factory: Callable[[str], Any], in_use: Optional[Callable[[str], bool]] = None) -> AgentPool:
+    """根据配置（agent.pool）创建Agent池"""
+    return AgentPool(
+        factory,
+        max_size=config.get("agent.pool.max_size", 200),
+        idle_ttl=config.get("agent.pool.idle_ttl", 1800),
+        snapshot_dir=config.get("agent.pool.snapshot_dir", "") or None,
+        in_use=in_use,
+    )
@@ -0,0 +1,268 @@
+"""主协调Agent的预算化对话记忆：最近几轮保留原文，较早的对话压缩为滚动摘要，限制每次请求发送的历史token数"""
+import asyncio
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+from langchain.memory.chat_memory import BaseChatMemory
+from langchain_core.messages import BaseMessage, SystemMessage
+from langchain_core.pydantic_v1 import Field, PrivateAttr
+
+from src.config import config
+
+
+# 每条消息的格式开销（角色、分隔符等）
+MESSAGE_TOKEN_OVERHEAD = 4
+
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u3400-\u9fff\uf900-\ufaff\uff00-\uffef]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算文本的token数（不依赖分词器，离线可用）：中文字符及全角标点按每字1个token，其他字符按每4个字符1个token
+    
+    Args:
+        text: 文本
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def estimate_message_tokens(messages: List[BaseMessage]) -> int:
+    """估算消息列表的token数"""
+    return sum(estimate_tokens(str(m.content)) + MESSAGE_TOKEN_OVERHEAD for m in messages)
+
+
+def _summary_message(summary: str) -> SystemMessage:
+    return SystemMessage(content=f"此前对话摘要（较早的对话已压缩）：\n{summary}")
+
+
+def _clip(text: str, limit: int) -> str:
+    """提取用户问题（去掉附加的旅行信息上下文），压缩空白并截断"""
+    text = str(text)
+    if "用户问题:" in text:
+        text = text.rsplit("用户问题:", 1)[1]
+    text = re.sub(r"\s+", " ", text).strip()
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+class BudgetedConversationMemory(BaseChatMemory):
+    """
+    预算化对话记忆
+    
+    - 最近 max_turns 轮对话保留原文
+    - 更早的对话折叠进滚动摘要（extractive：截取每轮的问题和回答要点；llm：由LLM压缩）
+    - 摘要 + 最近对话超过 max_tokens 时继续折叠最早的对话（至少保留最近一轮原文）
+    - 每轮记录发送的历史token数和相对完整历史节省的token数（见 report()）
+    - 在事件循环中保存记忆（AgentExecutor.ainvoke、asave_context()）时LLM摘要在线程池中生成，不阻塞事件循环
+    """
+    
+    memory_key: str = "chat_history"
+    max_turns: int = 4
+    max_tokens: int = 1500
+    summary_max_tokens: int = 300
+    summarizer: str = "extractive"
+    llm: Optional[Any] = None
+    summary: str = ""
+    summarized_turns: int = 0
+    # 完整历史的token数（即不压缩时每轮需要发送的历史）
+    history_tokens: int = 0
+    tokens_saved_total: int = 0
+    last_report: Dict[str, Any] = Field(default_factory=dict)
+    # 串行执行压缩；clear() 使进行中的压缩作废；事件循环中尚未完成的压缩
+    _compact_lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _generation: int = PrivateAttr(default=0)
+    _pending: Any = PrivateAttr(default=None)
+    
+    @property
+    def memory_variables(self) -> List[str]:
+        return [self.memory_key]
+    
+    @staticmethod
+    def _summary_tokens(summary: str) -> int:
+        return estimate_message_tokens([_summary_message(summary)]) if summary else 0
+    
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """返回摘要 + 最近对话，并记录本轮的token统计"""
+        messages: List[BaseMessage] = []
+        if self.summary:
+            messages.append(_summary_message(self.summary))
+        messages.extend(self.chat_memory.messages)
+        
+        prompt_tokens = estimate_message_tokens(messages)
+        tokens_saved = max(0, self.history_tokens - prompt_tokens)
+        self.tokens_saved_total += tokens_saved
+        self.last_report = {
+            "prompt_tokens": prompt_tokens,
+            "history_tokens": self.history_tokens,
+            "tokens_saved": tokens_saved,
+            "recent_turns": len(self.chat_memory.messages) // 2,
+            "summarized_turns": self.summarized_turns,
+        }
+        return {self.memory_key: messages}
+    
+    async def aload_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """load_memory_variables() 的异步版本（先等待进行中的压缩完成）"""
+        pending = self._pending
+        if pending is not None and not pending.done():
+            await pending
+        return self.load_memory_variables(inputs)
+    
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        """
+        保存本轮对话，并把超出轮数或token上限的旧对话折叠进摘要
+        
+        AgentExecutor.ainvoke 在事件循环中同步调用本方法；使用LLM摘要时压缩交给线程池，本方法立即返回
+        """
+        self._append(inputs, outputs)
+        if self._uses_llm():
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+            if loop is not None:
+                self._pending = loop.run_in_executor(None, self._compact)
+                return
+        self._compact()
+    
+    async def asave_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        """save_context() 的异步版本：使用LLM摘要时在线程池中压缩并等待完成"""
+        self._append(inputs, outputs)
+        if self._uses_llm():
+            self._pending = asyncio.get_running_loop().run_in_executor(None, self._compact)
+            await self._pending
+        else:
+            self._compact()
+    
+    def _append(self, inputs: Dict[str, Any], outputs: Dict[str, str]):
+        before = len(self.chat_memory.messages)
+        super().save_context(inputs, outputs)
+        self.history_tokens += estimate_message_tokens(self.chat_memory.messages[before:])
+    
+    def _uses_llm(self) -> bool:
+        return self.summarizer == "llm" and self.llm is not None
+    
+    def _over_budget(self, messages: List[BaseMessage]) -> bool:
+        if len(messages) > 2 * max(0, self.max_turns):
+            return True
+        if self.max_tokens and self.max_tokens > 0 and len(messages) > 2:
+            return self._summary_tokens(self.summary) + estimate_message_tokens(messages) > self.max_tokens
+        return False
+    
+    def _compact(self):
+        with self._compact_lock:
+            generation = self._generation
+            messages = list(self.chat_memory.messages)
+            dropped: List[BaseMessage] = []
+            while messages and self._over_budget(messages):
+                dropped.extend(messages[:2])
+                messages = messages[2:]
+            if not dropped:
+                return
+            summary = self._summarize(dropped)
+            # 摘要超出剩余预算时截短，保证摘要 + 最近对话不超过 max_tokens（最近一轮本身超出时除外）
+            if self.max_tokens and self.max_tokens > 0:
+                summary = self._fit(summary, self.max_tokens - estimate_message_tokens(messages))
+            if generation != self._generation:
+                # 生成摘要期间记忆被清空
+                return
+            self.summary = summary
+            self.summarized_turns += (len(dropped) + 1) // 2
+            # 只移除被折叠的对话（线程池中压缩时可能已保存了新的对话）
+            self.chat_memory.messages = self.chat_memory.messages[len(dropped):]
+    
+    def _fit(self, summary: str, budget: int) -> str:
+        """丢弃最早的摘要条目，直到摘要消息不超过 budget 个token"""
+        lines = summary.splitlines()
+        while lines and self._summary_tokens("\n".join(lines)) > budget:
+            if len(lines) > 1:
+                lines.pop(0)
+                continue
+            # 只剩一条（例如LLM生成的整段摘要）时按比例截断
+            tokens = self._summary_tokens(lines[0])
+            keep = int(len(lines[0]) * (budget - MESSAGE_TOKEN_OVERHEAD - 20) / tokens)
+            lines = [lines[0][:keep] + "…"] if keep > 0 else []
+            break
+        return "\n".join(lines)
+    
+    def _summarize(self, dropped: List[BaseMessage]) -> str:
+        """把被折叠的对话合并进摘要"""
+        if self.summarizer == "llm" and self.llm is not None:
+            try:
+                return self._summarize_with_llm(dropped)
+            except Exception as e:
+                print(f"对话摘要生成失败，改用要点截取: {e}", flush=True)
+        
+        lines = self.summary.splitlines() if self.summary else []
+        for i in range(0, len(dropped), 2):
+            pair = dropped[i:i + 2]
+            line = f"- 用户：{_clip(pair[0].content, 60)}"
+            if len(pair) > 1:
+                line += f"；助手：{_clip(pair[1].content, 100)}"
+            lines.append(line)
+        # 摘要超出上限时丢弃最早的条目（至少保留最新一条）
+        while len(lines) > 1 and estimate_tokens("\n".join(lines)) > self.summary_max_tokens:
+            lines.pop(0)
+        return "\n".join(lines)
+    
+    def _summarize_with_llm(self, dropped: List[BaseMessage]) -> str:
+        conversation = "\n".join(
+            f"{'用户' if m.type == 'human' else '助手'}：{_clip(m.content, 500)}" for m in dropped
+        )
+        prompt = (
+            f"请把以下旅行咨询对话合并进已有摘要，只保留目的地、日期、人数、预算、偏好和已给出的关键结论，"
+            f"不超过{self.summary_max_tokens}字，直接输出摘要。\n\n"
+            f"已有摘要：\n{self.summary or '（无）'}\n\n新增对话：\n{conversation}"
+        )
+        result = self.llm.invoke(prompt)
+        return str(getattr(result, "content", result)).strip()
+    
+    def clear(self) -> None:
+        self._generation += 1
+        super().clear()
+        self.summary = ""
+        self.summarized_turns = 0
+        self.history_tokens = 0
+        self.last_report = {}
+    
+    def report(self) -> Dict[str, Any]:
+        """获取最近一轮的token统计和累计节省的token数"""
+        return {
+            "mode": "budgeted",
+            **self.last_report,
+            "tokens_saved_total": self.tokens_saved_total,
+        }
+    
+    def export_state(self) -> Dict[str, Any]:
+        """导出摘要状态（对话原文由调用方通过 chat_memory 导出）"""
+        return {
+            "summary": self.summary,
+            "summarized_turns": self.summarized_turns,
+            "history_tokens": self.history_tokens,
+        }
+    
+    def restore_state(self, state: Dict[str, Any]):
+        """恢复 export_state() 导出的摘要状态"""
+        self.summary = state.get("summary", "")
+        self.summarized_turns = state.get("summarized_turns", 0)
+        self.history_tokens = state.get("history_tokens", 0)
+
+
+def create_budgeted_memory(llm=None) -> BudgetedConversationMemory:
+    """
+    根据配置（agent.memory）创建预算化对话记忆
+    
+    Args:
+        llm: summarizer 为 llm 时用于生成摘要的模型
+    """
+    return BudgetedConversationMemory(
+        memory_key="chat_history",
+        return_messages=True,
+        max_turns=config.get("agent.memory.max_turns", 4),
+        max_tokens=config.get("agent.memory.max_tokens", 1500),
+        summary_max_tokens=config.get("agent.memory.summary_max_tokens", 300),
+        summarizer=config.get("agent.memory.summarizer", "extractive"),
+        llm=llm,
+    )
@@ -0,0 +1,362 @@
+"""
+Agent运行事件总线：Agent执行过程中的工具调用、LLM调用和token统一发布为事件，SSE接口、命令行和测试订阅同一个事件流
+
+事件类型：
+- tool_start / tool_end：专门Agent（工具）开始和完成，tool_end 带 summary 和 elapsed（秒）
+- llm_start / llm_end：LLM调用开始和完成，llm_end 带 elapsed（秒）
+- token：LLM生成的token（见 streaming.TokenStreamHandler）
+- stage：执行阶段变化（如交给主协调Agent）
+- final / error / done：最终回答、错误和结束标记
+- heartbeat：订阅方空闲时生成的心跳（不经过总线）
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional
+from uuid import UUID
+
+from langchain.schema import AgentAction, LLMResult
+
+from src.agent.streaming import TokenStreamHandler
+from src.utils.cancellation import CancellationToken, RunCancelled, cancellation_scope
+
+
+TOOL_START = "tool_start"
+TOOL_END = "tool_end"
+LLM_START = "llm_start"
+LLM_END = "llm_end"
+TOKEN = "token"
+STAGE = "stage"
+FINAL = "final"
+ERROR = "error"
+DONE = "done"
+HEARTBEAT = "heartbeat"
+
+# 专门Agent在进度提示中的名称（开始时、完成时）
+TOOL_START_LABELS = {
+    "query_weather_agent": "天气查询",
+    "query_transport_agent": "交通路线",
+    "query_hotel_agent": "酒店价格",
+    "query_attraction_agent": "景点信息",
+    "query_planning_agent": "行程规划",
+    "query_recommendation_agent": "个性化推荐",
+}
+TOOL_END_LABELS = {
+    "query_weather_agent": "天气",
+    "query_transport_agent": "交通路线",
+    "query_hotel_agent": "酒店价格",
+    "query_attraction_agent": "景点信息",
+    "query_planning_agent": "行程规划",
+    "query_recommendation_agent": "推荐",
+}
+
+
+class AgentEvent:
+    """一个Agent运行事件"""
+    
+    def __init__(self, type: str, data: Optional[Dict[str, Any]] = None):
+        self.type = type
+        self.data = data or {}
+        self.timestamp = time.time()
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为发送给前端的JSON对象（{"type": 类型, ...数据}）"""
+        return {"type": self.type, **self.data}
+    
+    def __repr__(self) -> str:
+        return f"AgentEvent({self.type!r}, {self.data!r})"
+
+
+class EventBus:
+    """
+    一次Agent运行的有界事件队列（线程安全，发布方通常在工作线程中）
+    
+    - 订阅方可以同步迭代 events()、异步迭代 aevents()，有新事件时立即唤醒，空闲时按间隔生成心跳
+    - subscribe() 注册的监听函数在发布方线程中同步调用（命令行输出、测试统计）
+    - 队列满时，相同片段的token合并到队列中最后一个token事件；其他事件等待订阅方取走事件，
+      超时后丢弃；close() 之后发布的事件直接丢弃（例如订阅方已断开）
+    - 在事件循环线程中发布（异步执行的Agent）时不等待，以免阻塞同一事件循环中的订阅方：
+      队列满时token照常合并，其他事件超出容量入队（这类事件很少，不会无限增长）
+    """
+    
+    def __init__(self, max_size: int = 1000, put_timeout: float = 5.0):
+        """
+        Args:
+            max_size: 队列中最多缓存的事件数
+            put_timeout: 队列满时发布方最多等待的时间（秒）
+        """
+        self.max_size = max(1, int(max_size))
+        self.put_timeout = put_timeout
+        self._events: "deque[AgentEvent]" = deque()
+        self._cond = threading.Condition()
+        self._listeners: List[Callable[[AgentEvent], None]] = []
+        self._notifiers: List[Callable[[], None]] = []
+        self._closed = False
+        self.coalesced = 0
+        self.dropped = 0
+    
+    @property
+    def closed(self) -> bool:
+        return self._closed
+    
+    def subscribe(self, listener: Callable[[AgentEvent], None]):
+        """注册监听函数（在发布方线程中按发布顺序调用）"""
+        self._listeners.append(listener)
+    
+    def publish(self, type: str, **data: Any) -> bool:
+        """
+        发布事件
+        
+        Returns:
+            事件是否进入队列（已关闭或等待超时时为False）
+        """
+        event = AgentEvent(type, data)
+        for listener in list(self._listeners):
+            listener(event)
+        on_event_loop = _in_event_loop()
+        with self._cond:
+            offered = self._offer(event)
+            if offered is None and on_event_loop:
+                self._events.append(event)
+                offered = True
+            deadline = time.monotonic() + self.put_timeout
+            while offered is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.dropped += 1
+                    return False
+                self._cond.wait(remaining)
+                offered = self._offer(event)
+            if not offered:
+                return False
+            self._cond.notify_all()
+            notifiers = list(self._notifiers)
+        for notify in notifiers:
+            notify()
+        return True
+    
+    def _offer(self, event: AgentEvent) -> Optional[bool]:
+        """不等待地放入事件（调用方需持有锁）：放入或合并时返回True，已关闭时返回False，队列满时返回None"""
+        if self._closed:
+            return False
+        if len(self._events) < self.max_size:
+            self._events.append(event)
+            return True
+        return True if self._coalesce(event) else None
+    
+    def _coalesce(self, event: AgentEvent) -> bool:
+        """把token合并到队列中最后一个相同片段的token事件（调用方需持有锁）"""
+        last = self._events[-1] if self._events else None
+        if event.type != TOKEN or last is None or last.type != TOKEN:
+            return False
+        if (last.data.get("segment"), last.data.get("source")) != (event.data.get("segment"), event.data.get("source")):
+            return False
+        last.data["token"] += event.data["token"]
+        self.coalesced += 1
+        return True
+    
+    def close(self):
+        """关闭总线：订阅方取完剩余事件后结束迭代，之后发布的事件被丢弃"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            notifiers = list(self._notifiers)
+        for notify in notifiers:
+            notify()
+    
+    def _pop(self) -> Optional[AgentEvent]:
+        """取出一个事件（调用方需持有锁）"""
+        if not self._events:
+            return None
+        event = self._events.popleft()
+        self._cond.notify_all()
+        return event
+    
+    def events(self, heartbeat: Optional[float] = None) -> Iterator[AgentEvent]:
+        """
+        同步迭代事件，总线关闭且事件取完后结束
+        
+        Args:
+            heartbeat: 空闲超过该时间（秒）时生成一个心跳事件，None表示不生成
+        """
+        while True:
+            with self._cond:
+                event = self._pop()
+                if event is None:
+                    if self._closed:
+                        return
+                    self._cond.wait(heartbeat)
+                    event = self._pop()
+                    if event is None and self._closed:
+                        return
+            if event is None:
+                if heartbeat is not None:
+                    yield AgentEvent(HEARTBEAT)
+                continue
+            yield event
+    
+    async def aevents(self, heartbeat: Optional[float] = None) -> AsyncIterator[AgentEvent]:
+        """events() 的异步版本（发布方线程通过事件循环唤醒订阅方，不占用线程等待）"""
+        loop = asyncio.get_running_loop()
+        wakeup = asyncio.Event()
+        
+        def notify():
+            try:
+                loop.call_soon_threadsafe(wakeup.set)
+            except RuntimeError:
+                # 事件循环已关闭
+                pass
+        
+        with self._cond:
+            self._notifiers.append(notify)
+        try:
+            while True:
+                wakeup.clear()
+                with self._cond:
+                    event = self._pop()
+                    closed = self._closed
+                if event is not None:
+                    yield event
+                    continue
+                if closed:
+                    return
+                try:
+                    await asyncio.wait_for(wakeup.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield AgentEvent(HEARTBEAT)
+        finally:
+            with self._cond:
+                self._notifiers.remove(notify)
+
+
+class AgentEventHandler(TokenStreamHandler):
+    """
+    把LangChain回调转换为事件总线上的事件（所有流式接口共用）
+    
+    作为主协调Agent的回调时发布工具和LLM事件；放入 stream_tokens() 后，专门Agent的LLM调用通过 nested()
+    发布token和LLM事件（专门Agent内部的工具调用不作为进度发布）。
+    """
+    
+    def __init__(self, bus: EventBus, source: str = "coordinator", _shared: Optional[Dict[str, Any]] = None):
+        super().__init__(lambda event: bus.publish(TOKEN, **event), source, _shared)
+        self.bus = bus
+        self.current_tool = None
+        self._tools: Dict[Any, tuple] = {}
+        self._llm_started: Dict[UUID, float] = {}
+    
+    def nested(self, source: str = "agent") -> "AgentEventHandler":
+        return AgentEventHandler(self.bus, source, self._shared)
+    
+    def on_agent_action(self, action: AgentAction, **kwargs: Any) -> None:
+        """专门Agent即将被调用"""
+        if self.source != "coordinator":
+            return
+        self.current_tool = action.tool
+        label = TOOL_START_LABELS.get(action.tool, action.tool)
+        self.bus.publish(TOOL_START, tool=action.tool, message=f"正在查询{label}...")
+    
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any) -> None:
+        """记录运行ID对应的工具（并行执行时多个工具同时运行，按运行ID匹配完成通知）"""
+        if self.source == "coordinator":
+            self._tools[run_id] = (serialized.get("name") or self.current_tool, time.perf_counter())
+    
+    def on_tool_end(self, output: Any, *, run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        """专门Agent返回结果"""
+        if self.source != "coordinator":
+            return
+        tool_name, started = self._tools.pop(run_id, (self.current_tool, None))
+        if tool_name:
+            output = str(output)
+            label = TOOL_END_LABELS.get(tool_name, tool_name)
+            self.bus.publish(
+                TOOL_END,
+                tool=tool_name,
+                message=f"✓ {label}查询完成",
+                summary=output[:200] + "..." if len(output) > 200 else output,
+                elapsed=round(time.perf_counter() - started, 3) if started is not None else None,
+            )
+        if tool_name == self.current_tool:
+            self.current_tool = None
+    
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any) -> None:
+        self._llm_started[run_id] = time.perf_counter()
+        self.bus.publish(LLM_START, source=self.source)
+    
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], *, run_id: UUID,
+                            **kwargs: Any) -> None:
+        self.on_llm_start(serialized, [], run_id=run_id)
+    
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self._llm_started.pop(run_id, None)
+        self.bus.publish(
+            LLM_END,
+            source=self.source,
+            elapsed=round(time.perf_counter() - started, 3) if started is not None else None,
+        )
+
+
+def _in_event_loop() -> bool:
+    """当前线程是否正在运行事件循环"""
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+def _publish_error(bus: EventBus, e: Exception):
+    error = str(e) if len(str(e)) <= 200 else str(e)[:200] + "..."
+    bus.publish(ERROR, message=f"处理请求时出错: {error}", error=error)
+
+
+def run_in_background(bus: EventBus, work: Callable[[], str],
+                      token: Optional[CancellationToken] = None) -> threading.Thread:
+    """
+    在后台线程中执行一次Agent运行：返回值发布为 final 事件，异常发布为 error 事件，最后发布 done 并关闭总线
+    
+    Args:
+        bus: 事件总线
+        work: 执行Agent并返回最终回答的函数
+        token: 取消令牌（可选），取消后运行在下一个检查点结束，不再发布结果
+    """
+    def run():
+        try:
+            with cancellation_scope(token):
+                bus.publish(FINAL, message=work())
+        except RunCancelled:
+            pass
+        except Exception as e:
+            _publish_error(bus, e)
+        finally:
+            bus.publish(DONE)
+            bus.close()
+    
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def run_as_task(bus: EventBus, work: Callable[[], Awaitable[str]],
+                token: Optional[CancellationToken] = None) -> "asyncio.Task":
+    """
+    run_in_background() 的异步版本：在当前事件循环中以任务执行一次Agent运行（不占用线程）
+    
+    Args:
+        bus: 事件总线
+        work: 执行Agent并返回最终回答的协程函数
+        token: 取消令牌（可选）
+    """
+    async def run():
+        try:
+            with cancellation_scope(token):
+                bus.publish(FINAL, message=await work())
+        except RunCancelled:
+            pass
+        except Exception as e:
+            _publish_error(bus, e)
+        finally:
+            bus.publish(DONE)
+            bus.close()
+    
+    return asyncio.get_running_loop().create_task(run())
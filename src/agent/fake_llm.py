@@ -0,0 +1,327 @@
+"""
+本地脚本化聊天模型（离线基准测试用，不访问任何LLM服务，也不产生费用）
+
+与 ChatOpenAI 一样通过 OpenAI tools 格式返回工具调用，可以直接替换到 create_openai_tools_agent 中：
+- 规则模式：按顺序匹配最后一条用户消息，命中且该工具已绑定时返回工具调用；
+  收到工具结果后，把工具结果作为最终回复
+- 回放模式：按顺序回放录制的模型输出（TranscriptRecorder 从真实模型调用中录制）
+
+支持按token模拟生成延迟（首token延迟 + 每个token的延迟），以及流式输出（llm.streaming 开启时 invoke 也逐个token回调）。
+在 config.yaml 中设置 llm.provider 为 "fake"（或环境变量 LLM_PROVIDER=fake）即可启用。
+"""
+import asyncio
+import json
+import math
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel, agenerate_from_stream, generate_from_stream
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult, LLMResult
+from langchain_core.pydantic_v1 import PrivateAttr
+
+from src.config import config
+
+
+_CITY_PATTERN = "北京|上海|天津|重庆|广州|深圳|杭州|南京|苏州|成都|西安|武汉|厦门|三亚|青岛|大理|丽江|桂林|长沙|昆明"
+
+# 默认规则：前半部分由主Agent路由到专门Agent，后半部分由专门Agent调用具体工具
+# 一条规则可以用 calls 同时返回多个工具调用；args 中的字符串支持占位符：{input}（用户消息）、{today}、{tomorrow}、{day_after}，以及正则中的命名分组
+DEFAULT_RULES: List[Dict[str, Any]] = [
+    {"pattern": "规划|行程|攻略", "calls": [
+        {"tool": "query_weather_agent", "args": {"__arg1": "{input}"}},
+        {"tool": "query_planning_agent", "args": {"__arg1": "{input}"}},
+    ]},
+    {"pattern": "天气|气温|下雨", "tool": "query_weather_agent", "args": {"__arg1": "{input}"}},
+    {"pattern": "酒店|住宿", "tool": "query_hotel_agent", "args": {"__arg1": "{input}"}},
+    {"pattern": "景点|门票|好玩", "tool": "query_attraction_agent", "args": {"__arg1": "{input}"}},
+    {"pattern": "推荐", "tool": "query_recommendation_agent", "args": {"__arg1": "{input}"}},
+    {"pattern": "到|路线|交通|自驾", "tool": "query_transport_agent", "args": {"__arg1": "{input}"}},
+    {"pattern": f"(?P<origin>{_CITY_PATTERN}).*?到(?P<destination>{_CITY_PATTERN})", "tool": "get_transport_route",
+     "args": {"origin": "{origin}", "destination": "{destination}", "transport_mode": "自驾"}},
+    {"pattern": f"(?P<city>{_CITY_PATTERN}).*?(?:天气|气温|下雨)", "tool": "get_weather_info",
+     "args": {"city": "{city}", "date": "{tomorrow}"}},
+    {"pattern": f"(?P<city>{_CITY_PATTERN})", "tool": "get_hotel_prices",
+     "args": {"city": "{city}", "checkin_date": "{tomorrow}", "checkout_date": "{day_after}"}},
+    {"pattern": f"(?P<city>{_CITY_PATTERN})", "tool": "get_attraction_ticket_prices", "args": {"city": "{city}"}},
+    {"pattern": f"(?P<city>{_CITY_PATTERN})", "tool": "plan_travel_itinerary",
+     "args": {"days": 3, "destination": "{city}", "departure_date": "{tomorrow}"}},
+    {"pattern": f"(?P<city>{_CITY_PATTERN})", "tool": "get_personalized_recommendations",
+     "args": {"destination": "{city}", "interests": "{input}"}},
+]
+
+DEFAULT_RESPONSE = "您好！我是智能旅行助手，可以帮您查询天气、交通、酒店、景点，并规划旅行行程。"
+
+
+class _TemplateVars(dict):
+    """缺失的占位符替换为空字符串"""
+    
+    def __missing__(self, key):
+        return ""
+
+
+def _fill(value: Any, variables: _TemplateVars) -> Any:
+    """递归填充参数模板中的占位符"""
+    if isinstance(value, str):
+        return value.format_map(variables)
+    if isinstance(value, dict):
+        return {k: _fill(v, variables) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_fill(v, variables) for v in value]
+    return value
+
+
+def _bound_tool_names(kwargs: dict) -> List[str]:
+    """获取通过 bind(tools=...) 绑定的工具名称（OpenAI tools 格式）"""
+    names = []
+    for tool in kwargs.get("tools") or []:
+        function = tool.get("function", {}) if isinstance(tool, dict) else {}
+        if function.get("name"):
+            names.append(function["name"])
+    return names
+
+
+def _rule_calls(rule: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """获取规则中的工具调用列表（tool/args 简写或 calls）"""
+    if rule.get("calls"):
+        return rule["calls"]
+    if rule.get("tool"):
+        return [{"tool": rule["tool"], "args": rule.get("args", {})}]
+    return []
+
+
+class ScriptedChatModel(BaseChatModel):
+    """按规则或录制记录生成回复的本地聊天模型"""
+    
+    rules: List[Dict[str, Any]] = DEFAULT_RULES
+    """规则列表，每条规则包含 pattern（正则）、tool（工具名）和 args（参数模板），或 calls（多个工具调用），或 response（直接回复）"""
+    transcript: Optional[List[Dict[str, Any]]] = None
+    """录制的模型输出，设置后按顺序循环回放，忽略规则"""
+    default_response: str = DEFAULT_RESPONSE
+    """没有规则命中时的回复"""
+    token_latency: float = 0.0
+    """每个token的生成延迟（秒）"""
+    first_token_latency: float = 0.0
+    """首token延迟（秒）"""
+    chars_per_token: int = 2
+    """估算token数时每个token对应的字符数"""
+    streaming: bool = False
+    """invoke 时也按token流式生成（逐个触发 on_llm_new_token 回调），与 ChatOpenAI 的 streaming 一致"""
+    model_name: str = "scripted"
+    
+    _cursor: int = PrivateAttr(default=0)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-chat"
+    
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model_name": self.model_name, "transcript": self.transcript is not None}
+    
+    def _count_tokens(self, text: str) -> int:
+        return max(1, math.ceil(len(text) / max(1, self.chars_per_token)))
+    
+    def _next_message(self, messages: List[BaseMessage], **kwargs: Any) -> AIMessage:
+        """根据对话生成下一条模型输出"""
+        if self.transcript:
+            with self._lock:
+                entry = self.transcript[self._cursor % len(self.transcript)]
+                self._cursor += 1
+            return self._to_message(entry.get("content", ""), entry.get("tool_calls"))
+        
+        if messages and isinstance(messages[-1], ToolMessage):
+            # 收到工具结果：把本轮所有工具结果作为最终回复
+            outputs = []
+            for message in reversed(messages):
+                if not isinstance(message, ToolMessage):
+                    break
+                outputs.append(str(message.content))
+            return AIMessage(content="\n\n".join(reversed(outputs)))
+        
+        user_input = next((str(m.content) for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+        bound_tools = _bound_tool_names(kwargs)
+        today = datetime.now().date()
+        for rule in self.rules:
+            match = re.search(rule.get("pattern", ""), user_input)
+            if not match:
+                continue
+            calls = [call for call in _rule_calls(rule) if call["tool"] in bound_tools]
+            if not calls and "response" not in rule:
+                continue
+            variables = _TemplateVars(
+                input=user_input,
+                today=today.strftime("%Y-%m-%d"),
+                tomorrow=(today + timedelta(days=1)).strftime("%Y-%m-%d"),
+                day_after=(today + timedelta(days=2)).strftime("%Y-%m-%d"),
+            )
+            variables.update({k: v for k, v in match.groupdict().items() if v is not None})
+            if calls:
+                return self._to_message("", [
+                    {"name": call["tool"], "args": _fill(call.get("args", {}), variables)} for call in calls
+                ])
+            return AIMessage(content=_fill(rule.get("response", ""), variables))
+        return AIMessage(content=self.default_response)
+    
+    @staticmethod
+    def _to_message(content: str, tool_calls: Optional[List[Dict[str, Any]]]) -> AIMessage:
+        """把 {name, args} 形式的工具调用转换为 OpenAI tools 格式的消息"""
+        if not tool_calls:
+            return AIMessage(content=content)
+        return AIMessage(content=content, additional_kwargs={"tool_calls": [
+            {
+                "id": f"call_{uuid.uuid4().hex[:24]}",
+                "type": "function",
+                "function": {"name": call["name"], "arguments": json.dumps(call.get("args", {}), ensure_ascii=False)},
+            }
+            for call in tool_calls
+        ]})
+    
+    def _generation_delay(self, message: AIMessage) -> float:
+        """按输出的token数计算模拟延迟"""
+        text = str(message.content)
+        if message.additional_kwargs:
+            text += json.dumps(message.additional_kwargs, ensure_ascii=False)
+        return self.first_token_latency + self.token_latency * self._count_tokens(text)
+    
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if self.streaming:
+            return generate_from_stream(self._stream(messages, stop=stop, run_manager=run_manager, **kwargs))
+        message = self._next_message(messages, **kwargs)
+        delay = self._generation_delay(message)
+        if delay > 0:
+            time.sleep(delay)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+    
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if self.streaming:
+            return await agenerate_from_stream(self._astream(messages, stop=stop, run_manager=run_manager, **kwargs))
+        message = self._next_message(messages, **kwargs)
+        delay = self._generation_delay(message)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+    
+    def _chunks(self, message: AIMessage) -> Iterator[ChatGenerationChunk]:
+        """把消息拆分为流式输出的块（工具调用作为一个整体输出）"""
+        if message.additional_kwargs:
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content=str(message.content), additional_kwargs=message.additional_kwargs
+            ))
+            return
+        content = str(message.content)
+        size = max(1, self.chars_per_token)
+        for i in range(0, len(content), size):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=content[i:i + size]))
+    
+    def _chunk_delay(self, chunk: ChatGenerationChunk) -> float:
+        if chunk.message.additional_kwargs:
+            # 首token延迟已在开始输出前计入
+            return self._generation_delay(chunk.message) - self.first_token_latency
+        return self.token_latency
+    
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        message = self._next_message(messages, **kwargs)
+        if self.first_token_latency > 0:
+            time.sleep(self.first_token_latency)
+        for chunk in self._chunks(message):
+            delay = self._chunk_delay(chunk)
+            if delay > 0:
+                time.sleep(delay)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+    
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        message = self._next_message(messages, **kwargs)
+        if self.first_token_latency > 0:
+            await asyncio.sleep(self.first_token_latency)
+        for chunk in self._chunks(message):
+            delay = self._chunk_delay(chunk)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+class TranscriptRecorder(BaseCallbackHandler):
+    """录制真实模型的输出，保存后可供 ScriptedChatModel 回放"""
+    
+    def __init__(self):
+        super().__init__()
+        self.entries: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+    
+    def on_llm_end(self, response: LLMResult, **kwargs) -> None:
+        """记录每次模型调用的输出（内容和工具调用）"""
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                if message is None:
+                    continue
+                entry: Dict[str, Any] = {"content": str(message.content)}
+                tool_calls = message.additional_kwargs.get("tool_calls")
+                if tool_calls:
+                    entry["tool_calls"] = [
+                        {"name": call["function"]["name"], "args": json.loads(call["function"]["arguments"] or "{}")}
+                        for call in tool_calls
+                    ]
+                with self._lock:
+                    self.entries.append(entry)
+    
+    def save(self, path: str):
+        """保存录制记录为JSON文件"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=2)
+
+
+def load_transcript(path: str) -> List[Dict[str, Any]]:
+    """读取录制记录"""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def create_fake_llm() -> ScriptedChatModel:
+    """根据配置（llm.fake）创建本地脚本化模型"""
+    transcript_path = config.get("llm.fake.transcript_path", "")
+    return ScriptedChatModel(
+        rules=config.get("llm.fake.rules", None) or DEFAULT_RULES,
+        transcript=load_transcript(transcript_path) if transcript_path else None,
+        token_latency=config.get("llm.fake.token_latency", 0.0),
+        first_token_latency=config.get("llm.fake.first_token_latency", 0.0),
+        chars_per_token=config.get("llm.fake.chars_per_token", 2),
+        streaming=config.get("llm.streaming", True),
+        model_name=config.llm_model,
+    )
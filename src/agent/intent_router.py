@@ -0,0 +1,270 @@
+"""意图快速路由：对意图明确的天气、酒店、交通路线问题跳过主协调LLM，直接调用对应的专门Agent"""
+import importlib
+import re
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Tuple
+
+from src.config import config
+
+
+# 常见城市（用于判断问题中是否包含地点；不在列表中的城市可用“X市”写法，否则交给LLM路由）
+KNOWN_CITIES = (
+    "北京|上海|天津|重庆|广州|深圳|杭州|南京|苏州|成都|西安|武汉|厦门|三亚|青岛|大理|丽江|桂林|长沙|昆明|"
+    "郑州|济南|沈阳|大连|哈尔滨|长春|福州|合肥|南昌|南宁|贵阳|海口|拉萨|乌鲁木齐|兰州|西宁|银川|呼和浩特|"
+    "太原|石家庄|宁波|无锡|珠海|黄山|张家界|洛阳|扬州|烟台|威海|秦皇岛|北海|西双版纳|香港|澳门"
+)
+
+WEATHER_PATTERN = re.compile(r"天气|气温|温度|下雨|降雨|下雪|预报|冷不冷|热不热")
+HOTEL_PATTERN = re.compile(r"酒店|宾馆|住宿|民宿|住哪")
+TRANSPORT_PATTERN = re.compile(r"自驾|开车|驾车|距离|多远|多久|路线|怎么去|交通|高铁|火车|动车|飞机|航班|公里")
+# 需要整合多种信息的请求（规划、景点、推荐等）交给LLM路由
+COMPLEX_PATTERN = re.compile(r"行程|攻略|预算|旅行|旅游|景点|好玩|推荐.*(?:目的地|地方)|\d+\s*天(?!后)|规划(?!.*路线)")
+# 依赖上下文的追问（如“那里呢”），需要LLM结合对话历史理解
+CONTEXT_PATTERN = re.compile(r"那里|那边|这里|这边|那个|这个|刚才|上面|之前|上次|同样|还是|呢[？?]?$")
+PLACE_PATTERN = re.compile(rf"(?:{KNOWN_CITIES})|[\u4e00-\u9fa5]{{2,4}}[市县]")
+# 天气、酒店问题中不表示地点的词：去掉后仍剩下连续两个以上的汉字时，问题可能包含不在城市列表中的地名（如“婺源”“乌镇”），
+# 不能用旅行信息中的目的地代替
+_NON_PLACE_PATTERN = re.compile(
+    r"天气|气温|温度|下雨|降雨|下雪|预报|冷不冷|热不热|酒店|宾馆|住宿|民宿|住哪|"
+    r"大后天|后天|明天|今天|(?:\d+|[一两二三四五六七])\s*天后|周末|这周|下周|本周|最近|现在|"
+    r"请问|麻烦|帮我|帮忙|告诉我|我想知道|想知道|我想|查询|查一下|查|看看|一下|"
+    r"怎么样|怎样|如何|什么|多少|几度|会不会|有没有|是不是|是否|贵不贵|价格|推荐|经济型|豪华型?|快捷|"
+    r"哪家|哪些|哪里|附近|便宜|有|会|要|吗|呢|吧|啊|呀|的|了|是|贵|好|[\W\d_a-zA-Z]+"
+)
+ROUTE_PATTERN = re.compile(rf"(?P<from>从)?(?P<origin>{KNOWN_CITIES}|[\u4e00-\u9fa5]{{2,4}}[市县])(?:出发)?(?:到|去|至)"
+                           rf"(?P<destination>{KNOWN_CITIES}|[\u4e00-\u9fa5]{{2,4}}[市县])")
+
+_CN_NUMBERS = {"一": 1, "两": 2, "二": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7}
+_RELATIVE_DAYS = (("大后天", 3), ("后天", 2), ("明天", 1), ("今天", 0))
+_DAYS_LATER_PATTERN = re.compile(r"(\d+|[一两二三四五六七])\s*天后")
+
+INTENT_TOOLS = {
+    "weather": "query_weather_agent",
+    "hotel": "query_hotel_agent",
+    "transport": "query_transport_agent",
+}
+
+
+class RouteDecision:
+    """路由结果：intent 为空或置信度不足时交给LLM路由"""
+    
+    def __init__(self, intent: Optional[str] = None, confidence: float = 0.0, reason: str = "", query: str = ""):
+        self.intent = intent
+        self.tool_name = INTENT_TOOLS.get(intent) if intent else None
+        self.confidence = confidence
+        self.reason = reason
+        self.query = query
+    
+    def __repr__(self) -> str:
+        return f"RouteDecision(intent={self.intent!r}, confidence={self.confidence:.2f}, reason={self.reason!r})"
+
+
+def resolve_relative_date(text: str, today: Optional[datetime] = None) -> Optional[Tuple[str, str]]:
+    """
+    解析文本中的相对日期（今天、明天、后天、大后天、N天后）
+    
+    Args:
+        text: 用户问题
+        today: 当前日期（默认今天）
+    
+    Returns:
+        (相对日期原文, YYYY-MM-DD)，没有相对日期时返回None
+    """
+    today = today or datetime.now()
+    match = _DAYS_LATER_PATTERN.search(text)
+    if match:
+        raw = match.group(1)
+        days = int(raw) if raw.isdigit() else _CN_NUMBERS[raw]
+        return match.group(0), (today + timedelta(days=days)).strftime("%Y-%m-%d")
+    for word, days in _RELATIVE_DAYS:
+        if word in text:
+            return word, (today + timedelta(days=days)).strftime("%Y-%m-%d")
+    return None
+
+
+def load_classifier(path: str) -> Optional[Callable[[str], Tuple[Optional[str], float]]]:
+    """
+    加载可选的本地意图分类器（"模块:函数"，函数接收问题文本，返回 (intent, confidence)）
+    
+    Args:
+        path: 分类器路径，为空时返回None
+    """
+    if not path:
+        return None
+    module_name, _, func_name = path.partition(":")
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+class IntentRouter:
+    """
+    基于关键词、正则和旅行信息的意图路由器
+    
+    只在意图单一且信息完整（有地点，交通问题有出发地和目的地）时走快速路径；
+    涉及规划、多个领域或依赖对话上下文的问题都交给主协调LLM处理。
+    """
+    
+    def __init__(self, min_confidence: float = 0.85,
+                 classifier: Optional[Callable[[str], Tuple[Optional[str], float]]] = None):
+        """
+        Args:
+            min_confidence: 走快速路径的最低置信度
+            classifier: 可选的本地意图分类器，规则无法判断时使用，返回 (intent, confidence)
+        """
+        self.min_confidence = min_confidence
+        self.classifier = classifier
+        self._lock = threading.Lock()
+        self._stats: Dict[str, float] = {
+            "requests": 0,
+            "fast_path": 0,
+            "llm_fallback": 0,
+            "fast_path_errors": 0,
+            "fast_path_time_total": 0.0,
+            "llm_path_time_total": 0.0,
+        }
+        self._by_intent: Dict[str, int] = {}
+    
+    def classify(self, user_input: str, travel_info: Optional[dict] = None,
+                 today: Optional[datetime] = None) -> RouteDecision:
+        """
+        判断用户问题的意图
+        
+        Args:
+            user_input: 用户问题（不含附加的旅行信息上下文）
+            travel_info: 旅行信息（目的地可作为问题中缺失的地点）
+            today: 当前日期（默认今天，用于解析相对日期）
+        """
+        text = user_input.strip()
+        travel_info = travel_info or {}
+        if not text:
+            return RouteDecision(reason="空输入")
+        if CONTEXT_PATTERN.search(text):
+            return RouteDecision(reason="依赖对话上下文")
+        if COMPLEX_PATTERN.search(text):
+            return RouteDecision(reason="规划或多信息请求")
+        
+        domains = [name for name, pattern in (
+            ("weather", WEATHER_PATTERN), ("hotel", HOTEL_PATTERN), ("transport", TRANSPORT_PATTERN)
+        ) if pattern.search(text)]
+        route = ROUTE_PATTERN.search(text)
+        if route and not domains:
+            domains.append("transport")
+        
+        if len(domains) != 1:
+            if not domains and self.classifier:
+                return self._classify_with_model(text)
+            return RouteDecision(reason="多个领域" if domains else "未识别到意图")
+        
+        intent = domains[0]
+        destination = travel_info.get("destination")
+        has_place = bool(PLACE_PATTERN.search(text))
+        if intent == "transport":
+            if not route:
+                return RouteDecision(intent, 0.5, "缺少出发地或目的地")
+            confidence = 0.9 if (route.group("from") or TRANSPORT_PATTERN.search(text)) else 0.6
+            return RouteDecision(intent, confidence, "交通路线", self._build_query(text))
+        
+        if not has_place and re.search(r"[\u4e00-\u9fa5]{2,}", _NON_PLACE_PATTERN.sub(" ", text)):
+            return RouteDecision(intent, 0.6, "可能包含未识别的地点")
+        if not has_place and not destination:
+            return RouteDecision(intent, 0.5, "缺少地点")
+        confidence = 0.9 if has_place else 0.85
+        query = self._build_query(text, None if has_place else destination, today, resolve_dates=True)
+        return RouteDecision(intent, confidence, "天气" if intent == "weather" else "酒店", query)
+    
+    def _classify_with_model(self, text: str) -> RouteDecision:
+        try:
+            intent, confidence = self.classifier(text)
+        except Exception as e:
+            return RouteDecision(reason=f"分类器出错: {e}")
+        if intent not in INTENT_TOOLS:
+            return RouteDecision(reason="分类器未识别到意图")
+        return RouteDecision(intent, confidence, "本地分类器", self._build_query(text, resolve_dates=True))
+    
+    @staticmethod
+    def _build_query(text: str, destination: Optional[str] = None, today: Optional[datetime] = None,
+                     resolve_dates: bool = False) -> str:
+        """构建发送给专门Agent的问题（补充目的地和具体日期，代替主协调Agent的改写）"""
+        notes = []
+        if destination:
+            notes.append(f"城市: {destination}")
+        if resolve_dates:
+            now = today or datetime.now()
+            notes.append(f"当前日期: {now.strftime('%Y-%m-%d')}")
+            resolved = resolve_relative_date(text, now)
+            if resolved:
+                notes.append(f"{resolved[0]}即 {resolved[1]}")
+        return f"{text}（{'，'.join(notes)}）" if notes else text
+    
+    def route(self, user_input: str, travel_info: Optional[dict] = None) -> RouteDecision:
+        """
+        判断是否走快速路径（置信度不足时 intent 置空），并记录统计
+        
+        Args:
+            user_input: 用户问题
+            travel_info: 旅行信息
+        """
+        decision = self.classify(user_input, travel_info)
+        with self._lock:
+            self._stats["requests"] += 1
+        if decision.intent and decision.confidence >= self.min_confidence:
+            return decision
+        return RouteDecision(reason=decision.reason)
+    
+    def record(self, decision: RouteDecision, elapsed: float, fast_path_failed: bool = False):
+        """
+        记录一次对话的路由方式和耗时
+        
+        Args:
+            decision: route() 的结果
+            elapsed: 对话耗时（秒）
+            fast_path_failed: 快速路径执行失败并退回LLM路由
+        """
+        with self._lock:
+            if decision.intent and not fast_path_failed:
+                self._stats["fast_path"] += 1
+                self._stats["fast_path_time_total"] += elapsed
+                self._by_intent[decision.intent] = self._by_intent.get(decision.intent, 0) + 1
+            else:
+                self._stats["llm_fallback"] += 1
+                self._stats["llm_path_time_total"] += elapsed
+                if fast_path_failed:
+                    self._stats["fast_path_errors"] += 1
+    
+    def stats(self) -> Dict:
+        """获取路由统计（快速路径比例、两种路径的平均耗时及估算节省的时间）"""
+        with self._lock:
+            fast, fallback = self._stats["fast_path"], self._stats["llm_fallback"]
+            fast_avg = self._stats["fast_path_time_total"] / fast if fast else 0.0
+            llm_avg = self._stats["llm_path_time_total"] / fallback if fallback else 0.0
+            return {
+                "requests": int(self._stats["requests"]),
+                "fast_path": int(fast),
+                "llm_fallback": int(fallback),
+                "fast_path_errors": int(self._stats["fast_path_errors"]),
+                "fast_path_ratio": round(fast / (fast + fallback), 3) if fast + fallback else 0.0,
+                "by_intent": dict(self._by_intent),
+                "fast_path_avg_ms": round(fast_avg * 1000, 2),
+                "llm_path_avg_ms": round(llm_avg * 1000, 2),
+                # 按LLM路由的平均耗时估算快速路径节省的总时间
+                "estimated_time_saved_s": round(max(0.0, llm_avg - fast_avg) * fast, 2) if fast and fallback else 0.0,
+            }
+
+
+_intent_router: Optional[IntentRouter] = None
+_intent_router_lock = threading.Lock()
+
+
+def get_intent_router() -> Optional[IntentRouter]:
+    """获取全局意图路由器（agent.router.enabled 为 false 时返回None）"""
+    global _intent_router
+    if not config.get("agent.router.enabled", True):
+        return None
+    if _intent_router is None:
+        with _intent_router_lock:
+            if _intent_router is None:
+                _intent_router = IntentRouter(
+                    min_confidence=config.get("agent.router.min_confidence", 0.85),
+                    classifier=load_classifier(config.get("agent.router.classifier", "")),
+                )
+    return _intent_router
@@ -0,0 +1,156 @@
+"""LLM客户端注册表：进程内共享LLM实例和Agent（提示词 + 工具绑定），避免每个用户、每个专门Agent各建一套客户端和连接池"""
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain.agents import create_openai_tools_agent
+from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_openai import ChatOpenAI
+
+from src.agent.fake_llm import create_fake_llm
+from src.config import config
+
+
+_lock = threading.Lock()
+_llms: Dict[Tuple, Any] = {}
+_prompts: Dict[str, ChatPromptTemplate] = {}
+_agents: Dict[Tuple[str, int], Tuple[Any, Any]] = {}
+_stats = {"llm_hits": 0, "llm_misses": 0, "agent_hits": 0, "agent_misses": 0}
+
+
+def llm_registry_key(temperature: Optional[float] = None, max_tokens: Optional[int] = None) -> Tuple:
+    """
+    生成LLM实例的共享键：(provider, model, temperature, max_tokens, base_url)
+    
+    Args:
+        temperature: 温度，None表示使用配置 llm.temperature
+        max_tokens: 最大token数，None表示使用配置 llm.max_tokens
+    """
+    return (
+        config.llm_provider,
+        config.llm_model,
+        temperature if temperature is not None else config.get("llm.temperature", 0.7),
+        max_tokens if max_tokens is not None else config.get("llm.max_tokens", 2000),
+        config.openai_api_base,
+    )
+
+
+def _build_llm(key: Tuple):
+    """根据共享键创建LLM实例"""
+    provider, model, temperature, max_tokens, api_base = key
+    if provider == "fake":
+        return create_fake_llm()
+    
+    if not config.openai_api_key:
+        raise ValueError("OPENAI_API_KEY 未设置，请在 env 文件中配置API密钥")
+    
+    # 设置环境变量（ChatOpenAI 会从环境变量读取）
+    os.environ["OPENAI_API_KEY"] = config.openai_api_key
+    
+    llm_kwargs = {
+        "model": model,
+        "temperature": temperature,
+        "openai_api_key": config.openai_api_key,
+        "timeout": 60,  # 设置60秒超时
+        "max_retries": 2,  # 最多重试2次
+        # 流式生成：invoke 时逐个token触发 on_llm_new_token 回调，SSE接口据此实时转发（见 src/agent/streaming.py）
+        "streaming": config.get("llm.streaming", True),
+    }
+    
+    # 如果API base不是OpenAI默认值，需要设置
+    if api_base and "openai.com" not in api_base:
+        os.environ["OPENAI_API_BASE"] = api_base
+        llm_kwargs["openai_api_base"] = api_base
+    
+    if max_tokens:
+        llm_kwargs["max_tokens"] = max_tokens
+    
+    return ChatOpenAI(**llm_kwargs)
+
+
+def get_shared_llm(temperature: Optional[float] = None, max_tokens: Optional[int] = None):
+    """
+    获取共享的LLM实例（配置相同的调用方共用一个客户端及其连接池）
+    
+    Args:
+        temperature: 温度，None表示使用配置 llm.temperature
+        max_tokens: 最大token数，None表示使用配置 llm.max_tokens
+    """
+    key = llm_registry_key(temperature, max_tokens)
+    with _lock:
+        llm = _llms.get(key)
+        if llm is not None:
+            _stats["llm_hits"] += 1
+            return llm
+        llm = _build_llm(key)
+        _llms[key] = llm
+        _stats["llm_misses"] += 1
+        return llm
+
+
+def get_shared_prompt(name: str, system_prompt: str) -> ChatPromptTemplate:
+    """
+    获取共享的Agent提示词模板（按名称只构建一次）
+    
+    Args:
+        name: Agent名称
+        system_prompt: 系统提示词
+    """
+    with _lock:
+        prompt = _prompts.get(name)
+        if prompt is None:
+            prompt = ChatPromptTemplate.from_messages([
+                ("system", system_prompt),
+                MessagesPlaceholder(variable_name="chat_history"),
+                ("human", "{input}"),
+                MessagesPlaceholder(variable_name="agent_scratchpad"),
+            ])
+            _prompts[name] = prompt
+        return prompt
+
+
+def get_shared_agent(name: str, llm, tools: List, system_prompt: str):
+    """
+    获取共享的Agent（提示词 + LLM + 工具绑定），同一个LLM实例只构建一次
+    
+    Agent本身不保存会话状态，多个 AgentExecutor（各自带独立的记忆）可以复用同一个Agent。
+    
+    Args:
+        name: Agent名称
+        llm: LLM实例
+        tools: Agent可用的工具（只使用工具的名称和参数定义）
+        system_prompt: 系统提示词
+    """
+    key = (name, id(llm))
+    with _lock:
+        cached = _agents.get(key)
+        # 同时比较LLM实例，避免LLM被回收后id被复用
+        if cached is not None and cached[0] is llm:
+            _stats["agent_hits"] += 1
+            return cached[1]
+    
+    agent = create_openai_tools_agent(llm=llm, tools=tools, prompt=get_shared_prompt(name, system_prompt))
+    with _lock:
+        _agents[key] = (llm, agent)
+        _stats["agent_misses"] += 1
+    return agent
+
+
+def clear_llm_registry():
+    """清空注册表（配置变化后或测试中使用）"""
+    with _lock:
+        _llms.clear()
+        _prompts.clear()
+        _agents.clear()
+        for name in _stats:
+            _stats[name] = 0
+
+
+def llm_registry_stats() -> dict:
+    """获取注册表统计信息"""
+    with _lock:
+        return {
+            "llms": len(_llms),
+            "agents": len(_agents),
+            **_stats,
+        }
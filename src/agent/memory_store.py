@@ -0,0 +1,183 @@
+"""专门Agent的会话记忆存储模块（按会话保存子Agent的对话历史，Agent本身不持有状态）"""
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from langchain_core.messages import BaseMessage, messages_from_dict, messages_to_dict
+
+from src.config import config
+
+
+class MemoryStore(ABC):
+    """会话记忆存储的抽象基类：按 (session_id, agent_name) 保存消息列表，只保留最近 max_messages 条"""
+    
+    def __init__(self, max_messages: int = 20):
+        """
+        Args:
+            max_messages: 每个会话中每个Agent最多保留的消息数（一轮对话2条），<=0 表示不限制
+        """
+        self.max_messages = max_messages
+        self._lock = threading.RLock()
+    
+    def _trim(self, messages: List[dict]) -> List[dict]:
+        if self.max_messages and self.max_messages > 0 and len(messages) > self.max_messages:
+            return messages[-self.max_messages:]
+        return messages
+    
+    @abstractmethod
+    def load(self, session_id: str, agent_name: str) -> List[BaseMessage]:
+        """读取会话中某个Agent的对话历史"""
+    
+    @abstractmethod
+    def append(self, session_id: str, agent_name: str, messages: List[BaseMessage]):
+        """追加消息（超出 max_messages 的旧消息被丢弃）"""
+    
+    @abstractmethod
+    def clear(self, session_id: str):
+        """清空会话的所有Agent历史"""
+    
+    @abstractmethod
+    def stats(self) -> Dict:
+        """获取存储统计信息"""
+
+
+class InMemoryStore(MemoryStore):
+    """进程内记忆存储，按会话LRU淘汰"""
+    
+    def __init__(self, max_sessions: int = 1000, max_messages: int = 20):
+        """
+        Args:
+            max_sessions: 最多保存的会话数，超出后淘汰最久未使用的会话
+            max_messages: 每个会话中每个Agent最多保留的消息数
+        """
+        super().__init__(max_messages)
+        self.max_sessions = max(1, int(max_sessions))
+        self._sessions: "OrderedDict[str, Dict[str, List[dict]]]" = OrderedDict()
+        self._evictions = 0
+    
+    def load(self, session_id: str, agent_name: str) -> List[BaseMessage]:
+        with self._lock:
+            agents = self._sessions.get(session_id)
+            if agents is None:
+                return []
+            self._sessions.move_to_end(session_id)
+            return messages_from_dict(agents.get(agent_name, []))
+    
+    def append(self, session_id: str, agent_name: str, messages: List[BaseMessage]):
+        with self._lock:
+            agents = self._sessions.setdefault(session_id, {})
+            self._sessions.move_to_end(session_id)
+            agents[agent_name] = self._trim(agents.get(agent_name, []) + messages_to_dict(messages))
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self._evictions += 1
+    
+    def clear(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "messages": sum(len(m) for agents in self._sessions.values() for m in agents.values()),
+                "evictions": self._evictions,
+            }
+
+
+class SQLiteMemoryStore(MemoryStore):
+    """SQLite记忆存储，进程重启后会话历史仍然有效"""
+    
+    def __init__(self, path: str, max_messages: int = 20, ttl: float = 7 * 86400):
+        """
+        Args:
+            path: SQLite文件路径
+            max_messages: 每个会话中每个Agent最多保留的消息数
+            ttl: 会话历史的过期时间（秒），超过该时间未更新的历史在写入时清理，<=0 表示永不过期
+        """
+        super().__init__(max_messages)
+        self.path = path
+        self.ttl = ttl
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS "agent_memory" '
+            '(session_id TEXT NOT NULL, agent_name TEXT NOT NULL, messages TEXT NOT NULL, updated_at REAL NOT NULL, '
+            'PRIMARY KEY (session_id, agent_name))'
+        )
+        self._db.commit()
+    
+    def _load_raw(self, session_id: str, agent_name: str) -> List[dict]:
+        row = self._db.execute(
+            'SELECT messages, updated_at FROM "agent_memory" WHERE session_id = ? AND agent_name = ?',
+            (session_id, agent_name)
+        ).fetchone()
+        if not row:
+            return []
+        if self.ttl and self.ttl > 0 and row[1] + self.ttl <= time.time():
+            return []
+        return json.loads(row[0])
+    
+    def load(self, session_id: str, agent_name: str) -> List[BaseMessage]:
+        with self._lock:
+            return messages_from_dict(self._load_raw(session_id, agent_name))
+    
+    def append(self, session_id: str, agent_name: str, messages: List[BaseMessage]):
+        with self._lock:
+            stored = self._trim(self._load_raw(session_id, agent_name) + messages_to_dict(messages))
+            now = time.time()
+            self._db.execute(
+                'INSERT OR REPLACE INTO "agent_memory" (session_id, agent_name, messages, updated_at) '
+                'VALUES (?, ?, ?, ?)',
+                (session_id, agent_name, json.dumps(stored, ensure_ascii=False), now)
+            )
+            if self.ttl and self.ttl > 0:
+                self._db.execute('DELETE FROM "agent_memory" WHERE updated_at <= ?', (now - self.ttl,))
+            self._db.commit()
+    
+    def clear(self, session_id: str):
+        with self._lock:
+            self._db.execute('DELETE FROM "agent_memory" WHERE session_id = ?', (session_id,))
+            self._db.commit()
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            sessions = self._db.execute('SELECT COUNT(DISTINCT session_id) FROM "agent_memory"').fetchone()[0]
+            return {"backend": "sqlite", "path": self.path, "sessions": sessions}
+
+
+_memory_store: Optional[MemoryStore] = None
+_memory_store_lock = threading.Lock()
+
+
+def create_memory_store() -> MemoryStore:
+    """根据配置（agent.memory_store）创建记忆存储"""
+    backend = config.get("agent.memory_store.backend", "memory")
+    max_messages = config.get("agent.memory_store.max_messages", 20)
+    if backend == "sqlite":
+        return SQLiteMemoryStore(
+            path=config.get("agent.memory_store.path", "./data/agent_memory.sqlite"),
+            max_messages=max_messages,
+            ttl=config.get("agent.memory_store.ttl", 7 * 86400),
+        )
+    return InMemoryStore(
+        max_sessions=config.get("agent.memory_store.max_sessions", 1000),
+        max_messages=max_messages,
+    )
+
+
+def get_memory_store() -> MemoryStore:
+    """获取全局记忆存储实例"""
+    global _memory_store
+    if _memory_store is None:
+        with _memory_store_lock:
+            if _memory_store is None:
+                _memory_store = create_memory_store()
+    return _memory_store
@@ -0,0 +1,261 @@
+"""并行执行的Agent执行器：主协调LLM在同一步中返回多个专门Agent调用时并发执行，而不是逐个执行"""
+import asyncio
+import contextvars
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple, Union
+
+from langchain.agents import AgentExecutor
+from langchain.agents.agent import ExceptionTool, InvalidTool
+from langchain_core.agents import AgentAction, AgentFinish, AgentStep
+from langchain_core.callbacks import AsyncCallbackManagerForChainRun, CallbackManagerForChainRun
+from langchain_core.exceptions import OutputParserException
+from langchain_core.tools import BaseTool
+
+from src.config import config
+
+
+# 执行专门Agent调用的线程池（有界，所有会话共享）
+_dispatch_executor = ThreadPoolExecutor(
+    max_workers=config.get("agent.parallel_tools.max_workers", 4),
+    thread_name_prefix="agent-dispatch"
+)
+
+_stats_lock = threading.Lock()
+_stats = {"parallel_steps": 0, "parallel_calls": 0, "duplicate_calls": 0}
+
+
+def _count(name: str, value: int = 1):
+    with _stats_lock:
+        _stats[name] += value
+
+
+def parallel_executor_stats() -> Dict[str, int]:
+    """获取并行执行统计（并行执行的步数、并行执行的调用数、跳过的重复调用数）"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _call_key(action: AgentAction) -> str:
+    """工具调用的去重键（工具名 + 规范化的输入）"""
+    tool_input = action.tool_input
+    if isinstance(tool_input, str):
+        tool_input = tool_input.strip()
+    return json.dumps([action.tool, tool_input], ensure_ascii=False, sort_keys=True, default=str)
+
+
+class ParallelAgentExecutor(AgentExecutor):
+    """
+    同一步中互不依赖的专门Agent调用（query_*）并发执行的 AgentExecutor
+    
+    - 观察结果按LLM返回工具调用的顺序写入 intermediate_steps
+    - sequential_tools 中的工具（如依赖其他查询结果的规划Agent）在并发调用全部完成后再执行
+    - 同一个专门Agent在同一步中的多次调用在同一个线程中依次执行；
+      与本轮已执行过的调用完全相同（工具和输入都相同）的调用不再执行，直接复用之前的结果
+    """
+    
+    parallel_prefix: str = "query_"
+    """可以并发执行的工具名前缀"""
+    sequential_tools: List[str] = ["query_planning_agent"]
+    """需要在其他调用完成后执行的工具"""
+    
+    def _parsing_error_action(self, e: OutputParserException) -> AgentAction:
+        """按 handle_parsing_errors 把输出解析错误转换为发送给LLM的观察结果（与 AgentExecutor 一致）"""
+        if isinstance(self.handle_parsing_errors, bool):
+            if not self.handle_parsing_errors:
+                raise ValueError(
+                    "An output parsing error occurred. "
+                    "In order to pass this error back to the agent and have it try "
+                    "again, pass `handle_parsing_errors=True` to the AgentExecutor. "
+                    f"This is the error: {str(e)}"
+                )
+            if e.send_to_llm:
+                return AgentAction("_Exception", str(e.observation), str(e.llm_output))
+            return AgentAction("_Exception", "Invalid or incomplete response", str(e))
+        if isinstance(self.handle_parsing_errors, str):
+            return AgentAction("_Exception", self.handle_parsing_errors, str(e))
+        if callable(self.handle_parsing_errors):
+            return AgentAction("_Exception", self.handle_parsing_errors(e), str(e))
+        raise ValueError("Got unexpected type of `handle_parsing_errors`")
+    
+    def _schedule(self, actions: List[AgentAction], intermediate_steps: List[Tuple[AgentAction, str]],
+                  name_to_tool_map: Dict[str, BaseTool]) -> Tuple[Dict[int, Any], List[List[int]], List[int]]:
+        """
+        安排一步中的工具调用
+        
+        Returns:
+            (重复调用: {序号: 之前的观察结果或同一步中相同调用的序号},
+             并发执行的分组: 每组为同一个工具的调用序号,
+             并发调用完成后依次执行的调用序号)
+        """
+        previous = {_call_key(action): observation for action, observation in intermediate_steps}
+        duplicates, seen, groups, sequential = {}, {}, {}, []
+        for index, action in enumerate(actions):
+            key = _call_key(action)
+            if key in previous:
+                duplicates[index] = ("observation", previous[key])
+            elif key in seen:
+                duplicates[index] = ("index", seen[key])
+            else:
+                seen[key] = index
+                if (action.tool in name_to_tool_map and action.tool.startswith(self.parallel_prefix)
+                        and action.tool not in self.sequential_tools):
+                    groups.setdefault(action.tool, []).append(index)
+                else:
+                    sequential.append(index)
+        if duplicates:
+            _count("duplicate_calls", len(duplicates))
+        parallel = list(groups.values())
+        if len(parallel) < 2:
+            # 只有一个专门Agent时没有可并发的调用
+            sequential = sorted(sequential + [index for group in parallel for index in group])
+            parallel = []
+        else:
+            _count("parallel_steps")
+            _count("parallel_calls", sum(len(group) for group in parallel))
+        return duplicates, parallel, sequential
+    
+    @staticmethod
+    def _resolve_duplicates(actions: List[AgentAction], duplicates: Dict[int, Any],
+                            observations: Dict[int, Any]) -> List[AgentStep]:
+        """按原顺序组装每个调用的观察结果"""
+        for index, (kind, value) in duplicates.items():
+            observations[index] = observations[value] if kind == "index" else value
+        return [AgentStep(action=action, observation=observations[index]) for index, action in enumerate(actions)]
+    
+    def _run_action(self, action: AgentAction, name_to_tool_map: Dict[str, BaseTool], color_mapping: Dict[str, str],
+                    run_manager: Optional[CallbackManagerForChainRun]) -> Any:
+        """执行一个工具调用并返回观察结果（与 AgentExecutor 逐个执行时相同）"""
+        if run_manager:
+            run_manager.on_agent_action(action, color="green")
+        tool_run_kwargs = self.agent.tool_run_logging_kwargs()
+        callbacks = run_manager.get_child() if run_manager else None
+        if action.tool not in name_to_tool_map:
+            return InvalidTool().run(
+                {"requested_tool_name": action.tool, "available_tool_names": list(name_to_tool_map.keys())},
+                verbose=self.verbose, color=None, callbacks=callbacks, **tool_run_kwargs,
+            )
+        tool = name_to_tool_map[action.tool]
+        if tool.return_direct:
+            tool_run_kwargs["llm_prefix"] = ""
+        return tool.run(action.tool_input, verbose=self.verbose, color=color_mapping[action.tool],
+                        callbacks=callbacks, **tool_run_kwargs)
+    
+    async def _arun_action(self, action: AgentAction, name_to_tool_map: Dict[str, BaseTool],
+                           color_mapping: Dict[str, str],
+                           run_manager: Optional[AsyncCallbackManagerForChainRun]) -> Any:
+        """_run_action() 的异步版本"""
+        if run_manager:
+            await run_manager.on_agent_action(action, verbose=self.verbose, color="green")
+        tool_run_kwargs = self.agent.tool_run_logging_kwargs()
+        callbacks = run_manager.get_child() if run_manager else None
+        if action.tool not in name_to_tool_map:
+            return await InvalidTool().arun(
+                {"requested_tool_name": action.tool, "available_tool_names": list(name_to_tool_map.keys())},
+                verbose=self.verbose, color=None, callbacks=callbacks, **tool_run_kwargs,
+            )
+        tool = name_to_tool_map[action.tool]
+        if tool.return_direct:
+            tool_run_kwargs["llm_prefix"] = ""
+        return await tool.arun(action.tool_input, verbose=self.verbose, color=color_mapping[action.tool],
+                               callbacks=callbacks, **tool_run_kwargs)
+    
+    def _iter_next_step(
+        self,
+        name_to_tool_map: Dict[str, BaseTool],
+        color_mapping: Dict[str, str],
+        inputs: Dict[str, str],
+        intermediate_steps: List[Tuple[AgentAction, str]],
+        run_manager: Optional[CallbackManagerForChainRun] = None,
+    ) -> Iterator[Union[AgentFinish, AgentAction, AgentStep]]:
+        try:
+            output = self.agent.plan(
+                self._prepare_intermediate_steps(intermediate_steps),
+                callbacks=run_manager.get_child() if run_manager else None,
+                **inputs,
+            )
+        except OutputParserException as e:
+            action = self._parsing_error_action(e)
+            if run_manager:
+                run_manager.on_agent_action(action, color="green")
+            observation = ExceptionTool().run(
+                action.tool_input, verbose=self.verbose, color=None,
+                callbacks=run_manager.get_child() if run_manager else None,
+                **self.agent.tool_run_logging_kwargs(),
+            )
+            yield AgentStep(action=action, observation=observation)
+            return
+        
+        if isinstance(output, AgentFinish):
+            yield output
+            return
+        
+        actions = [output] if isinstance(output, AgentAction) else list(output)
+        for action in actions:
+            yield action
+        
+        duplicates, parallel, sequential = self._schedule(actions, intermediate_steps, name_to_tool_map)
+        observations = {}
+        
+        def run_group(group: List[int]) -> Dict[int, Any]:
+            return {
+                index: self._run_action(actions[index], name_to_tool_map, color_mapping, run_manager)
+                for index in group
+            }
+        
+        # 复制上下文到线程池（token转发、工具结果记忆等依赖上下文变量），每个任务使用独立的副本
+        futures = [_dispatch_executor.submit(contextvars.copy_context().run, run_group, group) for group in parallel]
+        for future in futures:
+            observations.update(future.result())
+        for index in sequential:
+            observations[index] = self._run_action(actions[index], name_to_tool_map, color_mapping, run_manager)
+        
+        yield from self._resolve_duplicates(actions, duplicates, observations)
+    
+    async def _aiter_next_step(
+        self,
+        name_to_tool_map: Dict[str, BaseTool],
+        color_mapping: Dict[str, str],
+        inputs: Dict[str, str],
+        intermediate_steps: List[Tuple[AgentAction, str]],
+        run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
+    ) -> AsyncIterator[Union[AgentFinish, AgentAction, AgentStep]]:
+        try:
+            output = await self.agent.aplan(
+                self._prepare_intermediate_steps(intermediate_steps),
+                callbacks=run_manager.get_child() if run_manager else None,
+                **inputs,
+            )
+        except OutputParserException as e:
+            action = self._parsing_error_action(e)
+            observation = await ExceptionTool().arun(
+                action.tool_input, verbose=self.verbose, color=None,
+                callbacks=run_manager.get_child() if run_manager else None,
+                **self.agent.tool_run_logging_kwargs(),
+            )
+            yield AgentStep(action=action, observation=observation)
+            return
+        
+        if isinstance(output, AgentFinish):
+            yield output
+            return
+        
+        actions = [output] if isinstance(output, AgentAction) else list(output)
+        for action in actions:
+            yield action
+        
+        duplicates, parallel, sequential = self._schedule(actions, intermediate_steps, name_to_tool_map)
+        observations = {}
+        
+        async def run_group(group: List[int]):
+            for index in group:
+                observations[index] = await self._arun_action(
+                    actions[index], name_to_tool_map, color_mapping, run_manager
+                )
+        
+        await asyncio.gather(*[run_group(group) for group in parallel])
+        await run_group(sequential)
+        
+        for step in self._resolve_duplicates(actions, duplicates, observations):
+            yield step
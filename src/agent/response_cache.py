@@ -0,0 +1,405 @@
+"""回答缓存：相同（或语义相近）的旅行问题直接返回缓存的回答，跳过多Agent的LLM调用"""
+import hashlib
+import json
+import math
+import re
+import threading
+import zlib
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from src.agent.intent_router import (
+    CONTEXT_PATTERN,
+    HOTEL_PATTERN,
+    PLACE_PATTERN,
+    TRANSPORT_PATTERN,
+    WEATHER_PATTERN,
+    load_classifier,
+    resolve_relative_date,
+)
+from src.config import config
+from src.utils.ttl_cache import TTLCache
+
+
+ATTRACTION_PATTERN = re.compile(r"景点|门票|好玩|博物馆|公园|古镇|游览|打卡")
+PLAN_PATTERN = re.compile(r"行程|攻略|规划|\d+\s*天(?!后)|预算")
+
+# 决定回答内容的槽位词，必须完全一致才允许相似匹配（字符 n-gram 向量无法区分只差一个景点名或档次的问题）
+POI_PATTERN = re.compile(r"[\u4e00-\u9fa5]{1,4}?(?:古城|古镇|广场|景区|海滩|公园|博物馆|[湖山寺宫园坛塔楼街岛湾峡谷洞桥庙馆])")
+HOTEL_TIER_PATTERN = re.compile(r"经济型?|快捷|舒适型?|高档|豪华型?|奢华|[二三四五]星|星级|民宿|青旅|青年旅舍|公寓|度假村|亲子|商务")
+TRANSPORT_MODE_PATTERN = re.compile(r"高铁|动车|飞机|航班|火车|自驾|开车|大巴|客车|地铁|公交|打车|骑行|步行|轮渡")
+# 意思相反的限定词（“最高温度”和“最低温度”、“贵”和“便宜”字面几乎相同但答案不同）
+QUALIFIER_PATTERN = re.compile(r"最高|最低|高温|低温|最贵|最便宜|便宜|实惠|划算|(?<!富)贵(?![州阳])|最快|最慢|最近|最远|最早|最晚|"
+                               r"最多|最少|冷(?!门)|热(?![门闹])")
+# 提取景点名之前去掉的疑问词和介词（避免“有哪些古镇”和“有什么古镇”被当作不同的景点名）
+_POI_STOPWORDS = re.compile(r"有什么|有哪些|什么|哪些|哪个|哪里|附近|周边|想去|去|到|在|和|与|及|是")
+
+# 按数据变化快慢划分的类别（问题命中多个类别时取最短的TTL）
+CATEGORY_PATTERNS = (
+    ("weather", WEATHER_PATTERN),
+    ("hotel", HOTEL_PATTERN),
+    ("transport", TRANSPORT_PATTERN),
+    ("attraction", ATTRACTION_PATTERN),
+    ("plan", PLAN_PATTERN),
+)
+
+# 各类别的默认TTL（秒）：天气变化快，景点信息变化慢
+DEFAULT_TTLS = {
+    "weather": 1800,
+    "hotel": 21600,
+    "transport": 86400,
+    "attraction": 604800,
+    "plan": 3600,
+    "general": 3600,
+}
+
+# 专门Agent的回答固定属于对应类别
+SCOPE_CATEGORIES = {
+    "WeatherAgent": "weather",
+    "HotelAgent": "hotel",
+    "TransportAgent": "transport",
+    "AttractionAgent": "attraction",
+    "PlanningAgent": "plan",
+    "RecommendationAgent": "attraction",
+}
+
+TRAVEL_INFO_FIELDS = ("destination", "departureCity", "departureDate", "returnDate", "budget",
+                      "travelStyle", "interests", "hotelPreference", "transportMode")
+
+# 各类别的回答依赖的旅行信息字段（只有这些字段参与缓存键，其他字段变化不影响命中）
+CATEGORY_FIELDS = {
+    "weather": ("destination", "departureDate", "returnDate"),
+    "hotel": ("destination", "departureDate", "returnDate", "hotelPreference", "budget"),
+    "transport": ("departureCity", "destination", "transportMode", "departureDate"),
+    "attraction": ("destination", "interests"),
+    "plan": TRAVEL_INFO_FIELDS,
+    "general": TRAVEL_INFO_FIELDS,
+}
+
+# 不影响问题含义的客套词和语气词
+_FILLER_PATTERN = re.compile(r"请问|麻烦|帮我|帮忙|告诉我|我想知道|想知道|一下|怎么样|怎样|如何|请|吗|呢|呀|啊|吧|的|了")
+_PUNCT_PATTERN = re.compile(r"[\W_]+")
+_NUMBER_PATTERN = re.compile(r"\d+")
+# 带量词的中文数字（“三天”、“两晚”、“一千元”），转换为阿拉伯数字后参与缓存键（不转换“三亚”、“九寨沟”等地名）
+_CN_NUMBER_PATTERN = re.compile(r"[零一二两三四五六七八九十百千万]+(?=天|日|晚|夜|人|位|个|小时|周|岁|间|张|次|公里|元|块)")
+_CN_DIGITS = {"零": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+_CN_UNITS = {"十": 10, "百": 100, "千": 1000, "万": 10000}
+
+EMBEDDING_DIM = 256
+
+
+def chinese_to_int(text: str) -> int:
+    """把中文数字（如“三”、“十五”、“两千五百”）转换为整数"""
+    total, section, digit = 0, 0, 0
+    for char in text:
+        if char in _CN_DIGITS:
+            digit = _CN_DIGITS[char]
+        elif char == "万":
+            total += (section + digit) * 10000
+            section, digit = 0, 0
+        else:
+            section += (digit or 1) * _CN_UNITS[char]
+            digit = 0
+    return total + section + digit
+
+
+def normalize_question(text: str, today: Optional[datetime] = None) -> str:
+    """
+    规范化问题文本：相对日期替换为具体日期，带量词的中文数字替换为阿拉伯数字，去掉客套词、语气词、标点和空白，统一大小写
+    
+    Args:
+        text: 问题
+        today: 当前日期（默认今天，用于解析相对日期）
+    """
+    text = (text or "").lower()
+    resolved = resolve_relative_date(text, today)
+    if resolved:
+        text = text.replace(resolved[0], resolved[1])
+    text = _CN_NUMBER_PATTERN.sub(lambda m: str(chinese_to_int(m.group())), text)
+    text = _FILLER_PATTERN.sub("", text)
+    return _PUNCT_PATTERN.sub("", text)
+
+
+def classify_categories(text: str, scope: str = "chat") -> Tuple[str, ...]:
+    """
+    判断问题涉及的数据类别（决定TTL和参与缓存键的旅行信息字段）
+    
+    Args:
+        text: 问题
+        scope: 缓存范围（chat 或专门Agent类名）
+    """
+    categories = {name for name, pattern in CATEGORY_PATTERNS if pattern.search(text)}
+    if scope in SCOPE_CATEGORIES:
+        categories.add(SCOPE_CATEGORIES[scope])
+    return tuple(sorted(categories)) or ("general",)
+
+
+def hashing_embedding(text: str, dim: int = EMBEDDING_DIM) -> List[float]:
+    """
+    本地字符 n-gram 哈希向量（不依赖模型，离线可用）：单字和相邻两字哈希到 dim 维后归一化
+    
+    Args:
+        text: 规范化后的问题
+        dim: 向量维数
+    """
+    vector = [0.0] * dim
+    grams = list(text) + [text[i:i + 2] for i in range(len(text) - 1)]
+    for gram in grams:
+        vector[zlib.crc32(gram.encode("utf-8")) % dim] += 1.0
+    norm = math.sqrt(sum(v * v for v in vector))
+    return [v / norm for v in vector] if norm else vector
+
+
+def _cosine(a: Sequence[float], b: Sequence[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class CacheKey:
+    """一个问题的缓存键（resolve() 的结果）"""
+    
+    def __init__(self, scope: str, normalized: str, categories: Tuple[str, ...], fields: Dict[str, str]):
+        self.scope = scope
+        self.normalized = normalized
+        self.categories = categories
+        # 地点、景点、酒店档次、交通方式、限定词、日期和数字必须完全一致才允许相似匹配
+        # （“北京天气”和“上海天气”、“北京故宫门票”和“北京天坛门票”字面相似但答案不同）
+        without_places = PLACE_PATTERN.sub("", normalized)
+        entities = {
+            "places": sorted(set(PLACE_PATTERN.findall(normalized))),
+            "pois": sorted(set(POI_PATTERN.findall(_POI_STOPWORDS.sub("", without_places)))),
+            "slots": sorted(set(HOTEL_TIER_PATTERN.findall(normalized) + TRANSPORT_MODE_PATTERN.findall(normalized))),
+            "qualifiers": sorted(set(QUALIFIER_PATTERN.findall(without_places))),
+            "numbers": _NUMBER_PATTERN.findall(normalized),
+        }
+        self.partition = self._digest(scope, categories, entities, fields)
+        self.key = self._digest(scope, normalized, fields)
+        self.vector: Optional[List[float]] = None
+    
+    @staticmethod
+    def _digest(*parts) -> str:
+        return hashlib.sha1(json.dumps(parts, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+    
+    def __repr__(self) -> str:
+        return f"CacheKey(scope={self.scope!r}, normalized={self.normalized!r}, categories={self.categories!r})"
+
+
+class ResponseCache:
+    """
+    旅行问题回答缓存
+    
+    - 缓存键：规范化后的问题 + 问题类别相关的旅行信息字段，按范围（主协调Agent或某个专门Agent）隔离
+    - TTL按数据类别区分（天气短、景点长），问题涉及多个类别时取最短的TTL
+    - 精确未命中时可在本地向量索引中查找相似问题（地点、景点、酒店档次、交通方式、限定词、日期、数字和旅行信息必须一致）
+    - 依赖对话上下文的追问（如“那里呢”）和错误回答不缓存
+    """
+    
+    def __init__(self, max_size: int = 1024, ttls: Optional[Dict[str, float]] = None, semantic: bool = True,
+                 similarity_threshold: float = 0.85, embedder: Optional[Callable[[str], Sequence[float]]] = None):
+        """
+        Args:
+            max_size: 最多缓存的回答数，超出后按LRU淘汰
+            ttls: 各类别的TTL（秒），未设置的类别使用 DEFAULT_TTLS
+            semantic: 是否启用相似问题查找
+            similarity_threshold: 相似问题的最低余弦相似度
+            embedder: 文本向量函数，默认使用本地字符 n-gram 哈希向量
+        """
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.semantic = semantic
+        self.similarity_threshold = similarity_threshold
+        self.embedder = embedder or hashing_embedding
+        self._cache = TTLCache(max_size=max_size, ttl=self.ttls["general"], name="responses")
+        self._lock = threading.Lock()
+        # 向量索引：partition -> [(向量, 缓存键)]
+        self._index: Dict[str, List[Tuple[Sequence[float], str]]] = {}
+        # 缓存键 -> (范围, 类别, partition)，用于按范围或类别失效
+        self._meta: Dict[str, Tuple[str, Tuple[str, ...], str]] = {}
+        self._stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "skipped": 0, "stores": 0, "invalidated": 0}
+    
+    def resolve(self, question: str, travel_info: Optional[dict] = None, scope: str = "chat",
+                today: Optional[datetime] = None) -> Optional[CacheKey]:
+        """
+        生成问题的缓存键，不适合缓存（空问题、依赖对话上下文）时返回None
+        
+        Args:
+            question: 用户问题（不含附加的旅行信息上下文）
+            travel_info: 旅行信息
+            scope: 缓存范围，chat（主协调Agent）或专门Agent类名
+            today: 当前日期（默认今天）
+        """
+        if not question or not question.strip() or CONTEXT_PATTERN.search(question):
+            with self._lock:
+                self._stats["skipped"] += 1
+            return None
+        normalized = normalize_question(question, today)
+        if not normalized:
+            return None
+        categories = classify_categories(question, scope)
+        travel_info = travel_info or {}
+        field_names = sorted({name for category in categories for name in CATEGORY_FIELDS[category]})
+        fields = {name: str(travel_info[name]) for name in field_names if travel_info.get(name) not in (None, "")}
+        return CacheKey(scope, normalized, categories, fields)
+    
+    def ttl_for(self, key: CacheKey) -> float:
+        """获取缓存键对应的TTL（取各类别中最短的）"""
+        return min(self.ttls.get(category, self.ttls["general"]) for category in key.categories)
+    
+    def _vector(self, key: CacheKey) -> Sequence[float]:
+        if key.vector is None:
+            # 数字（日期、天数、预算）已在分区中精确匹配，不参与相似度计算
+            key.vector = list(self.embedder(_NUMBER_PATTERN.sub("", key.normalized)))
+        return key.vector
+    
+    def get(self, key: Optional[CacheKey]) -> Optional[str]:
+        """
+        查找缓存的回答：先精确匹配，未命中时在同一分区内查找最相似的问题
+        
+        Args:
+            key: resolve() 的结果
+        """
+        if key is None:
+            return None
+        answer = self._cache.get(key.key)
+        if answer is not None:
+            with self._lock:
+                self._stats["exact_hits"] += 1
+            return answer
+        
+        if self.semantic:
+            answer = self._get_similar(key)
+            if answer is not None:
+                with self._lock:
+                    self._stats["semantic_hits"] += 1
+                return answer
+        
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+    
+    def _get_similar(self, key: CacheKey) -> Optional[str]:
+        with self._lock:
+            candidates = list(self._index.get(key.partition, ()))
+        if not candidates:
+            return None
+        vector = self._vector(key)
+        best_score, best_key = 0.0, None
+        for candidate_vector, candidate_key in candidates:
+            score = _cosine(vector, candidate_vector)
+            if score >= self.similarity_threshold and score > best_score:
+                best_score, best_key = score, candidate_key
+        if best_key is None:
+            return None
+        answer = self._cache.get(best_key)
+        if answer is None:
+            # 已过期或被淘汰
+            self._forget(best_key)
+        return answer
+    
+    def set(self, key: Optional[CacheKey], answer: str) -> bool:
+        """
+        缓存回答（空回答和错误回答不缓存）
+        
+        Args:
+            key: resolve() 的结果
+            answer: 回答
+        
+        Returns:
+            是否已缓存
+        """
+        if key is None or not answer or answer.lstrip().startswith("❌"):
+            return False
+        self._cache.set(key.key, answer, ttl=self.ttl_for(key))
+        vector = self._vector(key) if self.semantic else None
+        with self._lock:
+            self._stats["stores"] += 1
+            if key.key not in self._meta and vector is not None:
+                self._index.setdefault(key.partition, []).append((vector, key.key))
+            self._meta[key.key] = (key.scope, key.categories, key.partition)
+            stale = len(self._meta) > 2 * self._cache.max_size
+        if stale:
+            self._prune()
+        return True
+    
+    def _forget(self, cache_key: str):
+        """从索引中移除缓存键"""
+        with self._lock:
+            meta = self._meta.pop(cache_key, None)
+            if meta is None:
+                return
+            entries = [entry for entry in self._index.get(meta[2], []) if entry[1] != cache_key]
+            if entries:
+                self._index[meta[2]] = entries
+            else:
+                self._index.pop(meta[2], None)
+    
+    def _prune(self):
+        """清理已过期或被LRU淘汰的索引条目"""
+        with self._lock:
+            keys = list(self._meta)
+        for cache_key in keys:
+            if cache_key not in self._cache:
+                self._forget(cache_key)
+    
+    def invalidate(self, scope: Optional[str] = None, category: Optional[str] = None) -> int:
+        """
+        使缓存的回答失效（例如数据源更新后）
+        
+        Args:
+            scope: 只清除该范围（chat 或专门Agent类名）的回答
+            category: 只清除涉及该类别（weather、hotel、transport、attraction、plan、general）的回答
+        
+        Returns:
+            清除的回答数
+        """
+        with self._lock:
+            keys = [cache_key for cache_key, (entry_scope, categories, _) in self._meta.items()
+                    if (scope is None or entry_scope == scope) and (category is None or category in categories)]
+        for cache_key in keys:
+            self._cache.delete(cache_key)
+            self._forget(cache_key)
+        with self._lock:
+            self._stats["invalidated"] += len(keys)
+        return len(keys)
+    
+    def clear(self):
+        """清空缓存"""
+        self._cache.clear()
+        with self._lock:
+            self._index.clear()
+            self._meta.clear()
+    
+    def stats(self) -> Dict:
+        """获取命中统计"""
+        with self._lock:
+            hits = self._stats["exact_hits"] + self._stats["semantic_hits"]
+            total = hits + self._stats["misses"]
+            return {
+                "size": len(self._cache),
+                "max_size": self._cache.max_size,
+                **self._stats,
+                "hit_rate": round(hits / total, 4) if total else 0.0,
+                "semantic": self.semantic,
+            }
+
+
+_response_cache: Optional[ResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """获取全局回答缓存（agent.response_cache.enabled 为 false 时返回None）"""
+    global _response_cache
+    if not config.get("agent.response_cache.enabled", True):
+        return None
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = ResponseCache(
+                    max_size=config.get("agent.response_cache.max_size", 1024),
+                    ttls=config.get("agent.response_cache.ttl", None),
+                    semantic=config.get("agent.response_cache.semantic", True),
+                    similarity_threshold=config.get("agent.response_cache.similarity_threshold", 0.85),
+                    embedder=load_classifier(config.get("agent.response_cache.embedder", "")),
+                )
+    return _response_cache
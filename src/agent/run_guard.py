@@ -0,0 +1,328 @@
+"""
+请求级并发控制：同一会话的Agent运行依次执行（TravelAgent的旅行信息和对话记忆不是线程安全的），
+所有会话同时执行的运行数有上限，排队过多或等待超时的请求直接拒绝（Web接口返回429）
+
+同步线程（Flask）和异步任务（ASGI）共用同一套名额，释放名额时按先来后到直接交给最早的等待方。
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from src.config import config
+
+
+class RunRejected(Exception):
+    """请求被拒绝（会话排队已满、等待超时或系统繁忙）"""
+    
+    def __init__(self, reason: str, message: str, retry_after: int):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    """一个等待名额的同步线程或异步任务"""
+    
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.loop = loop
+        self.event = asyncio.Event() if loop else threading.Event()
+    
+    def grant(self) -> bool:
+        """通知等待方已获得名额（等待方的事件循环已关闭时返回False）"""
+        if self.loop is None:
+            self.event.set()
+            return True
+        try:
+            self.loop.call_soon_threadsafe(self.event.set)
+            return True
+        except RuntimeError:
+            return False
+
+
+class _Slots:
+    """先来先得的计数信号量（所有方法由调用方持有 RunGuard 的锁）"""
+    
+    def __init__(self, limit: int):
+        self.limit = max(1, int(limit))
+        self.active = 0
+        self.waiters: Deque[_Waiter] = deque()
+    
+    def try_enter(self) -> bool:
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            return True
+        return False
+    
+    def release(self):
+        """释放一个名额，有等待方时直接交给最早的等待方"""
+        while self.waiters:
+            if self.waiters.popleft().grant():
+                return
+        self.active -= 1
+    
+    def cancel(self, waiter: _Waiter) -> bool:
+        """放弃等待（返回False表示等待方已经获得名额，调用方需要释放）"""
+        try:
+            self.waiters.remove(waiter)
+            return True
+        except ValueError:
+            return False
+    
+    @property
+    def idle(self) -> bool:
+        return self.active == 0 and not self.waiters
+
+
+class RunTicket:
+    """一次Agent运行获得的执行名额，运行结束后调用 release()（或作为上下文管理器使用）"""
+    
+    def __init__(self, guard: "RunGuard", key: str, wait_time: float):
+        self.guard = guard
+        self.key = key
+        self.wait_time = wait_time
+        self._released = False
+    
+    def release(self):
+        """释放会话和全局的执行名额（可重复调用）"""
+        if not self._released:
+            self._released = True
+            self.guard._release(self.key)
+    
+    def __enter__(self) -> "RunTicket":
+        return self
+    
+    def __exit__(self, *exc):
+        self.release()
+
+
+class RunGuard:
+    """
+    Agent运行的并发控制
+    
+    - 同一会话（用户ID或会话ID）同时只有一个运行，其余请求排队，排队数超过 max_queue_per_agent 或
+      等待超过 agent_wait_timeout 时拒绝
+    - 所有会话同时执行的运行数不超过 max_concurrent_runs，等待执行名额的请求超过 max_queued_runs 或
+      等待超过 queue_timeout 时拒绝（先取得会话名额再等待全局名额，排队等待同一会话的请求不占用全局名额）
+    """
+    
+    def __init__(self, max_concurrent_runs: int = 16, max_queued_runs: int = 32, queue_timeout: float = 10,
+                 max_queue_per_agent: int = 2, agent_wait_timeout: float = 120, retry_after: int = 2):
+        """
+        Args:
+            max_concurrent_runs: 同时执行的运行数上限
+            max_queued_runs: 等待全局执行名额的请求数上限
+            queue_timeout: 等待全局执行名额的最长时间（秒）
+            max_queue_per_agent: 同一会话排队等待的请求数上限（不含正在执行的请求）
+            agent_wait_timeout: 等待同一会话上一个运行完成的最长时间（秒）
+            retry_after: 拒绝时建议客户端重试的间隔（秒）
+        """
+        self.max_queued_runs = max(0, int(max_queued_runs))
+        self.queue_timeout = queue_timeout
+        self.max_queue_per_agent = max(0, int(max_queue_per_agent))
+        self.agent_wait_timeout = agent_wait_timeout
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._global = _Slots(max_concurrent_runs)
+        self._agents: Dict[str, _Slots] = {}
+        self._stats = {
+            "admitted": 0,
+            "rejected_agent_queue": 0,
+            "rejected_agent_timeout": 0,
+            "rejected_overloaded": 0,
+            "queued_agent": 0,
+            "queued_global": 0,
+            "agent_wait_total": 0.0,
+            "agent_wait_max": 0.0,
+            "global_wait_total": 0.0,
+            "global_wait_max": 0.0,
+        }
+    
+    def _reject(self, reason: str) -> RunRejected:
+        """记录并构造拒绝异常（调用方需持有锁）"""
+        self._stats[f"rejected_{reason}"] += 1
+        if reason == "overloaded":
+            message = "当前请求较多，请稍后重试"
+        else:
+            message = "您的上一个请求仍在处理中，请稍后重试"
+        return RunRejected(reason, message, self.retry_after)
+    
+    def _enter_agent(self, key: str, waiter: _Waiter) -> bool:
+        """取得会话名额或排队（返回是否立即取得），排队已满时抛出 RunRejected"""
+        with self._lock:
+            slots = self._agents.setdefault(key, _Slots(1))
+            if slots.try_enter():
+                return True
+            if len(slots.waiters) >= self.max_queue_per_agent:
+                raise self._reject("agent_queue")
+            slots.waiters.append(waiter)
+            self._stats["queued_agent"] += 1
+            return False
+    
+    def _enter_global(self, key: str, waiter: _Waiter) -> bool:
+        """取得全局名额或排队（返回是否立即取得），排队已满时释放会话名额并抛出 RunRejected"""
+        with self._lock:
+            if self._global.try_enter():
+                return True
+            if len(self._global.waiters) >= self.max_queued_runs:
+                self._release_agent(key)
+                raise self._reject("overloaded")
+            self._global.waiters.append(waiter)
+            self._stats["queued_global"] += 1
+            return False
+    
+    def _abandon(self, slots_key: Optional[str], waiter: _Waiter, release_agent_key: Optional[str] = None) -> bool:
+        """
+        放弃等待（超时或请求被取消）：仍在排队时移出队列并释放 release_agent_key 已取得的会话名额，返回True；
+        已经获得名额（与超时同时发生）时返回False
+        
+        Args:
+            slots_key: 会话键（等待会话名额时）或None（等待全局名额时）
+        """
+        with self._lock:
+            slots = self._global if slots_key is None else self._agents[slots_key]
+            if not slots.cancel(waiter):
+                return False
+            if slots_key is not None and slots.idle:
+                del self._agents[slots_key]
+            if release_agent_key is not None:
+                self._release_agent(release_agent_key)
+            return True
+    
+    def _timed_out(self, reason: str) -> RunRejected:
+        with self._lock:
+            return self._reject(reason)
+    
+    def _record_wait(self, name: str, elapsed: float):
+        with self._lock:
+            self._stats[f"{name}_wait_total"] += elapsed
+            self._stats[f"{name}_wait_max"] = max(self._stats[f"{name}_wait_max"], elapsed)
+    
+    def acquire(self, key: str) -> RunTicket:
+        """
+        等待会话和全局的执行名额（阻塞当前线程）
+        
+        Args:
+            key: 会话键（用户ID或会话ID）
+        
+        Raises:
+            RunRejected: 排队已满或等待超时
+        """
+        started = time.perf_counter()
+        waiter = _Waiter()
+        if not self._enter_agent(key, waiter) and not waiter.event.wait(self.agent_wait_timeout):
+            if self._abandon(key, waiter):
+                raise self._timed_out("agent_timeout")
+        agent_waited = time.perf_counter()
+        self._record_wait("agent", agent_waited - started)
+        
+        waiter = _Waiter()
+        if not self._enter_global(key, waiter) and not waiter.event.wait(self.queue_timeout):
+            if self._abandon(None, waiter, release_agent_key=key):
+                raise self._timed_out("overloaded")
+        return self._admit(key, started, agent_waited)
+    
+    async def aacquire(self, key: str) -> RunTicket:
+        """acquire() 的异步版本（等待时不阻塞事件循环）"""
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        waiter = _Waiter(loop)
+        if not self._enter_agent(key, waiter):
+            await self._await_grant(waiter, self.agent_wait_timeout, key, "agent_timeout")
+        agent_waited = time.perf_counter()
+        self._record_wait("agent", agent_waited - started)
+        
+        waiter = _Waiter(loop)
+        if not self._enter_global(key, waiter):
+            await self._await_grant(waiter, self.queue_timeout, None, "overloaded", release_agent_key=key)
+        return self._admit(key, started, agent_waited)
+    
+    async def _await_grant(self, waiter: _Waiter, timeout: float, slots_key: Optional[str], reason: str,
+                           release_agent_key: Optional[str] = None):
+        """异步等待名额，超时时抛出 RunRejected；请求被取消（如客户端断开）时放弃排队，已经获得的名额归还"""
+        try:
+            await asyncio.wait_for(waiter.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            if self._abandon(slots_key, waiter, release_agent_key):
+                raise self._timed_out(reason)
+        except asyncio.CancelledError:
+            if not self._abandon(slots_key, waiter, release_agent_key):
+                if slots_key is None:
+                    self._release(release_agent_key)
+                else:
+                    self._release_agent_locked(slots_key)
+            raise
+    
+    def _admit(self, key: str, started: float, agent_waited: float) -> RunTicket:
+        now = time.perf_counter()
+        self._record_wait("global", now - agent_waited)
+        with self._lock:
+            self._stats["admitted"] += 1
+        return RunTicket(self, key, now - started)
+    
+    def _release_agent(self, key: str):
+        """释放会话名额（调用方需持有锁）"""
+        slots = self._agents.get(key)
+        if slots is None:
+            return
+        slots.release()
+        if slots.idle:
+            del self._agents[key]
+    
+    def _release_agent_locked(self, key: str):
+        with self._lock:
+            self._release_agent(key)
+    
+    def _release(self, key: str):
+        """运行结束：释放全局名额和会话名额"""
+        with self._lock:
+            self._global.release()
+            self._release_agent(key)
+    
+    def is_busy(self, key: str) -> bool:
+        """会话是否有执行中或排队的运行（Agent池不会回收这些会话的Agent）"""
+        with self._lock:
+            return key in self._agents
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取并发控制统计（执行中和排队的运行数、拒绝次数、排队等待时间）"""
+        with self._lock:
+            admitted = self._stats["admitted"]
+            return {
+                "max_concurrent_runs": self._global.limit,
+                "active_runs": self._global.active,
+                "queued_global": len(self._global.waiters),
+                "queued_agent": sum(len(slots.waiters) for slots in self._agents.values()),
+                "admitted": admitted,
+                "rejected_agent_queue": self._stats["rejected_agent_queue"],
+                "rejected_agent_timeout": self._stats["rejected_agent_timeout"],
+                "rejected_overloaded": self._stats["rejected_overloaded"],
+                "queued_agent_total": self._stats["queued_agent"],
+                "queued_global_total": self._stats["queued_global"],
+                "agent_wait_avg_ms": round(self._stats["agent_wait_total"] / admitted * 1000, 2) if admitted else 0.0,
+                "agent_wait_max_ms": round(self._stats["agent_wait_max"] * 1000, 2),
+                "global_wait_avg_ms": round(self._stats["global_wait_total"] / admitted * 1000, 2) if admitted else 0.0,
+                "global_wait_max_ms": round(self._stats["global_wait_max"] * 1000, 2),
+            }
+
+
+_run_guard: Optional[RunGuard] = None
+_run_guard_lock = threading.Lock()
+
+
+def get_run_guard() -> RunGuard:
+    """获取全局的Agent运行并发控制（agent.run_guard 配置）"""
+    global _run_guard
+    if _run_guard is None:
+        with _run_guard_lock:
+            if _run_guard is None:
+                _run_guard = RunGuard(
+                    max_concurrent_runs=config.get("agent.run_guard.max_concurrent_runs", 16),
+                    max_queued_runs=config.get("agent.run_guard.max_queued_runs", 32),
+                    queue_timeout=config.get("agent.run_guard.queue_timeout", 10),
+                    max_queue_per_agent=config.get("agent.run_guard.max_queue_per_agent", 2),
+                    agent_wait_timeout=config.get("agent.run_guard.agent_wait_timeout", 120),
+                    retry_after=config.get("agent.run_guard.retry_after", 2),
+                )
+    return _run_guard
@@ -1,11 +1,15 @@
 """专门的Agent类，每个Agent负责特定领域的服务"""
-from typing import Optional
-from langchain_openai import ChatOpenAI
-from langchain.agents import create_openai_tools_agent, AgentExecutor
-from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.memory import ConversationBufferMemory
+import threading
+from typing import Dict, Optional, Tuple, Type
+from langchain.agents import AgentExecutor
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from src.agent.llm_registry import get_shared_agent, get_shared_llm
+from src.agent.memory_store import MemoryStore, get_memory_store
+from src.agent.response_cache import CacheKey, get_response_cache
+from src.agent.streaming import current_token_callbacks
 from src.agent.tools import (
     get_weather_info,
+    get_weather_range,
     get_hotel_prices,
     get_transport_route,
     get_attraction_ticket_prices,
@@ -25,50 +29,117 @@ class BaseSpecializedAgent:
         self.logger = AgentLogger(verbose=self.verbose)
         self.llm = self._create_llm()
         self.agent_executor = None
+        # 回答缓存（按Agent类型隔离，相同或相近的查询直接返回缓存的回答）
+        self.response_cache = get_response_cache()
     
     def _create_llm(self):
-        """创建LLM实例"""
-        import os
-        
-        if not config.openai_api_key:
-            raise ValueError("OPENAI_API_KEY 未设置，请在 env 文件中配置API密钥")
-        
-        os.environ["OPENAI_API_KEY"] = config.openai_api_key
-        
-        llm_kwargs = {
-            "model": config.llm_model,
-            "temperature": config.get("llm.temperature", 0.7),
-            "openai_api_key": config.openai_api_key,
-            "timeout": 60,
-            "max_retries": 2,
-        }
+        """获取共享的LLM实例（配置相同的Agent共用一个客户端和连接池）"""
+        return get_shared_llm()
+    
+    def _build_executor(self, tools: list, system_prompt: str) -> AgentExecutor:
+        """
+        创建无状态的Agent执行器
         
-        if config.openai_api_base and "openai.com" not in config.openai_api_base:
-            os.environ["OPENAI_API_BASE"] = config.openai_api_base
-            llm_kwargs["openai_api_base"] = config.openai_api_base
+        提示词模板和Agent（LLM + 工具绑定）按类共享，只在第一次创建时构建；
+        执行器不持有记忆，会话历史在调用时从记忆存储读取，因此一个实例可以服务所有会话。
         
-        max_tokens = config.get("llm.max_tokens", 2000)
-        if max_tokens:
-            llm_kwargs["max_tokens"] = max_tokens
+        Args:
+            tools: Agent可用的工具
+            system_prompt: 系统提示词
+        """
+        agent = get_shared_agent(type(self).__name__, self.llm, tools, system_prompt)
         
-        return ChatOpenAI(**llm_kwargs)
+        return AgentExecutor(
+            agent=agent,
+            tools=tools,
+            verbose=False,  # 关闭LangChain的详细输出，使用我们自己的日志系统
+            max_iterations=5,
+            handle_parsing_errors=True
+        )
     
-    def query(self, user_input: str) -> str:
-        """执行查询"""
+    def _load_history(self, session_id: Optional[str],
+                      memory_store: Optional[MemoryStore]) -> Tuple[list, Optional[MemoryStore]]:
+        """读取会话在本Agent中的对话历史，返回 (历史消息, 记忆存储)"""
+        if not session_id:
+            return [], None
+        store = memory_store or get_memory_store()
+        return store.load(session_id, type(self).__name__), store
+    
+    def _prepare_inputs(self, user_input: str, session_id: Optional[str],
+                        memory_store: Optional[MemoryStore]) -> Tuple[dict, Optional[MemoryStore]]:
+        """组装执行器输入（包含会话历史），返回 (输入, 记忆存储)"""
         if not self.agent_executor:
             raise ValueError("Agent执行器未初始化")
         
-        try:
-            response = self.agent_executor.invoke({"input": user_input})
-            result = response.get("output", "抱歉，我无法处理您的请求。")
-            return result
-        except Exception as e:
-            # 只记录错误，不重复输出（错误会在调用结束时记录）
-            error_msg = str(e)
-            # 简化错误信息，避免过长
-            if len(error_msg) > 100:
-                error_msg = error_msg[:100] + "..."
-            raise Exception(error_msg)  # 重新抛出，让调用者处理
+        history, store = self._load_history(session_id, memory_store)
+        return {"input": user_input, "chat_history": history}, store
+    
+    def _save_turn(self, store: Optional[MemoryStore], session_id: Optional[str], user_input: str, result: str):
+        """把本轮对话写入会话历史"""
+        if store is not None:
+            store.append(session_id, type(self).__name__, [HumanMessage(content=user_input), AIMessage(content=result)])
+    
+    def _cached_result(self, user_input: str, history: list) -> Tuple[Optional[CacheKey], Optional[str]]:
+        """
+        查询回答缓存，返回 (缓存键, 缓存的回答)
+        
+        缓存在所有会话间共享，会话已有对话历史时不读写缓存（“那后天呢”、“便宜一点的呢”等追问的答案取决于该会话的历史）
+        """
+        if not self.response_cache or history:
+            return None, None
+        cache_key = self.response_cache.resolve(user_input, scope=type(self).__name__)
+        return cache_key, self.response_cache.get(cache_key)
+    
+    def _cache_result(self, cache_key: Optional[CacheKey], result: str):
+        if self.response_cache and cache_key is not None:
+            self.response_cache.set(cache_key, result)
+    
+    @staticmethod
+    def _shorten_error(e: Exception) -> Exception:
+        # 简化错误信息，避免过长
+        error_msg = str(e)
+        if len(error_msg) > 100:
+            error_msg = error_msg[:100] + "..."
+        return Exception(error_msg)
+    
+    def query(self, user_input: str, session_id: Optional[str] = None,
+              memory_store: Optional[MemoryStore] = None) -> str:
+        """
+        执行查询
+        
+        Args:
+            user_input: 查询内容
+            session_id: 会话ID，提供时读取并更新该会话在本Agent中的对话历史
+            memory_store: 记忆存储，默认使用全局存储（agent.memory_store 配置）
+        """
+        inputs, store = self._prepare_inputs(user_input, session_id, memory_store)
+        cache_key, result = self._cached_result(user_input, inputs["chat_history"])
+        if result is None:
+            try:
+                # 调用方启用了token转发时（见 src/agent/streaming.py），把本Agent的LLM输出实时转发出去
+                response = self.agent_executor.invoke(inputs, config={"callbacks": current_token_callbacks()})
+                result = response.get("output", "抱歉，我无法处理您的请求。")
+            except Exception as e:
+                # 只记录错误，不重复输出（错误会在调用结束时记录）
+                raise self._shorten_error(e)  # 重新抛出，让调用者处理
+            self._cache_result(cache_key, result)
+        self._save_turn(store, session_id, user_input, result)
+        return result
+    
+    async def aquery(self, user_input: str, session_id: Optional[str] = None,
+                     memory_store: Optional[MemoryStore] = None) -> str:
+        """异步执行查询（工具绑定了异步实现时直接在事件循环中调用，不占用线程）"""
+        inputs, store = self._prepare_inputs(user_input, session_id, memory_store)
+        cache_key, result = self._cached_result(user_input, inputs["chat_history"])
+        if result is None:
+            try:
+                response = await self.agent_executor.ainvoke(inputs, config={"callbacks": current_token_callbacks()})
+                result = response.get("output", "抱歉，我无法处理您的请求。")
+            except Exception as e:
+                raise self._shorten_error(e)  # 重新抛出，让调用者处理
+            self._cache_result(cache_key, result)
+        self._save_turn(store, session_id, user_input, result)
+        return result
 
 
 class WeatherAgent(BaseSpecializedAgent):
@@ -84,6 +155,7 @@ class WeatherAgent(BaseSpecializedAgent):
 
 你的职责：
 1. 使用 get_weather_info 工具查询指定城市在指定日期的天气信息
+   - 查询多天（如整个行程期间）的天气时，使用 get_weather_range 工具一次查询整个日期范围
 2. 根据天气情况提供旅行建议（如雨天推荐室内活动，晴天推荐户外活动）
 3. 提供详细的天气信息，包括温度、天气状况、风向、风力等
 
@@ -101,32 +173,7 @@ class WeatherAgent(BaseSpecializedAgent):
 
 回答要专业、准确、详细。"""
         
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", system_prompt),
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("human", "{input}"),
-            MessagesPlaceholder(variable_name="agent_scratchpad"),
-        ])
-        
-        agent = create_openai_tools_agent(
-            llm=self.llm,
-            tools=[get_weather_info],
-            prompt=prompt
-        )
-        
-        memory = ConversationBufferMemory(
-            memory_key="chat_history",
-            return_messages=True
-        )
-        
-        return AgentExecutor(
-            agent=agent,
-            tools=[get_weather_info],
-            memory=memory,
-            verbose=False,  # 关闭LangChain的详细输出，使用我们自己的日志系统
-            max_iterations=5,
-            handle_parsing_errors=True
-        )
+        return self._build_executor([get_weather_info, get_weather_range], system_prompt)
 
 
 class TransportAgent(BaseSpecializedAgent):
@@ -169,32 +216,7 @@ class TransportAgent(BaseSpecializedAgent):
 
 必须使用 get_transport_route 工具查询路线，不要猜测或估算。回答要专业、准确、简洁，直接回答用户的问题，不要添加任何额外信息。"""
         
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", system_prompt),
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("human", "{input}"),
-            MessagesPlaceholder(variable_name="agent_scratchpad"),
-        ])
-        
-        agent = create_openai_tools_agent(
-            llm=self.llm,
-            tools=[get_transport_route],
-            prompt=prompt
-        )
-        
-        memory = ConversationBufferMemory(
-            memory_key="chat_history",
-            return_messages=True
-        )
-        
-        return AgentExecutor(
-            agent=agent,
-            tools=[get_transport_route],
-            memory=memory,
-            verbose=False,  # 关闭LangChain的详细输出，使用我们自己的日志系统
-            max_iterations=5,
-            handle_parsing_errors=True
-        )
+        return self._build_executor([get_transport_route], system_prompt)
 
 
 class HotelAgent(BaseSpecializedAgent):
@@ -220,32 +242,7 @@ class HotelAgent(BaseSpecializedAgent):
 
 回答要专业、准确、详细。"""
         
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", system_prompt),
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("human", "{input}"),
-            MessagesPlaceholder(variable_name="agent_scratchpad"),
-        ])
-        
-        agent = create_openai_tools_agent(
-            llm=self.llm,
-            tools=[get_hotel_prices],
-            prompt=prompt
-        )
-        
-        memory = ConversationBufferMemory(
-            memory_key="chat_history",
-            return_messages=True
-        )
-        
-        return AgentExecutor(
-            agent=agent,
-            tools=[get_hotel_prices],
-            memory=memory,
-            verbose=False,  # 关闭LangChain的详细输出，使用我们自己的日志系统
-            max_iterations=5,
-            handle_parsing_errors=True
-        )
+        return self._build_executor([get_hotel_prices], system_prompt)
 
 
 class AttractionAgent(BaseSpecializedAgent):
@@ -278,32 +275,7 @@ class AttractionAgent(BaseSpecializedAgent):
 
 回答要专业、准确、详细，确保信息完整。"""
         
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", system_prompt),
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("human", "{input}"),
-            MessagesPlaceholder(variable_name="agent_scratchpad"),
-        ])
-        
-        agent = create_openai_tools_agent(
-            llm=self.llm,
-            tools=[get_attraction_ticket_prices, answer_attraction_question],
-            prompt=prompt
-        )
-        
-        memory = ConversationBufferMemory(
-            memory_key="chat_history",
-            return_messages=True
-        )
-        
-        return AgentExecutor(
-            agent=agent,
-            tools=[get_attraction_ticket_prices, answer_attraction_question],
-            memory=memory,
-            verbose=False,  # 关闭LangChain的详细输出，使用我们自己的日志系统
-            max_iterations=5,
-            handle_parsing_errors=True
-        )
+        return self._build_executor([get_attraction_ticket_prices, answer_attraction_question], system_prompt)
 
 
 class PlanningAgent(BaseSpecializedAgent):
@@ -336,32 +308,33 @@ class PlanningAgent(BaseSpecializedAgent):
 
 回答要专业、详细、实用。"""
         
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", system_prompt),
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("human", "{input}"),
-            MessagesPlaceholder(variable_name="agent_scratchpad"),
-        ])
-        
-        agent = create_openai_tools_agent(
-            llm=self.llm,
-            tools=[plan_travel_itinerary],
-            prompt=prompt
-        )
-        
-        memory = ConversationBufferMemory(
-            memory_key="chat_history",
-            return_messages=True
-        )
+        return self._build_executor([plan_travel_itinerary], system_prompt)
+    
+    SYNTHESIS_PROMPT = """你是一个专业的旅行行程规划助手。用户提供的内容已经包含查询好的交通、天气、酒店、景点信息和规划要求。
+
+请直接基于这些信息输出详细的每日行程安排，包括景点、餐饮、住宿、交通和预算分配；不要编造未提供的数据，缺少的信息给出合理的估算并注明。
+
+回答要专业、详细、实用。"""
+    
+    def synthesize(self, plan_prompt: str, request: Optional[str] = None, session_id: Optional[str] = None,
+                   memory_store: Optional[MemoryStore] = None) -> str:
+        """
+        基于 plan_travel_itinerary 已收集的信息直接生成行程（只调用一次LLM，不经过工具选择）
         
-        return AgentExecutor(
-            agent=agent,
-            tools=[plan_travel_itinerary],
-            memory=memory,
-            verbose=False,  # 关闭LangChain的详细输出，使用我们自己的日志系统
-            max_iterations=5,
-            handle_parsing_errors=True
-        )
+        Args:
+            plan_prompt: plan_travel_itinerary 返回的规划提示（包含查询到的信息）
+            request: 写入会话历史的用户请求，默认使用 plan_prompt
+            session_id: 会话ID，提供时读取并更新该会话在本Agent中的对话历史
+            memory_store: 记忆存储，默认使用全局存储
+        """
+        history, store = self._load_history(session_id, memory_store)
+        messages = [SystemMessage(content=self.SYNTHESIS_PROMPT), *history, HumanMessage(content=plan_prompt)]
+        try:
+            result = str(self.llm.invoke(messages, config={"callbacks": current_token_callbacks()}).content)
+        except Exception as e:
+            raise self._shorten_error(e)
+        self._save_turn(store, session_id, request or plan_prompt, result)
+        return result
 
 
 class RecommendationAgent(BaseSpecializedAgent):
@@ -387,30 +360,31 @@ class RecommendationAgent(BaseSpecializedAgent):
 
 回答要专业、个性化、详细。"""
         
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", system_prompt),
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("human", "{input}"),
-            MessagesPlaceholder(variable_name="agent_scratchpad"),
-        ])
-        
-        agent = create_openai_tools_agent(
-            llm=self.llm,
-            tools=[get_personalized_recommendations],
-            prompt=prompt
-        )
-        
-        memory = ConversationBufferMemory(
-            memory_key="chat_history",
-            return_messages=True
-        )
-        
-        return AgentExecutor(
-            agent=agent,
-            tools=[get_personalized_recommendations],
-            memory=memory,
-            verbose=False,  # 关闭LangChain的详细输出，使用我们自己的日志系统
-            max_iterations=5,
-            handle_parsing_errors=True
-        )
+        return self._build_executor([get_personalized_recommendations], system_prompt)
+
 
+_agent_instances: Dict[Type[BaseSpecializedAgent], BaseSpecializedAgent] = {}
+_agent_instances_lock = threading.Lock()
+
+
+def get_specialized_agent(agent_class: Type[BaseSpecializedAgent]) -> BaseSpecializedAgent:
+    """
+    获取专门Agent的进程内单例（Agent无状态，所有会话共用；会话历史通过 session_id 从记忆存储读取）
+    
+    Args:
+        agent_class: 专门Agent类，例如 WeatherAgent
+    """
+    agent = _agent_instances.get(agent_class)
+    if agent is None:
+        with _agent_instances_lock:
+            agent = _agent_instances.get(agent_class)
+            if agent is None:
+                agent = agent_class()
+                _agent_instances[agent_class] = agent
+    return agent
+
+
+def reset_specialized_agents():
+    """清空专门Agent单例（LLM配置变化后或测试中使用）"""
+    with _agent_instances_lock:
+        _agent_instances.clear()
@@ -0,0 +1,78 @@
+"""LLM token流式输出：把主协调Agent和专门Agent的LLM生成的token实时转发给调用方（如SSE接口）"""
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from uuid import UUID
+
+from langchain.callbacks.base import BaseCallbackHandler
+
+
+# 当前请求的token处理器（专门Agent在工具函数内部调用LLM，拿不到主协调Agent的回调，通过上下文变量传递）
+_token_sink: ContextVar[Optional["TokenStreamHandler"]] = ContextVar("token_sink", default=None)
+
+
+class TokenStreamHandler(BaseCallbackHandler):
+    """
+    把LLM的流式token转换为事件：{"token": 文本, "segment": 片段序号, "source": coordinator | agent}
+    
+    每次LLM调用（按 run_id 区分）输出的第一个非空token开启一个新片段，片段序号在同一请求内递增；
+    只调用工具的LLM步骤没有文本token，不产生片段。调用方通常只展示最新片段
+    （例如专门Agent的回答之后，主协调Agent原样转述的回答会作为下一个片段）。
+    """
+    
+    # 异步执行时也在事件循环中直接调用，保证token顺序
+    run_inline = True
+    
+    def __init__(self, on_token: Callable[[Dict[str, Any]], None], source: str = "coordinator",
+                 _shared: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            on_token: 收到token事件时调用（可能在工作线程中调用，需要线程安全）
+            source: 事件来源，coordinator（主协调Agent）或 agent（专门Agent）
+        """
+        super().__init__()
+        self.on_token = on_token
+        self.source = source
+        self._shared = _shared if _shared is not None else {"lock": threading.Lock(), "segments": {}}
+    
+    def nested(self, source: str = "agent") -> "TokenStreamHandler":
+        """创建给专门Agent使用的处理器（共享片段序号和 on_token）"""
+        return TokenStreamHandler(self.on_token, source, self._shared)
+    
+    @property
+    def segments(self) -> int:
+        """已产生的片段数"""
+        with self._shared["lock"]:
+            return len(self._shared["segments"])
+    
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        if not token:
+            return
+        with self._shared["lock"]:
+            segments = self._shared["segments"]
+            segment = segments.setdefault(run_id, len(segments))
+        self.on_token({"token": token, "segment": segment, "source": self.source})
+
+
+@contextmanager
+def stream_tokens(handler: TokenStreamHandler) -> Iterator[TokenStreamHandler]:
+    """
+    在当前上下文中启用token转发：期间调用的专门Agent会把LLM的token发送给 handler
+    
+    主协调Agent需要另外把 handler 加入自己的 callbacks。
+    
+    Args:
+        handler: token处理器
+    """
+    token = _token_sink.set(handler)
+    try:
+        yield handler
+    finally:
+        _token_sink.reset(token)
+
+
+def current_token_callbacks() -> List[BaseCallbackHandler]:
+    """获取专门Agent调用LLM时需要附加的回调（当前上下文未启用token转发时为空列表）"""
+    handler = _token_sink.get()
+    return [handler.nested()] if handler is not None else []
@@ -0,0 +1,62 @@
+"""结构化行程规划：旅行信息完整时直接根据表单字段构建工具参数，不经过主协调Agent和专门Agent的LLM选择工具"""
+from datetime import datetime
+from typing import Optional
+
+
+# 结构化规划需要的旅行信息字段（缺少任一字段时交给主协调Agent处理）
+REQUIRED_FIELDS = ("destination", "departureDate", "returnDate")
+
+
+def _parse_budget(budget) -> Optional[float]:
+    try:
+        return float(budget) if budget not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def build_plan_arguments(travel_info: dict, session_id: Optional[str] = None) -> Optional[dict]:
+    """
+    根据旅行信息构建 plan_travel_itinerary 的参数
+    
+    出发地、出行方式、酒店偏好、兴趣等可选字段存在时，工具会并发查询对应的交通路线、酒店价格和景点门票。
+    
+    Args:
+        travel_info: 旅行信息（前端表单字段，如 departureDate、destination、hotelPreference、departureCity）
+        session_id: 会话ID
+    
+    Returns:
+        工具参数字典；必填字段缺失或日期格式错误时返回None
+    """
+    if not travel_info or any(not travel_info.get(field) for field in REQUIRED_FIELDS):
+        return None
+    try:
+        departure = datetime.strptime(travel_info["departureDate"], "%Y-%m-%d")
+        return_date = datetime.strptime(travel_info["returnDate"], "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None
+    if return_date < departure:
+        return None
+    
+    preferences_parts = []
+    if travel_info.get("travelStyle"):
+        preferences_parts.append(f"旅行风格：{travel_info['travelStyle']}")
+    if travel_info.get("interests"):
+        preferences_parts.append(f"兴趣偏好：{travel_info['interests']}")
+    if travel_info.get("hotelPreference"):
+        preferences_parts.append(f"住宿偏好：{travel_info['hotelPreference']}")
+    if travel_info.get("transportMode"):
+        preferences_parts.append(f"出行方式：{travel_info['transportMode']}")
+    
+    return {
+        "days": (return_date - departure).days + 1,
+        "destination": travel_info["destination"],
+        "budget": _parse_budget(travel_info.get("budget")),
+        "preferences": "，".join(preferences_parts) or None,
+        "departure_date": travel_info["departureDate"],
+        "return_date": travel_info["returnDate"],
+        "hotel_preference": travel_info.get("hotelPreference") or None,
+        "departure_city": travel_info.get("departureCity") or None,
+        "transport_mode": travel_info.get("transportMode") or None,
+        "interests": travel_info.get("interests") or None,
+        "session_id": session_id,
+    }
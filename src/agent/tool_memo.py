@@ -0,0 +1,231 @@
+"""工具结果记忆化：同一请求内参数相同的工具调用只执行一次，跨请求的结果按工具声明的TTL共享"""
+import json
+import re
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from langchain_core.tools import BaseTool, StructuredTool
+
+from src.config import config
+from src.utils.ttl_cache import TTLCache
+
+
+# 当前请求的工具结果（{工具名: {参数键: 结果}}），未进入请求范围时为None
+_request_results: ContextVar[Optional[Dict[str, Dict[str, Any]]]] = ContextVar("tool_request_results", default=None)
+_request_lock = threading.Lock()
+
+# 工具返回的查询失败提示和接口出错后的估算结果（估算结果前加“高德地图API...”错误提示；只在请求范围内复用，不写入全局缓存，避免在TTL内一直返回）
+_FAILURE_PATTERN = re.compile(r"^(?:无法|获取.{0,10}时出错|日期格式错误|高德地图API)")
+
+_DATE_PATTERN = re.compile(r"^(\d{4})\s*[-/.年]\s*(\d{1,2})\s*[-/.月]\s*(\d{1,2})\s*日?$")
+
+
+def normalize_place(value: Any) -> Any:
+    """规范化地名：去除空白、统一大小写，去掉“北京市”等末尾的“市”"""
+    if not isinstance(value, str):
+        return value
+    value = "".join(value.split()).lower()
+    return value[:-1] if len(value) > 2 and value.endswith("市") else value
+
+
+def normalize_date(value: Any) -> Any:
+    """规范化日期为 YYYY-MM-DD（支持 2026/5/1、2026年5月1日、20260501 等写法），无法解析时只去除空白"""
+    if not isinstance(value, str):
+        return value
+    text = value.strip()
+    match = _DATE_PATTERN.match(text)
+    try:
+        if match:
+            return datetime(*(int(part) for part in match.groups())).strftime("%Y-%m-%d")
+        if re.fullmatch(r"\d{8}", text):
+            return datetime.strptime(text, "%Y%m%d").strftime("%Y-%m-%d")
+    except ValueError:
+        pass
+    return text
+
+
+def _normalize_text(value: Any) -> Any:
+    return value.strip() if isinstance(value, str) else value
+
+
+def is_failure_result(result: Any) -> bool:
+    """判断工具结果是否为查询失败的提示"""
+    return isinstance(result, str) and bool(_FAILURE_PATTERN.match(result.strip()))
+
+
+class ToolMemo:
+    """一个工具的结果记忆：请求范围（不限时间）+ 全局TTL缓存"""
+    
+    def __init__(self, name: str, ttl: float, normalizers: Optional[Dict[str, Callable[[Any], Any]]] = None,
+                 max_size: int = 512):
+        """
+        Args:
+            name: 工具名称
+            ttl: 全局缓存的过期时间（秒），<=0 表示只在请求范围内复用
+            normalizers: 参数规范化函数（参数名 -> 函数），未指定的字符串参数只去除首尾空白
+            max_size: 全局缓存的最大条目数
+        """
+        self.name = name
+        self.ttl = ttl
+        self.normalizers = normalizers or {}
+        self._cache = TTLCache(max_size=max_size, ttl=ttl, name=f"tool:{name}")
+        self._lock = threading.Lock()
+        self._stats = {"request_hits": 0, "global_hits": 0, "misses": 0, "failures_not_cached": 0}
+    
+    def key(self, args: Tuple, kwargs: Dict[str, Any]) -> str:
+        """根据规范化后的参数生成缓存键（参数值为None的可选参数与未传入等价）"""
+        normalized = {
+            name: self.normalizers.get(name, _normalize_text)(value)
+            for name, value in kwargs.items() if value is not None
+        }
+        return json.dumps([list(args), normalized], ensure_ascii=False, sort_keys=True, default=str)
+    
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+    
+    def lookup(self, key: str) -> Tuple[bool, Any]:
+        """查找结果，返回 (是否命中, 结果)"""
+        request_results = _request_results.get()
+        if request_results is not None:
+            with _request_lock:
+                results = request_results.get(self.name, {})
+                if key in results:
+                    hit, value = True, results[key]
+                else:
+                    hit, value = False, None
+            if hit:
+                self._count("request_hits")
+                return True, value
+        if self.ttl > 0:
+            marker = object()
+            value = self._cache.get(key, marker)
+            if value is not marker:
+                self._count("global_hits")
+                self._remember(key, value)
+                return True, value
+        self._count("misses")
+        return False, None
+    
+    def _remember(self, key: str, value: Any):
+        request_results = _request_results.get()
+        if request_results is not None:
+            with _request_lock:
+                request_results.setdefault(self.name, {})[key] = value
+    
+    def store(self, key: str, value: Any):
+        """保存结果（查询失败的提示只保存在请求范围内）"""
+        self._remember(key, value)
+        if self.ttl <= 0:
+            return
+        if is_failure_result(value):
+            self._count("failures_not_cached")
+            return
+        self._cache.set(key, value)
+    
+    def clear(self):
+        """清空全局缓存和命中统计"""
+        self._cache.clear()
+        with self._lock:
+            self._stats = dict.fromkeys(self._stats, 0)
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self._stats["request_hits"] + self._stats["global_hits"]
+            total = hits + self._stats["misses"]
+            return {
+                "ttl": self.ttl,
+                "size": len(self._cache),
+                **self._stats,
+                "hit_rate": round(hits / total, 4) if total else 0.0,
+            }
+
+
+class MemoizedTool(StructuredTool):
+    """带结果记忆的结构化工具（同步和异步调用共用同一份记忆，绑定的 coroutine 可在装饰后再设置）"""
+    
+    memo: Any = None
+    
+    def _run(self, *args: Any, run_manager=None, **kwargs: Any) -> Any:
+        key = self.memo.key(args, kwargs)
+        hit, value = self.memo.lookup(key)
+        if hit:
+            return value
+        value = super()._run(*args, run_manager=run_manager, **kwargs)
+        self.memo.store(key, value)
+        return value
+    
+    async def _arun(self, *args: Any, run_manager=None, **kwargs: Any) -> Any:
+        if self.coroutine is None:
+            # 没有异步实现时在线程池中调用 _run，由 _run 负责记忆
+            return await super()._arun(*args, run_manager=run_manager, **kwargs)
+        key = self.memo.key(args, kwargs)
+        hit, value = self.memo.lookup(key)
+        if hit:
+            return value
+        value = await super()._arun(*args, run_manager=run_manager, **kwargs)
+        self.memo.store(key, value)
+        return value
+
+
+_memos: Dict[str, ToolMemo] = {}
+
+
+def memoize_tool(ttl: float, normalize: Optional[Dict[str, Callable[[Any], Any]]] = None):
+    """
+    工具结果记忆化装饰器（放在 @tool 之上），工具结果只由参数决定时使用
+    
+    - 请求范围（tool_request_scope）内参数相同的调用只执行一次
+    - 跨请求按 ttl 共享结果（可用 tools.memo.ttl.<工具名> 覆盖，tools.memo.enabled 为 false 时不装饰）
+    - 参数先规范化再生成缓存键（如城市名去空白、日期统一为 YYYY-MM-DD）
+    
+    Args:
+        ttl: 全局缓存的过期时间（秒）
+        normalize: 参数规范化函数（参数名 -> 函数）
+    """
+    def decorator(tool: BaseTool) -> BaseTool:
+        if not isinstance(tool, StructuredTool):
+            raise TypeError("memoize_tool 只能装饰 @tool 创建的结构化工具")
+        if not config.get("tools.memo.enabled", True):
+            return tool
+        memo = ToolMemo(
+            tool.name,
+            ttl=config.get(f"tools.memo.ttl.{tool.name}", ttl),
+            normalizers=normalize,
+            max_size=config.get("tools.memo.max_size", 512),
+        )
+        _memos[tool.name] = memo
+        fields = {name: getattr(tool, name) for name in tool.__fields__}
+        return MemoizedTool(**fields, memo=memo)
+    return decorator
+
+
+@contextmanager
+def tool_request_scope() -> Iterator[None]:
+    """
+    进入一次请求的工具记忆范围（嵌套时沿用外层范围）
+    
+    范围内参数相同的工具调用只执行一次；在线程池中执行的工具需要通过 contextvars.copy_context() 传递范围。
+    """
+    if _request_results.get() is not None:
+        yield
+        return
+    token = _request_results.set({})
+    try:
+        yield
+    finally:
+        _request_results.reset(token)
+
+
+def clear_tool_memo():
+    """清空所有工具的全局缓存和命中统计（测试中或数据源更新后使用）"""
+    for memo in _memos.values():
+        memo.clear()
+
+
+def tool_memo_stats() -> Dict[str, Dict[str, Any]]:
+    """获取各工具的记忆命中统计"""
+    return {name: memo.stats() for name, memo in _memos.items()}
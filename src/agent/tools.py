@@ -1,7 +1,11 @@
 """Agent工具定义"""
-from typing import Optional
+from typing import Any, Dict, Generator, List, NamedTuple, Optional, Tuple
+import contextvars
+import httpx
 import requests
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime, timedelta
 try:
     from langchain.tools import tool
@@ -10,7 +14,10 @@ except ImportError:
 
 from src.config import config
 from src.utils.logger import AgentLogger
-from src.utils.amap_rate_limiter import get_amap_rate_limiter
+from src.utils.amap_rate_limiter import amap_url, get_amap_rate_limiter
+from src.utils.amap_cache import get_geocode_cache, get_route_cache, get_weather_cache, normalize_address, route_cache_key
+from src.utils.async_amap_client import get_async_amap_client
+from src.agent.tool_memo import memoize_tool, normalize_date, normalize_place
 
 # 创建全局日志记录器（工具函数使用）
 _tool_logger = AgentLogger(verbose=True)
@@ -18,7 +25,290 @@ _tool_logger = AgentLogger(verbose=True)
 # 获取高德地图API限流器实例
 _amap_limiter = get_amap_rate_limiter()
 
+# 获取地理编码缓存实例（所有工具共享）
+_geocode_cache = get_geocode_cache()
 
+# 获取城市天气缓存实例（按adcode缓存实况和预报数据）
+_weather_cache = get_weather_cache()
+
+# 获取自驾路线缓存实例（按取整后的起终点坐标和路线策略缓存）
+_route_cache = get_route_cache()
+
+# 获取高德地图API异步客户端实例（异步版本的工具使用）
+_async_amap_client = get_async_amap_client()
+
+class _AmapRequest(NamedTuple):
+    """一次高德地图API请求（由工具的请求步骤生成，交给同步或异步执行器发送）"""
+    url: str
+    params: dict
+    timeout: float = 5
+
+
+def _run_amap_sync(steps: Generator) -> Any:
+    """
+    同步执行工具的请求步骤
+    
+    工具逻辑写成生成器：每次 yield 一个 _AmapRequest 并接收对应的响应（请求异常会抛回生成器内部），
+    最后 return 工具结果。这样同步和异步版本共用同一份解析和格式化逻辑。
+    """
+    response, error = None, None
+    while True:
+        try:
+            request = steps.throw(error) if error is not None else steps.send(response)
+        except StopIteration as stop:
+            return stop.value
+        response, error = None, None
+        try:
+            response = _amap_limiter.get(request.url, params=request.params, timeout=request.timeout)
+        except Exception as e:
+            error = e
+
+
+async def _run_amap_async(steps: Generator) -> Any:
+    """
+    异步执行工具的请求步骤
+    
+    httpx 的超时和网络异常会转换为对应的 requests 异常，使工具内的错误处理与同步版本一致。
+    """
+    response, error = None, None
+    while True:
+        try:
+            request = steps.throw(error) if error is not None else steps.send(response)
+        except StopIteration as stop:
+            return stop.value
+        response, error = None, None
+        try:
+            response = await _async_amap_client.get(request.url, params=request.params, timeout=request.timeout)
+        except httpx.TimeoutException as e:
+            error = requests.exceptions.Timeout(str(e))
+        except httpx.HTTPError as e:
+            error = requests.exceptions.RequestException(str(e))
+        except Exception as e:
+            error = e
+
+
+def _geocode_address(address: str, api_key: str) -> Tuple[Optional[dict], Optional[str]]:
+    """
+    获取地址的地理编码，优先使用进程级缓存，未命中时调用高德地图地理编码API
+    
+    Args:
+        address: 地址或城市名称
+        api_key: 高德地图API密钥
+    
+    Returns:
+        (geocode, None) 成功，geocode包含 adcode、formatted_address、location
+        (None, error_message) 失败
+    """
+    return _run_amap_sync(_geocode_steps(address, api_key))
+
+
+def _geocode_steps(address: str, api_key: str) -> Generator:
+    """地理编码的请求步骤（同步和异步版本共用），返回值与 _geocode_address 相同"""
+    cache_key = normalize_address(address)
+    cached = _geocode_cache.get(cache_key)
+    if cached is not None:
+        _tool_logger.log_info(f"地理编码缓存命中: {address} -> {cached.get('adcode', '')}")
+        return cached, None
+    
+    geo_url = amap_url("/v3/geocode/geo")
+    geo_params = {
+        "address": address,
+        "key": api_key,
+        "output": "json"
+    }
+    geo_response = yield _AmapRequest(geo_url, geo_params, 5)
+    if geo_response.status_code != 200:
+        error_msg = f"HTTP {geo_response.status_code}"
+        _tool_logger.log_api_call("高德地图地理编码API", "失败", error_msg)
+        return None, error_msg
+    
+    geo_data = geo_response.json()
+    api_info = geo_data.get("info", "")
+    if geo_data.get("status") != "1":
+        # 检查是否是频率限制错误
+        if "QPS" in api_info or "LIMIT" in api_info:
+            error_msg = f"API调用频率超限: {api_info}"
+        else:
+            error_msg = f"未找到地址: {address} (API返回: {api_info})"
+        _tool_logger.log_api_call("高德地图地理编码API", "失败", error_msg)
+        return None, error_msg
+    if not geo_data.get("geocodes"):
+        error_msg = f"未找到地址: {address} (无geocodes)"
+        _tool_logger.log_api_call("高德地图地理编码API", "失败", error_msg)
+        return None, error_msg
+    
+    geocode = _parse_geocode(geo_data["geocodes"][0], address)
+    _geocode_cache.set(cache_key, geocode)
+    _tool_logger.log_api_call("高德地图地理编码API", "成功", f"获取{address}的地理编码: {geocode['adcode']} ({geocode['location']})")
+    return geocode, None
+
+
+def _parse_geocode(item: dict, address: str) -> dict:
+    """将高德地图返回的一条geocode转换为 {adcode, formatted_address, location}"""
+    geocode = {
+        "adcode": item.get("adcode", "") or "",
+        "formatted_address": item.get("formatted_address", "") or address,
+        "location": item.get("location", "") or "",
+    }
+    # 高德地图对未匹配字段可能返回空列表，统一转换为字符串
+    geocode = {k: (v if isinstance(v, str) else "") for k, v in geocode.items()}
+    geocode["formatted_address"] = geocode["formatted_address"] or address
+    return geocode
+
+
+def _batch_geocode(addresses: List[str], api_key: str) -> Dict[str, Tuple[Optional[dict], Optional[str]]]:
+    """
+    批量获取多个地址的地理编码，未命中缓存的地址每10个合并为一次API请求（batch=true）
+    
+    Args:
+        addresses: 地址或城市名称列表
+        api_key: 高德地图API密钥
+    
+    Returns:
+        {地址: (geocode, error_message)}，每个地址的结果与 _geocode_address 相同
+    """
+    return _run_amap_sync(_batch_geocode_steps(addresses, api_key))
+
+
+def _batch_geocode_steps(addresses: List[str], api_key: str) -> Generator:
+    """批量地理编码的请求步骤（同步和异步版本共用），返回值与 _batch_geocode 相同"""
+    results = {}
+    pending = []
+    for address in addresses:
+        if address in results or address in pending:
+            continue
+        cached = _geocode_cache.get(normalize_address(address))
+        if cached is not None:
+            _tool_logger.log_info(f"地理编码缓存命中: {address} -> {cached.get('adcode', '')}")
+            results[address] = (cached, None)
+        else:
+            pending.append(address)
+    
+    # 高德地图批量地理编码每次最多10个地址
+    for start in range(0, len(pending), 10):
+        chunk = pending[start:start + 10]
+        if len(chunk) == 1:
+            results[chunk[0]] = yield from _geocode_steps(chunk[0], api_key)
+            continue
+        
+        geo_params = {
+            "address": "|".join(chunk),
+            "batch": "true",
+            "key": api_key,
+            "output": "json"
+        }
+        geo_response = yield _AmapRequest(amap_url("/v3/geocode/geo"), geo_params, 5)
+        if geo_response.status_code != 200:
+            error_msg = f"HTTP {geo_response.status_code}"
+            _tool_logger.log_api_call("高德地图地理编码API", "失败", f"批量请求{len(chunk)}个地址: {error_msg}")
+            results.update({address: (None, error_msg) for address in chunk})
+            continue
+        
+        geo_data = geo_response.json()
+        api_info = geo_data.get("info", "")
+        if geo_data.get("status") == "1" and "QPS" not in api_info and "LIMIT" not in api_info:
+            geocodes = geo_data.get("geocodes") or []
+            if len(geocodes) != len(chunk):
+                # 返回数量与请求地址数不一致时无法对应，逐个地址重新查询
+                _tool_logger.log_warning(f"批量地理编码返回{len(geocodes)}条结果，请求了{len(chunk)}个地址，改为逐个查询")
+                for address in chunk:
+                    results[address] = yield from _geocode_steps(address, api_key)
+                continue
+            for address, item in zip(chunk, geocodes):
+                geocode = _parse_geocode(item, address)
+                if not geocode["location"] and not geocode["adcode"]:
+                    results[address] = (None, f"未找到地址: {address} (无geocodes)")
+                    continue
+                _geocode_cache.set(normalize_address(address), geocode)
+                results[address] = (geocode, None)
+            _tool_logger.log_api_call("高德地图地理编码API", "成功", f"批量获取{len(chunk)}个地址的地理编码: {', '.join(chunk)}")
+        else:
+            if "QPS" in api_info or "LIMIT" in api_info:
+                error_msg = f"API调用频率超限: {api_info}"
+            else:
+                error_msg = f"API返回: {api_info}"
+            _tool_logger.log_api_call("高德地图地理编码API", "失败", f"批量请求{len(chunk)}个地址: {error_msg}")
+            results.update({address: (None, error_msg) for address in chunk})
+    
+    return results
+
+
+def _weather_payload_steps(adcode: str, extensions: str, api_key: str) -> Generator:
+    """
+    获取城市天气数据的请求步骤，按 adcode 缓存实况（base）和预报（all）的原始数据
+    
+    Returns:
+        (weather_data, None) HTTP请求成功（由调用方检查API返回状态）
+        (None, "HTTP xxx") HTTP请求失败
+    """
+    cache_key = f"{adcode}:{extensions}"
+    cached = _weather_cache.get(cache_key)
+    if cached is not None:
+        _tool_logger.log_info(f"天气数据缓存命中: {cache_key}")
+        return cached, None
+    
+    weather_url = amap_url("/v3/weather/weatherInfo")
+    weather_params = {
+        "city": adcode,
+        "key": api_key,
+        "extensions": extensions,  # base返回实况天气，all返回4天预报
+        "output": "json"
+    }
+    weather_response = yield _AmapRequest(weather_url, weather_params, 5)
+    if weather_response.status_code != 200:
+        return None, f"HTTP {weather_response.status_code}"
+    
+    weather_data = weather_response.json()
+    if weather_data.get("status") == "1":
+        # 实况约每半小时更新一次，预报每天更新数次，分别设置过期时间
+        if extensions == "base":
+            ttl = config.get("amap.weather_cache.live_ttl", 1800)
+        else:
+            ttl = config.get("amap.weather_cache.forecast_ttl", 3600)
+        _weather_cache.set(cache_key, weather_data, ttl=ttl)
+    return weather_data, None
+
+
+def _format_live_weather(city_name: str, date: str, live: dict) -> str:
+    """格式化实况天气"""
+    temp = live.get("temperature", "N/A")
+    weather = live.get("weather", "未知")
+    wind_direction = live.get("winddirection", "")
+    wind_power = live.get("windpower", "")
+    humidity = live.get("humidity", "N/A")
+    
+    result = f"{city_name}在{date}的天气：{weather}，温度{temp}°C，湿度{humidity}%"
+    if wind_direction:
+        result += f"，风向{wind_direction}"
+    if wind_power:
+        result += f"，风力{wind_power}"
+    return result
+
+
+def _format_forecast_cast(city_name: str, date: str, cast: dict) -> str:
+    """格式化某一天的预报天气"""
+    dayweather = cast.get("dayweather", "未知")
+    nightweather = cast.get("nightweather", "未知")
+    daytemp = cast.get("daytemp", "N/A")
+    nighttemp = cast.get("nighttemp", "N/A")
+    daywind = cast.get("daywind", "")
+    nightwind = cast.get("nightwind", "")
+    daypower = cast.get("daypower", "")
+    nightpower = cast.get("nightpower", "")
+    
+    result = f"{city_name}在{date}的天气：白天{dayweather}，夜间{nightweather}，温度{nighttemp}-{daytemp}°C"
+    if daywind:
+        result += f"，白天风向{daywind}"
+    if daypower:
+        result += f"风力{daypower}"
+    if nightwind:
+        result += f"，夜间风向{nightwind}"
+    if nightpower:
+        result += f"风力{nightpower}"
+    return result
+
+
+@memoize_tool(ttl=1800, normalize={"city": normalize_place, "date": normalize_date})
 @tool
 def get_weather_info(city: str, date: str) -> str:
     """
@@ -37,6 +327,11 @@ def get_weather_info(city: str, date: str) -> str:
     Returns:
         天气信息字符串，包括温度、天气状况、降雨概率等。如果API不可用，返回提示信息。
     """
+    return _run_amap_sync(_weather_steps(city, date))
+
+
+def _weather_steps(city: str, date: str) -> Generator:
+    """获取天气信息的请求步骤（同步和异步版本共用）"""
     try:
         # 从配置获取API密钥（高德地图，与交通API共用）
         api_key = os.getenv("AMAP_API_KEY") or config.get("transport.api_key", "") or config.get("weather.api_key", "")
@@ -46,30 +341,17 @@ def get_weather_info(city: str, date: str) -> str:
             _tool_logger.log_fallback("天气信息", "API密钥未配置")
             return f"无法获取{city}在{date}的天气信息。天气API密钥未配置，请在环境变量中设置AMAP_API_KEY。"
         
-        # 首先通过地理编码API获取城市编码（adcode）
-        geo_url = "https://restapi.amap.com/v3/geocode/geo"
-        geo_params = {
-            "address": city,
-            "key": api_key,
-            "output": "json"
-        }
-        
-        geo_response = _amap_limiter.get(geo_url, params=geo_params, timeout=5)
-        if geo_response.status_code != 200:
-            _tool_logger.log_api_call("高德地图地理编码API", "失败", f"HTTP {geo_response.status_code}")
-            _tool_logger.log_fallback("天气信息", f"地理编码失败")
-            return f"无法获取{city}在{date}的天气信息。地理编码API调用失败（HTTP {geo_response.status_code}），请稍后重试。"
-        
-        geo_data = geo_response.json()
-        if geo_data.get("status") != "1" or not geo_data.get("geocodes"):
-            _tool_logger.log_api_call("高德地图地理编码API", "失败", f"未找到城市: {city}")
-            _tool_logger.log_fallback("天气信息", f"未找到城市")
+        # 首先获取城市编码（adcode），优先使用地理编码缓存
+        geocode, geo_error = yield from _geocode_steps(city, api_key)
+        if geocode is None:
+            _tool_logger.log_fallback("天气信息", "地理编码失败")
+            if geo_error.startswith("HTTP"):
+                return f"无法获取{city}在{date}的天气信息。地理编码API调用失败（{geo_error}），请稍后重试。"
             return f"无法获取{city}在{date}的天气信息。未找到城市{city}，请检查城市名称是否正确。"
         
         # 获取城市编码（adcode）
-        adcode = geo_data["geocodes"][0].get("adcode", "")
-        city_name = geo_data["geocodes"][0].get("formatted_address", city)
-        _tool_logger.log_api_call("高德地图地理编码API", "成功", f"获取{city}的地理编码: {adcode}")
+        adcode = geocode["adcode"]
+        city_name = geocode["formatted_address"]
         
         if not adcode:
             _tool_logger.log_api_call("高德地图地理编码API", "失败", "无法获取城市编码")
@@ -95,54 +377,24 @@ def get_weather_info(city: str, date: str) -> str:
         # 使用预报天气API查询
         # 注意：extensions="all" 返回预报+实况，但实况可能不在lives字段中
         # 如果是今天，先尝试获取实况，如果没有再使用预报
-        weather_url = "https://restapi.amap.com/v3/weather/weatherInfo"
-        
-        # 如果是今天，先尝试获取实况天气（extensions="base"）
+        # 实况和预报数据都按城市缓存，同一城市的多个日期共用一份数据
         if days_diff == 0:
-            weather_params_base = {
-                "city": adcode,
-                "key": api_key,
-                "extensions": "base",  # base返回实况天气
-                "output": "json"
-            }
-            weather_response_base = _amap_limiter.get(weather_url, params=weather_params_base, timeout=5)
-            if weather_response_base.status_code == 200:
-                weather_data_base = weather_response_base.json()
-                if weather_data_base.get("status") == "1":
-                    lives = weather_data_base.get("lives", [])
-                    if lives and len(lives) > 0:
-                        live = lives[0]
-                        temp = live.get("temperature", "N/A")
-                        weather = live.get("weather", "未知")
-                        wind_direction = live.get("winddirection", "")
-                        wind_power = live.get("windpower", "")
-                        humidity = live.get("humidity", "N/A")
-                        
-                        result = f"{city_name}在{date}的天气：{weather}，温度{temp}°C，湿度{humidity}%"
-                        if wind_direction:
-                            result += f"，风向{wind_direction}"
-                        if wind_power:
-                            result += f"，风力{wind_power}"
-                        
-                        _tool_logger.log_api_call("高德地图天气API", "成功", f"获取{city}当天实况天气（base）")
-                        # 记录天气查询结果到终端日志
-                        _tool_logger.log_weather_result(city, date, result)
-                        return result
+            weather_data_base, _ = yield from _weather_payload_steps(adcode, "base", api_key)
+            if weather_data_base and weather_data_base.get("status") == "1":
+                lives = weather_data_base.get("lives", [])
+                if lives and len(lives) > 0:
+                    result = _format_live_weather(city_name, date, lives[0])
+                    _tool_logger.log_api_call("高德地图天气API", "成功", f"获取{city}当天实况天气（base）")
+                    # 记录天气查询结果到终端日志
+                    _tool_logger.log_weather_result(city, date, result)
+                    return result
         
         # 使用all获取预报天气（包含今天和未来几天）
-        weather_params = {
-            "city": adcode,
-            "key": api_key,
-            "extensions": "all",  # all返回4天预报
-            "output": "json"
-        }
-        
-        weather_response = _amap_limiter.get(weather_url, params=weather_params, timeout=5)
-        if weather_response.status_code != 200:
-            _tool_logger.log_api_call("高德地图天气API", "失败", f"HTTP {weather_response.status_code}")
-            return f"无法获取{city_name}在{date}的天气信息。天气API调用失败（HTTP {weather_response.status_code}），请稍后重试。"
+        weather_data, http_error = yield from _weather_payload_steps(adcode, "all", api_key)
+        if http_error:
+            _tool_logger.log_api_call("高德地图天气API", "失败", http_error)
+            return f"无法获取{city_name}在{date}的天气信息。天气API调用失败（{http_error}），请稍后重试。"
         
-        weather_data = weather_response.json()
         api_status = weather_data.get("status", "")
         
         # 检查API返回状态
@@ -174,25 +426,7 @@ def get_weather_info(city: str, date: str) -> str:
             cast_date = cast.get("date", "")
             if cast_date == date:
                 # 找到目标日期的预报
-                dayweather = cast.get("dayweather", "未知")
-                nightweather = cast.get("nightweather", "未知")
-                daytemp = cast.get("daytemp", "N/A")
-                nighttemp = cast.get("nighttemp", "N/A")
-                daywind = cast.get("daywind", "")
-                nightwind = cast.get("nightwind", "")
-                daypower = cast.get("daypower", "")
-                nightpower = cast.get("nightpower", "")
-                
-                result = f"{city_name}在{date}的天气：白天{dayweather}，夜间{nightweather}，温度{nighttemp}-{daytemp}°C"
-                if daywind:
-                    result += f"，白天风向{daywind}"
-                if daypower:
-                    result += f"风力{daypower}"
-                if nightwind:
-                    result += f"，夜间风向{nightwind}"
-                if nightpower:
-                    result += f"风力{nightpower}"
-                
+                result = _format_forecast_cast(city_name, date, cast)
                 _tool_logger.log_api_call("高德地图天气API", "成功", f"获取{city}在{date}的预报天气")
                 # 记录天气查询结果到终端日志
                 _tool_logger.log_weather_result(city, date, result)
@@ -208,6 +442,90 @@ def get_weather_info(city: str, date: str) -> str:
         return f"获取天气信息时出错: {str(e)}。无法获取{city}在{date}的天气信息，请稍后重试。"
 
 
+@memoize_tool(ttl=1800, normalize={"city": normalize_place, "start_date": normalize_date, "end_date": normalize_date})
+@tool
+def get_weather_range(city: str, start_date: str, end_date: str) -> str:
+    """
+    获取指定城市在一段日期内（例如整个行程期间）每天的天气信息。一次查询返回所有日期，
+    查询多天天气时应使用此工具，而不是对每个日期分别调用 get_weather_info。
+    
+    Args:
+        city: 城市名称，例如"北京"、"上海"、"广州"
+        start_date: 开始日期，格式为"YYYY-MM-DD"，例如"2026-01-24"
+        end_date: 结束日期，格式为"YYYY-MM-DD"，例如"2026-01-27"
+    
+    Returns:
+        每天的天气信息，预报未覆盖的日期会给出提示。
+    """
+    return _run_amap_sync(_weather_range_steps(city, start_date, end_date))
+
+
+def _weather_range_steps(city: str, start_date: str, end_date: str) -> Generator:
+    """获取日期范围天气的请求步骤（同步和异步版本共用），整个范围只使用一份城市预报数据"""
+    try:
+        api_key = os.getenv("AMAP_API_KEY") or config.get("transport.api_key", "") or config.get("weather.api_key", "")
+        if not api_key:
+            _tool_logger.log_api_call("高德地图天气API", "跳过", "API密钥未配置")
+            _tool_logger.log_fallback("天气信息", "API密钥未配置")
+            return f"无法获取{city}在{start_date}至{end_date}的天气信息。天气API密钥未配置，请在环境变量中设置AMAP_API_KEY。"
+        
+        try:
+            start = datetime.strptime(start_date, "%Y-%m-%d").date()
+            end = datetime.strptime(end_date, "%Y-%m-%d").date()
+        except ValueError:
+            return f"日期格式错误：{start_date} - {end_date}，请使用YYYY-MM-DD格式。"
+        if end < start:
+            start, end = end, start
+        max_days = config.get("tools.travel_planning.max_days", 30)
+        if (end - start).days + 1 > max_days:
+            return f"日期范围过长（超过{max_days}天），请缩小查询范围。"
+        
+        geocode, geo_error = yield from _geocode_steps(city, api_key)
+        if geocode is None or not geocode["adcode"]:
+            _tool_logger.log_fallback("天气信息", "地理编码失败")
+            return f"无法获取{city}的天气信息。未找到城市{city}，请检查城市名称是否正确。"
+        adcode = geocode["adcode"]
+        city_name = geocode["formatted_address"]
+        
+        weather_data, http_error = yield from _weather_payload_steps(adcode, "all", api_key)
+        if http_error:
+            _tool_logger.log_api_call("高德地图天气API", "失败", http_error)
+            return f"无法获取{city_name}的天气信息。天气API调用失败（{http_error}），请稍后重试。"
+        if weather_data.get("status") != "1":
+            error_msg = weather_data.get("info", "") or "未知错误"
+            _tool_logger.log_api_call("高德地图天气API", "失败", error_msg)
+            return f"无法获取{city_name}的天气信息。API返回错误: {error_msg}"
+        
+        forecasts = weather_data.get("forecasts", [])
+        casts = {cast.get("date", ""): cast for cast in (forecasts[0].get("casts", []) if forecasts else [])}
+        
+        today = datetime.now().date()
+        lines = []
+        missing = []
+        current = start
+        while current <= end:
+            date = current.strftime("%Y-%m-%d")
+            if current < today:
+                lines.append(f"{date}：过去日期，不支持查询")
+            elif date in casts:
+                lines.append(_format_forecast_cast(city_name, date, casts[date]))
+            else:
+                missing.append(date)
+                lines.append(f"{date}：超出预报范围（预报通常覆盖未来3-4天），建议关注临近天气预报")
+            current += timedelta(days=1)
+        
+        _tool_logger.log_api_call("高德地图天气API", "成功", f"获取{city}在{start_date}至{end_date}的天气（{len(lines) - len(missing)}天有预报）")
+        result = f"{city_name}在{start_date}至{end_date}的天气：\n" + "\n".join(f"- {line}" for line in lines)
+        _tool_logger.log_weather_result(city, f"{start_date}~{end_date}", result)
+        return result
+    
+    except Exception as e:
+        _tool_logger.log_api_call("高德地图天气API", "异常", str(e)[:100])
+        _tool_logger.log_fallback("天气信息", f"异常错误: {str(e)[:100]}")
+        return f"获取天气信息时出错: {str(e)}。无法获取{city}在{start_date}至{end_date}的天气信息，请稍后重试。"
+
+
+@memoize_tool(ttl=21600, normalize={"city": normalize_place, "checkin_date": normalize_date, "checkout_date": normalize_date})
 @tool
 def get_hotel_prices(
     city: str,
@@ -316,6 +634,52 @@ def get_hotel_prices(
         return f"获取酒店价格时出错: {str(e)}。建议根据城市和偏好估算：经济型120-250元/晚，商务型250-500元/晚，豪华型600-1200元/晚。"
 
 
+def _prefetch_sources(fetchers: dict, timeout: float) -> dict:
+    """
+    并发执行相互独立的数据查询，总耗时约为最慢的一个查询，而不是所有查询之和
+    
+    Args:
+        fetchers: {数据源名称: 无参查询函数}
+        timeout: 每个数据源的超时时间（秒），超时的数据源不影响其他数据源的结果
+    
+    Returns:
+        {数据源名称: (结果, 错误信息)}，查询失败或超时时结果为None，错误信息说明原因
+    """
+    results = {}
+    if not config.get("tools.travel_planning.parallel_prefetch", True) or len(fetchers) <= 1:
+        for name, fetch in fetchers.items():
+            try:
+                results[name] = (fetch(), None)
+            except Exception as e:
+                results[name] = (None, str(e))
+        return results
+    
+    started = time.monotonic()
+    # 每次预取使用独立的线程池（每个数据源一个线程）：数据源提交后立即开始执行，超时从开始执行时计算，
+    # 不会因为其他会话占满共享线程池而在排队时超时；同时执行的规划数受请求级并发控制限制
+    executor = ThreadPoolExecutor(max_workers=len(fetchers), thread_name_prefix="plan-prefetch")
+    try:
+        # 复制上下文到线程池（工具的请求范围记忆、token转发等依赖上下文变量），每个任务使用独立的副本
+        futures = {
+            name: executor.submit(contextvars.copy_context().run, fetch)
+            for name, fetch in fetchers.items()
+        }
+        for name, future in futures.items():
+            remaining = max(0.0, started + timeout - time.monotonic())
+            try:
+                results[name] = (future.result(timeout=remaining), None)
+            except FutureTimeoutError:
+                # 正在执行的查询无法中断，在后台执行完毕后丢弃结果
+                _tool_logger.log_warning(f"行程规划数据预取超时: {name}（{timeout}秒）")
+                results[name] = (None, f"查询超时（{timeout}秒）")
+            except Exception as e:
+                results[name] = (None, str(e))
+    finally:
+        executor.shutdown(wait=False)
+    _tool_logger.log_info(f"行程规划数据预取完成: {list(fetchers.keys())}，耗时{time.monotonic() - started:.2f}秒")
+    return results
+
+
 @tool
 def plan_travel_itinerary(
     days: int,
@@ -370,23 +734,44 @@ def plan_travel_itinerary(
 当前偏好：{preferences if preferences else '无特殊偏好'}
 """
     
+    # 交通、天气、酒店、景点数据相互独立：先并发预取缺失的数据，再按固定顺序组装提示
+    fetchers = {}
+    if not existing_transport_info and departure_city and destination:
+        # 默认使用自驾方式
+        transport_mode_to_use = transport_mode if transport_mode == "自驾" else "自驾"
+        fetchers["transport"] = lambda: get_transport_route.invoke({
+            "origin": departure_city,
+            "destination": destination,
+            "transport_mode": transport_mode_to_use
+        })
+    if not existing_weather_info and destination and departure_date:
+        fetchers["weather"] = lambda: get_weather_info.invoke({"city": destination, "date": departure_date})
+    if not existing_hotel_info and destination and hotel_preference and departure_date and return_date:
+        fetchers["hotel"] = lambda: get_hotel_prices.invoke({
+            "city": destination,
+            "checkin_date": departure_date,
+            "checkout_date": return_date,
+            "hotel_preference": hotel_preference
+        })
+    if not existing_attraction_info and destination and interests:
+        fetchers["attraction"] = lambda: get_attraction_ticket_prices.invoke({
+            "city": destination,
+            "attraction_name": None,
+            "interests": interests
+        })
+    prefetched = _prefetch_sources(fetchers, config.get("tools.travel_planning.prefetch_timeout", 20))
+    
     # **优先使用已查询的交通信息，如果没有则查询**
     if existing_transport_info:
         plan_prompt += f"\n【重要】自驾路线信息（距离、时间、费用）：\n{existing_transport_info}\n"
         plan_prompt += "\n注意：请基于上述实际距离和时间来安排行程，而不是估算。\n"
     elif departure_city and destination:
-        # 默认使用自驾方式
-        transport_mode_to_use = transport_mode if transport_mode == "自驾" else "自驾"
-        try:
-            transport_info = get_transport_route.invoke({
-                "origin": departure_city,
-                "destination": destination,
-                "transport_mode": transport_mode_to_use
-            })
+        transport_info, transport_error = prefetched["transport"]
+        if transport_error is None:
             plan_prompt += f"\n【重要】自驾路线信息（距离、时间、费用）：\n{transport_info}\n"
             plan_prompt += "\n注意：请基于上述实际距离和时间来安排行程，而不是估算。\n"
-        except Exception as e:
-            plan_prompt += f"\n警告：无法获取自驾路线信息（{str(e)}），将使用估算值。\n"
+        else:
+            plan_prompt += f"\n警告：无法获取自驾路线信息（{transport_error}），将使用估算值。\n"
     elif departure_city or destination:
         plan_prompt += "\n提示：缺少出发地或目的地，无法查询准确的自驾路线和距离。建议询问用户完整信息或提供通用建议。\n"
     
@@ -394,11 +779,11 @@ def plan_travel_itinerary(
     if existing_weather_info:
         plan_prompt += f"\n出发日天气：{existing_weather_info}\n"
     elif destination and departure_date:
-        try:
-            weather_info = get_weather_info.invoke({"city": destination, "date": departure_date})
+        weather_info, weather_error = prefetched["weather"]
+        if weather_error is None:
             plan_prompt += f"\n出发日天气：{weather_info}\n"
-        except:
-            pass
+        else:
+            plan_prompt += f"\n警告：无法获取出发日天气（{weather_error}），请根据季节提供一般性天气建议。\n"
     elif departure_date and not destination:
         plan_prompt += "\n提示：已提供出发日期，但缺少目的地，无法查询具体天气。建议根据出发日期和季节提供一般性天气建议。\n"
     
@@ -406,16 +791,11 @@ def plan_travel_itinerary(
     if existing_hotel_info:
         plan_prompt += f"\n酒店价格信息：\n{existing_hotel_info}\n"
     elif destination and hotel_preference and departure_date and return_date:
-        try:
-            hotel_info = get_hotel_prices.invoke({
-                "city": destination,
-                "checkin_date": departure_date,
-                "checkout_date": return_date,
-                "hotel_preference": hotel_preference
-            })
+        hotel_info, hotel_error = prefetched["hotel"]
+        if hotel_error is None:
             plan_prompt += f"\n酒店价格信息：\n{hotel_info}\n"
-        except:
-            pass
+        else:
+            plan_prompt += f"\n警告：无法获取酒店价格信息（{hotel_error}），请根据酒店偏好提供一般性价格参考。\n"
     elif hotel_preference and departure_date and return_date and not destination:
         plan_prompt += "\n提示：已提供酒店偏好和日期，但缺少目的地，无法查询具体酒店价格。建议根据酒店偏好提供一般性价格参考。\n"
     
@@ -423,15 +803,11 @@ def plan_travel_itinerary(
     if existing_attraction_info:
         plan_prompt += f"\n景点门票信息：\n{existing_attraction_info}\n"
     elif destination and interests:
-        try:
-            attraction_info = get_attraction_ticket_prices.invoke({
-                "city": destination,
-                "attraction_name": None,
-                "interests": interests
-            })
+        attraction_info, attraction_error = prefetched["attraction"]
+        if attraction_error is None:
             plan_prompt += f"\n景点门票信息：\n{attraction_info}\n"
-        except:
-            pass
+        else:
+            plan_prompt += f"\n警告：无法获取景点门票信息（{attraction_error}），请根据兴趣偏好推荐相关类型的景点。\n"
     elif interests and not destination:
         plan_prompt += "\n提示：已提供兴趣偏好，但缺少目的地，无法查询具体景点门票。建议根据兴趣偏好推荐相关类型的景点。\n"
     
@@ -505,6 +881,7 @@ def get_personalized_recommendations(
     return recommendation_prompt
 
 
+@memoize_tool(ttl=21600, normalize={"origin": normalize_place, "destination": normalize_place})
 @tool
 def get_transport_route(
     origin: str,
@@ -524,6 +901,11 @@ def get_transport_route(
         自驾路线信息字符串，包括路线、距离、时间、过路费等。
         使用高德地图API精确计算实际距离、时间、过路费等。
     """
+    return _run_amap_sync(_transport_route_steps(origin, destination, transport_mode))
+
+
+def _transport_route_steps(origin: str, destination: str, transport_mode: str) -> Generator:
+    """获取交通路线的请求步骤（同步和异步版本共用）"""
     try:
         # 仅支持自驾方式
         if transport_mode != "自驾":
@@ -534,7 +916,7 @@ def get_transport_route(
         
         # 使用高德地图路径规划API获取自驾路线
         if api_key:
-            return _get_driving_route(origin, destination, api_key)
+            return (yield from _driving_route_steps(origin, destination, api_key))
         else:
             return _estimate_driving_route(origin, destination)
             
@@ -544,8 +926,8 @@ def get_transport_route(
         return f"获取交通路线时出错: {str(e)}。建议：{origin}到{destination}，请使用自驾方式。"
 
 
-def _get_driving_route(origin: str, destination: str, api_key: str) -> str:
-    """使用高德地图API获取自驾路线（优先使用坐标进行精确计算）"""
+def _driving_route_steps(origin: str, destination: str, api_key: str) -> Generator:
+    """使用高德地图API获取自驾路线的请求步骤（优先使用坐标进行精确计算）"""
     try:
         # 第一步：对出发地和目的地进行地理编码，获取精确坐标
         origin_coord = None
@@ -553,95 +935,54 @@ def _get_driving_route(origin: str, destination: str, api_key: str) -> str:
         origin_name = origin
         destination_name = destination
         
-        # 地理编码API
-        geo_url = "https://restapi.amap.com/v3/geocode/geo"
-        
-        # 获取出发地坐标
+        # 出发地和目的地合并为一次批量地理编码请求（优先使用地理编码缓存）
         try:
-            _tool_logger.log_info(f"请求出发地地理编码: {origin}")
-            geo_params_origin = {
-                "address": origin,
-                "key": api_key,
-                "output": "json"
-            }
-            geo_response_origin = _amap_limiter.get(geo_url, params=geo_params_origin, timeout=5)
-            if geo_response_origin.status_code == 200:
-                geo_data_origin = geo_response_origin.json()
-                api_status = geo_data_origin.get("status")
-                api_info = geo_data_origin.get("info", "")
-                
-                # 检查是否是频率限制错误
-                if api_status != "1":
-                    if "QPS" in api_info or "LIMIT" in api_info:
-                        _tool_logger.log_api_call("高德地图地理编码API", "失败", f"API调用频率超限: {api_info}")
-                        _tool_logger.log_warning(f"出发地地理编码因API频率限制失败，将使用地址字符串进行路径规划")
-                    else:
-                        _tool_logger.log_api_call("高德地图地理编码API", "失败", f"未找到出发地: {origin} (API返回: {api_info})")
-                elif api_status == "1" and geo_data_origin.get("geocodes"):
-                    location = geo_data_origin["geocodes"][0].get("location", "")
-                    if location:
-                        origin_coord = location  # 格式：经度,纬度
-                        origin_name = geo_data_origin["geocodes"][0].get("formatted_address", origin)
-                        _tool_logger.log_api_call("高德地图地理编码API", "成功", f"获取{origin}坐标: {origin_coord}")
-                else:
-                    _tool_logger.log_api_call("高德地图地理编码API", "失败", f"未找到出发地: {origin} (无geocodes)")
-            else:
-                _tool_logger.log_api_call("高德地图地理编码API", "失败", f"HTTP {geo_response_origin.status_code}")
-        except Exception as e:
-            # 地理编码失败，继续尝试使用地址字符串
-            _tool_logger.log_api_call("高德地图地理编码API", "异常", f"{origin}: {str(e)[:100]}")
-        
-        # 获取目的地坐标
-        try:
-            _tool_logger.log_info(f"请求目的地地理编码: {destination}")
-            geo_params_dest = {
-                "address": destination,
-                "key": api_key,
-                "output": "json"
-            }
-            geo_response_dest = _amap_limiter.get(geo_url, params=geo_params_dest, timeout=5)
-            if geo_response_dest.status_code == 200:
-                geo_data_dest = geo_response_dest.json()
-                api_status = geo_data_dest.get("status")
-                api_info = geo_data_dest.get("info", "")
-                
-                # 检查是否是频率限制错误
-                if api_status != "1":
-                    if "QPS" in api_info or "LIMIT" in api_info:
-                        _tool_logger.log_api_call("高德地图地理编码API", "失败", f"API调用频率超限: {api_info}")
-                        _tool_logger.log_warning(f"目的地地理编码因API频率限制失败，将使用地址字符串进行路径规划")
-                    else:
-                        _tool_logger.log_api_call("高德地图地理编码API", "失败", f"未找到目的地: {destination} (API返回: {api_info})")
-                elif api_status == "1" and geo_data_dest.get("geocodes"):
-                    location = geo_data_dest["geocodes"][0].get("location", "")
-                    if location:
-                        destination_coord = location  # 格式：经度,纬度
-                        destination_name = geo_data_dest["geocodes"][0].get("formatted_address", destination)
-                        _tool_logger.log_api_call("高德地图地理编码API", "成功", f"获取{destination}坐标: {destination_coord}")
-                else:
-                    _tool_logger.log_api_call("高德地图地理编码API", "失败", f"未找到目的地: {destination} (无geocodes)")
-            else:
-                _tool_logger.log_api_call("高德地图地理编码API", "失败", f"HTTP {geo_response_dest.status_code}")
+            _tool_logger.log_info(f"请求出发地和目的地地理编码: {origin} | {destination}")
+            geocodes = yield from _batch_geocode_steps([origin, destination], api_key)
+            
+            origin_geocode, geo_error = geocodes[origin]
+            if origin_geocode and origin_geocode["location"]:
+                origin_coord = origin_geocode["location"]  # 格式：经度,纬度
+                origin_name = origin_geocode["formatted_address"]
+            elif geo_error and "频率超限" in geo_error:
+                _tool_logger.log_warning(f"出发地地理编码因API频率限制失败，将使用地址字符串进行路径规划")
+            
+            destination_geocode, geo_error = geocodes[destination]
+            if destination_geocode and destination_geocode["location"]:
+                destination_coord = destination_geocode["location"]  # 格式：经度,纬度
+                destination_name = destination_geocode["formatted_address"]
+            elif geo_error and "频率超限" in geo_error:
+                _tool_logger.log_warning(f"目的地地理编码因API频率限制失败，将使用地址字符串进行路径规划")
         except Exception as e:
             # 地理编码失败，继续尝试使用地址字符串
-            _tool_logger.log_api_call("高德地图地理编码API", "异常", f"{destination}: {str(e)[:100]}")
+            _tool_logger.log_api_call("高德地图地理编码API", "异常", f"{origin} | {destination}: {str(e)[:100]}")
         
         # 第二步：使用高德地图路径规划API
-        route_url = "https://restapi.amap.com/v3/direction/driving"
+        route_url = amap_url("/v3/direction/driving")
         
         # 优先使用坐标，如果坐标不可用则使用地址字符串
         route_origin = origin_coord if origin_coord else origin
         route_destination = destination_coord if destination_coord else destination
         
+        strategy = config.get("amap.route.strategy", 0)
+        
+        # 路径规划是最消耗配额的接口：相同起终点（坐标取整后）和策略直接使用缓存结果
+        route_key = route_cache_key(route_origin, route_destination, strategy)
+        cached_route = _route_cache.get(route_key)
+        if cached_route is not None:
+            _tool_logger.log_info(f"路线缓存命中: {origin} -> {destination}（{route_key}）")
+            return cached_route["summary"]
+        
         route_params = {
             "origin": route_origin,
             "destination": route_destination,
             "key": api_key,
+            "strategy": strategy,
             "extensions": "all"  # 返回详细信息，包括过路费
         }
         
         _tool_logger.log_info(f"请求路径规划: {route_origin} -> {route_destination}")
-        route_response = _amap_limiter.get(route_url, params=route_params, timeout=10)
+        route_response = yield _AmapRequest(route_url, route_params, 10)
         if route_response.status_code == 200:
             route_data = route_response.json()
             
@@ -684,6 +1025,13 @@ def _get_driving_route(origin: str, destination: str, api_key: str) -> str:
                     else:
                         result += "- 建议：短途驾驶，适合当日往返\n"
                     
+                    _route_cache.set(route_key, {
+                        "distance": distance,
+                        "duration": duration,
+                        "tolls": tolls,
+                        "toll_distance": toll_distance,
+                        "summary": result,
+                    })
                     _tool_logger.log_api_call("高德地图路径规划API", "成功", f"获取{origin}到{destination}的精确路线")
                     return result
             else:
@@ -831,6 +1179,7 @@ def _estimate_public_transport(origin: str, destination: str, transport_mode: st
     return result
 
 
+@memoize_tool(ttl=86400, normalize={"city": normalize_place})
 @tool
 def get_attraction_ticket_prices(
     city: str,
@@ -849,31 +1198,29 @@ def get_attraction_ticket_prices(
     Returns:
         景点门票价格信息字符串，包括景点名称、地址、电话等。如果API不可用，返回估算信息。
     """
+    return _run_amap_sync(_attraction_ticket_steps(city, attraction_name, interests))
+
+
+def _attraction_ticket_steps(city: str, attraction_name: Optional[str], interests: Optional[str]) -> Generator:
+    """获取景点门票信息的请求步骤（同步和异步版本共用）"""
+    # 接口出错时的错误提示，加在估算结果前面（与自驾路线一致，工具结果记忆据此只在请求范围内复用估算结果）
+    api_error = None
     try:
         # 使用高德地图POI API
         amap_key = os.getenv("AMAP_API_KEY") or config.get("transport.api_key", "")
         
         if amap_key and city:
             try:
-                # 首先通过地理编码API获取城市编码（adcode），v5 API建议使用adcode
-                geo_url = "https://restapi.amap.com/v3/geocode/geo"
-                geo_params = {
-                    "address": city,
-                    "key": amap_key,
-                    "output": "json"
-                }
-                
-                geo_response = _amap_limiter.get(geo_url, params=geo_params, timeout=5)
+                # 首先获取城市编码（adcode），v5 API建议使用adcode（优先使用地理编码缓存）
                 adcode = None
                 city_name = city
-                if geo_response.status_code == 200:
-                    geo_data = geo_response.json()
-                    if geo_data.get("status") == "1" and geo_data.get("geocodes"):
-                        adcode = geo_data["geocodes"][0].get("adcode", "")
-                        city_name = geo_data["geocodes"][0].get("formatted_address", city)
+                geocode, _ = yield from _geocode_steps(city, amap_key)
+                if geocode:
+                    adcode = geocode["adcode"] or None
+                    city_name = geocode["formatted_address"]
                 
                 # 高德地图v5 POI搜索API - 优化关键字搜索策略
-                poi_url = "https://restapi.amap.com/v5/place/text"
+                poi_url = amap_url("/v5/place/text")
                 
                 # 构建搜索关键词：如果指定了景点名称，使用精确搜索；否则结合兴趣偏好
                 if attraction_name:
@@ -913,8 +1260,12 @@ def get_attraction_ticket_prices(
                     "extensions": "all"  # 返回详细信息
                 })
                 
-                poi_response = _amap_limiter.get(poi_url, params=poi_params, timeout=5)
-                if poi_response.status_code == 200:
+                poi_response = yield _AmapRequest(poi_url, poi_params, 5)
+                if poi_response.status_code != 200:
+                    api_error = f"高德地图API请求失败（HTTP {poi_response.status_code}）"
+                    _tool_logger.log_api_call("高德地图POI API (v5)", "失败", f"HTTP {poi_response.status_code}")
+                    _tool_logger.log_fallback("景点信息", f"HTTP请求失败: {poi_response.status_code}，使用智能估算")
+                else:
                     poi_data = poi_response.json()
                     # v5 API成功状态码是 "10000" 或可能有其他格式，兼容处理
                     is_success = (
@@ -977,8 +1328,14 @@ def get_attraction_ticket_prices(
                         
                         result += "提示：以上价格仅供参考，实际门票价格可能因季节、优惠活动等因素有所不同。建议通过官方渠道或携程、去哪儿等平台查询实时价格。"
                         return result
+                    if not is_success:
+                        error_info = poi_data.get("info", "未知错误")
+                        api_error = f"高德地图API返回错误：{error_info}"
+                        _tool_logger.log_api_call("高德地图POI API (v5)", "失败", error_info)
+                        _tool_logger.log_fallback("景点信息", f"API返回错误: {error_info}，使用智能估算")
             except Exception as e:
                 # API调用失败，使用估算
+                api_error = f"高德地图API网络错误：{str(e)[:100]}"
                 _tool_logger.log_api_call("高德地图POI API", "失败", str(e)[:100])
                 _tool_logger.log_fallback("景点信息", "高德地图POI API调用失败，使用智能估算")
         else:
@@ -986,8 +1343,9 @@ def get_attraction_ticket_prices(
             _tool_logger.log_fallback("景点信息", "高德地图POI API密钥未配置，使用智能估算")
         
         # 如果API不可用，使用基于城市和兴趣的估算
-        return _estimate_attraction_tickets(city, attraction_name, interests)
-        
+        estimate_result = _estimate_attraction_tickets(city, attraction_name, interests)
+        return f"{api_error}\n\n{estimate_result}" if api_error else estimate_result
+    
     except Exception as e:
         _tool_logger.log_api_call("景点门票工具", "异常", str(e)[:100])
         _tool_logger.log_fallback("景点信息", f"异常错误: {str(e)[:100]}")
@@ -1059,9 +1417,41 @@ def _estimate_attraction_tickets(city: str, attraction_name: Optional[str], inte
     return result
 
 
+async def aget_weather_info(city: str, date: str) -> str:
+    """get_weather_info 的异步版本，通过异步客户端请求高德地图API，等待期间不占用线程"""
+    return await _run_amap_async(_weather_steps(city, date))
+
+
+async def aget_weather_range(city: str, start_date: str, end_date: str) -> str:
+    """get_weather_range 的异步版本"""
+    return await _run_amap_async(_weather_range_steps(city, start_date, end_date))
+
+
+async def aget_transport_route(origin: str, destination: str, transport_mode: str) -> str:
+    """get_transport_route 的异步版本"""
+    return await _run_amap_async(_transport_route_steps(origin, destination, transport_mode))
+
+
+async def aget_attraction_ticket_prices(
+    city: str,
+    attraction_name: Optional[str] = None,
+    interests: Optional[str] = None
+) -> str:
+    """get_attraction_ticket_prices 的异步版本"""
+    return await _run_amap_async(_attraction_ticket_steps(city, attraction_name, interests))
+
+
+# 为工具绑定异步实现，tool.ainvoke / AgentExecutor.ainvoke 会直接在事件循环中执行，不再占用线程池
+get_weather_info.coroutine = aget_weather_info
+get_weather_range.coroutine = aget_weather_range
+get_transport_route.coroutine = aget_transport_route
+get_attraction_ticket_prices.coroutine = aget_attraction_ticket_prices
+
+
 # 所有工具列表
 TRAVEL_TOOLS = [
     get_weather_info,
+    get_weather_range,
     get_hotel_prices,
     get_transport_route,
     get_attraction_ticket_prices,
@@ -1,21 +1,36 @@
 """智能旅行助手Agent - 主协调Agent"""
-from typing import Optional, List, Callable, Generator
-from langchain_openai import ChatOpenAI
-from langchain.agents import create_openai_tools_agent, AgentExecutor
-from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
+import time
+import uuid
+from typing import Optional, List, Callable, Generator, Tuple
+from langchain.agents import AgentExecutor
 from langchain.memory import ConversationBufferMemory
 from langchain_core.tools import Tool
 from langchain.callbacks.base import BaseCallbackHandler
 from langchain.schema import AgentAction, AgentFinish, LLMResult
-from src.agent.tools import TRAVEL_TOOLS
+from langchain_core.messages import messages_from_dict, messages_to_dict
+from src.agent.budgeted_memory import BudgetedConversationMemory, create_budgeted_memory, estimate_message_tokens
+from src.agent.intent_router import RouteDecision, get_intent_router
+from src.agent.llm_registry import get_shared_agent, get_shared_llm
+from src.agent.parallel_executor import ParallelAgentExecutor
+from src.agent.response_cache import CacheKey, get_response_cache
+from src.agent.event_bus import (
+    ERROR, FINAL, STAGE, TOKEN, TOOL_END, TOOL_START, AgentEvent, AgentEventHandler, EventBus, run_in_background
+)
+from src.agent.streaming import stream_tokens
+from src.agent.structured_plan import build_plan_arguments
+from src.agent.tool_memo import tool_request_scope
+from src.agent.tools import TRAVEL_TOOLS, plan_travel_itinerary
+from src.utils.cancellation import CancellationToken
 from src.agent.specialized_agents import (
     WeatherAgent,
     TransportAgent,
     HotelAgent,
     AttractionAgent,
     PlanningAgent,
-    RecommendationAgent
+    RecommendationAgent,
+    get_specialized_agent
 )
+from src.agent.memory_store import get_memory_store
 from src.config import config
 from src.utils.logger import AgentLogger
 
@@ -37,48 +52,43 @@ class TravelAgent:
         self.travel_info_added_to_conversation = False
         self.last_travel_info_hash = None
         
-        # 初始化专门的Agent实例
+        # 专门Agent的会话历史在记忆存储中的会话ID（未提供session_id时每个实例独立）
+        self.memory_session_id = session_id or uuid.uuid4().hex
+        
+        # 获取专门的Agent（无状态单例，所有会话共用）
         self.logger.log_section("初始化专门的Agent")
-        self.weather_agent = WeatherAgent(verbose=self.verbose)
-        self.transport_agent = TransportAgent(verbose=self.verbose)
-        self.hotel_agent = HotelAgent(verbose=self.verbose)
-        self.attraction_agent = AttractionAgent(verbose=self.verbose)
-        self.planning_agent = PlanningAgent(verbose=self.verbose)
-        self.recommendation_agent = RecommendationAgent(verbose=self.verbose)
+        self.weather_agent = get_specialized_agent(WeatherAgent)
+        self.transport_agent = get_specialized_agent(TransportAgent)
+        self.hotel_agent = get_specialized_agent(HotelAgent)
+        self.attraction_agent = get_specialized_agent(AttractionAgent)
+        self.planning_agent = get_specialized_agent(PlanningAgent)
+        self.recommendation_agent = get_specialized_agent(RecommendationAgent)
         self.logger.log_info("所有专门Agent初始化完成")
         
+        # 意图快速路由（意图明确的天气、酒店、交通问题跳过主协调LLM）
+        self.intent_router = get_intent_router()
+        # 回答缓存（相同或相近的问题直接返回缓存的回答）
+        self.response_cache = get_response_cache()
+        
         # 初始化LLM
-        import os
+        self.llm = self._create_llm()
+        
+        # 创建Agent
+        self.agent_executor = self._create_agent()
+    
+    def _create_llm(self):
+        """获取共享的LLM实例（与专门Agent及其他会话共用客户端和连接池；llm.provider 为 fake 时使用本地脚本化模型）"""
+        if config.llm_provider == "fake":
+            self.logger.log_info("使用本地脚本化模型（llm.provider=fake）")
+            return get_shared_llm()
         
-        # 设置环境变量（ChatOpenAI 会从环境变量读取）
         if not config.openai_api_key:
             raise ValueError("OPENAI_API_KEY 未设置，请在 env 文件中配置API密钥")
         
-        os.environ["OPENAI_API_KEY"] = config.openai_api_key
-        
-        # 构建参数字典，只传递基本参数
-        llm_kwargs = {
-            "model": config.llm_model,
-            "temperature": config.get("llm.temperature", 0.7),
-            "openai_api_key": config.openai_api_key,
-            "timeout": 60,  # 设置60秒超时
-            "max_retries": 2,  # 最多重试2次
-        }
-        
-        # 如果API base不是OpenAI默认值，需要设置
-        if config.openai_api_base and "openai.com" not in config.openai_api_base:
-            os.environ["OPENAI_API_BASE"] = config.openai_api_base
-            llm_kwargs["openai_api_base"] = config.openai_api_base
-        
-        # 添加 max_tokens（如果支持）
-        max_tokens = config.get("llm.max_tokens", 2000)
-        if max_tokens:
-            llm_kwargs["max_tokens"] = max_tokens
-        
         try:
-            self.llm = ChatOpenAI(**llm_kwargs)
-            # 测试LLM是否可用（可选，但会增加初始化时间）
+            llm = get_shared_llm()
             self.logger.log_info("LLM初始化成功")
+            return llm
         except Exception as e:
             error_msg = str(e)
             self.logger.log_error("LLM初始化失败", e)
@@ -90,14 +100,12 @@ class TravelAgent:
                 f"3. 模型名称是否正确（当前: {config.llm_model}）\n"
                 f"4. 网络连接是否正常"
             )
-        
-        # 创建Agent
-        self.agent_executor = self._create_agent()
     
     def _create_agent(self):
         """创建主协调Agent执行器"""
         # 创建调用专门Agent的工具
         agent_tools = self._create_agent_tools()
+        self.agent_tools = {tool.name: tool for tool in agent_tools}
         
         # 系统提示词
         system_prompt = """你是一个专业的智能旅行助手主协调者，负责理解用户需求并调用相应的专门Agent来完成任务。
@@ -134,18 +142,19 @@ class TravelAgent:
 - **必须调用工具**：对于任何需要查询信息的问题，都必须调用相应的专门Agent工具，不能直接回答。只有专门Agent才能获取准确的实时数据。
 - **避免重复调用**：每个专门Agent只需调用一次即可获得完整信息，不要重复调用同一个Agent
 - **综合查询**：当用户需要规划完整行程时，应该：
-  1. 先调用 query_transport_agent 查询交通路线（如果有出发地和目的地）
-  2. 调用 query_weather_agent 查询天气（如果有日期和目的地）
-  3. 调用 query_hotel_agent 查询酒店价格（如果有日期、目的地和酒店偏好）
-  4. 调用 query_attraction_agent 查询景点信息（如果有目的地和兴趣偏好）**注意：只需调用一次，该Agent会返回完整的景点列表**
-  5. 最后调用 query_planning_agent 整合所有信息生成详细行程
+  1. 在同一步中同时调用以下互不依赖的专门Agent（它们会并发执行）：
+     - query_transport_agent 查询交通路线（如果有出发地和目的地）
+     - query_weather_agent 查询天气（如果有日期和目的地）
+     - query_hotel_agent 查询酒店价格（如果有日期、目的地和酒店偏好）
+     - query_attraction_agent 查询景点信息（如果有目的地和兴趣偏好）**注意：只需调用一次，该Agent会返回完整的景点列表**
+  2. 拿到以上结果后，最后调用 query_planning_agent 整合所有信息生成详细行程
 - **直接返回专门Agent的回答**：专门Agent已经根据用户问题的具体程度提供了合适的回答（简洁或详细），直接返回即可，不要添加额外信息
 - **个性化服务**：所有建议都应考虑用户的偏好和需求，提供真正个性化的服务
 - **专业详细**：提供详细、准确、实用的旅行建议，结合实时天气和价格信息
 
 特别注意：
 - 用户可能会提供旅行信息（格式为【用户旅行信息】），包括出发日期、返回日期、出发地（可选）、目的地（可选）、预算、旅店偏好、出行方式、旅行风格和兴趣偏好等
-- **在规划行程前，应该按顺序调用相应的专门Agent查询信息**（如果相关信息可用）
+- **在规划行程前，应该先同时调用相应的专门Agent查询信息**（如果相关信息可用），再调用规划Agent
 - **重要**：对于自驾方式，交通Agent会使用高德地图API精确计算距离和时间，确保使用实际数据而不是估算
 - 如果用户未指定目的地，应根据用户的偏好、预算、旅行天数和兴趣推荐合适的目的地
 - 根据天气情况调整活动建议（如雨天推荐室内活动，晴天推荐户外活动）
@@ -155,63 +164,116 @@ class TravelAgent:
 
 回答要友好、专业，直接返回专门Agent的回答，不要添加额外信息。"""
         
-        # 创建提示模板
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", system_prompt),
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("human", "{input}"),
-            MessagesPlaceholder(variable_name="agent_scratchpad"),
-        ])
-        
-        # 创建Agent（使用专门Agent工具）
-        agent = create_openai_tools_agent(
-            llm=self.llm,
-            tools=agent_tools,
-            prompt=prompt
-        )
+        # 获取共享的Agent（提示词和工具绑定只构建一次，所有会话复用；工具调用仍由本实例的执行器执行）
+        agent = get_shared_agent("TravelAgent", self.llm, agent_tools, system_prompt)
         
         # 创建内存（如果启用）
-        memory = None
-        if self.enable_memory:
-            memory = ConversationBufferMemory(
-                memory_key="chat_history",
-                return_messages=True
-            )
+        memory = self._create_memory() if self.enable_memory else None
         
         # 创建Agent执行器
         # 关闭LangChain的verbose输出，使用我们自己的日志系统
-        agent_executor = AgentExecutor(
+        # 启用并行执行时，同一步中互不依赖的专门Agent调用并发执行
+        executor_options = {}
+        if config.get("agent.parallel_tools.enabled", True):
+            executor_class = ParallelAgentExecutor
+            executor_options["sequential_tools"] = config.get(
+                "agent.parallel_tools.sequential_tools", ["query_planning_agent"]
+            )
+        else:
+            executor_class = AgentExecutor
+        agent_executor = executor_class(
             agent=agent,
             tools=agent_tools,
             memory=memory,
             verbose=False,  # 关闭LangChain的详细输出，避免与我们的日志重复
             max_iterations=config.get("agent.max_iterations", 15),  # 增加迭代次数，因为需要调用多个agent
-            handle_parsing_errors=True
+            handle_parsing_errors=True,
+            **executor_options
         )
         
         return agent_executor
     
-    def _create_agent_tools(self):
-        """创建调用专门Agent的工具"""
-        tools = []
+    def _create_memory(self):
+        """
+        创建主协调Agent的对话记忆（agent.memory.mode）
         
-        # 天气Agent工具
-        def call_weather_agent(query: str) -> str:
-            self.logger.log_agent_call_start("天气Agent (WeatherAgent)", query)
+        - budgeted: 最近几轮保留原文，较早的对话压缩为摘要，限制每次请求的历史token数
+        - buffer: 每轮发送完整历史
+        """
+        if config.get("agent.memory.mode", "budgeted") == "buffer":
+            return ConversationBufferMemory(
+                memory_key="chat_history",
+                return_messages=True
+            )
+        return create_budgeted_memory(llm=self.llm)
+    
+    def get_memory_report(self) -> dict:
+        """
+        获取最近一轮对话历史的token统计
+        
+        Returns:
+            发送的历史token数（prompt_tokens）、完整历史token数（history_tokens）、本轮节省的token数（tokens_saved）等
+        """
+        memory = self.agent_executor.memory
+        if isinstance(memory, BudgetedConversationMemory):
+            return memory.report()
+        if memory:
+            tokens = estimate_message_tokens(memory.chat_memory.messages)
+            return {"mode": "buffer", "prompt_tokens": tokens, "history_tokens": tokens, "tokens_saved": 0}
+        return {}
+    
+    def _create_agent_caller(self, agent_name: str, agent) -> tuple:
+        """
+        创建调用专门Agent的同步和异步函数（记录调用开始/结束日志）
+        
+        Args:
+            agent_name: 日志中显示的Agent名称
+            agent: 专门Agent实例
+        
+        Returns:
+            (同步调用函数, 异步调用函数)
+        """
+        def log_failure(e: Exception):
+            error_msg = str(e)
+            if len(error_msg) > 150:
+                error_msg = error_msg[:150] + "..."
+            self.logger.log_agent_call_end(agent_name, success=False, error=error_msg)
+        
+        def call_agent(query: str) -> str:
+            self.logger.log_agent_call_start(agent_name, query)
+            try:
+                result = agent.query(query, session_id=self.memory_session_id)
+                self.logger.log_agent_call_end(agent_name, success=True, response_length=len(result))
+                return result
+            except Exception as e:
+                log_failure(e)
+                raise
+        
+        async def acall_agent(query: str) -> str:
+            self.logger.log_agent_call_start(agent_name, query)
             try:
-                result = self.weather_agent.query(query)
-                self.logger.log_agent_call_end("天气Agent (WeatherAgent)", success=True, response_length=len(result))
+                result = await agent.aquery(query, session_id=self.memory_session_id)
+                self.logger.log_agent_call_end(agent_name, success=True, response_length=len(result))
                 return result
             except Exception as e:
-                error_msg = str(e)
-                if len(error_msg) > 150:
-                    error_msg = error_msg[:150] + "..."
-                self.logger.log_agent_call_end("天气Agent (WeatherAgent)", success=False, error=error_msg)
+                log_failure(e)
                 raise
         
+        return call_agent, acall_agent
+    
+    def _create_agent_tools(self):
+        """创建调用专门Agent的工具"""
+        tools = []
+        
+        # 天气Agent工具
+        call_weather_agent, acall_weather_agent = self._create_agent_caller(
+            "天气Agent (WeatherAgent)", self.weather_agent
+        )
+        
         tools.append(Tool(
             name="query_weather_agent",
             func=call_weather_agent,
+            coroutine=acall_weather_agent,
             description="""查询天气信息的专门Agent。当用户询问天气、需要根据天气调整行程时使用。
 
 使用场景：
@@ -226,102 +288,62 @@ class TravelAgent:
         ))
         
         # 交通Agent工具
-        def call_transport_agent(query: str) -> str:
-            self.logger.log_agent_call_start("交通Agent (TransportAgent)", query)
-            try:
-                result = self.transport_agent.query(query)
-                self.logger.log_agent_call_end("交通Agent (TransportAgent)", success=True, response_length=len(result))
-                return result
-            except Exception as e:
-                error_msg = str(e)
-                if len(error_msg) > 150:
-                    error_msg = error_msg[:150] + "..."
-                self.logger.log_agent_call_end("交通Agent (TransportAgent)", success=False, error=error_msg)
-                raise
+        call_transport_agent, acall_transport_agent = self._create_agent_caller(
+            "交通Agent (TransportAgent)", self.transport_agent
+        )
         
         tools.append(Tool(
             name="query_transport_agent",
             func=call_transport_agent,
+            coroutine=acall_transport_agent,
             description="查询交通路线信息的专门Agent。当用户询问交通路线、距离、时间、费用时使用。对于自驾方式，会使用高德地图API精确计算。输入应该包含出发地、目的地和出行方式。"
         ))
         
         # 酒店Agent工具
-        def call_hotel_agent(query: str) -> str:
-            self.logger.log_agent_call_start("酒店Agent (HotelAgent)", query)
-            try:
-                result = self.hotel_agent.query(query)
-                self.logger.log_agent_call_end("酒店Agent (HotelAgent)", success=True, response_length=len(result))
-                return result
-            except Exception as e:
-                error_msg = str(e)
-                if len(error_msg) > 150:
-                    error_msg = error_msg[:150] + "..."
-                self.logger.log_agent_call_end("酒店Agent (HotelAgent)", success=False, error=error_msg)
-                raise
+        call_hotel_agent, acall_hotel_agent = self._create_agent_caller(
+            "酒店Agent (HotelAgent)", self.hotel_agent
+        )
         
         tools.append(Tool(
             name="query_hotel_agent",
             func=call_hotel_agent,
+            coroutine=acall_hotel_agent,
             description="查询酒店价格信息的专门Agent。当用户询问酒店价格、住宿预算时使用。输入应该包含城市、入住日期、退房日期和酒店偏好。"
         ))
         
         # 景点Agent工具
-        def call_attraction_agent(query: str) -> str:
-            self.logger.log_agent_call_start("景点Agent (AttractionAgent)", query)
-            try:
-                result = self.attraction_agent.query(query)
-                self.logger.log_agent_call_end("景点Agent (AttractionAgent)", success=True, response_length=len(result))
-                return result
-            except Exception as e:
-                error_msg = str(e)
-                if len(error_msg) > 150:
-                    error_msg = error_msg[:150] + "..."
-                self.logger.log_agent_call_end("景点Agent (AttractionAgent)", success=False, error=error_msg)
-                raise
+        call_attraction_agent, acall_attraction_agent = self._create_agent_caller(
+            "景点Agent (AttractionAgent)", self.attraction_agent
+        )
         
         tools.append(Tool(
             name="query_attraction_agent",
             func=call_attraction_agent,
+            coroutine=acall_attraction_agent,
             description="查询景点信息的专门Agent。当用户询问景点门票、景点信息、景点问答、景点推荐时使用。输入应该包含城市名称和可选的景点名称或兴趣偏好（如历史、文化、美食等）。该Agent会查询并返回完整的景点列表信息，包括景点名称、地址、区域、人均消费等。"
         ))
         
         # 规划Agent工具
-        def call_planning_agent(query: str) -> str:
-            self.logger.log_agent_call_start("规划Agent (PlanningAgent)", query)
-            try:
-                result = self.planning_agent.query(query)
-                self.logger.log_agent_call_end("规划Agent (PlanningAgent)", success=True, response_length=len(result))
-                return result
-            except Exception as e:
-                error_msg = str(e)
-                if len(error_msg) > 150:
-                    error_msg = error_msg[:150] + "..."
-                self.logger.log_agent_call_end("规划Agent (PlanningAgent)", success=False, error=error_msg)
-                raise
+        call_planning_agent, acall_planning_agent = self._create_agent_caller(
+            "规划Agent (PlanningAgent)", self.planning_agent
+        )
         
         tools.append(Tool(
             name="query_planning_agent",
             func=call_planning_agent,
+            coroutine=acall_planning_agent,
             description="规划旅行行程的专门Agent。当用户需要规划详细行程时使用。该Agent会整合天气、酒店、交通、景点等信息。输入应该包含旅行天数、目的地、预算、偏好等信息。"
         ))
         
         # 推荐Agent工具
-        def call_recommendation_agent(query: str) -> str:
-            self.logger.log_agent_call_start("推荐Agent (RecommendationAgent)", query)
-            try:
-                result = self.recommendation_agent.query(query)
-                self.logger.log_agent_call_end("推荐Agent (RecommendationAgent)", success=True, response_length=len(result))
-                return result
-            except Exception as e:
-                error_msg = str(e)
-                if len(error_msg) > 150:
-                    error_msg = error_msg[:150] + "..."
-                self.logger.log_agent_call_end("推荐Agent (RecommendationAgent)", success=False, error=error_msg)
-                raise
+        call_recommendation_agent, acall_recommendation_agent = self._create_agent_caller(
+            "推荐Agent (RecommendationAgent)", self.recommendation_agent
+        )
         
         tools.append(Tool(
             name="query_recommendation_agent",
             func=call_recommendation_agent,
+            coroutine=acall_recommendation_agent,
             description="提供个性化推荐的专门Agent。当用户需要推荐目的地、景点、活动时使用。输入应该包含目的地、兴趣偏好、旅行风格等信息。"
         ))
         
@@ -338,70 +360,280 @@ class TravelAgent:
             Agent的回复
         """
         try:
-            # 检查旅行信息是否变化
-            import hashlib
-            travel_info_str = str(sorted(self.travel_info.items()))
-            current_travel_info_hash = hashlib.md5(travel_info_str.encode()).hexdigest()
-            
-            # 如果旅行信息变化了，或者还没有添加到对话中，则添加
-            # 否则直接使用用户输入，避免重复添加旅行信息
-            if self.travel_info and (not self.travel_info_added_to_conversation or current_travel_info_hash != self.last_travel_info_hash):
-                travel_context = self._format_travel_info()
-                combined_input = f"{travel_context}\n\n用户问题: {user_input}"
-                self.travel_info_added_to_conversation = True
-                self.last_travel_info_hash = current_travel_info_hash
-            else:
-                # 旅行信息已经添加过且未变化，直接使用用户输入
-                # ConversationBufferMemory会自动管理历史对话
-                combined_input = user_input
-            
-            # 记录主协调Agent的调用
-            self.logger.log_section("主协调Agent处理用户请求")
-            self.logger.log_info(f"用户输入: {user_input[:200]}{'...' if len(user_input) > 200 else ''}")
-            if self.travel_info:
-                self.logger.log_info(f"旅行信息: {list(self.travel_info.keys())}")
-            
-            # 调用Agent执行器（ConversationBufferMemory会自动包含历史对话）
-            response = self.agent_executor.invoke({"input": combined_input})
-            output = response.get("output", "抱歉，我无法处理您的请求。")
-            
-            self.logger.log_info(f"主协调Agent响应完成，输出长度: {len(output)} 字符")
-            
-            # 检查输出是否包含错误信息
-            if "错误" in output or "error" in output.lower() or "❌" in output:
-                # 提供更详细的错误诊断
-                error_lower = output.lower()
-                if "connection" in error_lower or "connect" in error_lower:
-                    return "❌ 连接错误：无法连接到AI服务。\n\n可能的原因：\n1. API密钥未配置或配置错误\n2. 网络连接问题\n3. API服务暂时不可用\n\n请检查您的API配置和网络连接。"
-                elif "api" in error_lower and "key" in error_lower:
-                    return "❌ API密钥错误：请检查您的API密钥是否正确配置。\n\n请在 env 文件中设置正确的 OPENAI_API_KEY。"
-                elif "rate limit" in error_lower or "quota" in error_lower:
-                    return "❌ API配额不足：您的API调用次数已用完或达到限制。\n\n请检查您的API账户余额或等待限制重置。"
-            
-            return output
+            with tool_request_scope():
+                combined_input = self._prepare_input(user_input)
+                cache_key, output = self.get_cached_response(user_input, combined_input)
+                if output is not None:
+                    return output
+                
+                output = self.try_fast_path(user_input, combined_input)
+                if output is None:
+                    # 调用Agent执行器（对话记忆会自动包含历史对话）
+                    started = time.perf_counter()
+                    response = self.agent_executor.invoke({"input": combined_input})
+                    self._record_llm_path(started)
+                    output = self._finalize_output(response)
+                self.cache_response(cache_key, output)
+                return output
         except Exception as e:
-            import traceback
-            error_str = str(e).lower()
-            error_trace = traceback.format_exc()
-            
-            # 简化错误信息
-            error_msg = str(e)
-            if len(error_msg) > 200:
-                error_msg = error_msg[:200] + "..."
-            self.logger.log_error("主协调Agent执行错误", Exception(error_msg))
-            # 只在详细模式下输出堆栈信息
-            if self.verbose and "timeout" not in error_msg.lower() and "connection" not in error_msg.lower():
-                print(f"   详细堆栈:\n{error_trace}", flush=True)
-            
-            # 根据错误类型提供友好的错误信息
-            if "connection" in error_str or "connect" in error_str:
-                return "❌ 连接错误：无法连接到AI服务。\n\n请检查：\n1. 网络连接是否正常\n2. API服务地址是否正确\n3. 防火墙或代理设置\n\n详细错误: " + str(e)
-            elif "api" in error_str and ("key" in error_str or "auth" in error_str):
-                return "❌ 认证错误：API密钥无效或未配置。\n\n请在 env 文件中设置正确的 OPENAI_API_KEY。\n\n详细错误: " + str(e)
-            elif "timeout" in error_str:
-                return "❌ 请求超时：AI服务响应时间过长。\n\n请稍后重试，或检查网络连接。\n\n详细错误: " + str(e)
-            else:
-                return f"❌ 处理您的请求时出现错误: {str(e)}\n\n如果问题持续，请检查API配置和网络连接。\n\n错误类型: {type(e).__name__}"
+            return self._format_error(e)
+    
+    async def achat(self, user_input: str) -> str:
+        """
+        异步与用户对话，专门Agent及其工具通过异步实现执行，等待外部API时不占用线程
+        
+        Args:
+            user_input: 用户输入
+        
+        Returns:
+            Agent的回复
+        """
+        try:
+            with tool_request_scope():
+                combined_input = self._prepare_input(user_input)
+                cache_key, output = self.get_cached_response(user_input, combined_input)
+                if output is not None:
+                    return output
+                
+                output = await self.atry_fast_path(user_input, combined_input)
+                if output is None:
+                    started = time.perf_counter()
+                    response = await self.agent_executor.ainvoke({"input": combined_input})
+                    self._record_llm_path(started)
+                    output = self._finalize_output(response)
+                self.cache_response(cache_key, output)
+                return output
+        except Exception as e:
+            return self._format_error(e)
+    
+    def get_cached_response(self, user_input: str, combined_input: str) -> Tuple[Optional[CacheKey], Optional[str]]:
+        """
+        查询回答缓存，命中时把本轮对话写入对话记忆
+        
+        Args:
+            user_input: 用户输入
+            combined_input: _prepare_input() 构建的输入
+        
+        Returns:
+            (缓存键, 缓存的回答)；未启用缓存或问题不适合缓存时缓存键为None，未命中时回答为None
+        """
+        if not self.response_cache:
+            return None, None
+        cache_key = self.response_cache.resolve(user_input, self.travel_info)
+        output = self.response_cache.get(cache_key)
+        if output is not None:
+            self.logger.log_info(f"回答缓存命中，跳过Agent执行（输出长度: {len(output)} 字符）")
+            if self.agent_executor.memory:
+                self.agent_executor.memory.save_context({"input": combined_input}, {"output": output})
+        return cache_key, output
+    
+    def cache_response(self, cache_key: Optional[CacheKey], output: str):
+        """缓存本轮回答（cache_key 为 get_cached_response() 返回的缓存键）"""
+        if self.response_cache and cache_key is not None:
+            self.response_cache.set(cache_key, output)
+    
+    def _fast_path_decision(self, user_input: str) -> Optional[RouteDecision]:
+        """判断是否可以跳过主协调LLM（返回None表示交给主协调Agent）"""
+        if not self.intent_router:
+            return None
+        decision = self.intent_router.route(user_input, self.travel_info)
+        if not decision.intent or decision.tool_name not in self.agent_tools:
+            return None
+        self.logger.log_info(
+            f"快速路由: {decision.intent}（置信度 {decision.confidence:.2f}），直接调用 {decision.tool_name}，跳过主协调LLM"
+        )
+        return decision
+    
+    @staticmethod
+    def _fast_path_query(decision: RouteDecision, user_input: str, combined_input: str) -> str:
+        """发送给专门Agent的问题（保留附加的旅行信息上下文，用户问题替换为补充了日期和城市的版本）"""
+        if combined_input == user_input or not combined_input.endswith(user_input):
+            return decision.query
+        return combined_input[:-len(user_input)] + decision.query
+    
+    @staticmethod
+    def _notify_agent_action(tool_name: str, query: str, log: str, callbacks: Optional[list]):
+        """通知回调即将调用专门Agent（与主协调Agent选择工具时的回调一致，用于前端进度提示和测试统计）"""
+        action = AgentAction(tool=tool_name, tool_input=query, log=log)
+        for handler in callbacks or []:
+            handler.on_agent_action(action, run_id=uuid.uuid4())
+    
+    def _finish_fast_path(self, decision: RouteDecision, combined_input: str, output: Optional[str],
+                          started: float) -> Optional[str]:
+        """保存快速路径的对话并记录统计（output 为None表示快速路径失败，退回主协调Agent）"""
+        self.intent_router.record(decision, time.perf_counter() - started, fast_path_failed=output is None)
+        if output is not None and self.agent_executor.memory:
+            self.agent_executor.memory.save_context({"input": combined_input}, {"output": output})
+        return output
+    
+    def try_fast_path(self, user_input: str, combined_input: str, callbacks: Optional[list] = None) -> Optional[str]:
+        """
+        意图明确时直接调用对应的专门Agent（跳过主协调LLM的一次往返）
+        
+        Args:
+            user_input: 用户输入
+            combined_input: _prepare_input() 构建的输入
+            callbacks: 回调处理器列表
+        
+        Returns:
+            专门Agent的回答；不适合快速路径或执行失败时返回None，由调用方交给主协调Agent
+        """
+        decision = self._fast_path_decision(user_input)
+        if decision is None:
+            return None
+        started = time.perf_counter()
+        query = self._fast_path_query(decision, user_input, combined_input)
+        try:
+            self._notify_agent_action(decision.tool_name, query, f"快速路由: {decision.reason}", callbacks)
+            output = self.agent_tools[decision.tool_name].run(query, callbacks=callbacks)
+        except Exception as e:
+            self.logger.log_warning(f"快速路由执行失败，改由主协调Agent处理: {str(e)[:150]}")
+            output = None
+        return self._finish_fast_path(decision, combined_input, output, started)
+    
+    async def atry_fast_path(self, user_input: str, combined_input: str,
+                             callbacks: Optional[list] = None) -> Optional[str]:
+        """try_fast_path() 的异步版本"""
+        decision = self._fast_path_decision(user_input)
+        if decision is None:
+            return None
+        started = time.perf_counter()
+        query = self._fast_path_query(decision, user_input, combined_input)
+        try:
+            self._notify_agent_action(decision.tool_name, query, f"快速路由: {decision.reason}", callbacks)
+            output = await self.agent_tools[decision.tool_name].arun(query, callbacks=callbacks)
+        except Exception as e:
+            self.logger.log_warning(f"快速路由执行失败，改由主协调Agent处理: {str(e)[:150]}")
+            output = None
+        return self._finish_fast_path(decision, combined_input, output, started)
+    
+    def plan_from_travel_info(self, user_request: str, callbacks: Optional[list] = None,
+                              combined_input: Optional[str] = None) -> Optional[str]:
+        """
+        结构化行程规划：旅行信息包含目的地和出发/返回日期时，直接根据旅行信息构建工具参数，
+        由 plan_travel_itinerary 并发查询交通、天气、酒店、景点信息，最后只调用一次规划Agent的LLM生成行程
+        
+        Args:
+            user_request: 用户的规划请求
+            callbacks: 回调处理器列表（收到与调用规划Agent相同的开始/完成通知）
+            combined_input: _prepare_input() 的结果（写入对话记忆；附加了旅行信息上下文时，
+                后续对话才能沿用出发日期、出发地和偏好），默认为 user_request
+        
+        Returns:
+            行程规划；旅行信息不完整、未启用或执行失败时返回None，由调用方交给主协调Agent
+        """
+        if not config.get("agent.structured_plan.enabled", True):
+            return None
+        arguments = build_plan_arguments(self.travel_info, self.memory_session_id)
+        if arguments is None:
+            return None
+        
+        self.logger.log_section("结构化行程规划（跳过工具选择，只调用一次规划LLM）")
+        self._notify_agent_action("query_planning_agent", user_request, "结构化规划", callbacks)
+        try:
+            with tool_request_scope():
+                plan_prompt = plan_travel_itinerary.invoke(arguments)
+            output = self.planning_agent.synthesize(plan_prompt, request=user_request, session_id=self.memory_session_id)
+        except Exception as e:
+            self.logger.log_warning(f"结构化规划失败，改由主协调Agent处理: {str(e)[:150]}")
+            return None
+        
+        for handler in callbacks or []:
+            handler.on_tool_end(output, run_id=uuid.uuid4())
+        if self.agent_executor.memory:
+            self.agent_executor.memory.save_context({"input": combined_input or user_request}, {"output": output})
+        self.logger.log_info(f"结构化规划完成，输出长度: {len(output)} 字符")
+        return output
+    
+    def _record_llm_path(self, started: float):
+        """记录经主协调LLM路由的对话耗时（用于估算快速路径节省的时间）"""
+        if self.intent_router:
+            self.intent_router.record(RouteDecision(), time.perf_counter() - started)
+    
+    def _prepare_input(self, user_input: str) -> str:
+        """
+        构建发送给主协调Agent的输入（旅行信息变化时附加旅行信息上下文）
+        
+        Args:
+            user_input: 用户输入
+        
+        Returns:
+            Agent执行器的输入文本
+        """
+        # 检查旅行信息是否变化
+        import hashlib
+        travel_info_str = str(sorted(self.travel_info.items()))
+        current_travel_info_hash = hashlib.md5(travel_info_str.encode()).hexdigest()
+        
+        # 如果旅行信息变化了，或者还没有添加到对话中，则添加
+        # 否则直接使用用户输入，避免重复添加旅行信息
+        if self.travel_info and (not self.travel_info_added_to_conversation or current_travel_info_hash != self.last_travel_info_hash):
+            travel_context = self._format_travel_info()
+            combined_input = f"{travel_context}\n\n用户问题: {user_input}"
+            self.travel_info_added_to_conversation = True
+            self.last_travel_info_hash = current_travel_info_hash
+        else:
+            # 旅行信息已经添加过且未变化，直接使用用户输入
+            # 对话记忆会自动管理历史对话
+            combined_input = user_input
+        
+        # 记录主协调Agent的调用
+        self.logger.log_section("主协调Agent处理用户请求")
+        self.logger.log_info(f"用户输入: {user_input[:200]}{'...' if len(user_input) > 200 else ''}")
+        if self.travel_info:
+            self.logger.log_info(f"旅行信息: {list(self.travel_info.keys())}")
+        
+        return combined_input
+    
+    def _finalize_output(self, response: dict) -> str:
+        """从Agent执行器的结果中提取回复，并将常见错误转换为友好提示"""
+        output = response.get("output", "抱歉，我无法处理您的请求。")
+        
+        self.logger.log_info(f"主协调Agent响应完成，输出长度: {len(output)} 字符")
+        report = self.get_memory_report()
+        if report.get("mode") == "budgeted":
+            self.logger.log_info(
+                f"对话历史: 发送约 {report.get('prompt_tokens', 0)} tokens，"
+                f"完整历史约 {report.get('history_tokens', 0)} tokens，节省 {report.get('tokens_saved', 0)} tokens"
+            )
+        
+        # 检查输出是否包含错误信息
+        if "错误" in output or "error" in output.lower() or "❌" in output:
+            # 提供更详细的错误诊断
+            error_lower = output.lower()
+            if "connection" in error_lower or "connect" in error_lower:
+                return "❌ 连接错误：无法连接到AI服务。\n\n可能的原因：\n1. API密钥未配置或配置错误\n2. 网络连接问题\n3. API服务暂时不可用\n\n请检查您的API配置和网络连接。"
+            elif "api" in error_lower and "key" in error_lower:
+                return "❌ API密钥错误：请检查您的API密钥是否正确配置。\n\n请在 env 文件中设置正确的 OPENAI_API_KEY。"
+            elif "rate limit" in error_lower or "quota" in error_lower:
+                return "❌ API配额不足：您的API调用次数已用完或达到限制。\n\n请检查您的API账户余额或等待限制重置。"
+        
+        return output
+    
+    def _format_error(self, e: Exception) -> str:
+        """记录主协调Agent的执行错误，并返回友好的错误信息"""
+        import traceback
+        error_str = str(e).lower()
+        error_trace = traceback.format_exc()
+        
+        # 简化错误信息
+        error_msg = str(e)
+        if len(error_msg) > 200:
+            error_msg = error_msg[:200] + "..."
+        self.logger.log_error("主协调Agent执行错误", Exception(error_msg))
+        # 只在详细模式下输出堆栈信息
+        if self.verbose and "timeout" not in error_msg.lower() and "connection" not in error_msg.lower():
+            print(f"   详细堆栈:\n{error_trace}", flush=True)
+        
+        # 根据错误类型提供友好的错误信息
+        if "connection" in error_str or "connect" in error_str:
+            return "❌ 连接错误：无法连接到AI服务。\n\n请检查：\n1. 网络连接是否正常\n2. API服务地址是否正确\n3. 防火墙或代理设置\n\n详细错误: " + str(e)
+        elif "api" in error_str and ("key" in error_str or "auth" in error_str):
+            return "❌ 认证错误：API密钥无效或未配置。\n\n请在 env 文件中设置正确的 OPENAI_API_KEY。\n\n详细错误: " + str(e)
+        elif "timeout" in error_str:
+            return "❌ 请求超时：AI服务响应时间过长。\n\n请稍后重试，或检查网络连接。\n\n详细错误: " + str(e)
+        else:
+            return f"❌ 处理您的请求时出现错误: {str(e)}\n\n如果问题持续，请检查API配置和网络连接。\n\n错误类型: {type(e).__name__}"
     
     def _format_travel_info(self) -> str:
         """
@@ -472,108 +704,119 @@ class TravelAgent:
     
     def chat_stream(self, user_input: str, on_tool_call: Optional[Callable[[str, str], None]] = None) -> Generator[str, None, None]:
         """
-        流式对话，支持实时返回工具执行结果
+        流式对话：最终回答的LLM token生成后立即输出，工具执行进度通过 on_tool_call 实时返回
+        
+        Agent在后台线程中执行；走主协调Agent时输出主协调LLM的回答，走快速路径时输出专门Agent的回答。
+        调用方在回答完成前停止迭代时取消运行，Agent不再继续调用LLM和API。
         
         Args:
             user_input: 用户输入
             on_tool_call: 工具调用回调函数，参数为(tool_name, result)
             
         Yields:
-            生成的文本片段
+            生成的文本片段（LLM未开启流式时一次性输出完整回答）
         """
+        bus = EventBus()
+        if on_tool_call:
+            def report_tool(event: AgentEvent):
+                if event.type == TOOL_START:
+                    on_tool_call(event.data["tool"], event.data["message"])
+                elif event.type == TOOL_END:
+                    on_tool_call(event.data["tool"], f"{event.data['message']}：{event.data['summary']}")
+            bus.subscribe(report_tool)
+        handler = AgentEventHandler(bus)
+        
+        def run() -> str:
+            combined_input = self._prepare_input(user_input)
+            cache_key, output = self.get_cached_response(user_input, combined_input)
+            if output is None:
+                with stream_tokens(handler), tool_request_scope():
+                    output = self.try_fast_path(user_input, combined_input, callbacks=[handler])
+                    if output is None:
+                        bus.publish(STAGE, stage="coordinator")
+                        started = time.perf_counter()
+                        response = self.agent_executor.invoke({"input": combined_input}, config={"callbacks": [handler]})
+                        self._record_llm_path(started)
+                        output = self._finalize_output(response)
+                self.cache_response(cache_key, output)
+            return output
+        
+        token = CancellationToken()
+        run_in_background(bus, run, token)
+        
+        # 只输出一个片段的token（主协调Agent执行时为主协调LLM的回答，否则为专门Agent的回答），
+        # 避免专门Agent的回答和主协调Agent转述的回答重复输出
+        source, segment, streamed = "agent", None, ""
+        finished = False
         try:
-            # 准备输入（与chat方法相同）
-            import hashlib
-            travel_info_str = str(sorted(self.travel_info.items()))
-            current_travel_info_hash = hashlib.md5(travel_info_str.encode()).hexdigest()
-            
-            if self.travel_info and (not self.travel_info_added_to_conversation or current_travel_info_hash != self.last_travel_info_hash):
-                travel_context = self._format_travel_info()
-                combined_input = f"{travel_context}\n\n用户问题: {user_input}"
-                self.travel_info_added_to_conversation = True
-                self.last_travel_info_hash = current_travel_info_hash
-            else:
-                combined_input = user_input
-            
-            # 创建流式回调处理器
-            class StreamCallbackHandler(BaseCallbackHandler):
-                def __init__(self):
-                    self.current_tool = None
-                    self.tool_output = None
-                    
-                def on_agent_action(self, action: AgentAction, **kwargs) -> None:
-                    """工具调用开始"""
-                    self.current_tool = action.tool
-                    self.tool_output = None
-                    tool_name = action.tool
-                    # 识别工具名称，发送友好的提示
-                    tool_names = {
-                        "query_weather_agent": "天气查询",
-                        "query_transport_agent": "交通路线",
-                        "query_hotel_agent": "酒店价格",
-                        "query_attraction_agent": "景点信息",
-                        "query_planning_agent": "行程规划",
-                        "query_recommendation_agent": "个性化推荐"
-                    }
-                    friendly_name = tool_names.get(tool_name, tool_name)
-                    if on_tool_call:
-                        on_tool_call(tool_name, f"正在查询{friendly_name}...")
-                    
-                def on_tool_end(self, output: str, **kwargs) -> None:
-                    """工具执行完成"""
-                    if self.current_tool and on_tool_call:
-                        tool_names = {
-                            "query_weather_agent": "天气",
-                            "query_transport_agent": "交通路线",
-                            "query_hotel_agent": "酒店价格",
-                            "query_attraction_agent": "景点信息",
-                            "query_planning_agent": "行程规划",
-                            "query_recommendation_agent": "推荐"
-                        }
-                        friendly_name = tool_names.get(self.current_tool, self.current_tool)
-                        # 提取关键信息（简化输出）
-                        if len(output) > 200:
-                            summary = output[:200] + "..."
-                        else:
-                            summary = output
-                        on_tool_call(self.current_tool, f"✓ {friendly_name}查询完成：{summary}")
-                        self.current_tool = None
-                        
-            callback = StreamCallbackHandler()
-            
-            # 使用流式执行（如果支持）
-            # 注意：AgentExecutor.invoke不支持流式，我们需要使用stream或astream
-            try:
-                # 尝试使用astream方法（异步流式）
-                # 对于同步调用，我们只能通过回调获取工具执行信息
-                # 实际的流式输出需要使用不同的方法
-                response = self.agent_executor.invoke(
-                    {"input": combined_input},
-                    config={"callbacks": [callback]}
-                )
-                output = response.get("output", "抱歉，我无法处理您的请求。")
-                
-                # 返回完整输出（这里无法真正流式输出LLM的token，但可以返回工具执行进度）
-                yield output
-                
-            except Exception as e:
-                # 如果流式失败，回退到普通方法
-                response = self.agent_executor.invoke({"input": combined_input})
-                output = response.get("output", "抱歉，我无法处理您的请求。")
-                yield output
-                
-        except Exception as e:
-            error_msg = str(e)
-            if len(error_msg) > 200:
-                error_msg = error_msg[:200] + "..."
-            yield f"❌ 处理您的请求时出现错误: {error_msg}"
+            for event in bus.events():
+                if event.type == STAGE:
+                    source, segment = event.data["stage"], None
+                elif event.type == TOKEN:
+                    if event.data["source"] != source or (segment is not None and event.data["segment"] != segment):
+                        continue
+                    segment = event.data["segment"]
+                    streamed += event.data["token"]
+                    yield event.data["token"]
+                elif event.type == ERROR:
+                    finished = True
+                    yield f"❌ 处理您的请求时出现错误: {event.data['error']}"
+                    return
+                elif event.type == FINAL:
+                    finished = True
+                    output = event.data["message"]
+                    # 未流式输出（LLM未开启流式）或只输出了一部分时，补齐剩余的回答
+                    if not streamed:
+                        yield output
+                    elif output.startswith(streamed) and len(output) > len(streamed):
+                        yield output[len(streamed):]
+                    return
+        finally:
+            # 调用方提前停止迭代时取消运行，后续事件不再进入队列
+            if not finished:
+                token.cancel("调用方停止读取回答")
+            bus.close()
     
     def reset_memory(self):
-        """重置对话记忆和旅行信息"""
+        """重置对话记忆（包括专门Agent的会话历史）和旅行信息"""
         if self.agent_executor.memory:
             self.agent_executor.memory.clear()
+        get_memory_store().clear(self.memory_session_id)
         # 重置旅行信息
         self.travel_info = {}
         self.travel_info_added_to_conversation = False
         self.last_travel_info_hash = None
-
+    
+    def export_state(self) -> dict:
+        """
+        导出会话状态（旅行信息和主Agent的对话历史），用于Agent被回收后按需恢复
+        
+        Returns:
+            可JSON序列化的状态字典
+        """
+        memory = self.agent_executor.memory
+        return {
+            "memory_session_id": self.memory_session_id,
+            "travel_info": self.travel_info,
+            "travel_info_added_to_conversation": self.travel_info_added_to_conversation,
+            "last_travel_info_hash": self.last_travel_info_hash,
+            "chat_history": messages_to_dict(memory.chat_memory.messages) if memory else [],
+            "memory_summary": memory.export_state() if isinstance(memory, BudgetedConversationMemory) else {},
+        }
+    
+    def restore_state(self, state: dict):
+        """
+        恢复 export_state() 导出的会话状态
+        
+        Args:
+            state: 状态字典
+        """
+        self.memory_session_id = state.get("memory_session_id") or self.memory_session_id
+        self.travel_info = state.get("travel_info") or {}
+        self.travel_info_added_to_conversation = state.get("travel_info_added_to_conversation", False)
+        self.last_travel_info_hash = state.get("last_travel_info_hash")
+        memory = self.agent_executor.memory
+        if memory:
+            memory.chat_memory.messages = messages_from_dict(state.get("chat_history") or [])
+        if isinstance(memory, BudgetedConversationMemory):
+            memory.restore_state(state.get("memory_summary") or {})
@@ -31,6 +31,7 @@ class Config:
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
         self.openai_api_base = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
         self.llm_model = os.getenv("LLM_MODEL", self.config.get("llm", {}).get("model", "gpt-4-turbo-preview"))
+        self.llm_provider = os.getenv("LLM_PROVIDER", self.config.get("llm", {}).get("provider", "openai"))
     
     def get(self, key: str, default=None):
         """获取配置值"""
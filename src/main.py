@@ -37,6 +37,10 @@ def interactive_mode():
     
     agent = TravelAgent()
     
+    def report_progress(tool_name: str, message: str):
+        """输出专门Agent的调用进度（只显示第一行）"""
+        print(f"  {message.splitlines()[0][:80]}", flush=True)
+    
     while True:
         try:
             user_input = input("\n您: ").strip()
@@ -48,10 +52,16 @@ def interactive_mode():
                 print("再见！祝您旅途愉快！")
                 break
             
-            print("\n助手: ", end="", flush=True)
-            response = agent.chat(user_input)
-            print(response)
-            
+            # 调用进度和回答的token来自同一个事件流，token生成后立即输出
+            print()
+            answering = False
+            for chunk in agent.chat_stream(user_input, on_tool_call=report_progress):
+                if not answering:
+                    print("助手: ", end="", flush=True)
+                    answering = True
+                print(chunk, end="", flush=True)
+            print()
+        
         except KeyboardInterrupt:
             print("\n\n再见！祝您旅途愉快！")
             break
@@ -63,7 +73,7 @@ def main():
     """主函数"""
     try:
         # 检查API密钥
-        if not config.openai_api_key:
+        if not config.openai_api_key and config.llm_provider != "fake":
             print("错误：未设置 OPENAI_API_KEY 环境变量", flush=True)
             print("请在 .env 或 env 文件中设置您的 OpenAI API 密钥", flush=True)
             sys.exit(1)
@@ -0,0 +1,79 @@
+"""高德地图API结果缓存模块（进程级共享）"""
+from src.config import config
+from src.utils.ttl_cache import TTLCache
+
+
+# 地理编码缓存：地址 -> {adcode, formatted_address, location}
+# 城市/地址的地理编码几乎不会变化，默认缓存1天
+_geocode_cache = TTLCache(
+    max_size=config.get("amap.geocode_cache.max_size", 2048),
+    ttl=config.get("amap.geocode_cache.ttl", 86400),
+    persist_path=config.get("amap.geocode_cache.persist_path", "") or None,
+    name="geocode",
+)
+
+# 天气缓存：adcode:extensions -> 高德天气API原始数据（实况base / 预报all）
+# 过期时间在写入时按数据类型单独设置（见 amap.weather_cache）
+_weather_cache = TTLCache(
+    max_size=config.get("amap.weather_cache.max_size", 512),
+    ttl=config.get("amap.weather_cache.forecast_ttl", 3600),
+    name="weather",
+)
+
+# 自驾路线缓存：起点|终点|策略 -> {distance, duration, tolls, toll_distance, summary}
+# 坐标按 precision 位小数取整（3位约100米），同一地点的不同写法可以共用缓存
+_route_cache = TTLCache(
+    max_size=config.get("amap.route_cache.max_size", 1024),
+    ttl=config.get("amap.route_cache.ttl", 21600),
+    persist_path=config.get("amap.route_cache.persist_path", "") or None,
+    name="route",
+)
+
+
+def normalize_address(address: str) -> str:
+    """规范化地址作为缓存键（去除首尾及内部空白，统一大小写）"""
+    return "".join((address or "").split()).lower()
+
+
+def _round_location(location: str, precision: int) -> str:
+    """将"经度,纬度"坐标按指定小数位数取整，非坐标的地址字符串则做规范化处理"""
+    parts = (location or "").split(",")
+    if len(parts) == 2:
+        try:
+            return ",".join(f"{float(part):.{precision}f}" for part in parts)
+        except ValueError:
+            pass
+    return normalize_address(location)
+
+
+def route_cache_key(origin: str, destination: str, strategy) -> str:
+    """
+    生成自驾路线缓存键
+    
+    Args:
+        origin: 起点坐标（"经度,纬度"）或地址
+        destination: 终点坐标（"经度,纬度"）或地址
+        strategy: 高德地图路线策略
+    """
+    precision = config.get("amap.route_cache.precision", 3)
+    return f"{_round_location(origin, precision)}|{_round_location(destination, precision)}|{strategy}"
+
+
+def get_geocode_cache() -> TTLCache:
+    """获取地理编码缓存实例"""
+    return _geocode_cache
+
+
+def get_weather_cache() -> TTLCache:
+    """获取城市天气缓存实例"""
+    return _weather_cache
+
+
+def get_route_cache() -> TTLCache:
+    """获取自驾路线缓存实例"""
+    return _route_cache
+
+
+def cache_stats() -> dict:
+    """获取所有高德地图API缓存的命中率等统计信息"""
+    return {cache.name: cache.stats() for cache in (_geocode_cache, _weather_cache, _route_cache)}
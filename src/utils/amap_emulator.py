@@ -0,0 +1,404 @@
+"""
+高德地图API本地模拟服务（离线测试、压测与录制回放）
+
+支持三种模式：
+- synthetic: 根据请求参数生成确定性的模拟数据（地理编码、天气、POI、自驾路线）
+- record: 将请求转发到真实的高德地图API（或 upstream 指定的地址），并把响应记录到fixtures文件
+- replay: 从fixtures文件回放记录的响应，不访问网络
+
+所有模式都支持注入固定延迟/随机抖动和按比例注入错误（HTTP 503 或高德QPS超限错误）。
+
+用法：
+    python -m src.utils.amap_emulator --mode synthetic --port 8765 --latency 0.05
+    然后设置环境变量 AMAP_BASE_URL=http://127.0.0.1:8765（或配置 amap.base_url）
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+
+from src.utils.amap_rate_limiter import DEFAULT_AMAP_BASE_URL
+
+
+# 常用城市的模拟地理编码：名称 -> (adcode, formatted_address, location)
+_KNOWN_CITIES = {
+    "北京": ("110000", "北京市", "116.407387,39.904179"),
+    "上海": ("310000", "上海市", "121.473667,31.230525"),
+    "天津": ("120000", "天津市", "117.201538,39.085294"),
+    "重庆": ("500000", "重庆市", "106.551557,29.563010"),
+    "广州": ("440100", "广东省广州市", "113.264385,23.129112"),
+    "深圳": ("440300", "广东省深圳市", "114.057868,22.543099"),
+    "杭州": ("330100", "浙江省杭州市", "120.155070,30.274084"),
+    "南京": ("320100", "江苏省南京市", "118.796877,32.060255"),
+    "苏州": ("320500", "江苏省苏州市", "120.585315,31.298886"),
+    "成都": ("510100", "四川省成都市", "104.066541,30.572269"),
+    "西安": ("610100", "陕西省西安市", "108.939621,34.343147"),
+    "武汉": ("420100", "湖北省武汉市", "114.305393,30.593099"),
+    "厦门": ("350200", "福建省厦门市", "118.089425,24.479834"),
+    "三亚": ("460200", "海南省三亚市", "109.511909,18.252847"),
+}
+
+_WEATHERS = ["晴", "多云", "阴", "小雨", "中雨", "雷阵雨"]
+_WINDS = ["东", "南", "西", "北", "东北", "西南"]
+_WEEKDAYS = "1234567"
+
+
+def _stable_int(text: str) -> int:
+    """根据文本生成稳定的整数（同一文本在不同进程中结果一致）"""
+    return int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16)
+
+
+def fixture_key(path: str, params: dict) -> str:
+    """生成fixtures的键：接口路径 + 排序后的参数（不包含API密钥）"""
+    items = sorted((k, v) for k, v in params.items() if k != "key")
+    return f"{path}?{urlencode(items)}"
+
+
+def synthetic_geocode(address: str) -> dict:
+    """生成单个地址的模拟地理编码"""
+    for name, (adcode, formatted_address, location) in _KNOWN_CITIES.items():
+        if name in address:
+            return {"formatted_address": formatted_address if address in (name, name + "市") else address,
+                    "adcode": adcode, "location": location, "level": "市"}
+    seed = _stable_int(address)
+    lng = 100 + (seed % 20000) / 1000
+    lat = 22 + (seed // 20000 % 18000) / 1000
+    return {"formatted_address": address, "adcode": f"9{seed % 100000:05d}",
+            "location": f"{lng:.6f},{lat:.6f}", "level": "兴趣点"}
+
+
+def _parse_location(value: str) -> Tuple[float, float]:
+    """解析"经度,纬度"，非坐标时先做模拟地理编码"""
+    parts = value.split(",")
+    if len(parts) == 2:
+        try:
+            return float(parts[0]), float(parts[1])
+        except ValueError:
+            pass
+    lng, lat = synthetic_geocode(value)["location"].split(",")
+    return float(lng), float(lat)
+
+
+def _haversine_km(origin: Tuple[float, float], destination: Tuple[float, float]) -> float:
+    """计算两个坐标之间的球面距离（公里）"""
+    lng1, lat1, lng2, lat2 = map(math.radians, (*origin, *destination))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 6371 * 2 * math.asin(math.sqrt(a))
+
+
+class AmapEmulator:
+    """高德地图API本地模拟服务"""
+    
+    MODES = ("synthetic", "record", "replay")
+    
+    def __init__(self, mode: str = "synthetic", host: str = "127.0.0.1", port: int = 0,
+                 fixtures_path: Optional[str] = None, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, error_mode: str = "http", upstream: str = DEFAULT_AMAP_BASE_URL,
+                 seed: Optional[int] = None):
+        """
+        Args:
+            mode: 运行模式，synthetic / record / replay
+            host: 监听地址
+            port: 监听端口，0表示自动分配
+            fixtures_path: fixtures文件路径（record模式写入，replay模式读取）
+            latency: 每个请求的固定延迟（秒）
+            jitter: 额外的随机延迟上限（秒）
+            error_rate: 注入错误的比例（0-1）
+            error_mode: 注入的错误类型，http（返回503）或 quota（返回高德QPS超限错误）
+            upstream: record模式转发请求的目标地址
+            seed: 随机数种子（用于复现抖动和错误注入）
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"不支持的模式: {mode}，可选: {', '.join(self.MODES)}")
+        if mode in ("record", "replay") and not fixtures_path:
+            raise ValueError(f"{mode} 模式需要指定 fixtures_path")
+        
+        self.mode = mode
+        self.host = host
+        self.port = port
+        self.fixtures_path = fixtures_path
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_mode = error_mode
+        self.upstream = upstream.rstrip("/")
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._fixtures: Dict[str, dict] = self._load_fixtures() if mode == "replay" else {}
+        self._stats = {"requests": 0, "injected_errors": 0, "recorded": 0, "replay_misses": 0, "by_path": {}}
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+    
+    @property
+    def base_url(self) -> str:
+        """模拟服务地址（启动后可用）"""
+        return f"http://{self.host}:{self.port}"
+    
+    def start(self) -> str:
+        """
+        在后台线程中启动模拟服务
+        
+        Returns:
+            模拟服务地址，可设置为 AMAP_BASE_URL
+        """
+        emulator = self
+        
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # 支持keep-alive，与真实API的连接复用行为一致
+            
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                status, payload = emulator.handle(parts.path, dict(parse_qsl(parts.query)))
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json;charset=UTF-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        self._server = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="amap-emulator", daemon=True)
+        self._thread.start()
+        return self.base_url
+    
+    def stop(self):
+        """停止模拟服务（record模式会保存fixtures）"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self.mode == "record":
+            self.save_fixtures()
+    
+    def __enter__(self) -> "AmapEmulator":
+        self.start()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+    
+    def handle(self, path: str, params: dict) -> Tuple[int, dict]:
+        """
+        处理一个请求
+        
+        Returns:
+            (HTTP状态码, 响应JSON)
+        """
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["by_path"][path] = self._stats["by_path"].get(path, 0) + 1
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            inject_error = self.error_rate > 0 and self._random.random() < self.error_rate
+            if inject_error:
+                self._stats["injected_errors"] += 1
+        
+        if delay > 0:
+            time.sleep(delay)
+        if inject_error:
+            if self.error_mode == "quota":
+                return 200, {"status": "0", "info": "CUQPS_HAS_EXCEEDED_THE_LIMIT", "infocode": "10021"}
+            return 503, {"status": "0", "info": "SERVICE_UNAVAILABLE"}
+        
+        if self.mode == "record":
+            return self._record(path, params)
+        if self.mode == "replay":
+            return self._replay(path, params)
+        return self._synthetic(path, params)
+    
+    def _record(self, path: str, params: dict) -> Tuple[int, dict]:
+        """转发请求到上游并记录响应"""
+        response = requests.get(self.upstream + path, params=params, timeout=10)
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = {"status": "0", "info": "INVALID_JSON_RESPONSE"}
+        with self._lock:
+            self._fixtures[fixture_key(path, params)] = {"status_code": response.status_code, "body": payload}
+            self._stats["recorded"] += 1
+        return response.status_code, payload
+    
+    def _replay(self, path: str, params: dict) -> Tuple[int, dict]:
+        """从fixtures回放响应"""
+        fixture = self._fixtures.get(fixture_key(path, params))
+        if fixture is None:
+            with self._lock:
+                self._stats["replay_misses"] += 1
+            return 404, {"status": "0", "info": "FIXTURE_NOT_FOUND", "infocode": "40400"}
+        return fixture["status_code"], fixture["body"]
+    
+    def _synthetic(self, path: str, params: dict) -> Tuple[int, dict]:
+        """生成模拟响应"""
+        if path == "/v3/geocode/geo":
+            return 200, self._geocode(params)
+        if path == "/v3/weather/weatherInfo":
+            return 200, self._weather(params)
+        if path == "/v5/place/text":
+            return 200, self._place_text(params)
+        if path == "/v3/direction/driving":
+            return 200, self._driving(params)
+        return 404, {"status": "0", "info": "INVALID_REQUEST", "infocode": "20000"}
+    
+    @staticmethod
+    def _geocode(params: dict) -> dict:
+        address = params.get("address", "")
+        if not address:
+            return {"status": "0", "info": "INVALID_PARAMS", "infocode": "20000"}
+        addresses = address.split("|") if params.get("batch") == "true" else [address]
+        geocodes = [synthetic_geocode(item) for item in addresses]
+        return {"status": "1", "info": "OK", "infocode": "10000", "count": str(len(geocodes)), "geocodes": geocodes}
+    
+    @staticmethod
+    def _weather(params: dict) -> dict:
+        adcode = params.get("city", "")
+        city_name = next((name for name, info in _KNOWN_CITIES.items() if info[0] == adcode), adcode)
+        today = datetime.now().date()
+        if params.get("extensions") == "all":
+            casts = []
+            for offset in range(4):
+                day = today + timedelta(days=offset)
+                seed = _stable_int(f"{adcode}:{day}")
+                daytemp = 10 + seed % 20
+                casts.append({
+                    "date": day.strftime("%Y-%m-%d"),
+                    "week": _WEEKDAYS[day.weekday()],
+                    "dayweather": _WEATHERS[seed % len(_WEATHERS)],
+                    "nightweather": _WEATHERS[seed // 7 % len(_WEATHERS)],
+                    "daytemp": str(daytemp),
+                    "nighttemp": str(daytemp - 8),
+                    "daywind": _WINDS[seed % len(_WINDS)],
+                    "nightwind": _WINDS[seed // 3 % len(_WINDS)],
+                    "daypower": "1-3",
+                    "nightpower": "1-3",
+                })
+            forecast = {"city": city_name, "adcode": adcode, "reporttime": f"{today} 08:00:00", "casts": casts}
+            return {"status": "1", "info": "OK", "infocode": "10000", "count": "1", "forecasts": [forecast]}
+        
+        seed = _stable_int(f"{adcode}:{today}")
+        live = {
+            "city": city_name,
+            "adcode": adcode,
+            "weather": _WEATHERS[seed % len(_WEATHERS)],
+            "temperature": str(10 + seed % 20),
+            "winddirection": _WINDS[seed % len(_WINDS)],
+            "windpower": "≤3",
+            "humidity": str(40 + seed % 50),
+            "reporttime": datetime.now().strftime("%Y-%m-%d %H:00:00"),
+        }
+        return {"status": "1", "info": "OK", "infocode": "10000", "count": "1", "lives": [live]}
+    
+    @staticmethod
+    def _place_text(params: dict) -> dict:
+        keywords = params.get("keywords", "景点")
+        region = params.get("region", "")
+        page_size = int(params.get("page_size") or params.get("offset") or 10)
+        pois = []
+        for i in range(1, page_size + 1):
+            seed = _stable_int(f"{keywords}:{i}")
+            pois.append({
+                "name": f"{keywords}{i}号",
+                "id": f"B0{seed % 10 ** 8:08d}",
+                "type": "风景名胜;风景名胜;国家级景点",
+                "address": f"{region}模拟路{seed % 500 + 1}号",
+                "adname": f"模拟{_WINDS[seed % len(_WINDS)]}区",
+                "business_area": f"{keywords}商圈",
+                "tel": f"0571-{seed % 10 ** 8:08d}",
+                "cost": str(seed % 200),
+                "rating": f"{3.5 + seed % 15 / 10:.1f}",
+            })
+        return {"status": "1", "info": "OK", "infocode": "10000", "count": str(len(pois)), "pois": pois}
+    
+    @staticmethod
+    def _driving(params: dict) -> dict:
+        if not params.get("origin") or not params.get("destination"):
+            return {"status": "0", "info": "MISSING_REQUIRED_PARAMS", "infocode": "20001"}
+        origin = _parse_location(params["origin"])
+        destination = _parse_location(params["destination"])
+        distance_km = max(1.0, _haversine_km(origin, destination) * 1.25)  # 道路距离约为直线距离的1.25倍
+        path = {
+            "distance": str(int(distance_km * 1000)),
+            "duration": str(int(distance_km / 80 * 3600)),  # 平均时速80公里
+            "strategy": "速度最快",
+            "tolls": str(int(distance_km * 0.45)),
+            "toll_distance": str(int(distance_km * 800)),
+            "steps": [],
+        }
+        route = {"origin": params["origin"], "destination": params["destination"], "paths": [path]}
+        return {"status": "1", "info": "OK", "infocode": "10000", "count": "1", "route": route}
+    
+    def _load_fixtures(self) -> Dict[str, dict]:
+        """读取fixtures文件"""
+        if not os.path.exists(self.fixtures_path):
+            raise FileNotFoundError(f"fixtures文件不存在: {self.fixtures_path}")
+        with open(self.fixtures_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    
+    def save_fixtures(self):
+        """保存录制的响应（已有文件中的记录会被保留并合并）"""
+        existing = {}
+        if os.path.exists(self.fixtures_path):
+            with open(self.fixtures_path, "r", encoding="utf-8") as f:
+                existing = json.load(f)
+        with self._lock:
+            existing.update(self._fixtures)
+        directory = os.path.dirname(self.fixtures_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.fixtures_path, "w", encoding="utf-8") as f:
+            json.dump(existing, f, ensure_ascii=False, indent=2)
+    
+    def stats(self) -> dict:
+        """获取模拟服务统计信息"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["by_path"] = dict(self._stats["by_path"])
+            return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="高德地图API本地模拟服务")
+    parser.add_argument("--mode", choices=AmapEmulator.MODES, default="synthetic", help="运行模式")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8765, help="监听端口")
+    parser.add_argument("--fixtures", default=None, help="fixtures文件路径（record/replay模式必填）")
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的固定延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="额外随机延迟上限（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="注入错误的比例（0-1）")
+    parser.add_argument("--error-mode", choices=("http", "quota"), default="http", help="注入的错误类型")
+    parser.add_argument("--upstream", default=DEFAULT_AMAP_BASE_URL, help="record模式转发请求的目标地址")
+    args = parser.parse_args()
+    
+    emulator = AmapEmulator(
+        mode=args.mode, host=args.host, port=args.port, fixtures_path=args.fixtures,
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        error_mode=args.error_mode, upstream=args.upstream,
+    )
+    base_url = emulator.start()
+    print(f"高德地图模拟服务已启动（{args.mode}模式）: {base_url}")
+    print(f"请设置环境变量 AMAP_BASE_URL={base_url}，按 Ctrl+C 停止")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        emulator.stop()
+        print(f"模拟服务已停止，统计: {json.dumps(emulator.stats(), ensure_ascii=False)}")
+
+
+if __name__ == "__main__":
+    main()
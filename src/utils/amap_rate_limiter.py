@@ -1,12 +1,83 @@
 """高德地图API并发控制模块"""
+import os
 import threading
 import time
-from typing import Callable, Any, List
+from typing import Callable, Dict, Optional, Tuple
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from src.config import config
+from src.utils.cancellation import CHECK_INTERVAL, check_cancelled
+from src.utils.token_bucket import TokenBucket
+
+
+class _PooledHTTPAdapter(HTTPAdapter):
+    """带连接复用统计的HTTP适配器"""
+    
+    def connection_stats(self) -> Dict[str, dict]:
+        """
+        统计每个主机的请求数和新建连接数
+        
+        Returns:
+            {host: {"requests": 请求数, "connections": 新建连接数, "reused": 复用连接的请求数}}
+        """
+        stats = {}
+        pools = self.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = f"{pool.host}:{pool.port}" if pool.port else pool.host
+            entry = stats.setdefault(host, {"requests": 0, "connections": 0, "reused": 0})
+            entry["requests"] += pool.num_requests
+            entry["connections"] += pool.num_connections
+            entry["reused"] = max(0, entry["requests"] - entry["connections"])
+        return stats
+
+
+# 高德地图Web服务API的默认地址
+DEFAULT_AMAP_BASE_URL = "https://restapi.amap.com"
+
+
+def amap_url(path: str) -> str:
+    """
+    拼接高德地图API地址
+    
+    基础地址依次取环境变量 AMAP_BASE_URL、配置 amap.base_url、默认地址，
+    可以指向本地模拟服务（src/utils/amap_emulator.py）进行离线测试和压测。
+    
+    Args:
+        path: 接口路径，例如 "/v3/geocode/geo"
+    """
+    base_url = os.getenv("AMAP_BASE_URL") or config.get("amap.base_url", "") or DEFAULT_AMAP_BASE_URL
+    return base_url.rstrip("/") + path
+
+
+def request_key(url: str, params: Optional[dict]) -> Tuple:
+    """生成请求的去重键（URL + 排序后的参数）"""
+    return url, tuple(sorted((str(k), str(v)) for k, v in (params or {}).items()))
+
+
+# 服务端错误时在限流器层面重试（每次重试重新获取令牌，重试也计入QPS配额）
+RETRY_STATUS = (500, 502, 503, 504)
+
+
+class _LeaderAbandoned(Exception):
+    """合并请求的发起方在得到结果前被取消（运行取消、任务取消），等待方自行重新发起请求"""
+
+
+class _InFlightCall:
+    """一个正在执行中的请求，相同请求的其他调用方等待并共享它的结果"""
+    
+    def __init__(self):
+        self.event = threading.Event()
+        self.response = None
+        self.error = None
 
 
 class AmapRateLimiter:
-    """高德地图API并发限流器，限制每秒最多3次请求，最多3个并发请求"""
+    """高德地图API并发限流器，使用令牌桶控制请求频率（默认每秒3次），并限制最大并发请求数"""
     
     _instance = None
     _lock = threading.Lock()
@@ -23,64 +94,138 @@ class AmapRateLimiter:
         if self._initialized:
             return
         
-        # 使用信号量控制并发数，最多3个并发请求
-        self._semaphore = threading.Semaphore(3)
-        # 记录最近3次请求的时间戳（用于控制每秒最多3次）
-        self._request_timestamps: List[float] = []
-        # 保护时间戳列表的锁
-        self._timestamp_lock = threading.Lock()
+        rate = config.get("amap.rate_limit.rate", 3)
+        burst = config.get("amap.rate_limit.burst", 3)
+        max_concurrency = config.get("amap.rate_limit.max_concurrency", 3)
+        
+        # 使用信号量控制并发数
+        self._semaphore = threading.Semaphore(max_concurrency)
+        # 令牌桶控制请求频率：锁内只计算精确的等待时间，休眠在锁外进行
+        self._bucket = TokenBucket(rate=rate, burst=burst)
+        # 复用连接池的HTTP会话，避免每次请求都重新进行TCP+TLS握手
+        self._adapter = self._create_adapter()
+        self._session = self._create_session(self._adapter)
+        self._max_retries = config.get("amap.http.max_retries", 2)
+        self._backoff_factor = config.get("amap.http.backoff_factor", 0.3)
+        self._retries = 0
+        # 请求合并（single-flight）：相同的并发请求只发送一次，共享响应
+        self._single_flight = config.get("amap.single_flight", True)
+        self._inflight: Dict[Tuple, _InFlightCall] = {}
+        self._inflight_lock = threading.Lock()
+        self._deduplicated = 0
         self._initialized = True
     
-    def _wait_if_needed(self):
+    @staticmethod
+    def _create_adapter() -> _PooledHTTPAdapter:
         """
-        检查是否需要等待，确保每秒最多3次请求
-        如果已经连续调用3次，等待1秒
+        创建带连接池的HTTP适配器
+        
+        连接池只重试建立连接失败（请求没有到达服务端，不占用API配额）；5xx和读取超时由 execute_request()
+        重试，每次重试都重新获取令牌。
         """
-        with self._timestamp_lock:
-            current_time = time.time()
-            
-            # 清理超过1秒的时间戳（只保留最近1秒内的请求）
-            self._request_timestamps = [
-                ts for ts in self._request_timestamps 
-                if current_time - ts < 1.0
-            ]
-            
-            # 如果已经有3次请求在1秒内，需要等待1秒
-            if len(self._request_timestamps) >= 3:
-                # 等待1秒，确保不会触发频率限制
-                time.sleep(1.0)
-                # 等待完成后，清理时间戳列表（保留超过1秒的会被清理）
-                current_time = time.time()
-                self._request_timestamps = [
-                    ts for ts in self._request_timestamps 
-                    if current_time - ts < 1.0
-                ]
-            
-            # 记录当前请求的时间戳
-            self._request_timestamps.append(time.time())
+        retry = Retry(
+            total=config.get("amap.http.max_retries", 2),
+            connect=config.get("amap.http.max_retries", 2),
+            read=0,
+            status=0,
+            other=0,
+            backoff_factor=config.get("amap.http.backoff_factor", 0.3),
+            allowed_methods=frozenset(["GET"]),
+            raise_on_status=False,
+        )
+        return _PooledHTTPAdapter(
+            pool_connections=config.get("amap.http.pool_connections", 4),
+            pool_maxsize=config.get("amap.http.pool_maxsize", 10),
+            max_retries=retry,
+        )
+    
+    @staticmethod
+    def _create_session(adapter: HTTPAdapter) -> requests.Session:
+        """创建启用keep-alive和gzip压缩的HTTP会话"""
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({
+            "Connection": "keep-alive",
+            "Accept-Encoding": "gzip, deflate",
+        })
+        return session
+    
+    def configure(self, rate: Optional[float] = None, burst: Optional[int] = None):
+        """
+        调整请求频率限制（例如对本地模拟服务压测时放开配额）
+        
+        Args:
+            rate: 每秒补充的令牌数，None表示保持不变
+            burst: 令牌桶容量，None表示保持不变
+        """
+        self._bucket = TokenBucket(
+            rate=rate if rate is not None else self._bucket.rate,
+            burst=burst if burst is not None else self._bucket.capacity,
+        )
+    
+    def _wait_if_needed(self) -> float:
+        """
+        获取一个令牌，确保请求频率不超过限制
+        
+        Returns:
+            实际等待的秒数
+        """
+        return self._bucket.wait()
+    
+    def try_acquire(self) -> float:
+        """
+        非阻塞地尝试获取请求配额
+        
+        Returns:
+            0.0 表示已获取配额，可以立即发送请求；否则返回还需等待的秒数
+        """
+        return self._bucket.try_acquire()
+    
+    async def acquire(self) -> float:
+        """
+        异步获取请求配额，等待期间不阻塞事件循环
+        
+        Returns:
+            实际等待的秒数
+        """
+        return await self._bucket.acquire()
     
     def execute_request(self, request_func: Callable[[], requests.Response]) -> requests.Response:
         """
-        执行高德地图API请求，自动控制并发数和请求频率
+        执行高德地图API请求，自动控制并发数和请求频率；遇到5xx或读取超时时按指数退避重试，
+        每次重试都重新获取令牌，重试不会让请求频率超过限制
         
         Args:
             request_func: 返回 requests.Response 的调用函数
-            
+        
         Returns:
-            requests.Response: API响应
+            requests.Response: API响应（重试耗尽后返回最后一次响应，由调用方处理状态码）
         """
-        # 检查并等待，确保每秒最多3次请求
-        self._wait_if_needed()
-        
-        # 获取信号量，如果当前已有3个并发请求，这里会阻塞等待
-        self._semaphore.acquire()
-        try:
-            # 执行请求
-            response = request_func()
-            return response
-        finally:
-            # 释放信号量，允许下一个请求执行
-            self._semaphore.release()
+        attempt = 0
+        while True:
+            # 获取令牌，确保请求频率不超过限制
+            self._wait_if_needed()
+            
+            # 获取信号量，如果当前并发请求数已满，这里会阻塞等待
+            self._semaphore.acquire()
+            try:
+                response = request_func()
+            except requests.exceptions.ReadTimeout:
+                if attempt >= self._max_retries:
+                    raise
+                response = None
+            finally:
+                # 释放信号量，允许下一个请求执行
+                self._semaphore.release()
+            
+            if response is not None and (response.status_code not in RETRY_STATUS or attempt >= self._max_retries):
+                return response
+            attempt += 1
+            with self._inflight_lock:
+                self._retries += 1
+            time.sleep(self._backoff_factor * (2 ** (attempt - 1)))
+            check_cancelled("api")
     
     def get(self, url: str, params: dict = None, timeout: float = 5, **kwargs) -> requests.Response:
         """
@@ -96,9 +241,67 @@ class AmapRateLimiter:
             requests.Response: API响应
         """
         def _request():
-            return requests.get(url, params=params, timeout=timeout, **kwargs)
+            return self._session.get(url, params=params, timeout=timeout, **kwargs)
+        
+        # 所在的Agent运行已取消（客户端已断开）时不再发出请求
+        check_cancelled("api")
         
-        return self.execute_request(_request)
+        if not self._single_flight or kwargs:
+            return self.execute_request(_request)
+        
+        # 相同的请求正在执行时，直接等待它的响应，不再占用限流配额
+        key = request_key(url, params)
+        with self._inflight_lock:
+            call = self._inflight.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _InFlightCall()
+                self._inflight[key] = call
+            else:
+                self._deduplicated += 1
+        
+        if not is_leader:
+            # 分段等待，所在的运行被取消时不再等待发起方（发起方继续为其他等待方执行请求）
+            while not call.event.wait(CHECK_INTERVAL):
+                check_cancelled("api")
+            if isinstance(call.error, _LeaderAbandoned):
+                return self.get(url, params=params, timeout=timeout)
+            if call.error is not None:
+                raise call.error
+            return call.response
+        
+        # 发起方无论成功、出错还是被取消，都在 finally 中通知等待方（得到响应、异常或重新发起请求）
+        try:
+            response = self.execute_request(_request)
+            # 在共享给其他线程之前读取响应内容，避免多个线程同时读取底层连接
+            response.content
+            call.response = response
+            return response
+        except Exception as e:
+            call.error = e
+            raise
+        except BaseException:
+            # 发起方的运行被取消（RunCancelled）：不把取消传给其他运行的等待方
+            call.error = _LeaderAbandoned()
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+            call.event.set()
+    
+    def connection_stats(self) -> Dict[str, dict]:
+        """获取每个主机的连接复用统计（请求数、新建连接数、复用次数）"""
+        return self._adapter.connection_stats()
+    
+    def stats(self) -> dict:
+        """获取限流器状态"""
+        stats = self._bucket.stats()
+        with self._inflight_lock:
+            stats["in_flight"] = len(self._inflight)
+            stats["deduplicated"] = self._deduplicated
+            stats["retries"] = self._retries
+        stats["connections"] = self.connection_stats()
+        return stats
 
 
 # 创建全局单例实例
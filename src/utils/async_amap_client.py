@@ -0,0 +1,150 @@
+"""高德地图API异步HTTP客户端模块"""
+import asyncio
+import threading
+import weakref
+from typing import Optional
+
+import httpx
+
+from src.config import config
+from src.utils.amap_rate_limiter import RETRY_STATUS, AmapRateLimiter, _LeaderAbandoned, get_amap_rate_limiter, request_key
+from src.utils.cancellation import check_cancelled
+
+
+class AsyncAmapClient:
+    """
+    基于 httpx.AsyncClient 的高德地图API异步客户端
+    
+    与同步限流器共享同一个令牌桶，保证同步和异步请求合计不超过API的QPS配额；
+    令牌等待和并发控制都通过 await 完成，不会阻塞事件循环。
+    """
+    
+    def __init__(self, limiter: Optional[AmapRateLimiter] = None):
+        self._limiter = limiter or get_amap_rate_limiter()
+        self._max_concurrency = config.get("amap.rate_limit.max_concurrency", 3)
+        self._max_retries = config.get("amap.http.max_retries", 2)
+        self._backoff_factor = config.get("amap.http.backoff_factor", 0.3)
+        self._limits = httpx.Limits(
+            max_connections=config.get("amap.http.pool_maxsize", 10),
+            max_keepalive_connections=config.get("amap.http.pool_maxsize", 10),
+        )
+        self._single_flight = config.get("amap.single_flight", True)
+        # httpx.AsyncClient、asyncio.Semaphore 和正在执行的请求都绑定在事件循环上，按事件循环分别维护
+        self._loop_states = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._retries = 0
+        self._deduplicated = 0
+    
+    def _get_state(self) -> tuple:
+        """获取当前事件循环对应的 (httpx.AsyncClient, asyncio.Semaphore, 正在执行的请求)"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            state = self._loop_states.get(loop)
+            if state is None or state[0].is_closed:
+                client = httpx.AsyncClient(
+                    limits=self._limits,
+                    headers={"Accept-Encoding": "gzip, deflate"},
+                    # 传输层只重试建立连接失败（请求没有到达服务端，不占用API配额）
+                    transport=httpx.AsyncHTTPTransport(limits=self._limits, retries=self._max_retries),
+                )
+                state = (client, asyncio.Semaphore(self._max_concurrency), {})
+                self._loop_states[loop] = state
+            return state
+    
+    async def get(self, url: str, params: dict = None, timeout: float = 5, **kwargs) -> httpx.Response:
+        """
+        异步执行GET请求，自动控制并发数和请求频率
+        
+        Args:
+            url: 请求URL
+            params: 请求参数
+            timeout: 超时时间
+            **kwargs: 其他httpx.AsyncClient.get参数
+        
+        Returns:
+            httpx.Response: API响应（与 requests.Response 一样提供 status_code 和 json()）
+        """
+        # 所在的Agent运行已取消（客户端已断开）时不再发出请求
+        check_cancelled("api")
+        client, semaphore, inflight = self._get_state()
+        if not self._single_flight or kwargs:
+            return await self._send(client, semaphore, url, params, timeout, **kwargs)
+        
+        # 请求合并（single-flight）：相同的请求正在执行时，等待并共享它的响应
+        key = request_key(url, params)
+        future = inflight.get(key)
+        if future is not None:
+            with self._lock:
+                self._deduplicated += 1
+            try:
+                return await asyncio.shield(future)
+            except _LeaderAbandoned:
+                # 发起方被取消，由当前调用方重新发起请求
+                return await self.get(url, params=params, timeout=timeout)
+        
+        future = asyncio.get_running_loop().create_future()
+        inflight[key] = future
+        try:
+            response = await self._send(client, semaphore, url, params, timeout)
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            # 发起方的任务或运行被取消时，不把取消传给其他请求的等待方，而是让它们重新发起请求
+            future.set_exception(e if isinstance(e, Exception) else _LeaderAbandoned())
+            future.exception()  # 标记异常已被处理，避免没有等待者时输出警告
+            raise
+        finally:
+            inflight.pop(key, None)
+    
+    async def _send(self, client: httpx.AsyncClient, semaphore: asyncio.Semaphore, url: str,
+                    params: Optional[dict], timeout: float, **kwargs) -> httpx.Response:
+        """发送请求（获取令牌、控制并发、5xx和读取超时重试）"""
+        with self._lock:
+            self._requests += 1
+        attempt = 0
+        while True:
+            # 获取令牌，确保请求频率不超过限制（与同步请求共享配额，每次重试都重新获取）
+            await self._limiter.acquire()
+            async with semaphore:
+                try:
+                    response = await client.get(url, params=params, timeout=timeout, **kwargs)
+                except httpx.ReadTimeout:
+                    if attempt >= self._max_retries:
+                        raise
+                    response = None
+            # 与同步限流器的重试策略保持一致：5xx或读取超时时按指数退避重试
+            if response is not None and (response.status_code not in RETRY_STATUS or attempt >= self._max_retries):
+                return response
+            attempt += 1
+            with self._lock:
+                self._retries += 1
+            await asyncio.sleep(self._backoff_factor * (2 ** (attempt - 1)))
+            check_cancelled("api")
+    
+    async def aclose(self):
+        """关闭当前事件循环上的HTTP连接池"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            state = self._loop_states.pop(loop, None)
+        if state is not None:
+            await state[0].aclose()
+    
+    def stats(self) -> dict:
+        """获取异步客户端状态"""
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "retries": self._retries,
+                "deduplicated": self._deduplicated,
+                "event_loops": len(self._loop_states),
+            }
+
+
+# 创建全局单例实例
+_async_amap_client = AsyncAmapClient()
+
+
+def get_async_amap_client() -> AsyncAmapClient:
+    """获取高德地图API异步客户端实例"""
+    return _async_amap_client
@@ -0,0 +1,136 @@
+"""
+运行取消：流式接口的客户端断开后，Agent运行在下一个检查点放弃执行，不再为没有人读取的回答消耗LLM和API配额
+
+取消令牌通过上下文变量传递（Agent执行器、专门Agent、线程池和异步任务都沿用调用方的上下文）。检查点：
+- 每次LLM调用和工具调用开始时（LangChain回调，自动加入上下文中的所有运行）
+- LLM流式生成每个token时（放弃正在生成的回答）
+- 每次高德地图API请求之前（amap_rate_limiter、async_amap_client）
+"""
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+
+
+class RunCancelled(BaseException):
+    """
+    运行已被取消
+    
+    继承 BaseException（与 asyncio.CancelledError 相同），工具和专门Agent中处理普通错误的 except Exception
+    不会把取消当作失败结果返回给LLM继续执行。
+    """
+
+
+_stats_lock = threading.Lock()
+_stats = {
+    "cancelled_runs": 0,
+    "saved_llm_calls": 0,
+    "saved_tool_calls": 0,
+    "saved_api_calls": 0,
+    "abandoned_llm_streams": 0,
+}
+
+
+def _count(name: str):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def cancellation_stats() -> Dict[str, int]:
+    """获取取消统计（取消的运行数，因取消而没有发出的LLM调用、工具调用、高德地图API请求数，中途放弃的LLM流式生成数）"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+class CancellationToken:
+    """一次Agent运行的取消令牌（线程安全）"""
+    
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason: Optional[str] = None
+    
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+    
+    def cancel(self, reason: str = "运行已取消"):
+        """取消运行（重复调用只记录一次）"""
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+            _count("cancelled_runs")
+    
+    def check(self, kind: str):
+        """
+        检查点：已取消时记录省下的调用并抛出 RunCancelled
+        
+        Args:
+            kind: 即将发出的调用类型（llm、tool、api）
+        """
+        if self._event.is_set():
+            _count(f"saved_{kind}_calls")
+            raise RunCancelled(self.reason)
+
+
+class CancellationHandler(BaseCallbackHandler):
+    """在LLM调用、工具调用开始和生成token时检查取消令牌的回调"""
+    
+    raise_error = True
+    run_inline = True
+    
+    def __init__(self, token: CancellationToken):
+        self.token = token
+    
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: Any, **kwargs: Any) -> None:
+        self.token.check("llm")
+    
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, **kwargs: Any) -> None:
+        self.token.check("llm")
+    
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, **kwargs: Any) -> None:
+        self.token.check("tool")
+    
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        if self.token.cancelled:
+            _count("abandoned_llm_streams")
+            raise RunCancelled(self.token.reason)
+
+
+_current_token: ContextVar[Optional[CancellationToken]] = ContextVar("cancellation_token", default=None)
+_current_handler: ContextVar[Optional[CancellationHandler]] = ContextVar("cancellation_handler", default=None)
+# 上下文中有取消令牌时，LangChain为每个运行（Agent执行器、LLM、工具）自动加入检查回调
+register_configure_hook(_current_handler, inheritable=True)
+
+
+# 阻塞等待（限流排队、等待合并请求的结果）时检查取消令牌的间隔（秒）
+CHECK_INTERVAL = 0.1
+
+
+def current_cancellation_token() -> Optional[CancellationToken]:
+    """获取当前上下文的取消令牌"""
+    return _current_token.get()
+
+
+def check_cancelled(kind: str):
+    """检查点：当前上下文的运行已取消时抛出 RunCancelled（没有取消令牌时不做任何事）"""
+    token = _current_token.get()
+    if token is not None:
+        token.check(kind)
+
+
+@contextmanager
+def cancellation_scope(token: Optional[CancellationToken]) -> Iterator[Optional[CancellationToken]]:
+    """在上下文中使用取消令牌（token 为None时不启用取消）"""
+    if token is None:
+        yield None
+        return
+    token_reset = _current_token.set(token)
+    handler_reset = _current_handler.set(CancellationHandler(token))
+    try:
+        yield token
+    finally:
+        _current_handler.reset(handler_reset)
+        _current_token.reset(token_reset)
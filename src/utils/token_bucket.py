@@ -0,0 +1,126 @@
+"""令牌桶限流模块（GCRA风格的预约式令牌桶）"""
+import asyncio
+import threading
+import time
+
+from src.utils.cancellation import CHECK_INTERVAL, check_cancelled
+
+
+class TokenBucket:
+    """
+    线程安全的令牌桶限流器
+    
+    令牌以 rate 个/秒的速度补充，桶容量为 burst。
+    获取令牌时在锁内只做计算（预约一个令牌并算出精确的等待时间），
+    等待始终在锁外进行，不会阻塞其他线程。等待被取消（运行取消、任务取消）时退还预约的令牌，
+    放弃的请求不会推迟后面的请求。
+    """
+    
+    def __init__(self, rate: float = 3.0, burst: int = 3):
+        """
+        Args:
+            rate: 每秒补充的令牌数（即稳定状态下的每秒请求数）
+            burst: 桶容量（允许的最大突发请求数）
+        """
+        if rate <= 0:
+            raise ValueError("rate 必须大于0")
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(burst))
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _refill(self, now: float):
+        """按流逝时间补充令牌（调用方需持有锁）"""
+        elapsed = now - self._last_refill
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._last_refill = now
+    
+    def try_acquire(self) -> float:
+        """
+        非阻塞地尝试获取一个令牌
+        
+        Returns:
+            0.0 表示已获取令牌；否则返回还需等待的秒数（此时不消耗令牌）
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+    
+    def reserve(self) -> float:
+        """
+        预约一个令牌（令牌数可以暂时为负，代表已排队的请求）
+        
+        Returns:
+            调用方在发出请求前需要等待的秒数
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+    
+    def refund(self):
+        """退还一个预约后未使用的令牌"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens + 1)
+    
+    def wait(self) -> float:
+        """
+        同步获取一个令牌，必要时在锁外休眠精确的等待时间（所在的运行被取消时退还令牌并抛出 RunCancelled）
+        
+        Returns:
+            实际等待的秒数
+        """
+        delay = self.reserve()
+        if delay > 0:
+            deadline = time.monotonic() + delay
+            try:
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    time.sleep(min(remaining, CHECK_INTERVAL))
+                    check_cancelled("api")
+            except BaseException:
+                self.refund()
+                raise
+        return delay
+    
+    async def acquire(self) -> float:
+        """
+        异步获取一个令牌，等待期间不阻塞事件循环
+        
+        Returns:
+            实际等待的秒数
+        """
+        delay = self.reserve()
+        if delay > 0:
+            try:
+                await asyncio.sleep(delay)
+            except BaseException:
+                # 任务被取消
+                self.refund()
+                raise
+        return delay
+    
+    @property
+    def available_tokens(self) -> float:
+        """当前可用令牌数（负数表示排队中的请求数）"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+    
+    def stats(self) -> dict:
+        """获取限流器状态"""
+        return {
+            "rate": self.rate,
+            "burst": self.capacity,
+            "available_tokens": round(self.available_tokens, 3),
+        }
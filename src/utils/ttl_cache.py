@@ -0,0 +1,177 @@
+"""带TTL和LRU淘汰的进程内缓存模块"""
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+class TTLCache:
+    """线程安全的LRU缓存，每个条目带独立的过期时间，可选持久化到SQLite"""
+    
+    def __init__(self, max_size: int = 1024, ttl: float = 3600,
+                 persist_path: Optional[str] = None, name: str = "cache"):
+        """
+        Args:
+            max_size: 最大条目数，超出后按LRU淘汰
+            ttl: 默认过期时间（秒），<=0 表示永不过期
+            persist_path: SQLite文件路径（可选），设置后缓存命中在重启后仍然有效
+            name: 缓存名称，同时用作SQLite表名
+        """
+        self.name = name
+        self.max_size = max(1, int(max_size))
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.RLock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        
+        self._db = None
+        if persist_path:
+            self._open_db(persist_path)
+    
+    def _open_db(self, persist_path: str):
+        """打开SQLite持久化文件（失败时退化为纯内存缓存）"""
+        try:
+            Path(persist_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(persist_path, check_same_thread=False)
+            self._db.execute(
+                f'CREATE TABLE IF NOT EXISTS "{self.name}" '
+                '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)'
+            )
+            self._db.commit()
+        except Exception as e:
+            print(f"缓存持久化文件打开失败（{persist_path}）: {e}", flush=True)
+            self._db = None
+    
+    def _expires_at(self, ttl: Optional[float]) -> Optional[float]:
+        ttl = self.ttl if ttl is None else ttl
+        if ttl is None or ttl <= 0:
+            return None
+        return time.time() + ttl
+    
+    def _load_from_db(self, key: str):
+        """从SQLite读取条目，返回 (value, expires_at) 或 None"""
+        row = self._db.execute(
+            f'SELECT value, expires_at FROM "{self.name}" WHERE key = ?', (key,)
+        ).fetchone()
+        if not row:
+            return None
+        value, expires_at = json.loads(row[0]), row[1]
+        if expires_at is not None and expires_at <= time.time():
+            self._db.execute(f'DELETE FROM "{self.name}" WHERE key = ?', (key,))
+            self._db.commit()
+            return None
+        return value, expires_at
+    
+    def _store(self, key: str, value: Any, expires_at: Optional[float]):
+        """写入内存并按LRU淘汰（调用方需持有锁）"""
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self._evictions += 1
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        """获取缓存值，未命中或已过期时返回default"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.time():
+                    self._data.move_to_end(key)
+                    self._hits += 1
+                    return value
+                # 已过期
+                del self._data[key]
+                self._expirations += 1
+            
+            if self._db is not None:
+                try:
+                    entry = self._load_from_db(key)
+                except Exception:
+                    entry = None
+                if entry is not None:
+                    self._store(key, entry[0], entry[1])
+                    self._hits += 1
+                    return entry[0]
+            
+            self._misses += 1
+            return default
+    
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """
+        写入缓存
+        
+        Args:
+            key: 缓存键
+            value: 缓存值（启用持久化时必须可JSON序列化）
+            ttl: 该条目的过期时间（秒），不传则使用默认TTL
+        """
+        expires_at = self._expires_at(ttl)
+        with self._lock:
+            self._store(key, value, expires_at)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        f'INSERT OR REPLACE INTO "{self.name}" (key, value, expires_at) VALUES (?, ?, ?)',
+                        (key, json.dumps(value, ensure_ascii=False), expires_at)
+                    )
+                    self._db.commit()
+                except Exception as e:
+                    print(f"缓存持久化写入失败: {e}", flush=True)
+    
+    def delete(self, key: str):
+        """删除指定条目"""
+        with self._lock:
+            self._data.pop(key, None)
+            if self._db is not None:
+                self._db.execute(f'DELETE FROM "{self.name}" WHERE key = ?', (key,))
+                self._db.commit()
+    
+    def clear(self, persistent: bool = True):
+        """
+        清空缓存
+        
+        Args:
+            persistent: 是否同时清空SQLite中的持久化数据
+        """
+        with self._lock:
+            self._data.clear()
+            if persistent and self._db is not None:
+                self._db.execute(f'DELETE FROM "{self.name}"')
+                self._db.commit()
+    
+    def reset_stats(self):
+        """重置命中统计"""
+        with self._lock:
+            self._hits = self._misses = self._evictions = self._expirations = 0
+    
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and (entry[1] is None or entry[1] > time.time())
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / total, 4) if total else 0.0,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "persistent": self._db is not None,
+            }
@@ -1,4 +1,5 @@
 """测试工具和fixtures"""
 from .test_callback_handler import TestCallbackHandler
+from .routing_cases import MULTI_AGENT_QUERY, ROUTING_CASES
 
-__all__ = ['TestCallbackHandler']
+__all__ = ['TestCallbackHandler', 'ROUTING_CASES', 'MULTI_AGENT_QUERY']
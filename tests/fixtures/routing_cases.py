@@ -0,0 +1,24 @@
+"""Agent路由用例：tests/test_agent_routing.py（真实LLM路由）和意图快速路由的离线评估共用"""
+
+# 需要多个专门Agent协作的完整规划请求
+MULTI_AGENT_QUERY = "我想从北京到上海，3天时间，预算5000元，帮我规划一下"
+
+# (用户问题, 应调用的专门Agent工具)
+ROUTING_CASES = [
+    ("请查询北京明天的天气", "query_weather_agent"),
+    ("我想知道上海今天的天气", "query_weather_agent"),
+    ("请查询广州3天后的天气预报", "query_weather_agent"),
+    ("从北京到上海自驾需要多久？", "query_transport_agent"),
+    ("查询从广州到深圳的交通路线", "query_transport_agent"),
+    ("北京到天津的距离是多少？", "query_transport_agent"),
+    ("北京有什么酒店推荐？", "query_hotel_agent"),
+    ("查询上海的经济型酒店价格", "query_hotel_agent"),
+    ("广州的酒店价格是多少？", "query_hotel_agent"),
+    ("北京有什么景点？", "query_attraction_agent"),
+    ("推荐一些上海的旅游景点", "query_attraction_agent"),
+    ("广州有哪些历史景点？", "query_attraction_agent"),
+    ("帮我规划一个3天的北京旅行", "query_planning_agent"),
+    ("制定一个上海5天的行程计划", "query_planning_agent"),
+    ("我想去广州旅游，帮我规划一下", "query_planning_agent"),
+    (MULTI_AGENT_QUERY, "query_planning_agent"),
+]
@@ -14,6 +14,7 @@ warnings.filterwarnings('ignore', message='.*dict.*method is deprecated.*')
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from src.agent.travel_agent import TravelAgent
+from src.config import config
 from tests.fixtures.test_callback_handler import TestCallbackHandler
 
 
@@ -23,8 +24,8 @@ class TestAgentPerformance(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
         """测试类初始化"""
-        if not os.getenv('OPENAI_API_KEY'):
-            raise unittest.SkipTest("OPENAI_API_KEY未设置，跳过测试")
+        if not os.getenv('OPENAI_API_KEY') and config.llm_provider != "fake":
+            raise unittest.SkipTest("OPENAI_API_KEY未设置，跳过测试（可设置 LLM_PROVIDER=fake 离线测试编排开销）")
         
         cls.agent = TravelAgent(verbose=False)
     
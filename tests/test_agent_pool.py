@@ -0,0 +1,170 @@
+"""测试会话Agent池（LRU/空闲回收、状态快照和恢复）"""
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.agent.agent_pool import AgentPool
+from src.agent.llm_registry import clear_llm_registry
+from src.agent.specialized_agents import reset_specialized_agents
+
+
+class _FakeAgent:
+    """带状态导出/恢复的简单Agent"""
+    
+    def __init__(self, key: str):
+        self.key = key
+        self.travel_info = {}
+    
+    def export_state(self) -> dict:
+        return {"travel_info": self.travel_info}
+    
+    def restore_state(self, state: dict):
+        self.travel_info = state["travel_info"]
+
+
+class TestAgentPool(unittest.TestCase):
+    """测试Agent池的回收和恢复"""
+    
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+    
+    def test_reuses_live_agent(self):
+        """测试同一会话复用常驻的Agent"""
+        pool = AgentPool(_FakeAgent, max_size=2)
+        self.assertIs(pool.get("a"), pool.get("a"))
+        self.assertEqual(pool.stats()["created"], 1)
+    
+    def test_lru_eviction(self):
+        """测试超过上限时回收最久未使用的Agent"""
+        pool = AgentPool(_FakeAgent, max_size=2, idle_ttl=0)
+        pool.get("a")
+        pool.get("b")
+        pool.get("a")  # a 变为最近使用
+        pool.get("c")
+        self.assertIn("a", pool)
+        self.assertNotIn("b", pool)
+        self.assertEqual(pool.stats()["evictions_lru"], 1)
+    
+    def test_idle_eviction(self):
+        """测试空闲超时的Agent在下次访问池时被回收"""
+        pool = AgentPool(_FakeAgent, max_size=10, idle_ttl=60)
+        with patch('src.agent.agent_pool.time.time', return_value=1000.0):
+            pool.get("a")
+        with patch('src.agent.agent_pool.time.time', return_value=1030.0):
+            pool.get("b")
+        with patch('src.agent.agent_pool.time.time', return_value=1070.0):
+            pool.evict_idle()
+        self.assertNotIn("a", pool)
+        self.assertIn("b", pool)
+        self.assertEqual(pool.stats()["evictions_idle"], 1)
+    
+    def test_snapshot_and_revive(self):
+        """测试被回收Agent的状态保存到磁盘，再次访问时恢复"""
+        pool = AgentPool(_FakeAgent, max_size=1, snapshot_dir=self.tmpdir.name)
+        pool.get("a").travel_info = {"destination": "杭州"}
+        pool.get("b")  # 回收 a 并保存快照
+        
+        revived = pool.get("a")
+        self.assertEqual(revived.travel_info, {"destination": "杭州"})
+        stats = pool.stats()
+        self.assertEqual(stats["snapshots"], 2)  # a 被回收，之后 b 被回收
+        self.assertEqual(stats["revived"], 1)
+        self.assertGreaterEqual(stats["revive_latency_max_ms"], 0)
+    
+    def test_remove_discards_snapshot(self):
+        """测试移除会话时同时删除快照"""
+        pool = AgentPool(_FakeAgent, max_size=1, snapshot_dir=self.tmpdir.name)
+        pool.get("a").travel_info = {"destination": "杭州"}
+        pool.get("b")
+        pool.remove("a")
+        self.assertEqual(pool.get("a").travel_info, {})
+    
+    
+    def test_in_use_not_evicted(self):
+        """测试正在运行的会话的Agent不被LRU和空闲回收"""
+        busy = {"a"}
+        pool = AgentPool(_FakeAgent, max_size=1, snapshot_dir=self.tmpdir.name, in_use=lambda key: key in busy)
+        agent = pool.get("a")
+        pool.get("b")
+        self.assertIn("a", pool)
+        self.assertIs(pool.get("a"), agent)
+        self.assertEqual(pool.stats()["evictions_lru"], 1)
+        self.assertGreaterEqual(pool.stats()["eviction_skipped_in_use"], 1)
+        
+        busy.clear()
+        pool.get("c")
+        self.assertNotIn("a", pool)
+    
+    def test_slow_factory_does_not_block(self):
+        """测试创建Agent在锁外进行：一个会话创建缓慢时不阻塞其他会话，同一会话只创建一次"""
+        started = threading.Event()
+        release = threading.Event()
+        created = []
+        
+        def factory(key):
+            created.append(key)
+            if key == "slow":
+                started.set()
+                release.wait(5)
+            return _FakeAgent(key)
+        
+        pool = AgentPool(factory, max_size=10)
+        pool.get("fast")
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(pool.get("slow"))) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        self.assertTrue(started.wait(5))
+        
+        begin = time.perf_counter()
+        pool.get("fast")
+        pool.get("other")
+        self.assertLess(time.perf_counter() - begin, 1)
+        
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertIs(results[0], results[1])
+        self.assertEqual(created.count("slow"), 1)
+
+
+
+class TestTravelAgentState(unittest.TestCase):
+    """测试TravelAgent的状态导出和恢复"""
+    
+    def setUp(self):
+        reset_specialized_agents()
+        clear_llm_registry()
+        self.addCleanup(reset_specialized_agents)
+        self.addCleanup(clear_llm_registry)
+    
+    @patch('src.agent.travel_agent.config')
+    @patch('src.agent.llm_registry.config')
+    def test_export_restore_round_trip(self, mock_registry_config, mock_agent_config):
+        """测试旅行信息和对话历史可以恢复到新的TravelAgent"""
+        for mock_config in (mock_registry_config, mock_agent_config):
+            mock_config.get.side_effect = lambda key, default=None: default
+            mock_config.llm_provider = "fake"
+        
+        from src.agent.travel_agent import TravelAgent
+        agent = TravelAgent(verbose=False, session_id="user-1")
+        agent.set_travel_info({"destination": "杭州"})
+        agent.agent_executor.memory.chat_memory.add_user_message("你好")
+        agent.agent_executor.memory.chat_memory.add_ai_message("您好！")
+        
+        restored = TravelAgent(verbose=False, session_id="user-1")
+        restored.restore_state(agent.export_state())
+        self.assertEqual(restored.get_travel_info(), {"destination": "杭州"})
+        self.assertEqual([m.content for m in restored.agent_executor.memory.chat_memory.messages], ["你好", "您好！"])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
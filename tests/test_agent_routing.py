@@ -29,6 +29,12 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 # 导入模块（警告已被抑制）
 from src.agent.travel_agent import TravelAgent
 from tests.fixtures.test_callback_handler import TestCallbackHandler
+from tests.fixtures.routing_cases import MULTI_AGENT_QUERY, ROUTING_CASES
+
+
+def _queries(tool_name: str) -> list:
+    """应路由到指定专门Agent的单一意图用例"""
+    return [query for query, expected in ROUTING_CASES if expected == tool_name and query != MULTI_AGENT_QUERY]
 
 
 class TestAgentRouting(unittest.TestCase):
@@ -50,11 +56,7 @@ class TestAgentRouting(unittest.TestCase):
     
     def test_weather_routing(self):
         """测试天气查询路由"""
-        test_cases = [
-            "请查询北京明天的天气",
-            "我想知道上海今天的天气",
-            "请查询广州3天后的天气预报",
-        ]
+        test_cases = _queries("query_weather_agent")
         
         for query in test_cases:
             with self.subTest(query=query):
@@ -95,11 +97,7 @@ class TestAgentRouting(unittest.TestCase):
     
     def test_transport_routing(self):
         """测试交通路线路由"""
-        test_cases = [
-            "从北京到上海自驾需要多久？",
-            "查询从广州到深圳的交通路线",
-            "北京到天津的距离是多少？",
-        ]
+        test_cases = _queries("query_transport_agent")
         
         for query in test_cases:
             with self.subTest(query=query):
@@ -125,11 +123,7 @@ class TestAgentRouting(unittest.TestCase):
     
     def test_hotel_routing(self):
         """测试酒店查询路由"""
-        test_cases = [
-            "北京有什么酒店推荐？",
-            "查询上海的经济型酒店价格",
-            "广州的酒店价格是多少？",
-        ]
+        test_cases = _queries("query_hotel_agent")
         
         for query in test_cases:
             with self.subTest(query=query):
@@ -155,11 +149,7 @@ class TestAgentRouting(unittest.TestCase):
     
     def test_attraction_routing(self):
         """测试景点查询路由"""
-        test_cases = [
-            "北京有什么景点？",
-            "推荐一些上海的旅游景点",
-            "广州有哪些历史景点？",
-        ]
+        test_cases = _queries("query_attraction_agent")
         
         for query in test_cases:
             with self.subTest(query=query):
@@ -185,11 +175,7 @@ class TestAgentRouting(unittest.TestCase):
     
     def test_planning_routing(self):
         """测试行程规划路由"""
-        test_cases = [
-            "帮我规划一个3天的北京旅行",
-            "制定一个上海5天的行程计划",
-            "我想去广州旅游，帮我规划一下",
-        ]
+        test_cases = _queries("query_planning_agent")
         
         for query in test_cases:
             with self.subTest(query=query):
@@ -217,7 +203,7 @@ class TestAgentRouting(unittest.TestCase):
     def test_multi_agent_routing(self):
         """测试多Agent协作路由"""
         # 完整行程规划应该调用多个Agent
-        query = "我想从北京到上海，3天时间，预算5000元，帮我规划一下"
+        query = MULTI_AGENT_QUERY
         
         self.callback_handler.reset()
         try:
@@ -3,6 +3,8 @@ import unittest
 from unittest.mock import patch, MagicMock
 import os
 import sys
+import threading
+import time
 from datetime import datetime, timedelta
 
 # 添加项目根目录到路径
@@ -13,8 +15,11 @@ from src.agent.tools import (
     get_hotel_prices,
     get_transport_route,
     get_attraction_ticket_prices,
-    plan_travel_itinerary
+    plan_travel_itinerary,
+    _prefetch_sources
 )
+from src.agent.tool_memo import clear_tool_memo
+from src.utils.amap_cache import get_geocode_cache, get_route_cache, get_weather_cache
 
 
 class TestWeatherTool(unittest.TestCase):
@@ -24,8 +29,12 @@ class TestWeatherTool(unittest.TestCase):
         """设置测试环境"""
         self.city = "北京"
         self.date = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+        # 清空地理编码、天气缓存和工具结果记忆，避免测试之间互相影响
+        get_geocode_cache().clear(persistent=False)
+        get_weather_cache().clear(persistent=False)
+        clear_tool_memo()
     
-    @patch('src.agent.tools.requests.get')
+    @patch('src.utils.amap_rate_limiter.requests.Session.get')
     def test_weather_api_success(self, mock_get):
         """测试天气API调用成功"""
         # 模拟API响应
@@ -95,8 +104,12 @@ class TestTransportTool(unittest.TestCase):
         self.origin = "北京"
         self.destination = "上海"
         self.transport_mode = "自驾"
+        # 清空地理编码、路线缓存和工具结果记忆，避免测试之间互相影响
+        get_geocode_cache().clear(persistent=False)
+        get_route_cache().clear(persistent=False)
+        clear_tool_memo()
     
-    @patch('src.agent.tools.requests.get')
+    @patch('src.utils.amap_rate_limiter.requests.Session.get')
     def test_transport_api_success(self, mock_get):
         """测试交通API调用成功（自驾）"""
         # 模拟地理编码响应
@@ -307,6 +320,63 @@ class TestPlanningTool(unittest.TestCase):
             "行程" in result or "规划" in result or "安排" in result or
             "交通" in result_lower or "天气" in result_lower or "酒店" in result_lower
         )
+    
+    def _slow_tool(self, output, delay=0.2):
+        """模拟耗时的工具调用"""
+        mock_tool = MagicMock()
+        mock_tool.invoke.side_effect = lambda args: time.sleep(delay) or output
+        return mock_tool
+    
+    def test_planning_prefetch_parallel(self):
+        """测试行程规划并发预取数据，耗时接近最慢的数据源且章节顺序不变"""
+        with patch('src.agent.tools.get_transport_route', self._slow_tool("路线数据")), \
+             patch('src.agent.tools.get_weather_info', self._slow_tool("天气数据")), \
+             patch('src.agent.tools.get_hotel_prices', self._slow_tool("酒店数据")), \
+             patch('src.agent.tools.get_attraction_ticket_prices', self._slow_tool("景点数据")):
+            begin = time.perf_counter()
+            result = plan_travel_itinerary.invoke({
+                "days": self.days,
+                "destination": self.destination,
+                "departure_city": self.departure_city,
+                "departure_date": self.departure_date,
+                "return_date": self.return_date,
+                "hotel_preference": "经济型",
+                "interests": "历史"
+            })
+            elapsed = time.perf_counter() - begin
+        
+        self.assertLess(elapsed, 0.6)  # 串行执行需要约0.8秒
+        positions = [result.index(text) for text in ("路线数据", "天气数据", "酒店数据", "景点数据")]
+        self.assertEqual(positions, sorted(positions))
+    
+    def test_prefetch_timeout_keeps_partial_results(self):
+        """测试单个数据源超时不影响其他数据源"""
+        fetchers = {
+            "weather": lambda: "天气数据",
+            "transport": lambda: time.sleep(0.5) or "路线数据",
+            "hotel": lambda: 1 / 0,
+        }
+        results = _prefetch_sources(fetchers, timeout=0.1)
+        
+        self.assertEqual(results["weather"], ("天气数据", None))
+        self.assertIsNone(results["transport"][0])
+        self.assertIn("超时", results["transport"][1])
+        self.assertIsNone(results["hotel"][0])
+    
+    def test_prefetch_concurrent_plans_not_queued(self):
+        """测试多个会话同时规划时，数据源不会因为排队等待线程而超时"""
+        fetchers = {name: (lambda name=name: time.sleep(0.2) or name) for name in ("a", "b", "c", "d")}
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(_prefetch_sources(fetchers, timeout=0.35)))
+                   for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        
+        self.assertEqual(len(results), 6)
+        for result in results:
+            self.assertEqual(result, {name: (name, None) for name in fetchers})
 
 
 class TestSpecializedAgents(unittest.TestCase):
@@ -0,0 +1,290 @@
+"""测试高德地图API结果缓存（TTL、LRU淘汰、持久化、地理编码复用）"""
+import unittest
+from unittest.mock import patch, MagicMock
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.ttl_cache import TTLCache
+from src.utils.amap_cache import (
+    get_geocode_cache, get_route_cache, get_weather_cache, normalize_address, route_cache_key
+)
+from src.agent.tool_memo import clear_tool_memo
+from src.agent.tools import _batch_geocode, _geocode_address, get_transport_route, get_weather_info, get_weather_range
+
+
+class TestTTLCache(unittest.TestCase):
+    """测试通用TTL缓存"""
+    
+    def test_lru_eviction(self):
+        """测试超出容量时淘汰最久未使用的条目"""
+        cache = TTLCache(max_size=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")  # a变为最近使用
+        cache.set("c", 3)
+        
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(cache.stats()["evictions"], 1)
+    
+    def test_ttl_expiration(self):
+        """测试条目过期"""
+        cache = TTLCache(max_size=10, ttl=60)
+        cache.set("short", "v", ttl=0.05)
+        cache.set("long", "v")
+        time.sleep(0.1)
+        
+        self.assertIsNone(cache.get("short"))
+        self.assertEqual(cache.get("long"), "v")
+        stats = cache.stats()
+        self.assertEqual(stats["expirations"], 1)
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+    
+    def test_sqlite_persistence(self):
+        """测试缓存持久化后在新实例中仍可命中"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "cache.sqlite")
+            cache = TTLCache(max_size=10, ttl=60, persist_path=path, name="geocode")
+            cache.set("北京", {"adcode": "110000"})
+            
+            restarted = TTLCache(max_size=10, ttl=60, persist_path=path, name="geocode")
+            self.assertEqual(restarted.get("北京"), {"adcode": "110000"})
+            self.assertTrue(restarted.stats()["persistent"])
+            restarted._db.close()
+            cache._db.close()
+
+
+class TestGeocodeCache(unittest.TestCase):
+    """测试地理编码缓存在工具间复用"""
+    
+    def setUp(self):
+        get_geocode_cache().clear(persistent=False)
+        get_geocode_cache().reset_stats()
+    
+    def test_normalize_address(self):
+        """测试地址规范化"""
+        self.assertEqual(normalize_address(" 北京 市 "), "北京市")
+        self.assertEqual(normalize_address("Beijing"), normalize_address("beijing"))
+    
+    @patch('src.agent.tools._amap_limiter')
+    def test_geocode_request_once(self, mock_limiter):
+        """测试同一城市只请求一次地理编码API"""
+        geo_response = MagicMock()
+        geo_response.status_code = 200
+        geo_response.json.return_value = {
+            "status": "1",
+            "geocodes": [{
+                "adcode": "330100",
+                "formatted_address": "浙江省杭州市",
+                "location": "120.155070,30.274084"
+            }]
+        }
+        mock_limiter.get.return_value = geo_response
+        
+        first, error = _geocode_address("杭州", "test_key")
+        second, _ = _geocode_address(" 杭州 ", "test_key")
+        
+        self.assertIsNone(error)
+        self.assertEqual(first, second)
+        self.assertEqual(first["adcode"], "330100")
+        self.assertEqual(mock_limiter.get.call_count, 1)
+        self.assertEqual(get_geocode_cache().stats()["hits"], 1)
+    
+    @patch('src.agent.tools._amap_limiter')
+    def test_failed_geocode_not_cached(self, mock_limiter):
+        """测试失败的地理编码结果不会被缓存"""
+        geo_response = MagicMock()
+        geo_response.status_code = 200
+        geo_response.json.return_value = {"status": "0", "info": "INVALID_USER_KEY"}
+        mock_limiter.get.return_value = geo_response
+        
+        geocode, error = _geocode_address("杭州", "test_key")
+        _geocode_address("杭州", "test_key")
+        
+        self.assertIsNone(geocode)
+        self.assertIn("INVALID_USER_KEY", error)
+        self.assertEqual(mock_limiter.get.call_count, 2)
+
+
+
+class TestWeatherCache(unittest.TestCase):
+    """测试城市天气数据缓存（同一城市的多个日期共用一份预报数据）"""
+    
+    def setUp(self):
+        get_geocode_cache().clear(persistent=False)
+        get_weather_cache().clear(persistent=False)
+        clear_tool_memo()
+        self.dates = [(datetime.now() + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(1, 4)]
+    
+    def _mock_responses(self, url, params=None, timeout=5):
+        response = MagicMock()
+        response.status_code = 200
+        if "geocode" in url:
+            response.json.return_value = {
+                "status": "1",
+                "geocodes": [{"adcode": "330100", "formatted_address": "浙江省杭州市", "location": "120.15,30.27"}]
+            }
+        else:
+            response.json.return_value = {
+                "status": "1",
+                "forecasts": [{"casts": [
+                    {"date": date, "dayweather": "晴", "nightweather": "多云", "daytemp": "25", "nighttemp": "15"}
+                    for date in self.dates[:2]
+                ]}]
+            }
+        return response
+    
+    @patch.dict(os.environ, {"AMAP_API_KEY": "test_key"})
+    @patch('src.agent.tools._amap_limiter')
+    def test_forecast_fetched_once_per_city(self, mock_limiter):
+        """测试同一城市不同日期的天气查询只请求一次预报API"""
+        mock_limiter.get.side_effect = self._mock_responses
+        
+        first = get_weather_info.invoke({"city": "杭州", "date": self.dates[0]})
+        second = get_weather_info.invoke({"city": "杭州", "date": self.dates[1]})
+        
+        self.assertIn(self.dates[0], first)
+        self.assertIn(self.dates[1], second)
+        self.assertEqual(mock_limiter.get.call_count, 2)  # 地理编码 + 预报各一次
+        self.assertIn("330100:all", get_weather_cache())
+    
+    @patch.dict(os.environ, {"AMAP_API_KEY": "test_key"})
+    @patch('src.agent.tools._amap_limiter')
+    def test_weather_range_single_payload(self, mock_limiter):
+        """测试日期范围查询使用一份预报数据，并标注超出预报范围的日期"""
+        mock_limiter.get.side_effect = self._mock_responses
+        
+        result = get_weather_range.invoke({"city": "杭州", "start_date": self.dates[0], "end_date": self.dates[2]})
+        
+        self.assertEqual(mock_limiter.get.call_count, 2)
+        self.assertIn(f"浙江省杭州市在{self.dates[0]}的天气：白天晴", result)
+        self.assertIn(f"浙江省杭州市在{self.dates[1]}的天气：白天晴", result)
+        self.assertIn(f"{self.dates[2]}：超出预报范围", result)
+
+
+
+def _geocode_item(address: str) -> dict:
+    """模拟高德地图返回的单条地理编码结果"""
+    locations = {"北京": "116.397428,39.90923", "上海": "121.473701,31.230416", "杭州": "120.155070,30.274084"}
+    if address not in locations:
+        return {"adcode": [], "formatted_address": [], "location": []}
+    return {"adcode": "100000", "formatted_address": address + "市", "location": locations[address]}
+
+
+class TestRouteCache(unittest.TestCase):
+    """测试自驾路线缓存"""
+    
+    def setUp(self):
+        get_geocode_cache().clear(persistent=False)
+        get_route_cache().clear(persistent=False)
+        get_route_cache().reset_stats()
+        clear_tool_memo()
+    
+    def test_key_rounds_coordinates(self):
+        """测试相近坐标（约100米内）共用同一个缓存键，不同策略不共用"""
+        key = route_cache_key("116.397428,39.90923", "121.473701,31.230416", 0)
+        self.assertEqual(key, route_cache_key("116.3971,39.9089", "121.4741,31.2301", 0))
+        self.assertNotEqual(key, route_cache_key("116.397428,39.90923", "121.473701,31.230416", 2))
+        self.assertEqual(route_cache_key(" 北京 ", "上海", 0), route_cache_key("北京", "上海", 0))
+    
+    @patch.dict(os.environ, {"AMAP_API_KEY": "test_key"})
+    @patch('src.agent.tools._amap_limiter')
+    def test_repeat_route_uses_no_api_calls(self, mock_limiter):
+        """测试重复查询同一路线时不再调用高德地图API"""
+        def respond(url, params=None, timeout=5):
+            response = MagicMock()
+            response.status_code = 200
+            if "geocode" in url:
+                response.json.return_value = {
+                    "status": "1",
+                    "geocodes": [_geocode_item(address) for address in params["address"].split("|")]
+                }
+            else:
+                response.json.return_value = {
+                    "status": "1",
+                    "route": {"paths": [{"distance": "1200000", "duration": "43200", "tolls": "500", "toll_distance": "1000000"}]}
+                }
+            return response
+        
+        mock_limiter.get.side_effect = respond
+        args = {"origin": "北京", "destination": "上海", "transport_mode": "自驾"}
+        
+        first = get_transport_route.invoke(args)
+        calls_after_first = mock_limiter.get.call_count
+        clear_tool_memo()  # 跳过工具结果记忆，验证路线缓存本身
+        second = get_transport_route.invoke(args)
+        
+        self.assertEqual(calls_after_first, 2)  # 一次批量地理编码 + 一次路径规划
+        self.assertEqual(mock_limiter.get.call_count, calls_after_first)
+        self.assertEqual(first, second)
+        self.assertIn("1200.0公里", first)
+        stats = get_route_cache().stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+
+
+class TestBatchGeocode(unittest.TestCase):
+    """测试批量地理编码"""
+    
+    def setUp(self):
+        get_geocode_cache().clear(persistent=False)
+    
+    def _respond(self, url, params=None, timeout=5):
+        response = MagicMock()
+        response.status_code = 200
+        response.json.return_value = {
+            "status": "1",
+            "geocodes": [_geocode_item(address) for address in params["address"].split("|")]
+        }
+        return response
+    
+    @patch('src.agent.tools._amap_limiter')
+    def test_addresses_collapsed_into_chunks(self, mock_limiter):
+        """测试N个地址合并为 ceil(N/10) 次请求，结果按地址拆分并写入缓存"""
+        mock_limiter.get.side_effect = self._respond
+        addresses = ["北京", "上海"] + [f"未知地点{i}" for i in range(10)]
+        
+        results = _batch_geocode(addresses, "test_key")
+        
+        self.assertEqual(mock_limiter.get.call_count, 2)
+        self.assertEqual(mock_limiter.get.call_args_list[0].kwargs["params"]["batch"], "true")
+        self.assertEqual(results["上海"][0]["location"], "121.473701,31.230416")
+        self.assertIsNone(results["未知地点0"][0])
+        self.assertIn("未找到地址", results["未知地点0"][1])
+        
+        # 已缓存的地址不再请求，单个未缓存地址使用普通请求
+        mock_limiter.get.reset_mock()
+        results = _batch_geocode(["北京", "上海", "杭州"], "test_key")
+        self.assertEqual(mock_limiter.get.call_count, 1)
+        self.assertNotIn("batch", mock_limiter.get.call_args.kwargs["params"])
+        self.assertEqual(results["北京"][0]["formatted_address"], "北京市")
+    
+    @patch('src.agent.tools._amap_limiter')
+    def test_count_mismatch_falls_back(self, mock_limiter):
+        """测试批量结果数量不一致时逐个地址重新查询"""
+        def respond(url, params=None, timeout=5):
+            if params.get("batch"):
+                response = MagicMock()
+                response.status_code = 200
+                response.json.return_value = {"status": "1", "geocodes": [_geocode_item("北京")]}
+                return response
+            return self._respond(url, params)
+        
+        mock_limiter.get.side_effect = respond
+        results = _batch_geocode(["北京", "上海"], "test_key")
+        
+        self.assertEqual(mock_limiter.get.call_count, 3)
+        self.assertEqual(results["上海"][0]["formatted_address"], "上海市")
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,141 @@
+"""测试高德地图API本地模拟服务（模拟数据、录制回放、延迟和错误注入）"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+import requests
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.agent.tools import get_attraction_ticket_prices, get_transport_route, get_weather_info
+from src.agent.tool_memo import clear_tool_memo
+from src.utils.amap_cache import get_geocode_cache, get_route_cache, get_weather_cache
+from src.utils.amap_emulator import AmapEmulator
+
+
+def _clear_caches():
+    get_geocode_cache().clear(persistent=False)
+    get_weather_cache().clear(persistent=False)
+    get_route_cache().clear(persistent=False)
+    clear_tool_memo()
+
+
+class TestSyntheticMode(unittest.TestCase):
+    """测试工具通过 AMAP_BASE_URL 访问模拟服务"""
+    
+    @classmethod
+    def setUpClass(cls):
+        cls.emulator = AmapEmulator(mode="synthetic")
+        cls.base_url = cls.emulator.start()
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.emulator.stop()
+    
+    def setUp(self):
+        _clear_caches()
+        patcher = patch.dict(os.environ, {"AMAP_BASE_URL": self.base_url, "AMAP_API_KEY": "test_key"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def test_weather_tool(self):
+        """测试天气工具使用模拟的地理编码和天气预报"""
+        result = get_weather_info.invoke({"city": "北京", "date": datetime.now().strftime("%Y-%m-%d")})
+        self.assertIn("北京", result)
+        self.assertIn("温度", result)
+        self.assertNotIn("无法获取", result)
+    
+    def test_transport_tool(self):
+        """测试自驾路线使用模拟的批量地理编码和路径规划"""
+        result = get_transport_route.invoke({"origin": "北京", "destination": "上海", "transport_mode": "自驾"})
+        self.assertIn("高德地图API精确计算", result)
+        self.assertEqual(self.emulator.stats()["by_path"].get("/v3/direction/driving"), 1)
+    
+    def test_attraction_tool(self):
+        """测试景点搜索使用模拟的POI数据"""
+        result = get_attraction_ticket_prices.invoke({"city": "杭州"})
+        self.assertIn("杭州", result)
+        self.assertNotIn("未配置", result)
+    
+    def test_unknown_path(self):
+        """测试未知接口返回404"""
+        response = requests.get(self.base_url + "/v3/unknown", timeout=5)
+        self.assertEqual(response.status_code, 404)
+
+
+class TestRecordReplay(unittest.TestCase):
+    """测试录制上游响应并离线回放"""
+    
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.fixtures_path = os.path.join(self.tmpdir, "amap_fixtures.json")
+        self.upstream = AmapEmulator(mode="synthetic")
+        self.upstream.start()
+    
+    def tearDown(self):
+        self.upstream.stop()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+    
+    def test_record_then_replay(self):
+        """测试录制的响应可以原样回放，未录制的请求返回 FIXTURE_NOT_FOUND"""
+        params = {"key": "real_key", "address": "上海", "output": "JSON"}
+        with AmapEmulator(mode="record", fixtures_path=self.fixtures_path,
+                          upstream=self.upstream.base_url) as recorder:
+            recorded = requests.get(recorder.base_url + "/v3/geocode/geo", params=params, timeout=5).json()
+            self.assertEqual(recorder.stats()["recorded"], 1)
+        self.assertTrue(os.path.exists(self.fixtures_path))
+        
+        with AmapEmulator(mode="replay", fixtures_path=self.fixtures_path) as replayer:
+            # API密钥不参与匹配，回放时可以使用任意密钥
+            replay_params = dict(params, key="other_key")
+            replayed = requests.get(replayer.base_url + "/v3/geocode/geo", params=replay_params, timeout=5)
+            self.assertEqual(replayed.json(), recorded)
+            
+            miss = requests.get(replayer.base_url + "/v3/geocode/geo",
+                                params=dict(params, address="广州"), timeout=5)
+            self.assertEqual(miss.json()["info"], "FIXTURE_NOT_FOUND")
+            self.assertEqual(replayer.stats()["replay_misses"], 1)
+        
+        self.assertEqual(self.upstream.stats()["requests"], 1)  # 回放不访问上游
+    
+    def test_replay_requires_fixtures(self):
+        """测试回放模式缺少fixtures文件时报错"""
+        with self.assertRaises(ValueError):
+            AmapEmulator(mode="replay")
+        with self.assertRaises(FileNotFoundError):
+            AmapEmulator(mode="replay", fixtures_path=self.fixtures_path)
+
+
+class TestInjection(unittest.TestCase):
+    """测试延迟和错误注入"""
+    
+    def test_latency(self):
+        """测试每个请求按配置延迟"""
+        with AmapEmulator(latency=0.2) as emulator:
+            begin = time.perf_counter()
+            requests.get(emulator.base_url + "/v3/geocode/geo", params={"address": "北京"}, timeout=5)
+            self.assertGreaterEqual(time.perf_counter() - begin, 0.2)
+    
+    def test_http_errors(self):
+        """测试注入HTTP 503错误"""
+        with AmapEmulator(error_rate=1.0) as emulator:
+            response = requests.get(emulator.base_url + "/v3/geocode/geo", params={"address": "北京"}, timeout=5)
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(emulator.stats()["injected_errors"], 1)
+    
+    def test_quota_errors(self):
+        """测试注入高德QPS超限错误"""
+        with AmapEmulator(error_rate=1.0, error_mode="quota") as emulator:
+            response = requests.get(emulator.base_url + "/v3/geocode/geo", params={"address": "北京"}, timeout=5)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["info"], "CUQPS_HAS_EXCEEDED_THE_LIMIT")
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,167 @@
+"""测试高德地图API限流器的HTTP连接池（keep-alive复用、重试）和请求合并"""
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.amap_rate_limiter import get_amap_rate_limiter
+from src.utils.cancellation import CancellationToken, RunCancelled, cancellation_scope
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    """支持HTTP/1.1 keep-alive的测试服务器，前 fail_count 次请求返回503"""
+    
+    protocol_version = "HTTP/1.1"
+    fail_count = 0
+    request_count = 0
+    delay = 0.0
+    
+    def do_GET(self):
+        type(self).request_count += 1
+        time.sleep(type(self).delay)
+        if type(self).request_count <= type(self).fail_count:
+            status, body = 503, b'{"status": "0"}'
+        else:
+            status, body = 200, json.dumps({"status": "1", "path": self.path}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+class TestAmapHttpPool(unittest.TestCase):
+    """测试限流器复用HTTP连接"""
+    
+    def setUp(self):
+        _KeepAliveHandler.fail_count = 0
+        _KeepAliveHandler.request_count = 0
+        _KeepAliveHandler.delay = 0.0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAliveHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.host = f"127.0.0.1:{self.server.server_address[1]}"
+        self.limiter = get_amap_rate_limiter()
+    
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+    
+    def test_connection_reused(self):
+        """测试多次请求复用同一个TCP连接"""
+        for i in range(4):
+            response = self.limiter.get(f"{self.base_url}/v3/geocode/geo", params={"address": str(i)})
+            self.assertEqual(response.status_code, 200)
+        
+        stats = self.limiter.connection_stats()[self.host]
+        self.assertEqual(stats["requests"], 4)
+        self.assertEqual(stats["connections"], 1)
+        self.assertEqual(stats["reused"], 3)
+    
+    def test_retry_on_5xx(self):
+        """测试遇到5xx时自动重试，每次重试都重新获取令牌"""
+        _KeepAliveHandler.fail_count = 2
+        with patch.object(self.limiter, "_wait_if_needed", wraps=self.limiter._wait_if_needed) as wait:
+            response = self.limiter.get(f"{self.base_url}/v3/weather/weatherInfo")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(_KeepAliveHandler.request_count, 3)
+        self.assertEqual(wait.call_count, 3)
+    
+    
+    def test_single_flight_dedup(self):
+        """测试相同的并发请求只发送一次，其他调用方共享响应"""
+        _KeepAliveHandler.delay = 0.3
+        deduplicated_before = self.limiter.stats()["deduplicated"]
+        responses = []
+        
+        def fetch(city):
+            response = self.limiter.get(f"{self.base_url}/v3/weather/weatherInfo", params={"city": city, "key": "k"})
+            responses.append(response.json())
+        
+        threads = [threading.Thread(target=fetch, args=("330100",)) for _ in range(4)]
+        threads.append(threading.Thread(target=fetch, args=("110000",)))
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        
+        self.assertEqual(len(responses), 5)
+        self.assertEqual(_KeepAliveHandler.request_count, 2)  # 两个不同的城市各请求一次
+        self.assertEqual(self.limiter.stats()["deduplicated"] - deduplicated_before, 3)
+        self.assertEqual(self.limiter.stats()["in_flight"], 0)
+    
+    def test_single_flight_leader_cancelled(self):
+        """测试合并请求的发起方被取消时，等待方自行重新发起请求，而不是得到空响应或取消"""
+        _KeepAliveHandler.fail_count = 1
+        _KeepAliveHandler.delay = 0.2
+        url, params = f"{self.base_url}/v3/weather/weatherInfo", {"city": "310000", "key": "k"}
+        token = CancellationToken()
+        results = {}
+        
+        def lead():
+            with cancellation_scope(token):
+                try:
+                    self.limiter.get(url, params=params)
+                except RunCancelled:
+                    results["leader"] = "cancelled"
+        
+        def follow():
+            results["follower"] = self.limiter.get(url, params=params).status_code
+        
+        leader = threading.Thread(target=lead)
+        leader.start()
+        time.sleep(0.05)
+        follower = threading.Thread(target=follow)
+        follower.start()
+        token.cancel()
+        leader.join(5)
+        follower.join(5)
+        # 发起方第一次请求返回503，重试前检查到运行已取消；等待方重新发起请求并成功
+        self.assertEqual(results, {"leader": "cancelled", "follower": 200})
+        self.assertEqual(self.limiter.stats()["in_flight"], 0)
+    
+    def test_single_flight_waiter_cancelled(self):
+        """测试合并请求的等待方所在的运行被取消时立即结束等待，发起方照常完成请求"""
+        _KeepAliveHandler.delay = 0.5
+        url, params = f"{self.base_url}/v3/weather/weatherInfo", {"city": "320100", "key": "k"}
+        token = CancellationToken()
+        results = {}
+        
+        def lead():
+            results["leader"] = self.limiter.get(url, params=params).status_code
+        
+        def follow():
+            with cancellation_scope(token):
+                try:
+                    self.limiter.get(url, params=params)
+                except RunCancelled:
+                    results["follower"] = time.perf_counter()
+        
+        leader = threading.Thread(target=lead)
+        leader.start()
+        time.sleep(0.05)
+        follower = threading.Thread(target=follow)
+        follower.start()
+        time.sleep(0.05)
+        begin = time.perf_counter()
+        token.cancel()
+        follower.join(5)
+        self.assertLess(results["follower"] - begin, 0.3)
+        self.assertNotIn("leader", results)
+        leader.join(5)
+        self.assertEqual(results["leader"], 200)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,154 @@
+"""测试ASGI应用入口（异步SSE流式接口、与Flask共用会话、会话忙时返回429、其他路由由Flask处理）"""
+import json
+import os
+import sys
+import unittest
+import uuid
+from unittest.mock import patch
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+try:
+    from starlette.testclient import TestClient
+    from asgi import app, sessions
+    ASGI_AVAILABLE = True
+except ImportError:
+    ASGI_AVAILABLE = False
+
+from src.agent.llm_registry import clear_llm_registry
+from src.agent.run_guard import RunGuard
+from src.agent.specialized_agents import reset_specialized_agents
+
+
+def _events(response) -> list:
+    return [json.loads(line[len("data: "):]) for line in response.text.splitlines() if line.startswith("data: ")]
+
+
+@unittest.skipUnless(ASGI_AVAILABLE, "未安装 starlette / a2wsgi")
+class TestAsgiApp(unittest.TestCase):
+    """测试ASGI应用（本地脚本化模型）"""
+    
+    def setUp(self):
+        reset_specialized_agents()
+        clear_llm_registry()
+        self.addCleanup(reset_specialized_agents)
+        self.addCleanup(clear_llm_registry)
+        settings = {"agent.response_cache.enabled": False}
+        patchers = [patch('src.agent.llm_registry.config'), patch('src.agent.travel_agent.config'),
+                    patch('src.agent.fake_llm.config'), patch('src.agent.response_cache.config')]
+        for patcher in patchers:
+            mock_config = patcher.start()
+            mock_config.get.side_effect = lambda key, default=None: settings.get(key, default)
+            mock_config.llm_provider = "fake"
+            mock_config.llm_model = "scripted"
+            self.addCleanup(patcher.stop)
+        self.client = TestClient(app)
+        self.session = {"user_id": f"asgi-test-{uuid.uuid4().hex[:8]}"}
+        self.client.cookies.set("session", sessions.serializer.dumps(self.session))
+    
+    def test_login_required(self):
+        """测试未登录时流式接口返回401"""
+        response = TestClient(app).post("/api/chat/stream", json={"message": "北京明天天气怎么样？"})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()["error"], "请先登录")
+    
+    def test_chat_stream(self):
+        """测试异步执行Agent并按SSE推送工具进度、最终回答和结束标记"""
+        response = self.client.post("/api/chat/stream", json={"message": "北京明天天气怎么样？"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/event-stream"))
+        
+        events = _events(response)
+        types = [event["type"] for event in events]
+        self.assertIn("tool_start", types)
+        self.assertEqual(types[-2:], ["final", "done"])
+        self.assertTrue(events[-2]["message"])
+    
+    def test_busy_agent_rejected(self):
+        """测试同一会话的上一个请求仍在执行且排队已满时返回429"""
+        guard = RunGuard(max_queue_per_agent=0, retry_after=3)
+        ticket = guard.acquire(self.session["user_id"])
+        with patch('asgi.get_run_guard', return_value=guard):
+            response = self.client.post("/api/chat/stream", json={"message": "北京明天天气怎么样？"})
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response.headers["retry-after"], "3")
+            ticket.release()
+            response = self.client.post("/api/chat/stream", json={"message": "北京明天天气怎么样？"})
+            self.assertEqual(_events(response)[-1]["type"], "done")
+        self.assertEqual(guard.stats()["active_runs"], 0)
+    
+    def test_ticket_released_on_setup_error(self):
+        """测试运行交给后台之前出错时释放执行名额（ASGI和Flask的流式接口）"""
+        import app as flask_module
+        guard = RunGuard()
+        flask_client = flask_module.app.test_client()
+        with flask_client.session_transaction() as flask_session:
+            flask_session["user_id"] = self.session["user_id"] + "-flask"
+        with patch('asgi.get_run_guard', return_value=guard), patch('app.get_run_guard', return_value=guard), \
+                patch('asgi.get_or_create_agent', side_effect=RuntimeError("初始化失败")), \
+                patch('app.get_or_create_agent', side_effect=RuntimeError("初始化失败")):
+            response = self.client.post("/api/chat/stream", json={"message": "北京明天天气怎么样？"})
+            self.assertEqual(response.status_code, 500)
+            response = flask_client.post("/api/generate-plan/stream",
+                                         json={"travelInfo": {"departureDate": "2026-05-01", "returnDate": "2026-05-03"}})
+            self.assertEqual(response.status_code, 500)
+        self.assertEqual(guard.stats()["active_runs"], 0)
+    
+    def test_reset_waits_for_run(self):
+        """测试重置对话与对话请求共用执行名额：同一会话正在运行且排队已满时返回429，名额释放后重置成功"""
+        import app as flask_module
+        guard = RunGuard(max_queue_per_agent=0, retry_after=3)
+        flask_client = flask_module.app.test_client()
+        with flask_client.session_transaction() as flask_session:
+            flask_session["user_id"] = self.session["user_id"]
+        ticket = guard.acquire(self.session["user_id"])
+        with patch('app.get_run_guard', return_value=guard):
+            response = flask_client.post("/api/reset")
+            self.assertEqual((response.status_code, response.headers["Retry-After"]), (429, "3"))
+            ticket.release()
+            response = flask_client.post("/api/reset")
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(guard.stats()["active_runs"], 0)
+    
+    def test_plan_stream_saves_session(self):
+        """测试流式规划把旅行信息写入Flask会话，Flask路由读取同一个会话"""
+        travel_info = {"departureDate": "2026-05-01", "returnDate": "2026-05-03"}
+        response = self.client.post("/api/generate-plan/stream", json={"travelInfo": {}})
+        self.assertEqual(response.status_code, 400)
+        
+        response = self.client.post("/api/generate-plan/stream", json={"travelInfo": travel_info})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(_events(response)[-1]["type"], "done")
+        session = sessions.serializer.loads(response.cookies["session"])
+        self.assertEqual(session["travel_info"], travel_info)
+        self.assertEqual(session["user_id"], self.session["user_id"])
+        
+        # 其他路由由Flask应用处理，并读取到同一个登录状态（测试用户不存在，返回404而不是未登录的401）
+        self.client.cookies.set("session", response.cookies["session"])
+        response = self.client.get("/api/user/info")
+        self.assertEqual((response.status_code, response.json()["error"]), (404, "用户不存在"))
+        self.assertIn("api_configured", self.client.get("/api/status").json())
+    
+    
+    def test_generate_plan_uses_plan_request(self):
+        """测试非流式规划接口与流式接口使用同一个规划请求和结构化规划入口"""
+        import app as flask_module
+        travel_info = {"departureDate": "2026-05-01", "returnDate": "2026-05-03", "destination": "杭州"}
+        calls = []
+        
+        def plan(agent, user_request, callbacks=None, combined_input=None):
+            calls.append((user_request, combined_input))
+            return "杭州三日游行程"
+        
+        with patch('src.agent.travel_agent.TravelAgent.plan_from_travel_info', autospec=True, side_effect=plan):
+            response = self.client.post("/api/generate-plan", json={"travelInfo": travel_info})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()["plan"], response.json()["days"]), ("杭州三日游行程", 3))
+        user_request, combined_input = calls[0]
+        self.assertEqual(user_request, flask_module.build_plan_request(travel_info))
+        self.assertIn(user_request, combined_input)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
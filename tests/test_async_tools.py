@@ -0,0 +1,285 @@
+"""测试高德地图API异步客户端和异步版本的工具"""
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock, patch
+
+import httpx
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.agent.tools import get_weather_info, get_transport_route
+from src.agent.tool_memo import clear_tool_memo
+from src.utils.amap_cache import get_geocode_cache, get_weather_cache
+from src.utils.async_amap_client import AsyncAmapClient
+
+
+def _json_response(payload: dict) -> MagicMock:
+    response = MagicMock()
+    response.status_code = 200
+    response.json.return_value = payload
+    return response
+
+
+def _fake_amap_response(url: str, params: dict) -> MagicMock:
+    """根据URL返回模拟的高德地图API响应"""
+    if "geocode" in url:
+        return _json_response({
+            "status": "1",
+            "geocodes": [{"adcode": "110000", "formatted_address": params["address"], "location": "116.4,39.9"}]
+        })
+    if "weather" in url:
+        return _json_response({
+            "status": "1",
+            "forecasts": [{"casts": [{"date": (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d"),
+                                      "dayweather": "晴", "nightweather": "多云",
+                                      "daytemp": "25", "nighttemp": "15"}]}]
+        })
+    return _json_response({"status": "0", "info": "UNKNOWN"})
+
+
+class _FakeAsyncClient:
+    """模拟异步客户端，每次请求耗时 latency 秒"""
+    
+    def __init__(self, latency: float = 0.0, error: Exception = None):
+        self.latency = latency
+        self.error = error
+        self.calls = 0
+    
+    async def get(self, url, params=None, timeout=5, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if self.error is not None:
+            raise self.error
+        return _fake_amap_response(url, params)
+
+
+class TestAsyncTools(unittest.TestCase):
+    """测试异步版本的工具与同步版本共享解析逻辑"""
+    
+    def setUp(self):
+        get_geocode_cache().clear(persistent=False)
+        get_weather_cache().clear(persistent=False)
+        clear_tool_memo()
+        self.date = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+    
+    @patch.dict(os.environ, {"AMAP_API_KEY": "test_key"})
+    @patch('src.agent.tools._amap_limiter')
+    def test_async_result_matches_sync(self, mock_limiter):
+        """测试异步工具与同步工具返回相同结果"""
+        mock_limiter.get.side_effect = lambda url, params=None, timeout=5: _fake_amap_response(url, params)
+        sync_result = get_weather_info.invoke({"city": "北京", "date": self.date})
+        
+        get_geocode_cache().clear(persistent=False)
+        get_weather_cache().clear(persistent=False)
+        clear_tool_memo()
+        with patch('src.agent.tools._async_amap_client', _FakeAsyncClient()):
+            async_result = asyncio.run(get_weather_info.ainvoke({"city": "北京", "date": self.date}))
+        
+        self.assertIn("白天晴", sync_result)
+        self.assertEqual(sync_result, async_result)
+    
+    @patch.dict(os.environ, {"AMAP_API_KEY": "test_key"})
+    def test_concurrent_calls_overlap(self):
+        """测试多个异步工具调用在同一事件循环中并发执行"""
+        client = _FakeAsyncClient(latency=0.1)
+        cities = ["北京", "上海", "广州", "深圳", "杭州"]
+        
+        async def run_all():
+            return await asyncio.gather(*[
+                get_weather_info.ainvoke({"city": city, "date": self.date}) for city in cities
+            ])
+        
+        with patch('src.agent.tools._async_amap_client', client):
+            begin = time.perf_counter()
+            results = asyncio.run(run_all())
+            elapsed = time.perf_counter() - begin
+        
+        self.assertEqual(client.calls, 10)  # 每个城市：地理编码 + 天气
+        self.assertLess(elapsed, 0.5)  # 串行执行需要约1秒
+        for city, result in zip(cities, results):
+            self.assertIn(city, result)
+    
+    @patch.dict(os.environ, {"AMAP_API_KEY": "test_key"})
+    def test_httpx_timeout_handled_like_requests(self):
+        """测试httpx超时异常按requests超时处理（返回估算结果）"""
+        client = _FakeAsyncClient(error=httpx.ReadTimeout("timed out"))
+        with patch('src.agent.tools._async_amap_client', client):
+            result = asyncio.run(get_transport_route.ainvoke({
+                "origin": "北京", "destination": "上海", "transport_mode": "自驾"
+            }))
+        
+        self.assertIn("高德地图API请求超时", result)
+        self.assertIn("自驾路线估算", result)
+
+
+class _FlakyHandler(BaseHTTPRequestHandler):
+    """前 fail_count 次请求返回503、前 slow_count 次请求延迟 delay 秒响应的测试服务器"""
+    
+    protocol_version = "HTTP/1.1"
+    fail_count = 0
+    slow_count = 0
+    delay = 0.0
+    request_count = 0
+    
+    def do_GET(self):
+        type(self).request_count += 1
+        if type(self).request_count <= type(self).slow_count:
+            time.sleep(type(self).delay)
+        if type(self).request_count <= type(self).fail_count:
+            status, body = 503, b'{"status": "0"}'
+        else:
+            status, body = 200, json.dumps({"status": "1"}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+class TestAsyncAmapClient(unittest.TestCase):
+    """测试异步客户端的重试和限流"""
+    
+    def setUp(self):
+        _FlakyHandler.fail_count = 0
+        _FlakyHandler.slow_count = 0
+        _FlakyHandler.request_count = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _FlakyHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v3/weather/weatherInfo"
+    
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+    
+    def test_retry_on_5xx(self):
+        """测试遇到5xx时自动重试，每次重试都重新获取令牌"""
+        _FlakyHandler.fail_count = 1
+        limiter = MagicMock()
+        
+        async def acquire():
+            return 0.0
+        
+        limiter.acquire.side_effect = acquire
+        client = AsyncAmapClient(limiter=limiter)
+        
+        async def fetch():
+            try:
+                return await client.get(self.url, params={"city": "110000"})
+            finally:
+                await client.aclose()
+        
+        response = asyncio.run(fetch())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"status": "1"})
+        self.assertEqual(_FlakyHandler.request_count, 2)
+        self.assertEqual(client.stats()["retries"], 1)
+        self.assertEqual(limiter.acquire.call_count, 2)
+    
+    def test_retry_on_read_timeout(self):
+        """测试读取超时时与同步限流器一样重试，每次重试都重新获取令牌"""
+        _FlakyHandler.slow_count = 1
+        _FlakyHandler.delay = 0.5
+        limiter = MagicMock()
+        
+        async def acquire():
+            return 0.0
+        
+        limiter.acquire.side_effect = acquire
+        client = AsyncAmapClient(limiter=limiter)
+        
+        async def fetch():
+            try:
+                return await client.get(self.url, params={"city": "110000"}, timeout=0.2)
+            finally:
+                await client.aclose()
+        
+        response = asyncio.run(fetch())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(_FlakyHandler.request_count, 2)
+        self.assertEqual(client.stats()["retries"], 1)
+        self.assertEqual(limiter.acquire.call_count, 2)
+    
+    def test_shares_rate_limiter(self):
+        """测试异步请求从共享限流器获取配额，相同的并发请求只占用一次配额"""
+        limiter = MagicMock()
+        
+        async def acquire():
+            return 0.0
+        
+        limiter.acquire.side_effect = acquire
+        client = AsyncAmapClient(limiter=limiter)
+        
+        async def fetch_many():
+            try:
+                return await asyncio.gather(*[client.get(self.url) for _ in range(3)])
+            finally:
+                await client.aclose()
+        
+        responses = asyncio.run(fetch_many())
+        self.assertEqual([r.status_code for r in responses], [200, 200, 200])
+        self.assertEqual(limiter.acquire.call_count, 1)  # 相同的并发请求被合并
+        self.assertEqual(client.stats()["deduplicated"], 2)
+    
+    def test_single_flight_shares_errors(self):
+        """测试合并的请求共享异常，且不同参数的请求不会合并"""
+        client = AsyncAmapClient()
+        calls = []
+        
+        async def failing_send(*args, **kwargs):
+            calls.append(args)
+            await asyncio.sleep(0.05)
+            raise httpx.ConnectError("refused")
+        
+        client._send = failing_send
+        
+        async def fetch_many():
+            return await asyncio.gather(
+                client.get(self.url, params={"city": "1"}),
+                client.get(self.url, params={"city": "1"}),
+                client.get(self.url, params={"city": "2"}),
+                return_exceptions=True,
+            )
+        
+        results = asyncio.run(fetch_many())
+        self.assertTrue(all(isinstance(r, httpx.ConnectError) for r in results))
+        self.assertEqual(len(calls), 2)
+    
+    def test_single_flight_leader_cancelled(self):
+        """测试合并请求的发起方任务被取消时，等待方重新发起请求，而不是收到取消"""
+        client = AsyncAmapClient()
+        sends = []
+        
+        async def slow_send(*args, **kwargs):
+            sends.append(args)
+            await asyncio.sleep(0.2)
+            return "response"
+        
+        client._send = slow_send
+        
+        async def run():
+            leader = asyncio.create_task(client.get(self.url, params={"city": "1"}))
+            await asyncio.sleep(0.05)
+            follower = asyncio.create_task(client.get(self.url, params={"city": "1"}))
+            await asyncio.sleep(0.05)
+            leader.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            return await follower
+        
+        self.assertEqual(asyncio.run(run()), "response")
+        self.assertEqual(len(sends), 2)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
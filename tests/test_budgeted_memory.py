@@ -0,0 +1,166 @@
+"""测试主协调Agent的预算化对话记忆"""
+import asyncio
+import os
+import sys
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.messages import SystemMessage
+
+from src.agent.budgeted_memory import BudgetedConversationMemory, estimate_tokens
+from src.agent.llm_registry import clear_llm_registry
+from src.agent.specialized_agents import reset_specialized_agents
+
+
+def _chat(memory: BudgetedConversationMemory, user: str, answer: str) -> dict:
+    """模拟一轮对话：读取历史，保存本轮"""
+    history = memory.load_memory_variables({"input": user})
+    memory.save_context({"input": user}, {"output": answer})
+    return history
+
+
+class TestBudgetedMemory(unittest.TestCase):
+    """测试最近对话保留、摘要压缩和token统计"""
+    
+    def test_estimate_tokens(self):
+        """测试token估算（中文按字，其他字符按4个字符1个token）"""
+        self.assertEqual(estimate_tokens(""), 0)
+        self.assertEqual(estimate_tokens("北京天气"), 4)
+        self.assertEqual(estimate_tokens("abcdefgh"), 2)
+    
+    def test_keeps_recent_turns(self):
+        """测试只保留最近K轮原文，较早的对话进入摘要"""
+        memory = BudgetedConversationMemory(max_turns=2, max_tokens=0)
+        for i in range(5):
+            _chat(memory, f"旅行信息\n\n用户问题: 第{i}个问题", f"第{i}个回答")
+        
+        self.assertEqual(len(memory.chat_memory.messages), 4)
+        self.assertEqual(memory.chat_memory.messages[0].content, "旅行信息\n\n用户问题: 第3个问题")
+        self.assertEqual(memory.summarized_turns, 3)
+        self.assertIn("第0个问题", memory.summary)
+        self.assertNotIn("旅行信息", memory.summary)
+        
+        history = memory.load_memory_variables({})["chat_history"]
+        self.assertIsInstance(history[0], SystemMessage)
+        self.assertIn(memory.summary, history[0].content)
+    
+    def test_token_cap(self):
+        """测试历史超过token上限时继续压缩，至少保留最近一轮"""
+        memory = BudgetedConversationMemory(max_turns=10, max_tokens=300, summary_max_tokens=100)
+        for i in range(6):
+            _chat(memory, f"问题{i}", "行程安排" * 50)
+        
+        report_history = memory.load_memory_variables({})
+        self.assertLessEqual(memory.last_report["prompt_tokens"], 300)
+        self.assertGreaterEqual(len(report_history["chat_history"]), 2)
+        self.assertLessEqual(estimate_tokens(memory.summary), 100)
+    
+    def test_reports_tokens_saved(self):
+        """测试每轮报告相对完整历史节省的token数"""
+        memory = BudgetedConversationMemory(max_turns=1, max_tokens=0)
+        _chat(memory, "北京三日游怎么安排", "行程" * 200)
+        _chat(memory, "预算多少", "费用" * 200)
+        _chat(memory, "天气如何", "晴")
+        
+        report = memory.report()
+        self.assertEqual(report["mode"], "budgeted")
+        self.assertGreater(report["history_tokens"], report["prompt_tokens"])
+        self.assertEqual(report["tokens_saved"], report["history_tokens"] - report["prompt_tokens"])
+        self.assertGreater(report["tokens_saved_total"], 0)
+    
+    def test_llm_summarizer_fallback(self):
+        """测试LLM摘要失败时退回要点截取"""
+        llm = MagicMock()
+        llm.invoke.side_effect = RuntimeError("timeout")
+        memory = BudgetedConversationMemory(max_turns=1, max_tokens=0, summarizer="llm", llm=llm)
+        _chat(memory, "去杭州", "好的")
+        _chat(memory, "住哪里", "西湖附近")
+        self.assertIn("去杭州", memory.summary)
+        
+        llm.invoke.side_effect = None
+        llm.invoke.return_value = MagicMock(content="用户计划去杭州，住西湖附近")
+        _chat(memory, "玩几天", "三天")
+        self.assertEqual(memory.summary, "用户计划去杭州，住西湖附近")
+    
+    def test_llm_summary_off_event_loop(self):
+        """测试在事件循环中保存记忆时LLM摘要在线程池中生成，不阻塞事件循环"""
+        release = threading.Event()
+        llm = MagicMock()
+        
+        def invoke(prompt):
+            release.wait(5)
+            return MagicMock(content="用户计划去杭州")
+        
+        llm.invoke.side_effect = invoke
+        memory = BudgetedConversationMemory(max_turns=1, max_tokens=0, summarizer="llm", llm=llm)
+        
+        async def run():
+            _chat(memory, "去杭州", "好的")
+            # 超出轮数，摘要在线程池中生成，save_context 立即返回
+            _chat(memory, "住哪里", "西湖附近")
+            self.assertEqual(memory.summary, "")
+            release.set()
+            await memory.aload_memory_variables({})
+            self.assertEqual(memory.summary, "用户计划去杭州")
+            self.assertEqual([m.content for m in memory.chat_memory.messages], ["住哪里", "西湖附近"])
+            
+            await memory.asave_context({"input": "玩几天"}, {"output": "三天"})
+            self.assertEqual(llm.invoke.call_count, 2)
+            self.assertEqual([m.content for m in memory.chat_memory.messages], ["玩几天", "三天"])
+        
+        asyncio.run(run())
+    
+    def test_clear(self):
+        """测试清空记忆同时清空摘要和统计"""
+        memory = BudgetedConversationMemory(max_turns=1)
+        _chat(memory, "去杭州", "好的")
+        _chat(memory, "住哪里", "西湖附近")
+        memory.clear()
+        self.assertEqual(memory.summary, "")
+        self.assertEqual(memory.history_tokens, 0)
+        self.assertEqual(memory.chat_memory.messages, [])
+
+
+class TestTravelAgentMemory(unittest.TestCase):
+    """测试TravelAgent使用预算化对话记忆"""
+    
+    def setUp(self):
+        reset_specialized_agents()
+        clear_llm_registry()
+        self.addCleanup(reset_specialized_agents)
+        self.addCleanup(clear_llm_registry)
+    
+    @patch('src.agent.budgeted_memory.config')
+    @patch('src.agent.travel_agent.config')
+    @patch('src.agent.llm_registry.config')
+    def test_chat_reports_memory(self, mock_registry_config, mock_agent_config, mock_memory_config):
+        """测试对话后报告历史token统计，且摘要随状态导出/恢复"""
+        settings = {"agent.memory.max_turns": 1, "agent.memory.max_tokens": 0}
+        for mock_config in (mock_registry_config, mock_agent_config, mock_memory_config):
+            mock_config.get.side_effect = lambda key, default=None: settings.get(key, default)
+            mock_config.llm_provider = "fake"
+        
+        from src.agent.travel_agent import TravelAgent
+        agent = TravelAgent(verbose=False, session_id="user-1")
+        self.assertIsInstance(agent.agent_executor.memory, BudgetedConversationMemory)
+        agent.intent_router = None  # 经主协调Agent处理，才会读取对话历史
+        agent.chat("北京明天天气怎么样？")
+        agent.chat("北京酒店推荐")
+        agent.chat("从北京到上海自驾")
+        
+        report = agent.get_memory_report()
+        self.assertEqual(report["summarized_turns"], 1)
+        self.assertGreater(report["history_tokens"], 0)
+        self.assertEqual(report["tokens_saved"], max(0, report["history_tokens"] - report["prompt_tokens"]))
+        
+        restored = TravelAgent(verbose=False, session_id="user-1")
+        restored.restore_state(agent.export_state())
+        self.assertEqual(restored.agent_executor.memory.summary, agent.agent_executor.memory.summary)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,182 @@
+"""测试运行取消（取消令牌、LLM和工具调用检查点、高德地图API检查点、后台运行取消、chat_stream提前停止）"""
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain.tools import tool
+from langchain_core.messages import HumanMessage
+
+from src.agent.event_bus import DONE, EventBus, run_in_background
+from src.agent.fake_llm import ScriptedChatModel
+from src.agent.llm_registry import clear_llm_registry
+from src.agent.specialized_agents import reset_specialized_agents
+from src.agent.streaming import TokenStreamHandler
+from src.utils.amap_rate_limiter import AmapRateLimiter
+from src.utils.cancellation import (
+    CancellationToken, RunCancelled, cancellation_scope, cancellation_stats, check_cancelled,
+)
+
+
+def _saved(before: dict, name: str) -> int:
+    return cancellation_stats()[name] - before[name]
+
+
+class TestCancellation(unittest.TestCase):
+    """测试取消令牌和检查点"""
+    
+    def test_token(self):
+        """测试取消只记录一次，检查点记录省下的调用并抛出 RunCancelled，范围外的检查点不做任何事"""
+        before = cancellation_stats()
+        token = CancellationToken()
+        token.check("llm")
+        token.cancel("客户端断开连接")
+        token.cancel()
+        self.assertTrue(token.cancelled)
+        with self.assertRaises(RunCancelled):
+            token.check("llm")
+        self.assertEqual(_saved(before, "cancelled_runs"), 1)
+        self.assertEqual(_saved(before, "saved_llm_calls"), 1)
+        
+        check_cancelled("api")
+        with cancellation_scope(token):
+            with self.assertRaises(RunCancelled):
+                check_cancelled("api")
+        check_cancelled("api")
+        self.assertEqual(_saved(before, "saved_api_calls"), 1)
+    
+    def test_llm_and_tool_checkpoints(self):
+        """测试范围内的LLM和工具调用自动检查取消令牌（不需要传入回调）"""
+        llm = ScriptedChatModel(default_response="北京明天晴")
+        calls = []
+        
+        @tool
+        def lookup(city: str) -> str:
+            """查询城市"""
+            calls.append(city)
+            return city
+        
+        token = CancellationToken()
+        with cancellation_scope(token):
+            self.assertEqual(llm.invoke([HumanMessage(content="你好")]).content, "北京明天晴")
+            self.assertEqual(lookup.invoke({"city": "北京"}), "北京")
+            token.cancel()
+            before = cancellation_stats()
+            with self.assertRaises(RunCancelled):
+                llm.invoke([HumanMessage(content="你好")])
+            with self.assertRaises(RunCancelled):
+                lookup.invoke({"city": "上海"})
+        
+        self.assertEqual(calls, ["北京"])
+        self.assertEqual(_saved(before, "saved_llm_calls"), 1)
+        self.assertEqual(_saved(before, "saved_tool_calls"), 1)
+    
+    def test_abandon_llm_stream(self):
+        """测试LLM流式生成过程中取消时放弃剩余的token"""
+        tokens = []
+        token = CancellationToken()
+        
+        def on_token(event):
+            tokens.append(event)
+            token.cancel()
+        
+        llm = ScriptedChatModel(default_response="一二三四五六", chars_per_token=2, streaming=True)
+        before = cancellation_stats()
+        with cancellation_scope(token):
+            with self.assertRaises(RunCancelled):
+                llm.invoke([HumanMessage(content="你好")], config={"callbacks": [TokenStreamHandler(on_token)]})
+        self.assertEqual(len(tokens), 1)
+        self.assertEqual(_saved(before, "abandoned_llm_streams"), 1)
+    
+    def test_amap_checkpoint(self):
+        """测试运行取消后高德地图限流器不再发出请求"""
+        limiter = AmapRateLimiter()
+        token = CancellationToken()
+        token.cancel()
+        before = cancellation_stats()
+        with patch.object(limiter, "execute_request") as execute_request, cancellation_scope(token):
+            with self.assertRaises(RunCancelled):
+                limiter.get("http://127.0.0.1:1/v3/weather/weatherInfo", params={"city": "110000"})
+        execute_request.assert_not_called()
+        self.assertEqual(_saved(before, "saved_api_calls"), 1)
+    
+    def test_run_in_background_cancelled(self):
+        """测试后台运行被取消后不发布结果或错误，只发布结束标记"""
+        token = CancellationToken()
+        started = threading.Event()
+        
+        def work() -> str:
+            started.set()
+            while True:
+                check_cancelled("llm")
+                time.sleep(0.01)
+        
+        bus = EventBus()
+        thread = run_in_background(bus, work, token)
+        started.wait(1)
+        token.cancel()
+        thread.join(1)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual([event.type for event in bus.events()], [DONE])
+
+
+class TestChatStreamCancellation(unittest.TestCase):
+    """测试 chat_stream 的调用方提前停止读取时取消运行（本地脚本化模型）"""
+    
+    def setUp(self):
+        reset_specialized_agents()
+        clear_llm_registry()
+        self.addCleanup(reset_specialized_agents)
+        self.addCleanup(clear_llm_registry)
+        settings = {"llm.fake.token_latency": 0.01, "agent.response_cache.enabled": False}
+        patchers = [patch('src.agent.llm_registry.config'), patch('src.agent.travel_agent.config'),
+                    patch('src.agent.fake_llm.config'), patch('src.agent.response_cache.config')]
+        for patcher in patchers:
+            mock_config = patcher.start()
+            mock_config.get.side_effect = lambda key, default=None: settings.get(key, default)
+            mock_config.llm_provider = "fake"
+            mock_config.llm_model = "scripted"
+            self.addCleanup(patcher.stop)
+    
+    def test_close_early(self):
+        """测试读取第一个片段后关闭生成器，运行被取消且回答不写入对话记忆"""
+        from src.agent.travel_agent import TravelAgent
+        agent = TravelAgent(verbose=False, session_id="user-cancel")
+        agent.intent_router = None
+        before = cancellation_stats()
+        
+        runs = []
+        
+        def background(bus, work, token):
+            runs.append((run_in_background(bus, work, token), token))
+            return runs[-1][0]
+        
+        with patch('src.agent.travel_agent.run_in_background', side_effect=background):
+            stream = agent.chat_stream("北京明天天气怎么样？")
+            self.assertTrue(next(stream))
+            stream.close()
+        thread, token = runs[0]
+        self.assertTrue(token.cancelled)
+        self.assertEqual(_saved(before, "cancelled_runs"), 1)
+        
+        # 后台线程在下一个检查点结束
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(agent.agent_executor.memory.chat_memory.messages, [])
+    
+    def test_finished_not_cancelled(self):
+        """测试读取完整回答后不取消运行"""
+        from src.agent.travel_agent import TravelAgent
+        agent = TravelAgent(verbose=False, session_id="user-finished")
+        before = cancellation_stats()
+        self.assertTrue("".join(agent.chat_stream("北京明天天气怎么样？")))
+        self.assertEqual(_saved(before, "cancelled_runs"), 0)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
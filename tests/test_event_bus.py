@@ -0,0 +1,163 @@
+"""测试Agent运行事件总线（事件顺序、事件驱动唤醒、有界队列、异步订阅、回调转换、后台运行）"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import unittest
+import uuid
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain.schema import AgentAction, LLMResult
+
+from src.agent.event_bus import (
+    DONE, ERROR, FINAL, HEARTBEAT, LLM_END, LLM_START, TOKEN, TOOL_END, TOOL_START,
+    AgentEventHandler, EventBus, run_as_task, run_in_background,
+)
+
+
+def _publish_later(bus: EventBus, delay: float, *events):
+    def publish():
+        time.sleep(delay)
+        for event_type in events:
+            bus.publish(event_type)
+        bus.close()
+    threading.Thread(target=publish, daemon=True).start()
+
+
+class TestEventBus(unittest.TestCase):
+    """测试事件总线"""
+    
+    def test_order_and_listeners(self):
+        """测试按发布顺序迭代，关闭后取完剩余事件结束，监听函数收到所有事件"""
+        bus = EventBus()
+        heard = []
+        bus.subscribe(lambda event: heard.append(event.type))
+        bus.publish(TOOL_START, tool="query_weather_agent")
+        bus.publish(TOKEN, token="晴", segment=0, source="agent")
+        bus.publish(DONE)
+        bus.close()
+        
+        events = list(bus.events())
+        self.assertEqual([event.type for event in events], [TOOL_START, TOKEN, DONE])
+        self.assertEqual(events[1].to_dict(), {"type": TOKEN, "token": "晴", "segment": 0, "source": "agent"})
+        self.assertEqual(heard, [TOOL_START, TOKEN, DONE])
+        self.assertFalse(bus.publish(FINAL, message="关闭后丢弃"))
+    
+    def test_event_driven_wakeup(self):
+        """测试有事件时立即唤醒订阅方（不等到心跳间隔），空闲时才生成心跳"""
+        bus = EventBus()
+        _publish_later(bus, 0.1, FINAL)
+        started = time.perf_counter()
+        first = next(bus.events(heartbeat=2))
+        self.assertEqual(first.type, FINAL)
+        self.assertLess(time.perf_counter() - started, 1)
+        
+        idle = EventBus()
+        _publish_later(idle, 0.3, DONE)
+        types = [event.type for event in idle.events(heartbeat=0.1)]
+        self.assertIn(HEARTBEAT, types)
+        self.assertEqual(types[-1], DONE)
+    
+    def test_bounded_queue(self):
+        """测试队列满时合并相同片段的token，其他事件等待超时后丢弃"""
+        bus = EventBus(max_size=2, put_timeout=0.05)
+        bus.publish(TOKEN, token="北", segment=0, source="agent")
+        bus.publish(TOKEN, token="京", segment=0, source="agent")
+        self.assertTrue(bus.publish(TOKEN, token="晴", segment=0, source="agent"))
+        self.assertFalse(bus.publish(TOOL_START, tool="query_weather_agent"))
+        bus.close()
+        
+        self.assertEqual([event.data["token"] for event in bus.events()], ["北", "京晴"])
+        self.assertEqual((bus.coalesced, bus.dropped), (1, 1))
+    
+    def test_publish_on_event_loop(self):
+        """测试在事件循环线程中发布时队列满也不等待（订阅方可能在同一个事件循环中）"""
+        bus = EventBus(max_size=1, put_timeout=5)
+        
+        async def publish():
+            started = time.perf_counter()
+            results = [bus.publish(TOOL_START), bus.publish(TOOL_END), bus.publish(FINAL)]
+            return results, time.perf_counter() - started
+        
+        results, elapsed = asyncio.run(publish())
+        bus.close()
+        self.assertEqual(results, [True, True, True])
+        self.assertLess(elapsed, 1)
+        self.assertEqual([event.type for event in bus.events()], [TOOL_START, TOOL_END, FINAL])
+    
+    def test_async_subscriber(self):
+        """测试异步订阅方由发布线程唤醒"""
+        bus = EventBus()
+        _publish_later(bus, 0.05, TOOL_START, FINAL, DONE)
+        
+        async def collect():
+            return [event.type async for event in bus.aevents(heartbeat=2)]
+        
+        started = time.perf_counter()
+        self.assertEqual(asyncio.run(collect()), [TOOL_START, FINAL, DONE])
+        self.assertLess(time.perf_counter() - started, 1)
+    
+    def test_run_in_background(self):
+        """测试后台线程和异步任务运行的最终回答、错误和结束标记"""
+        bus = EventBus()
+        run_in_background(bus, lambda: "北京明天晴")
+        self.assertEqual([(event.type, event.data.get("message")) for event in bus.events()],
+                         [(FINAL, "北京明天晴"), (DONE, None)])
+        
+        def fail():
+            raise RuntimeError("连接超时")
+        
+        bus = EventBus()
+        run_in_background(bus, fail)
+        events = list(bus.events())
+        self.assertEqual([event.type for event in events], [ERROR, DONE])
+        self.assertEqual(events[0].data["message"], "处理请求时出错: 连接超时")
+        
+        async def answer():
+            return "杭州明天小雨"
+        
+        async def run_task():
+            bus = EventBus()
+            await run_as_task(bus, answer)
+            return [(event.type, event.data.get("message")) async for event in bus.aevents()]
+        
+        self.assertEqual(asyncio.run(run_task()), [(FINAL, "杭州明天小雨"), (DONE, None)])
+
+
+class TestAgentEventHandler(unittest.TestCase):
+    """测试LangChain回调转换为事件"""
+    
+    def test_tool_and_llm_events(self):
+        """测试并发的工具按运行ID匹配完成事件并带耗时，专门Agent内部的工具调用不发布进度"""
+        bus = EventBus()
+        handler = AgentEventHandler(bus)
+        weather, hotel, llm = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+        handler.on_agent_action(AgentAction("query_weather_agent", "北京天气", ""))
+        handler.on_tool_start({"name": "query_weather_agent"}, "北京天气", run_id=weather)
+        handler.on_agent_action(AgentAction("query_hotel_agent", "北京酒店", ""))
+        handler.on_tool_start({"name": "query_hotel_agent"}, "北京酒店", run_id=hotel)
+        handler.on_tool_end("北京明天晴", run_id=weather)
+        handler.on_tool_end("经济型200元", run_id=hotel)
+        
+        nested = handler.nested()
+        nested.on_agent_action(AgentAction("get_weather_info", {"city": "北京"}, ""))
+        nested.on_llm_start({}, ["北京天气"], run_id=llm)
+        nested.on_llm_end(LLMResult(generations=[]), run_id=llm)
+        bus.close()
+        
+        events = [event.to_dict() for event in bus.events()]
+        self.assertEqual([event["type"] for event in events], [TOOL_START, TOOL_START, TOOL_END, TOOL_END, LLM_START, LLM_END])
+        self.assertEqual(events[0]["message"], "正在查询天气查询...")
+        self.assertEqual((events[2]["tool"], events[2]["message"], events[2]["summary"]),
+                         ("query_weather_agent", "✓ 天气查询完成", "北京明天晴"))
+        self.assertEqual(events[3]["tool"], "query_hotel_agent")
+        self.assertIsNotNone(events[3]["elapsed"])
+        self.assertEqual(events[5]["source"], "agent")
+        self.assertGreaterEqual(events[5]["elapsed"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,113 @@
+"""测试本地脚本化聊天模型（离线基准测试用的LLM替身）"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.agent.llm_registry import clear_llm_registry
+from src.agent.fake_llm import ScriptedChatModel, TranscriptRecorder, load_transcript
+from src.agent.tools import get_transport_route, get_weather_info
+
+
+class TestScriptedChatModel(unittest.TestCase):
+    """测试规则匹配、回放和模拟延迟"""
+    
+    def setUp(self):
+        self.tools = [convert_to_openai_tool(get_weather_info), convert_to_openai_tool(get_transport_route)]
+    
+    def test_rule_emits_tool_call_for_bound_tool(self):
+        """测试命中规则且工具已绑定时返回OpenAI格式的工具调用"""
+        llm = ScriptedChatModel()
+        message = llm.invoke([HumanMessage(content="从北京到上海自驾要多久？")], tools=self.tools)
+        tool_calls = message.additional_kwargs["tool_calls"]
+        self.assertEqual(tool_calls[0]["function"]["name"], "get_transport_route")
+        self.assertIn('"destination": "上海"', tool_calls[0]["function"]["arguments"])
+    
+    def test_rule_with_multiple_calls(self):
+        """测试一条规则同时返回多个工具调用（只保留已绑定的工具）"""
+        tools = [{"type": "function", "function": {"name": name}}
+                 for name in ("query_weather_agent", "query_planning_agent")]
+        message = ScriptedChatModel().invoke([HumanMessage(content="帮我规划成都3天行程")], tools=tools)
+        names = [call["function"]["name"] for call in message.additional_kwargs["tool_calls"]]
+        self.assertEqual(names, ["query_weather_agent", "query_planning_agent"])
+    
+    def test_unbound_tools_are_skipped(self):
+        """测试未绑定的工具不会被调用，没有规则命中时返回默认回复"""
+        llm = ScriptedChatModel(default_response="默认回复")
+        message = llm.invoke([HumanMessage(content="北京天气")])
+        self.assertEqual(message.content, "默认回复")
+        self.assertFalse(message.additional_kwargs)
+    
+    def test_tool_results_become_final_answer(self):
+        """测试收到工具结果后返回最终回复"""
+        llm = ScriptedChatModel()
+        messages = [
+            HumanMessage(content="北京天气"),
+            AIMessage(content="", additional_kwargs={"tool_calls": []}),
+            ToolMessage(content="北京明天晴", tool_call_id="call_1"),
+        ]
+        self.assertEqual(llm.invoke(messages, tools=self.tools).content, "北京明天晴")
+    
+    def test_transcript_replay_and_recorder(self):
+        """测试录制的模型输出可以按顺序回放"""
+        source = ScriptedChatModel()
+        recorder = TranscriptRecorder()
+        source.invoke([HumanMessage(content="上海天气")], tools=self.tools, config={"callbacks": [recorder]})
+        source.invoke([HumanMessage(content="你好")], config={"callbacks": [recorder]})
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "transcript.json")
+            recorder.save(path)
+            replay = ScriptedChatModel(transcript=load_transcript(path))
+        
+        first = replay.invoke([HumanMessage(content="任意输入")])
+        self.assertEqual(first.additional_kwargs["tool_calls"][0]["function"]["name"], "get_weather_info")
+        self.assertEqual(replay.invoke([HumanMessage(content="任意输入")]).content, source.default_response)
+    
+    def test_token_latency_and_streaming(self):
+        """测试按token模拟延迟，流式输出逐块返回"""
+        llm = ScriptedChatModel(default_response="一二三四五六七八", chars_per_token=2, token_latency=0.02)
+        begin = time.perf_counter()
+        chunks = [chunk.content for chunk in llm.stream([HumanMessage(content="你好")])]
+        self.assertGreaterEqual(time.perf_counter() - begin, 0.08)
+        self.assertEqual(chunks, ["一二", "三四", "五六", "七八"])
+    
+    def test_async_invoke(self):
+        """测试异步调用"""
+        llm = ScriptedChatModel(default_response="异步回复")
+        message = asyncio.run(llm.ainvoke([HumanMessage(content="你好")]))
+        self.assertEqual(message.content, "异步回复")
+
+
+class TestFakeProvider(unittest.TestCase):
+    """测试 llm.provider 为 fake 时专门Agent不需要API密钥"""
+    
+    @patch.dict(os.environ, {"AMAP_API_KEY": ""})
+    @patch('src.agent.llm_registry.config')
+    def test_weather_agent_runs_offline(self, mock_config):
+        """测试天气Agent使用脚本化模型完成一次完整的工具调用"""
+        mock_config.get.side_effect = lambda key, default=None: default
+        mock_config.llm_provider = "fake"
+        mock_config.openai_api_key = None
+        clear_llm_registry()
+        self.addCleanup(clear_llm_registry)
+        
+        from src.agent.specialized_agents import WeatherAgent
+        agent = WeatherAgent(verbose=False)
+        self.assertIsInstance(agent.llm, ScriptedChatModel)
+        
+        result = agent.query("北京明天天气怎么样？")
+        self.assertIn("北京", result)  # 工具结果（未配置高德密钥时的提示）作为最终回复
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,129 @@
+"""测试意图快速路由"""
+import os
+import sys
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.agent.intent_router import IntentRouter, resolve_relative_date
+from src.agent.llm_registry import clear_llm_registry
+from src.agent.specialized_agents import reset_specialized_agents
+from tests.fixtures import ROUTING_CASES, TestCallbackHandler
+
+FAST_PATH_TOOLS = {"query_weather_agent", "query_hotel_agent", "query_transport_agent"}
+
+
+class TestIntentRouter(unittest.TestCase):
+    """测试规则分类的准确率和回退条件"""
+    
+    def setUp(self):
+        self.router = IntentRouter()
+    
+    def test_routing_cases(self):
+        """测试路由用例：快速路径不误判，天气、酒店、交通用例全部走快速路径"""
+        for query, expected_tool in ROUTING_CASES:
+            with self.subTest(query=query):
+                decision = self.router.route(query)
+                if expected_tool in FAST_PATH_TOOLS:
+                    self.assertEqual(decision.tool_name, expected_tool)
+                else:
+                    self.assertIsNone(decision.tool_name, f"'{query}' 应交给LLM路由")
+    
+    def test_fallback_cases(self):
+        """测试多领域、依赖上下文、缺少地点的问题交给LLM路由"""
+        for query in ["北京明天天气和酒店价格", "那后天呢？", "那里的酒店贵吗", "明天天气怎么样", "上海到杭州"]:
+            with self.subTest(query=query):
+                self.assertIsNone(self.router.route(query).intent)
+    
+    def test_destination_from_travel_info(self):
+        """测试问题中没有城市时使用旅行信息中的目的地"""
+        decision = self.router.classify("明天天气怎么样", {"destination": "杭州"}, today=datetime(2026, 1, 20))
+        self.assertEqual(decision.intent, "weather")
+        self.assertIn("城市: 杭州", decision.query)
+        self.assertIn("明天即 2026-01-21", decision.query)
+    
+    def test_unknown_place_not_replaced(self):
+        """测试问题中有不在城市列表中的地名时不用旅行信息中的目的地代替，交给LLM路由"""
+        for query in ["婺源天气怎么样", "乌镇的酒店贵吗"]:
+            with self.subTest(query=query):
+                self.assertIsNone(self.router.route(query, {"destination": "上海"}).intent)
+        self.assertEqual(self.router.route("明天会下雨吗", {"destination": "上海"}).intent, "weather")
+    
+    def test_resolve_relative_date(self):
+        """测试相对日期解析"""
+        today = datetime(2026, 1, 30)
+        self.assertEqual(resolve_relative_date("北京明天天气", today), ("明天", "2026-01-31"))
+        self.assertEqual(resolve_relative_date("大后天下雨吗", today), ("大后天", "2026-02-02"))
+        self.assertEqual(resolve_relative_date("三天后天气", today), ("三天后", "2026-02-02"))
+        self.assertIsNone(resolve_relative_date("北京天气", today))
+    
+    def test_classifier(self):
+        """测试规则无法判断时使用本地分类器，分类器出错时回退"""
+        router = IntentRouter(classifier=lambda text: ("hotel", 0.95))
+        self.assertEqual(router.route("北京哪里住着方便").tool_name, "query_hotel_agent")
+        
+        def broken(text):
+            raise RuntimeError("model not loaded")
+        self.assertIsNone(IntentRouter(classifier=broken).route("北京哪里住着方便").intent)
+    
+    def test_stats(self):
+        """测试统计快速路径比例和节省的时间"""
+        decision = self.router.route("请查询北京明天的天气")
+        self.router.record(decision, 0.5)
+        self.router.record(self.router.route("帮我规划一个3天的北京旅行"), 2.0)
+        stats = self.router.stats()
+        self.assertEqual(stats["fast_path"], 1)
+        self.assertEqual(stats["llm_fallback"], 1)
+        self.assertEqual(stats["by_intent"], {"weather": 1})
+        self.assertEqual(stats["estimated_time_saved_s"], 1.5)
+
+
+class TestTravelAgentFastPath(unittest.TestCase):
+    """测试TravelAgent的快速路径"""
+    
+    def setUp(self):
+        reset_specialized_agents()
+        clear_llm_registry()
+        self.addCleanup(reset_specialized_agents)
+        self.addCleanup(clear_llm_registry)
+        patchers = [patch('src.agent.llm_registry.config'), patch('src.agent.travel_agent.config')]
+        for patcher in patchers:
+            mock_config = patcher.start()
+            mock_config.get.side_effect = lambda key, default=None: default
+            mock_config.llm_provider = "fake"
+            self.addCleanup(patcher.stop)
+        
+        from src.agent.travel_agent import TravelAgent
+        self.agent = TravelAgent(verbose=False, session_id="user-1")
+        self.agent.intent_router = IntentRouter()
+        self.agent.response_cache = None
+    
+    def test_fast_path_skips_coordinator(self):
+        """测试意图明确的问题直接调用专门Agent，不调用主协调LLM"""
+        handler = TestCallbackHandler()
+        output = self.agent.try_fast_path("北京明天天气怎么样？", "北京明天天气怎么样？", callbacks=[handler])
+        
+        self.assertTrue(output)
+        self.assertEqual(handler.get_llm_call_count(), 0)
+        self.assertEqual(handler.get_agent_call_sequence(), ["query_weather_agent"])
+        self.assertEqual(self.agent.intent_router.stats()["fast_path"], 1)
+        # 快速路径的对话同样写入主Agent的记忆
+        self.assertEqual(len(self.agent.agent_executor.memory.chat_memory.messages), 2)
+    
+    def test_fast_path_failure_falls_back(self):
+        """测试快速路径执行失败时退回主协调Agent"""
+        with patch.object(self.agent.weather_agent, "query", side_effect=RuntimeError("boom")), \
+             patch.object(type(self.agent.agent_executor), "invoke", return_value={"output": "LLM路由的回答"}):
+            output = self.agent.chat("北京明天天气怎么样？")
+        
+        self.assertEqual(output, "LLM路由的回答")
+        stats = self.agent.intent_router.stats()
+        self.assertEqual(stats["fast_path_errors"], 1)
+        self.assertEqual(stats["llm_fallback"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
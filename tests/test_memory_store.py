@@ -0,0 +1,137 @@
+"""测试专门Agent的会话记忆存储和无状态单例"""
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.agent.llm_registry import clear_llm_registry
+from src.agent.memory_store import InMemoryStore, MemoryStore, SQLiteMemoryStore
+from src.agent.specialized_agents import WeatherAgent, get_specialized_agent, reset_specialized_agents
+
+
+def _turn(question: str, answer: str) -> list:
+    return [HumanMessage(content=question), AIMessage(content=answer)]
+
+
+class TestInMemoryStore(unittest.TestCase):
+    """测试进程内记忆存储"""
+    
+    def test_sessions_are_isolated(self):
+        """测试不同会话、不同Agent的历史互不影响"""
+        store = InMemoryStore()
+        store.append("s1", "WeatherAgent", _turn("北京天气", "晴"))
+        store.append("s2", "WeatherAgent", _turn("上海天气", "雨"))
+        store.append("s1", "HotelAgent", _turn("北京酒店", "500元"))
+        
+        self.assertEqual([m.content for m in store.load("s1", "WeatherAgent")], ["北京天气", "晴"])
+        self.assertEqual([m.content for m in store.load("s2", "WeatherAgent")], ["上海天气", "雨"])
+        self.assertEqual(len(store.load("s1", "HotelAgent")), 2)
+        self.assertEqual(store.load("s3", "WeatherAgent"), [])
+    
+    def test_trim_and_lru_eviction(self):
+        """测试每个Agent只保留最近的消息，会话数超限时淘汰最久未使用的会话"""
+        store = InMemoryStore(max_sessions=2, max_messages=4)
+        for i in range(3):
+            store.append("s1", "WeatherAgent", _turn(f"问题{i}", f"回答{i}"))
+        self.assertEqual([m.content for m in store.load("s1", "WeatherAgent")], ["问题1", "回答1", "问题2", "回答2"])
+        
+        store.append("s2", "WeatherAgent", _turn("q", "a"))
+        store.load("s1", "WeatherAgent")  # s1 变为最近使用
+        store.append("s3", "WeatherAgent", _turn("q", "a"))
+        self.assertEqual(store.load("s2", "WeatherAgent"), [])
+        self.assertEqual(len(store.load("s1", "WeatherAgent")), 4)
+        self.assertEqual(store.stats()["evictions"], 1)
+    
+    def test_clear(self):
+        """测试清空会话"""
+        store = InMemoryStore()
+        store.append("s1", "WeatherAgent", _turn("q", "a"))
+        store.clear("s1")
+        self.assertEqual(store.load("s1", "WeatherAgent"), [])
+    
+    def test_base_class_is_abstract(self):
+        """测试存储基类不能直接实例化，子类必须实现全部接口"""
+        with self.assertRaises(TypeError):
+            MemoryStore()
+        
+        class PartialStore(MemoryStore):
+            def load(self, session_id, agent_name):
+                return []
+        
+        with self.assertRaises(TypeError):
+            PartialStore()
+
+
+class TestSQLiteMemoryStore(unittest.TestCase):
+    """测试SQLite记忆存储"""
+    
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "memory.sqlite")
+    
+    def tearDown(self):
+        self.tmpdir.cleanup()
+    
+    def test_history_survives_restart(self):
+        """测试历史在重新打开存储后仍然有效，并按上限裁剪"""
+        store = SQLiteMemoryStore(self.path, max_messages=2)
+        store.append("s1", "WeatherAgent", _turn("问题0", "回答0"))
+        store.append("s1", "WeatherAgent", _turn("问题1", "回答1"))
+        
+        reopened = SQLiteMemoryStore(self.path, max_messages=2)
+        messages = reopened.load("s1", "WeatherAgent")
+        self.assertEqual([m.content for m in messages], ["问题1", "回答1"])
+        self.assertIsInstance(messages[0], HumanMessage)
+        
+        reopened.clear("s1")
+        self.assertEqual(reopened.load("s1", "WeatherAgent"), [])
+    
+    def test_expired_history_is_ignored(self):
+        """测试过期的历史不再返回"""
+        store = SQLiteMemoryStore(self.path, ttl=60)
+        with patch('src.agent.memory_store.time.time', return_value=1000.0):
+            store.append("s1", "WeatherAgent", _turn("q", "a"))
+        with patch('src.agent.memory_store.time.time', return_value=1061.0):
+            self.assertEqual(store.load("s1", "WeatherAgent"), [])
+
+
+class TestStatelessAgents(unittest.TestCase):
+    """测试专门Agent单例按会话读写历史"""
+    
+    def setUp(self):
+        reset_specialized_agents()
+        clear_llm_registry()
+        self.addCleanup(reset_specialized_agents)
+        self.addCleanup(clear_llm_registry)
+    
+    @patch.dict(os.environ, {"AMAP_API_KEY": ""})
+    @patch('src.agent.llm_registry.config')
+    def test_singleton_serves_multiple_sessions(self, mock_config):
+        """测试同一个Agent实例服务多个会话，历史按会话保存，执行器不持有记忆"""
+        mock_config.get.side_effect = lambda key, default=None: default
+        mock_config.llm_provider = "fake"
+        
+        agent = get_specialized_agent(WeatherAgent)
+        self.assertIs(agent, get_specialized_agent(WeatherAgent))
+        self.assertIsNone(agent.agent_executor.memory)
+        
+        store = InMemoryStore()
+        agent.query("北京天气怎么样", session_id="alice", memory_store=store)
+        agent.query("上海天气怎么样", session_id="bob", memory_store=store)
+        agent.query("北京后天天气呢", session_id="alice", memory_store=store)
+        
+        self.assertEqual(len(store.load("alice", "WeatherAgent")), 4)
+        self.assertEqual(store.load("bob", "WeatherAgent")[0].content, "上海天气怎么样")
+        
+        agent.query("北京天气", memory_store=store)  # 不提供会话ID时不读写历史
+        self.assertEqual(store.stats()["sessions"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,127 @@
+"""测试并行执行的Agent执行器（同一步的专门Agent调用并发执行、结果顺序、规划Agent最后执行、重复调用去重）"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import unittest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain.agents import create_openai_tools_agent
+from langchain_core.agents import AgentAction
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.tools import Tool
+
+from src.agent.fake_llm import ScriptedChatModel
+from src.agent.parallel_executor import ParallelAgentExecutor
+
+DELAY = 0.2
+
+RULES = [{"pattern": "规划", "calls": [
+    {"tool": "query_transport_agent", "args": {"__arg1": "北京到杭州"}},
+    {"tool": "query_weather_agent", "args": {"__arg1": "杭州天气"}},
+    {"tool": "query_planning_agent", "args": {"__arg1": "规划杭州行程"}},
+    {"tool": "query_hotel_agent", "args": {"__arg1": "杭州酒店"}},
+    {"tool": "query_weather_agent", "args": {"__arg1": "杭州天气"}},
+]}]
+
+
+class _ToolEvents(BaseCallbackHandler):
+    """按运行ID记录工具开始和结束"""
+    
+    def __init__(self):
+        self.running = {}
+        self.ended = []
+    
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        self.running[kwargs["run_id"]] = serialized["name"]
+    
+    def on_tool_end(self, output, **kwargs):
+        self.ended.append(self.running.pop(kwargs["run_id"]))
+
+
+class TestParallelAgentExecutor(unittest.TestCase):
+    """测试并行执行的Agent执行器（本地脚本化模型）"""
+    
+    def setUp(self):
+        self.calls = []
+        self.lock = threading.Lock()
+        
+        def make_tool(name):
+            def run(query: str) -> str:
+                started = time.perf_counter()
+                time.sleep(DELAY)
+                with self.lock:
+                    self.calls.append((name, started, time.perf_counter()))
+                return f"{name}结果"
+            
+            async def arun(query: str) -> str:
+                started = time.perf_counter()
+                await asyncio.sleep(DELAY)
+                with self.lock:
+                    self.calls.append((name, started, time.perf_counter()))
+                return f"{name}结果"
+            return Tool(name=name, func=run, coroutine=arun, description=name)
+        
+        tools = [make_tool(name) for name in (
+            "query_transport_agent", "query_weather_agent", "query_hotel_agent", "query_planning_agent"
+        )]
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", "你是旅行助手"),
+            ("human", "{input}"),
+            MessagesPlaceholder(variable_name="agent_scratchpad"),
+        ])
+        agent = create_openai_tools_agent(ScriptedChatModel(rules=RULES), tools, prompt)
+        self.executor = ParallelAgentExecutor(agent=agent, tools=tools, return_intermediate_steps=True)
+    
+    def check(self, result, elapsed):
+        steps = result["intermediate_steps"]
+        # 观察结果按调用顺序返回，重复的天气调用复用第一次的结果
+        self.assertEqual([action.tool for action, _ in steps], [
+            "query_transport_agent", "query_weather_agent", "query_planning_agent",
+            "query_hotel_agent", "query_weather_agent",
+        ])
+        self.assertEqual([observation for _, observation in steps], [
+            f"{action.tool}结果" for action, _ in steps
+        ])
+        names = [name for name, _, _ in self.calls]
+        self.assertEqual(sorted(names), sorted([
+            "query_transport_agent", "query_weather_agent", "query_planning_agent", "query_hotel_agent"
+        ]))
+        # 规划Agent在其他查询完成后才开始
+        planning_started = next(started for name, started, _ in self.calls if name == "query_planning_agent")
+        self.assertTrue(all(ended <= planning_started for name, _, ended in self.calls if name != "query_planning_agent"))
+        # 三个查询并发执行，总耗时约为两次调用（并发的查询 + 规划）
+        self.assertLess(elapsed, DELAY * 3.5)
+    
+    def test_parallel_dispatch(self):
+        """测试同步执行时并发调用专门Agent，并按运行ID通知每个工具的开始和结束"""
+        events = _ToolEvents()
+        started = time.perf_counter()
+        result = self.executor.invoke({"input": "帮我规划杭州行程"}, config={"callbacks": [events]})
+        self.check(result, time.perf_counter() - started)
+        self.assertEqual(len(events.ended), 4)
+        self.assertEqual(events.ended[-1], "query_planning_agent")
+    
+    def test_async_parallel_dispatch(self):
+        """测试异步执行时的并发、顺序和去重与同步执行一致"""
+        started = time.perf_counter()
+        result = asyncio.run(self.executor.ainvoke({"input": "帮我规划杭州行程"}))
+        self.check(result, time.perf_counter() - started)
+    
+    def test_repeated_call_across_steps(self):
+        """测试与之前步骤完全相同的调用直接复用之前的观察结果"""
+        previous = [(AgentAction("query_weather_agent", "杭州天气", ""), "之前的天气")]
+        actions = [AgentAction("query_weather_agent", " 杭州天气 ", ""), AgentAction("query_hotel_agent", "杭州酒店", "")]
+        tools = {tool.name: tool for tool in self.executor.tools}
+        duplicates, parallel, sequential = self.executor._schedule(actions, previous, tools)
+        self.assertEqual(duplicates, {0: ("observation", "之前的天气")})
+        self.assertEqual(parallel, [])
+        self.assertEqual(sequential, [1])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,185 @@
+"""测试回答缓存（问题规范化、按类别的TTL、相似问题查找、失效，以及TravelAgent和专门Agent的缓存命中）"""
+import os
+import sys
+import time
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.agent.fake_llm import ScriptedChatModel
+from src.agent.llm_registry import clear_llm_registry
+from src.agent.response_cache import ResponseCache, classify_categories, normalize_question
+from src.agent.specialized_agents import reset_specialized_agents
+
+TODAY = datetime(2026, 5, 1)
+
+
+class TestResponseCache(unittest.TestCase):
+    """测试回答缓存"""
+    
+    def setUp(self):
+        self.cache = ResponseCache()
+    
+    def resolve(self, question, travel_info=None, scope="chat"):
+        return self.cache.resolve(question, travel_info, scope=scope, today=TODAY)
+    
+    def test_normalize_question(self):
+        """测试相对日期替换为具体日期，去掉客套词和标点"""
+        self.assertEqual(normalize_question("请问北京明天天气怎么样？", TODAY), "北京20260502天气")
+        self.assertEqual(normalize_question("北京 明天的天气", TODAY), "北京20260502天气")
+        self.assertEqual(normalize_question("3天杭州行程 预算3000", TODAY), "3天杭州行程预算3000")
+        self.assertEqual(normalize_question("三天两晚，一千五百元", TODAY), "3天2晚1500元")
+        self.assertEqual(normalize_question("三亚九寨沟", TODAY), "三亚九寨沟")
+    
+    def test_categories_and_ttl(self):
+        """测试按问题类别选择TTL（涉及多个类别时取最短的），专门Agent固定属于对应类别"""
+        self.assertEqual(classify_categories("杭州有什么好玩的景点"), ("attraction",))
+        self.assertEqual(classify_categories("你好"), ("general",))
+        self.assertEqual(classify_categories("杭州", scope="WeatherAgent"), ("weather",))
+        self.assertEqual(self.cache.ttl_for(self.resolve("杭州景点门票")), 604800)
+        self.assertEqual(self.cache.ttl_for(self.resolve("杭州景点门票和明天天气")), 1800)
+    
+    def test_exact_hit(self):
+        """测试规范化后相同的问题命中，相关旅行信息变化时不命中，无关字段不影响"""
+        self.cache.set(self.resolve("北京明天天气怎么样", {"destination": "北京", "budget": "3000"}), "晴")
+        self.assertEqual(self.cache.get(self.resolve("请问北京明天的天气？", {"destination": "北京", "budget": "5000"})), "晴")
+        self.assertIsNone(self.cache.get(self.resolve("北京明天天气怎么样", {"destination": "上海"})))
+        self.assertIsNone(self.cache.get(self.resolve("北京明天天气怎么样", scope="WeatherAgent")))
+        self.assertEqual(self.cache.stats()["exact_hits"], 1)
+    
+    def test_semantic_hit(self):
+        """测试相似问题命中，地点或数字不同时不命中"""
+        self.cache.set(self.resolve("杭州有什么好玩的景点"), "西湖")
+        self.cache.set(self.resolve("3天杭州行程 预算3000"), "行程")
+        self.assertEqual(self.cache.get(self.resolve("杭州都有什么好玩的景点")), "西湖")
+        self.assertEqual(self.cache.get(self.resolve("3天的杭州行程，预算3000元")), "行程")
+        self.assertIsNone(self.cache.get(self.resolve("苏州有哪些好玩的景点")))
+        self.assertIsNone(self.cache.get(self.resolve("4天杭州行程 预算3000")))
+        stats = self.cache.stats()
+        self.assertEqual(stats["semantic_hits"], 2)
+        self.assertEqual(stats["misses"], 2)
+        
+        exact_only = ResponseCache(semantic=False)
+        exact_only.set(exact_only.resolve("杭州有什么好玩的景点", today=TODAY), "西湖")
+        self.assertIsNone(exact_only.get(exact_only.resolve("杭州都有什么好玩的景点", today=TODAY)))
+    
+    def test_similar_question_different_entity(self):
+        """测试只差景点名、酒店档次或交通方式的相似问题不命中，同一实体的改写仍命中"""
+        self.cache.set(self.resolve("北京故宫的门票价格是多少钱"), "故宫门票60元")
+        self.cache.set(self.resolve("杭州西湖附近的经济型酒店价格"), "西湖经济型酒店")
+        self.cache.set(self.resolve("从上海到杭州坐高铁要多久"), "高铁1小时")
+        for question in ("北京天坛的门票价格是多少钱", "北京颐和园的门票价格是多少钱",
+                         "杭州千岛湖附近的经济型酒店价格", "杭州西湖附近的豪华型酒店价格",
+                         "从上海到杭州自驾要多久"):
+            with self.subTest(question=question):
+                self.assertIsNone(self.cache.get(self.resolve(question)))
+        self.assertEqual(self.cache.get(self.resolve("北京故宫门票价格多少钱")), "故宫门票60元")
+        self.assertEqual(self.cache.get(self.resolve("杭州西湖附近经济型酒店的价格")), "西湖经济型酒店")
+    
+    def test_similar_question_different_number_or_qualifier(self):
+        """测试中文数字不同或限定词相反的相似问题不命中，中文数字与阿拉伯数字相同的问题命中"""
+        self.cache.set(self.resolve("成都五天行程推荐"), "成都五日游")
+        self.cache.set(self.resolve("北京明天的最低温度"), "最低12度")
+        self.cache.set(self.resolve("北京的酒店便宜吗"), "经济型200元起")
+        for question in ("成都三天行程推荐", "北京明天的最高温度", "北京的酒店贵吗"):
+            with self.subTest(question=question):
+                self.assertIsNone(self.cache.get(self.resolve(question)))
+        self.assertEqual(self.cache.get(self.resolve("成都5天行程推荐")), "成都五日游")
+    
+    def test_not_cacheable(self):
+        """测试依赖上下文的追问和错误回答不缓存"""
+        self.assertIsNone(self.resolve("那里明天天气呢？"))
+        self.assertFalse(self.cache.set(self.resolve("北京明天天气"), "❌ 连接错误"))
+        self.assertFalse(self.cache.set(self.resolve("北京明天天气"), ""))
+    
+    def test_expiry(self):
+        """测试按类别的TTL过期"""
+        cache = ResponseCache(ttls={"weather": 0.05})
+        cache.set(cache.resolve("北京明天天气", today=TODAY), "晴")
+        cache.set(cache.resolve("北京景点门票", today=TODAY), "故宫60元")
+        time.sleep(0.1)
+        self.assertIsNone(cache.get(cache.resolve("北京明天天气", today=TODAY)))
+        self.assertEqual(cache.get(cache.resolve("北京景点门票", today=TODAY)), "故宫60元")
+    
+    def test_invalidate(self):
+        """测试按类别和范围失效"""
+        self.cache.set(self.resolve("北京明天天气"), "晴")
+        self.cache.set(self.resolve("北京景点门票"), "故宫60元")
+        self.cache.set(self.resolve("北京景点门票", scope="AttractionAgent"), "故宫60元")
+        
+        self.assertEqual(self.cache.invalidate(category="weather"), 1)
+        self.assertIsNone(self.cache.get(self.resolve("北京明天天气")))
+        self.assertEqual(self.cache.invalidate(scope="AttractionAgent"), 1)
+        self.assertEqual(self.cache.get(self.resolve("北京景点门票")), "故宫60元")
+        self.cache.clear()
+        self.assertEqual(self.cache.stats()["size"], 0)
+
+
+class TestAgentResponseCache(unittest.TestCase):
+    """测试TravelAgent和专门Agent使用回答缓存（本地脚本化模型）"""
+    
+    def setUp(self):
+        reset_specialized_agents()
+        clear_llm_registry()
+        self.addCleanup(reset_specialized_agents)
+        self.addCleanup(clear_llm_registry)
+        patchers = [patch('src.agent.llm_registry.config'), patch('src.agent.travel_agent.config')]
+        for patcher in patchers:
+            mock_config = patcher.start()
+            mock_config.get.side_effect = lambda key, default=None: default
+            mock_config.llm_provider = "fake"
+            self.addCleanup(patcher.stop)
+        # 每个测试使用独立的缓存
+        cache_patcher = patch('src.agent.response_cache._response_cache', ResponseCache())
+        cache_patcher.start()
+        self.addCleanup(cache_patcher.stop)
+        
+        from src.agent.travel_agent import TravelAgent
+        self.agent = TravelAgent(verbose=False, session_id="user-1")
+        self.agent.intent_router = None
+    
+    def test_chat_cache_hit(self):
+        """测试相同的问题第二次直接返回缓存的回答，不调用LLM，且对话写入记忆"""
+        with patch.object(ScriptedChatModel, "_generate", autospec=True,
+                          side_effect=ScriptedChatModel._generate) as mock_generate:
+            first = self.agent.chat("上海明天天气怎么样？")
+            calls = mock_generate.call_count
+            second = self.agent.chat("请问上海明天的天气")
+        
+        self.assertTrue(first)
+        self.assertGreater(calls, 0)
+        self.assertEqual(second, first)
+        self.assertEqual(mock_generate.call_count, calls)
+        self.assertEqual(len(self.agent.agent_executor.memory.chat_memory.messages), 4)
+        self.assertEqual(self.agent.response_cache.stats()["exact_hits"], 1)
+    
+    def test_specialized_agent_cache_hit(self):
+        """测试专门Agent的相同查询直接返回缓存的回答"""
+        first = self.agent.weather_agent.query("北京明天天气怎么样？")
+        with patch.object(ScriptedChatModel, "_generate", autospec=True) as mock_generate:
+            second = self.agent.weather_agent.query("北京明天天气怎么样？")
+        self.assertEqual(second, first)
+        mock_generate.assert_not_called()
+    
+    def test_specialized_agent_skips_cache_with_history(self):
+        """测试会话已有对话历史时专门Agent不使用共享缓存（追问的答案取决于该会话的历史）"""
+        from src.agent.memory_store import InMemoryStore
+        store = InMemoryStore()
+        first = self.agent.weather_agent.query("上海明天天气怎么样？", session_id="user-a", memory_store=store)
+        self.agent.weather_agent.query("北京呢？", session_id="user-b", memory_store=store)
+        with patch.object(ScriptedChatModel, "_generate", autospec=True,
+                          side_effect=ScriptedChatModel._generate) as mock_generate:
+            # 没有历史的会话命中其他会话缓存的回答
+            self.assertEqual(self.agent.weather_agent.query("上海明天天气怎么样？", session_id="user-c", memory_store=store), first)
+            mock_generate.assert_not_called()
+            # 已有历史的会话重新调用LLM，回答也不写入共享缓存
+            self.agent.weather_agent.query("上海明天天气怎么样？", session_id="user-b", memory_store=store)
+            self.assertGreater(mock_generate.call_count, 0)
+        self.assertEqual(self.agent.response_cache.stats()["stores"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,130 @@
+"""测试请求级并发控制（同一会话依次执行、会话排队上限和超时、全局并发上限和拒绝、异步等待、等待时间统计）"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import unittest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.agent.run_guard import RunGuard, RunRejected
+
+
+def _acquire_in_thread(guard: RunGuard, key: str, results: list, hold: float = 0.0) -> threading.Thread:
+    def run():
+        try:
+            with guard.acquire(key) as ticket:
+                results.append((key, ticket.wait_time))
+                time.sleep(hold)
+        except RunRejected as e:
+            results.append((key, e.reason))
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def _wait_until(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+
+
+class TestRunGuard(unittest.TestCase):
+    """测试Agent运行的并发控制"""
+    
+    def test_same_agent_runs_in_order(self):
+        """测试同一会话的请求依次执行，后到的请求记录排队等待时间，不同会话不互相等待"""
+        guard = RunGuard()
+        results = []
+        first = guard.acquire("user-a")
+        waiting = _acquire_in_thread(guard, "user-a", results)
+        other = _acquire_in_thread(guard, "user-b", results)
+        other.join(timeout=2)
+        _wait_until(lambda: guard.stats()["queued_agent"] == 1)
+        self.assertEqual([key for key, _ in results], ["user-b"])
+        
+        time.sleep(0.1)
+        first.release()
+        first.release()
+        waiting.join(timeout=2)
+        self.assertEqual(results[-1][0], "user-a")
+        self.assertGreaterEqual(results[-1][1], 0.1)
+        
+        stats = guard.stats()
+        self.assertEqual((stats["admitted"], stats["active_runs"], stats["queued_agent"]), (3, 0, 0))
+        self.assertGreaterEqual(stats["agent_wait_max_ms"], 100)
+    
+    def test_agent_queue_limit_and_timeout(self):
+        """测试同一会话排队已满时立即拒绝，等待超时后拒绝并移出队列"""
+        guard = RunGuard(max_queue_per_agent=1, agent_wait_timeout=0.2)
+        results = []
+        ticket = guard.acquire("user-a")
+        waiting = _acquire_in_thread(guard, "user-a", results)
+        _wait_until(lambda: guard.stats()["queued_agent"] == 1)
+        with self.assertRaises(RunRejected) as ctx:
+            guard.acquire("user-a")
+        self.assertEqual(ctx.exception.reason, "agent_queue")
+        self.assertEqual(ctx.exception.retry_after, 2)
+        
+        waiting.join(timeout=2)
+        self.assertEqual(results, [("user-a", "agent_timeout")])
+        ticket.release()
+        # 会话名额全部释放后可以再次执行
+        guard.acquire("user-a").release()
+        stats = guard.stats()
+        self.assertEqual((stats["rejected_agent_queue"], stats["rejected_agent_timeout"], stats["queued_agent"]), (1, 1, 0))
+    
+    def test_global_shedding(self):
+        """测试全局并发已满且排队已满时拒绝，排队超时后拒绝，拒绝时归还会话名额"""
+        guard = RunGuard(max_concurrent_runs=1, max_queued_runs=1, queue_timeout=0.2)
+        results = []
+        ticket = guard.acquire("user-a")
+        waiting = _acquire_in_thread(guard, "user-b", results)
+        _wait_until(lambda: guard.stats()["queued_global"] == 1)
+        with self.assertRaises(RunRejected) as ctx:
+            guard.acquire("user-c")
+        self.assertEqual(ctx.exception.reason, "overloaded")
+        
+        waiting.join(timeout=2)
+        self.assertEqual(results, [("user-b", "overloaded")])
+        ticket.release()
+        guard.acquire("user-c").release()
+        self.assertEqual(guard.stats()["rejected_overloaded"], 2)
+        self.assertEqual(guard.stats()["active_runs"], 0)
+    
+    def test_async_waiters(self):
+        """测试异步等待不阻塞事件循环，同步线程释放的名额交给异步等待方，被取消的等待方不占用名额"""
+        guard = RunGuard(max_concurrent_runs=1)
+        ticket = guard.acquire("user-a")
+        threading.Timer(0.1, ticket.release).start()
+        
+        async def run():
+            ticks = 0
+            
+            async def tick():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0.01)
+            
+            ticker = asyncio.create_task(tick())
+            cancelled = asyncio.create_task(guard.aacquire("user-c"))
+            waiter = await guard.aacquire("user-b")
+            ticker.cancel()
+            cancelled.cancel()
+            await asyncio.gather(cancelled, return_exceptions=True)
+            waiter.release()
+            return ticks, waiter.wait_time
+        
+        ticks, wait_time = asyncio.run(run())
+        self.assertGreater(ticks, 3)
+        self.assertGreaterEqual(wait_time, 0.05)
+        stats = guard.stats()
+        self.assertEqual((stats["active_runs"], stats["queued_global"]), (0, 0))
+        guard.acquire("user-c").release()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -7,6 +7,7 @@ import sys
 # 添加项目根目录到路径
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+from src.agent.llm_registry import clear_llm_registry, llm_registry_stats
 from src.agent.specialized_agents import (
     WeatherAgent,
     TransportAgent,
@@ -20,8 +21,8 @@ from src.agent.specialized_agents import (
 class TestWeatherAgent(unittest.TestCase):
     """测试天气Agent"""
     
-    @patch('src.agent.specialized_agents.config')
-    @patch('src.agent.specialized_agents.ChatOpenAI')
+    @patch('src.agent.llm_registry.config')
+    @patch('src.agent.llm_registry.ChatOpenAI')
     def test_weather_agent_creation(self, mock_llm, mock_config):
         """测试天气Agent创建"""
         # 模拟配置
@@ -46,8 +47,8 @@ class TestWeatherAgent(unittest.TestCase):
 class TestTransportAgent(unittest.TestCase):
     """测试交通Agent"""
     
-    @patch('src.agent.specialized_agents.config')
-    @patch('src.agent.specialized_agents.ChatOpenAI')
+    @patch('src.agent.llm_registry.config')
+    @patch('src.agent.llm_registry.ChatOpenAI')
     def test_transport_agent_creation(self, mock_llm, mock_config):
         """测试交通Agent创建"""
         # 模拟配置
@@ -72,8 +73,8 @@ class TestTransportAgent(unittest.TestCase):
 class TestHotelAgent(unittest.TestCase):
     """测试酒店Agent"""
     
-    @patch('src.agent.specialized_agents.config')
-    @patch('src.agent.specialized_agents.ChatOpenAI')
+    @patch('src.agent.llm_registry.config')
+    @patch('src.agent.llm_registry.ChatOpenAI')
     def test_hotel_agent_creation(self, mock_llm, mock_config):
         """测试酒店Agent创建"""
         # 模拟配置
@@ -98,8 +99,8 @@ class TestHotelAgent(unittest.TestCase):
 class TestAttractionAgent(unittest.TestCase):
     """测试景点Agent"""
     
-    @patch('src.agent.specialized_agents.config')
-    @patch('src.agent.specialized_agents.ChatOpenAI')
+    @patch('src.agent.llm_registry.config')
+    @patch('src.agent.llm_registry.ChatOpenAI')
     def test_attraction_agent_creation(self, mock_llm, mock_config):
         """测试景点Agent创建"""
         # 模拟配置
@@ -124,8 +125,8 @@ class TestAttractionAgent(unittest.TestCase):
 class TestPlanningAgent(unittest.TestCase):
     """测试规划Agent"""
     
-    @patch('src.agent.specialized_agents.config')
-    @patch('src.agent.specialized_agents.ChatOpenAI')
+    @patch('src.agent.llm_registry.config')
+    @patch('src.agent.llm_registry.ChatOpenAI')
     def test_planning_agent_creation(self, mock_llm, mock_config):
         """测试规划Agent创建"""
         # 模拟配置
@@ -150,8 +151,8 @@ class TestPlanningAgent(unittest.TestCase):
 class TestRecommendationAgent(unittest.TestCase):
     """测试推荐Agent"""
     
-    @patch('src.agent.specialized_agents.config')
-    @patch('src.agent.specialized_agents.ChatOpenAI')
+    @patch('src.agent.llm_registry.config')
+    @patch('src.agent.llm_registry.ChatOpenAI')
     def test_recommendation_agent_creation(self, mock_llm, mock_config):
         """测试推荐Agent创建"""
         # 模拟配置
@@ -173,6 +174,38 @@ class TestRecommendationAgent(unittest.TestCase):
             self.fail(f"RecommendationAgent创建失败: {str(e)}")
 
 
+
+class TestSharedLLMRegistry(unittest.TestCase):
+    """测试专门Agent共享LLM实例和Agent"""
+    
+    def setUp(self):
+        clear_llm_registry()
+        self.addCleanup(clear_llm_registry)
+    
+    @patch('src.agent.llm_registry.config')
+    @patch('src.agent.llm_registry.ChatOpenAI')
+    def test_agents_share_llm_and_agent(self, mock_llm, mock_config):
+        """测试多个Agent实例共用一个LLM客户端，同类Agent复用同一个Agent"""
+        mock_config.get.side_effect = lambda key, default=None: default
+        mock_config.llm_provider = "openai"
+        mock_config.openai_api_key = "test_key"
+        mock_config.llm_model = "gpt-3.5-turbo"
+        mock_config.openai_api_base = None
+        mock_llm.return_value = MagicMock()
+        
+        first = WeatherAgent(verbose=False)
+        second = WeatherAgent(verbose=False)
+        transport = TransportAgent(verbose=False)
+        
+        self.assertEqual(mock_llm.call_count, 1)
+        self.assertIs(first.llm, transport.llm)
+        self.assertIs(first.agent_executor.agent.runnable, second.agent_executor.agent.runnable)
+        
+        stats = llm_registry_stats()
+        self.assertEqual(stats["llms"], 1)
+        self.assertEqual(stats["agents"], 2)  # WeatherAgent 和 TransportAgent
+
+
 if __name__ == '__main__':
     print("=" * 60)
     print("专门Agent功能测试")
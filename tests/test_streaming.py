@@ -0,0 +1,137 @@
+"""测试LLM token流式输出（token事件、专门Agent的token转发、TravelAgent.chat_stream）"""
+import os
+import sys
+import unittest
+import uuid
+from unittest.mock import MagicMock, patch
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.messages import HumanMessage
+
+from src.agent.fake_llm import ScriptedChatModel
+from src.agent.llm_registry import clear_llm_registry
+from src.agent.specialized_agents import WeatherAgent, get_specialized_agent, reset_specialized_agents
+from src.agent.streaming import TokenStreamHandler, current_token_callbacks, stream_tokens
+
+
+class TestTokenStreamHandler(unittest.TestCase):
+    """测试token处理器"""
+    
+    def test_segments(self):
+        """测试按LLM调用划分片段，跳过空token，专门Agent的处理器共享片段序号"""
+        events = []
+        handler = TokenStreamHandler(events.append)
+        first, second = uuid.uuid4(), uuid.uuid4()
+        handler.on_llm_new_token("", run_id=first)
+        handler.on_llm_new_token("北京", run_id=first)
+        handler.nested().on_llm_new_token("晴", run_id=second)
+        handler.on_llm_new_token("天", run_id=first)
+        
+        self.assertEqual(events, [
+            {"token": "北京", "segment": 0, "source": "coordinator"},
+            {"token": "晴", "segment": 1, "source": "agent"},
+            {"token": "天", "segment": 0, "source": "coordinator"},
+        ])
+        self.assertEqual(handler.segments, 2)
+    
+    def test_context(self):
+        """测试只在 stream_tokens 上下文中为专门Agent提供回调"""
+        self.assertEqual(current_token_callbacks(), [])
+        handler = TokenStreamHandler(lambda event: None)
+        with stream_tokens(handler):
+            callbacks = current_token_callbacks()
+            self.assertEqual(len(callbacks), 1)
+            self.assertEqual(callbacks[0].source, "agent")
+        self.assertEqual(current_token_callbacks(), [])
+    
+    def test_scripted_model_streaming_invoke(self):
+        """测试开启 streaming 后 invoke 也逐个token回调"""
+        events = []
+        llm = ScriptedChatModel(default_response="一二三四五六", chars_per_token=2, streaming=True)
+        result = llm.invoke([HumanMessage(content="你好")], config={"callbacks": [TokenStreamHandler(events.append)]})
+        self.assertEqual(result.content, "一二三四五六")
+        self.assertEqual([event["token"] for event in events], ["一二", "三四", "五六"])
+
+
+class TestAgentStreaming(unittest.TestCase):
+    """测试专门Agent和TravelAgent的流式输出（本地脚本化模型）"""
+    
+    def setUp(self):
+        reset_specialized_agents()
+        clear_llm_registry()
+        self.addCleanup(reset_specialized_agents)
+        self.addCleanup(clear_llm_registry)
+        settings = {"llm.fake.token_latency": 0.002, "agent.response_cache.enabled": False}
+        patchers = [patch('src.agent.llm_registry.config'), patch('src.agent.travel_agent.config'),
+                    patch('src.agent.fake_llm.config'), patch('src.agent.response_cache.config')]
+        for patcher in patchers:
+            mock_config = patcher.start()
+            mock_config.get.side_effect = lambda key, default=None: settings.get(key, default)
+            mock_config.llm_provider = "fake"
+            mock_config.llm_model = "scripted"
+            self.addCleanup(patcher.stop)
+    
+    def test_specialized_agent_tokens(self):
+        """测试专门Agent在 stream_tokens 上下文中转发最终回答的token"""
+        events = []
+        agent = get_specialized_agent(WeatherAgent)
+        with stream_tokens(TokenStreamHandler(events.append)):
+            result = agent.query("北京明天天气怎么样？")
+        
+        self.assertTrue(events)
+        self.assertTrue(all(event["source"] == "agent" for event in events))
+        self.assertEqual("".join(event["token"] for event in events), result)
+    
+    def test_chat_stream(self):
+        """测试主协调Agent路径和快速路径都逐段输出，拼接结果与保存的回答一致，且首个片段在回答完成前输出"""
+        from src.agent.travel_agent import TravelAgent
+        for use_router in (False, True):
+            with self.subTest(use_router=use_router):
+                agent = TravelAgent(verbose=False, session_id=f"user-{use_router}")
+                if not use_router:
+                    agent.intent_router = None
+                chunks, saved_at_first_chunk = [], None
+                for chunk in agent.chat_stream("北京明天天气怎么样？"):
+                    if saved_at_first_chunk is None:
+                        # 回答完成后才写入对话记忆
+                        saved_at_first_chunk = len(agent.agent_executor.memory.chat_memory.messages)
+                    chunks.append(chunk)
+                
+                self.assertGreater(len(chunks), 1)
+                self.assertEqual(saved_at_first_chunk, 0)
+                saved = agent.agent_executor.memory.chat_memory.messages[-1].content
+                self.assertEqual("".join(chunks), saved)
+    
+    def test_chat_stream_finalizes_like_chat(self):
+        """测试 chat_stream 的主协调Agent路径与 chat 一样处理回答（友好错误提示、记忆统计）并记录LLM路由耗时"""
+        from src.agent.intent_router import RouteDecision
+        from src.agent.travel_agent import TravelAgent
+        agent = TravelAgent(verbose=False, session_id="user-finalize")
+        agent.intent_router = MagicMock()
+        agent.intent_router.route.return_value = RouteDecision()
+        with patch.object(agent, "_finalize_output", wraps=agent._finalize_output) as finalize:
+            output = "".join(agent.chat_stream("北京明天天气怎么样？"))
+        
+        self.assertTrue(output)
+        finalize.assert_called_once()
+        agent.intent_router.record.assert_called_once()
+        self.assertIsNone(agent.intent_router.record.call_args[0][0].intent)
+    
+    def test_chat_stream_tool_progress(self):
+        """测试 chat_stream 通过事件总线回调专门Agent的开始和完成进度"""
+        from src.agent.travel_agent import TravelAgent
+        agent = TravelAgent(verbose=False, session_id="user-progress")
+        agent.intent_router = None
+        progress = []
+        output = "".join(agent.chat_stream("北京明天天气怎么样？", on_tool_call=lambda tool, message: progress.append((tool, message))))
+        
+        self.assertTrue(output)
+        self.assertEqual([tool for tool, _ in progress], ["query_weather_agent", "query_weather_agent"])
+        self.assertEqual(progress[0][1], "正在查询天气查询...")
+        self.assertTrue(progress[1][1].startswith("✓ 天气查询完成："))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
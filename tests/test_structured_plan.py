@@ -0,0 +1,111 @@
+"""测试结构化行程规划（直接根据旅行信息调用工具，只调用一次规划LLM）"""
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain.agents import AgentExecutor
+
+from src.agent.fake_llm import ScriptedChatModel
+from src.agent.llm_registry import clear_llm_registry
+from src.agent.specialized_agents import reset_specialized_agents
+from src.agent.structured_plan import build_plan_arguments
+from tests.fixtures import TestCallbackHandler
+
+TRAVEL_INFO = {
+    "departureDate": "2026-05-01",
+    "returnDate": "2026-05-03",
+    "destination": "杭州",
+    "departureCity": "上海",
+    "transportMode": "自驾",
+    "hotelPreference": "经济型",
+    "interests": "历史、美食",
+    "budget": "3000",
+}
+
+
+class TestBuildPlanArguments(unittest.TestCase):
+    """测试根据旅行信息构建工具参数"""
+    
+    def test_full_travel_info(self):
+        """测试完整的旅行信息"""
+        arguments = build_plan_arguments(TRAVEL_INFO, session_id="user-1")
+        self.assertEqual(arguments["days"], 3)
+        self.assertEqual(arguments["destination"], "杭州")
+        self.assertEqual(arguments["budget"], 3000.0)
+        self.assertEqual(arguments["departure_city"], "上海")
+        self.assertEqual(arguments["hotel_preference"], "经济型")
+        self.assertIn("兴趣偏好：历史、美食", arguments["preferences"])
+        self.assertEqual(arguments["session_id"], "user-1")
+    
+    def test_incomplete_travel_info(self):
+        """测试缺少目的地、日期格式错误或返回日期早于出发日期时返回None"""
+        self.assertIsNone(build_plan_arguments({}))
+        self.assertIsNone(build_plan_arguments({**TRAVEL_INFO, "destination": ""}))
+        self.assertIsNone(build_plan_arguments({**TRAVEL_INFO, "departureDate": "5月1日"}))
+        self.assertIsNone(build_plan_arguments({**TRAVEL_INFO, "returnDate": "2026-04-30"}))
+    
+    def test_optional_fields(self):
+        """测试可选字段缺失时参数为None"""
+        arguments = build_plan_arguments({
+            "departureDate": "2026-05-01", "returnDate": "2026-05-01", "destination": "杭州", "budget": "不限"
+        })
+        self.assertEqual(arguments["days"], 1)
+        self.assertIsNone(arguments["budget"])
+        self.assertIsNone(arguments["departure_city"])
+        self.assertIsNone(arguments["preferences"])
+
+
+class TestTravelAgentStructuredPlan(unittest.TestCase):
+    """测试TravelAgent的结构化规划"""
+    
+    def setUp(self):
+        reset_specialized_agents()
+        clear_llm_registry()
+        self.addCleanup(reset_specialized_agents)
+        self.addCleanup(clear_llm_registry)
+        patchers = [patch('src.agent.llm_registry.config'), patch('src.agent.travel_agent.config')]
+        for patcher in patchers:
+            mock_config = patcher.start()
+            mock_config.get.side_effect = lambda key, default=None: default
+            mock_config.llm_provider = "fake"
+            self.addCleanup(patcher.stop)
+        
+        from src.agent.travel_agent import TravelAgent
+        self.agent = TravelAgent(verbose=False, session_id="user-1")
+    
+    def test_single_llm_call(self):
+        """测试只调用一次LLM，且不经过任何Agent执行器；附加旅行信息上下文的输入写入对话记忆"""
+        self.agent.set_travel_info(TRAVEL_INFO)
+        combined_input = self.agent._prepare_input("请为我规划一个3天的杭州旅行行程")
+        handler = TestCallbackHandler()
+        with patch.object(ScriptedChatModel, "_generate", autospec=True,
+                          side_effect=ScriptedChatModel._generate) as mock_generate, \
+             patch.object(AgentExecutor, "invoke") as mock_invoke:
+            output = self.agent.plan_from_travel_info("请为我规划一个3天的杭州旅行行程", callbacks=[handler],
+                                                      combined_input=combined_input)
+        
+        self.assertTrue(output)
+        self.assertEqual(mock_generate.call_count, 1)
+        mock_invoke.assert_not_called()
+        self.assertEqual(handler.get_agent_call_sequence(), ["query_planning_agent"])
+        # 规划提示包含工具直接查询到的信息
+        plan_prompt = mock_generate.call_args[0][1][-1].content
+        self.assertIn("目的地：杭州", plan_prompt)
+        self.assertIn("酒店价格信息", plan_prompt)
+        messages = self.agent.agent_executor.memory.chat_memory.messages
+        self.assertEqual(len(messages), 2)
+        self.assertEqual(messages[0].content, combined_input)
+        self.assertIn(TRAVEL_INFO["departureDate"], messages[0].content)
+    
+    def test_incomplete_info_falls_back(self):
+        """测试旅行信息不完整时返回None（交给主协调Agent）"""
+        self.agent.set_travel_info({"departureDate": "2026-05-01", "returnDate": "2026-05-03"})
+        self.assertIsNone(self.agent.plan_from_travel_info("请为我规划一个3天的旅行行程"))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
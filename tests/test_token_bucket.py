@@ -0,0 +1,119 @@
+"""测试令牌桶限流器"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import unittest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.token_bucket import TokenBucket
+from src.utils.amap_rate_limiter import get_amap_rate_limiter
+from src.utils.cancellation import CancellationToken, RunCancelled, cancellation_scope
+
+
+class TestTokenBucket(unittest.TestCase):
+    """测试令牌桶限流器"""
+    
+    def test_burst_then_wait_time(self):
+        """测试桶内令牌用完后返回精确的等待时间"""
+        bucket = TokenBucket(rate=10, burst=2)
+        self.assertEqual(bucket.try_acquire(), 0.0)
+        self.assertEqual(bucket.try_acquire(), 0.0)
+        
+        wait = bucket.try_acquire()
+        self.assertGreater(wait, 0.0)
+        self.assertLessEqual(wait, 0.1)
+    
+    def test_try_acquire_does_not_consume_when_empty(self):
+        """测试获取失败时不消耗令牌"""
+        bucket = TokenBucket(rate=10, burst=1)
+        bucket.try_acquire()
+        first_wait = bucket.try_acquire()
+        second_wait = bucket.try_acquire()
+        self.assertAlmostEqual(first_wait, second_wait, delta=0.02)
+    
+    def test_reservations_are_spaced(self):
+        """测试排队的请求按补充速率依次放行"""
+        bucket = TokenBucket(rate=20, burst=1)
+        delays = [bucket.reserve() for _ in range(4)]
+        self.assertEqual(delays[0], 0.0)
+        for previous, current in zip(delays, delays[1:]):
+            self.assertAlmostEqual(current - previous, 0.05, delta=0.01)
+    
+    def test_wait_does_not_hold_lock(self):
+        """测试等待期间其他线程仍可查询令牌状态"""
+        bucket = TokenBucket(rate=2, burst=1)
+        bucket.reserve()
+        waiter = threading.Thread(target=bucket.wait)
+        waiter.start()
+        time.sleep(0.05)
+        
+        begin = time.perf_counter()
+        bucket.try_acquire()
+        self.assertLess(time.perf_counter() - begin, 0.05)
+        waiter.join()
+    
+    def test_async_acquire(self):
+        """测试异步获取令牌"""
+        bucket = TokenBucket(rate=20, burst=1)
+        
+        async def acquire_many():
+            return [await bucket.acquire() for _ in range(3)]
+        
+        begin = time.perf_counter()
+        delays = asyncio.run(acquire_many())
+        self.assertEqual(delays[0], 0.0)
+        self.assertGreaterEqual(time.perf_counter() - begin, 0.09)
+    
+    def test_cancelled_wait_refunds_token(self):
+        """测试等待令牌时运行被取消，立即结束等待并退还预约的令牌"""
+        bucket = TokenBucket(rate=1, burst=1)
+        bucket.reserve()
+        token = CancellationToken()
+        results = []
+        
+        def wait():
+            with cancellation_scope(token):
+                try:
+                    bucket.wait()
+                except RunCancelled:
+                    results.append(time.perf_counter())
+        
+        waiter = threading.Thread(target=wait)
+        waiter.start()
+        time.sleep(0.05)
+        begin = time.perf_counter()
+        token.cancel()
+        waiter.join(2)
+        self.assertEqual(len(results), 1)
+        self.assertLess(results[0] - begin, 0.5)
+        # 未退还时约为 -1（被放弃的预约仍在排队）
+        self.assertGreater(bucket.available_tokens, -0.5)
+    
+    def test_async_cancel_refunds_token(self):
+        """测试异步等待令牌的任务被取消时退还预约的令牌"""
+        bucket = TokenBucket(rate=1, burst=1)
+        bucket.reserve()
+        
+        async def cancel_waiter():
+            task = asyncio.ensure_future(bucket.acquire())
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+        
+        asyncio.run(cancel_waiter())
+        self.assertGreater(bucket.available_tokens, -0.5)
+    
+    def test_amap_limiter_exposes_bucket(self):
+        """测试高德地图限流器提供非阻塞获取接口和状态"""
+        limiter = get_amap_rate_limiter()
+        self.assertIsInstance(limiter.try_acquire(), float)
+        self.assertIn("rate", limiter.stats())
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,160 @@
+"""测试工具结果记忆（参数规范化、请求范围、全局TTL、失败结果不跨请求缓存、异步调用和线程池中的请求范围）"""
+import asyncio
+import os
+import sys
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.tools import tool
+
+from src.agent.tool_memo import (
+    MemoizedTool,
+    clear_tool_memo,
+    memoize_tool,
+    normalize_date,
+    normalize_place,
+    tool_memo_stats,
+    tool_request_scope,
+)
+from src.agent.tools import _prefetch_sources, get_attraction_ticket_prices, get_weather_info
+
+calls = []
+
+
+@memoize_tool(ttl=60, normalize={"city": normalize_place, "date": normalize_date})
+@tool
+def memo_weather(city: str, date: str) -> str:
+    """测试用的天气查询"""
+    calls.append((city, date))
+    if city == "未知":
+        return f"无法获取{city}在{date}的天气信息。未找到城市{city}，请检查城市名称是否正确。"
+    return f"{city}{date}晴"
+
+
+@memoize_tool(ttl=0.05)
+@tool
+def memo_short(city: str) -> str:
+    """测试用的短TTL查询"""
+    calls.append((city,))
+    return f"{city}结果"
+
+
+@memoize_tool(ttl=0)
+@tool
+def memo_request_only(city: str) -> str:
+    """测试用的只在请求内复用的查询"""
+    calls.append((city,))
+    return f"{city}结果"
+
+
+async def amemo_weather(city: str, date: str) -> str:
+    calls.append(("async", city, date))
+    return f"{city}{date}晴"
+
+
+memo_weather.coroutine = amemo_weather
+
+
+class TestToolMemo(unittest.TestCase):
+    """测试工具结果记忆"""
+    
+    def setUp(self):
+        calls.clear()
+        clear_tool_memo()
+    
+    def test_normalizers(self):
+        """测试地名和日期的规范化"""
+        self.assertEqual(normalize_place(" 北京市 "), "北京")
+        self.assertEqual(normalize_place("沙市"), "沙市")
+        self.assertEqual(normalize_place("Hang Zhou"), "hangzhou")
+        for value in ("2026-5-1", "2026/05/01", "2026年5月1日", "20260501", " 2026-05-01 "):
+            self.assertEqual(normalize_date(value), "2026-05-01")
+        self.assertEqual(normalize_date("明天"), "明天")
+        self.assertEqual(normalize_date("2026-13-40"), "2026-13-40")
+    
+    def test_global_hit_with_normalized_arguments(self):
+        """测试规范化后参数相同的调用跨请求命中，工具收到的是原始参数"""
+        first = memo_weather.invoke({"city": "北京市", "date": "2026/5/1"})
+        second = memo_weather.invoke({"city": " 北京 ", "date": "2026-05-01"})
+        self.assertEqual(second, first)
+        self.assertEqual(calls, [("北京市", "2026/5/1")])
+        
+        stats = tool_memo_stats()["memo_weather"]
+        self.assertEqual(stats["global_hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+    
+    def test_failure_only_reused_within_request(self):
+        """测试查询失败的结果只在请求范围内复用"""
+        with tool_request_scope():
+            memo_weather.invoke({"city": "未知", "date": "2026-05-01"})
+            memo_weather.invoke({"city": "未知", "date": "2026-05-01"})
+        self.assertEqual(len(calls), 1)
+        
+        memo_weather.invoke({"city": "未知", "date": "2026-05-01"})
+        self.assertEqual(len(calls), 2)
+        self.assertGreaterEqual(tool_memo_stats()["memo_weather"]["failures_not_cached"], 1)
+    
+    def test_estimate_after_api_error_not_cached(self):
+        """测试高德地图接口出错后的景点门票估算只在请求范围内复用，下一个请求重新调用接口"""
+        def no_geocode(city, api_key):
+            return None, None
+            yield
+        
+        limiter = MagicMock()
+        limiter.get.return_value = MagicMock(status_code=500)
+        arguments = {"city": "测试城市甲"}
+        with patch.dict(os.environ, {"AMAP_API_KEY": "test-key"}), patch("src.agent.tools._amap_limiter", limiter), \
+                patch("src.agent.tools._geocode_steps", no_geocode):
+            result = get_attraction_ticket_prices.invoke(arguments)
+            get_attraction_ticket_prices.invoke(arguments)
+        self.assertTrue(result.startswith("高德地图API请求失败（HTTP 500）"))
+        self.assertIn("门票价格估算", result)
+        self.assertEqual(limiter.get.call_count, 2)
+        stats = tool_memo_stats()["get_attraction_ticket_prices"]
+        self.assertEqual(stats["global_hits"], 0)
+        self.assertEqual(stats["failures_not_cached"], 2)
+    
+    def test_expiry_and_request_only(self):
+        """测试全局缓存过期，ttl为0的工具只在请求范围内复用"""
+        memo_short.invoke({"city": "杭州"})
+        time.sleep(0.1)
+        memo_short.invoke({"city": "杭州"})
+        self.assertEqual(len(calls), 2)
+        
+        with tool_request_scope():
+            memo_request_only.invoke({"city": "杭州"})
+            # 嵌套的范围沿用外层范围
+            with tool_request_scope():
+                memo_request_only.invoke({"city": "杭州"})
+        memo_request_only.invoke({"city": "杭州"})
+        self.assertEqual(len(calls), 4)
+    
+    def test_async_shares_memo(self):
+        """测试异步调用使用装饰后绑定的 coroutine，并与同步调用共用记忆"""
+        result = asyncio.run(memo_weather.ainvoke({"city": "上海", "date": "2026-05-01"}))
+        self.assertEqual(memo_weather.invoke({"city": "上海", "date": "2026-05-01"}), result)
+        self.assertEqual(calls, [("async", "上海", "2026-05-01")])
+    
+    def test_prefetch_threads_share_request_scope(self):
+        """测试线程池中的预取查询能复用当前请求范围内的结果"""
+        fetch = lambda: memo_request_only.invoke({"city": "苏州"})
+        with tool_request_scope():
+            fetch()
+            results = _prefetch_sources({"a": fetch, "b": fetch}, timeout=5)
+        self.assertEqual(results["a"], ("苏州结果", None))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(tool_memo_stats()["memo_request_only"]["request_hits"], 2)
+    
+    def test_travel_tools_memoized(self):
+        """测试旅行工具已启用结果记忆"""
+        self.assertIsInstance(get_weather_info, MemoizedTool)
+        self.assertIn("get_weather_info", tool_memo_stats())
+        self.assertEqual(get_weather_info.name, "get_weather_info")
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)